@@ -0,0 +1,85 @@
+"""
+Benchmark for storing the visited tiles of an uploaded track.
+
+Compares the previous approach (one INSERT and one commit per tile) with BulkTileWriter
+(multi-row INSERT ... ON CONFLICT DO NOTHING and a single commit) for tracks of different lengths.
+
+By default a temporary SQLite database file is used. Set the environment variable BENCHMARK_DATABASE_URI to run
+against another database, e.g. PostgreSQL. All rows written by the benchmark are deleted afterward.
+
+Usage (from the repository root):
+    python -m benchmarks.benchmark_BulkTileWriter
+"""
+
+import os
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import delete
+
+from sporttracker.db import db
+from sporttracker.tileHunting.BulkTileWriter import BulkTileWriter
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+
+BENCHMARK_WORKOUT_ID_OFFSET = 900_000_000
+NUMBERS_OF_TILES = [100, 500, 1500]
+
+
+def create_track_tiles(numberOfTiles: int) -> list[tuple[int, int]]:
+    # a track is a connected line of tiles
+    return [(8799 + index // 2, 5373 + (index + 1) // 2) for index in range(numberOfTiles)]
+
+
+def insert_tile_by_tile(workoutId: int, tiles: list[tuple[int, int]]) -> None:
+    for x, y in tiles:
+        db.session.add(GpxVisitedTile(workout_id=workoutId, x=x, y=y))
+        db.session.commit()
+
+
+def insert_bulk(workoutId: int, tiles: list[tuple[int, int]]) -> None:
+    BulkTileWriter.insert_visited_tiles(db.session, workoutId, tiles)
+    db.session.commit()
+
+
+def measure(insertFunction, workoutId: int, tiles: list[tuple[int, int]]) -> float:
+    startTime = time.perf_counter()
+    insertFunction(workoutId, tiles)
+    duration = time.perf_counter() - startTime
+
+    if GpxVisitedTile.query.filter(GpxVisitedTile.workout_id == workoutId).count() != len(tiles):
+        raise AssertionError(f'Not all tiles were stored for workout {workoutId}')
+
+    return duration
+
+
+def run_benchmark(databaseUri: str) -> None:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = databaseUri
+    db.init_app(app)
+
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=[GpxVisitedTile.__table__])
+
+        print(f'{"tiles":>6} | {"tile by tile [ms]":>18} | {"bulk [ms]":>10} | {"speedup":>8}')
+        try:
+            for index, numberOfTiles in enumerate(NUMBERS_OF_TILES):
+                tiles = create_track_tiles(numberOfTiles)
+                workoutId = BENCHMARK_WORKOUT_ID_OFFSET + 2 * index
+
+                tileByTileDuration = measure(insert_tile_by_tile, workoutId, tiles)
+                bulkDuration = measure(insert_bulk, workoutId + 1, tiles)
+
+                print(
+                    f'{numberOfTiles:>6} | {tileByTileDuration * 1000:>18.1f} | {bulkDuration * 1000:>10.1f} | '
+                    f'{tileByTileDuration / bulkDuration:>7.1f}x'
+                )
+        finally:
+            db.session.execute(delete(GpxVisitedTile).where(GpxVisitedTile.workout_id >= BENCHMARK_WORKOUT_ID_OFFSET))
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        defaultDatabaseUri = f'sqlite:///{os.path.join(temporaryDirectory, "benchmark.db")}'
+        run_benchmark(os.environ.get('BENCHMARK_DATABASE_URI', defaultDatabaseUri))
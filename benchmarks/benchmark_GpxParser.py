@@ -0,0 +1,202 @@
+"""
+Benchmark for GpxParser.get_visited_tiles.
+
+Generates long random tracks with different distances between consecutive points (dense recordings, FIT files
+recorded every 10 seconds and sparse planned routes) and extracts the visited tiles with
+- the previous implementation (convert_coordinate_to_tile_position for every point)
+- the point-only mode
+- the segment mode (all tiles crossed by the lines between consecutive points)
+
+Prints the durations and the number of tiles found by each mode.
+
+Afterwards the metadata and tile extraction of a long multi-day track is compared between GpxParser (gpxpy object
+tree), GpxStreamParser (expat, typed arrays) and the track points file written during the upload (memory-mapped,
+no gpx parsing): duration and peak memory (tracemalloc).
+
+Usage (from the repository root):
+    python -m benchmarks.benchmark_GpxParser
+"""
+
+import math
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from typing import Any
+from zipfile import ZipFile, ZIP_DEFLATED
+
+from sporttracker.gpx.GpxParser import GpxParser, VisitedTile, TileExtractionMode
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+
+BASE_ZOOM_LEVEL = 14
+TRACK_LENGTH_IN_KILOMETERS = 200
+START_LATITUDE = 52.5145
+START_LONGITUDE = 13.3503
+METERS_PER_DEGREE_LATITUDE = 111_320
+NUMBER_OF_REPETITIONS = 3
+# distance between consecutive points in meters and number of points of the multi-day track
+STREAM_TRACK_POINT_DISTANCE = 5
+STREAM_TRACK_NUMBER_OF_POINTS = 200_000
+
+# name and distance between consecutive points in meters
+TRACK_VARIANTS = [
+    ('dense recording', 5),
+    ('fit file (10 s at 30 km/h)', 83),
+    ('planned route', 400),
+    ('sparse planned route', 2000),
+]
+
+
+def create_gpx(
+    distanceBetweenPoints: float, randomGenerator: random.Random, numberOfPoints: int | None = None
+) -> bytes:
+    if numberOfPoints is None:
+        numberOfPoints = int(TRACK_LENGTH_IN_KILOMETERS * 1000 / distanceBetweenPoints)
+    latitude = START_LATITUDE
+    longitude = START_LONGITUDE
+    heading = randomGenerator.uniform(0, 2 * math.pi)
+
+    points: list[str] = []
+    for _ in range(numberOfPoints):
+        elevation = 100 + 50 * math.sin(len(points) / 500)
+        points.append(
+            f'<trkpt lat="{latitude:.7f}" lon="{longitude:.7f}"><ele>{elevation:.1f}</ele>'
+            f'<time>2024-05-01T10:00:00Z</time></trkpt>'
+        )
+
+        heading += randomGenerator.gauss(0, 0.02)
+        latitude += math.cos(heading) * distanceBetweenPoints / METERS_PER_DEGREE_LATITUDE
+        longitude += (
+            math.sin(heading) * distanceBetweenPoints / (METERS_PER_DEGREE_LATITUDE * math.cos(math.radians(latitude)))
+        )
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="benchmark" xmlns="http://www.topografix.com/GPX/1/1">'
+        f'<trk><trkseg>{"".join(points)}</trkseg></trk></gpx>'
+    ).encode('utf-8')
+
+
+def get_visited_tiles_point_by_point(parser: GpxParser) -> set[VisitedTile]:
+    visitedTiles = set()
+    for track in parser._gpx.tracks:
+        for segment in track.segments:
+            for point in segment.points:
+                visitedTiles.add(
+                    GpxParser.convert_coordinate_to_tile_position(point.latitude, point.longitude, BASE_ZOOM_LEVEL)
+                )
+
+    return visitedTiles
+
+
+def measure(function) -> tuple[float, set[VisitedTile]]:
+    durations = []
+    result: set[VisitedTile] = set()
+    for _ in range(NUMBER_OF_REPETITIONS):
+        startTime = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - startTime)
+
+    return min(durations), result
+
+
+def run_benchmark() -> None:
+    randomGenerator = random.Random(42)
+
+    print(
+        f'{"track":>27} | {"points":>6} | {"previous [ms]":>13} | {"points [ms]":>11} | {"segments [ms]":>13} | '
+        f'{"point tiles":>11} | {"segment tiles":>13}'
+    )
+    for name, distanceBetweenPoints in TRACK_VARIANTS:
+        parser = GpxParser(create_gpx(distanceBetweenPoints, randomGenerator))
+        numberOfPoints = parser._gpx.get_points_no()
+
+        previousDuration, previousTiles = measure(lambda: get_visited_tiles_point_by_point(parser))
+        pointDuration, pointTiles = measure(lambda: parser.get_visited_tiles(BASE_ZOOM_LEVEL))
+        segmentDuration, segmentTiles = measure(
+            lambda: parser.get_visited_tiles(BASE_ZOOM_LEVEL, TileExtractionMode.SEGMENTS)
+        )
+
+        if pointTiles != previousTiles:
+            raise AssertionError(f'Point-only extraction differs from the previous implementation ({name})')
+        if not pointTiles <= segmentTiles:
+            raise AssertionError(f'Segment extraction misses tiles of the track points ({name})')
+
+        print(
+            f'{name:>27} | {numberOfPoints:>6} | {previousDuration * 1000:>13.1f} | {pointDuration * 1000:>11.1f} | '
+            f'{segmentDuration * 1000:>13.1f} | {len(pointTiles):>11} | {len(segmentTiles):>13}'
+        )
+
+
+def measure_parsing(zipFilePath: str, parse) -> tuple[float, int, Any]:
+    tracemalloc.start()
+    startTime = time.perf_counter()
+    with ZipFile(zipFilePath) as zipObject:
+        with zipObject.open('track.gpx') as gpxFile:
+            result = parse(gpxFile)
+    duration = time.perf_counter() - startTime
+    _, peakMemory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return duration, peakMemory, result
+
+
+def run_stream_benchmark(zipFilePath: str) -> None:
+    randomGenerator = random.Random(42)
+    with ZipFile(zipFilePath, mode='w', compression=ZIP_DEFLATED) as zipObject:
+        zipObject.writestr(
+            'track.gpx', create_gpx(STREAM_TRACK_POINT_DISTANCE, randomGenerator, STREAM_TRACK_NUMBER_OF_POINTS)
+        )
+
+    def parse_with_gpxpy(gpxFile):
+        parser = GpxParser(gpxFile.read())
+        return parser.get_meta_info(), parser.get_visited_tiles(BASE_ZOOM_LEVEL)
+
+    def parse_with_stream(gpxFile):
+        parser = GpxStreamParser(gpxFile)
+        return parser.get_meta_info(), parser.get_visited_tiles(BASE_ZOOM_LEVEL)
+
+    print()
+    print(f'{"parser":>15} | {"points":>7} | {"duration [ms]":>13} | {"peak memory [MB]":>16}')
+    results = []
+    for name, parse in [('GpxParser', parse_with_gpxpy), ('GpxStreamParser', parse_with_stream)]:
+        duration, peakMemory, result = measure_parsing(zipFilePath, parse)
+        results.append(result)
+        print(
+            f'{name:>15} | {STREAM_TRACK_NUMBER_OF_POINTS:>7} | {duration * 1000:>13.1f} | '
+            f'{peakMemory / 1024 / 1024:>16.1f}'
+        )
+
+    if results[0] != results[1]:
+        raise AssertionError('GpxStreamParser differs from GpxParser')
+
+    # tile extraction from the track points file written during the upload (no gpx is parsed)
+    trackPointsFilePath = zipFilePath.replace('.gpx.zip', '.points')
+    with ZipFile(zipFilePath) as zipObject:
+        with zipObject.open('track.gpx') as gpxFile:
+            GpxStreamParser(gpxFile).get_track_points().save(trackPointsFilePath)
+
+    tracemalloc.start()
+    startTime = time.perf_counter()
+    tiles = GpxParser.get_visited_tiles_of_segments(
+        GpxTrackPoints.load(trackPointsFilePath).get_segments(), BASE_ZOOM_LEVEL
+    )
+    duration = time.perf_counter() - startTime
+    _, peakMemory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(
+        f'{"points file":>15} | {STREAM_TRACK_NUMBER_OF_POINTS:>7} | {duration * 1000:>13.1f} | '
+        f'{peakMemory / 1024 / 1024:>16.1f}'
+    )
+    if tiles != results[1][1]:
+        raise AssertionError('Tiles from the track points file differ from GpxParser')
+
+
+if __name__ == '__main__':
+    run_benchmark()
+
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        run_stream_benchmark(os.path.join(temporaryDirectory, 'track.gpx.zip'))
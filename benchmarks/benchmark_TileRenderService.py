@@ -0,0 +1,336 @@
+"""
+Benchmark for TileRenderService.render_image.
+
+Renders the same set of tiles for the zoom levels 9 to 18 with the current renderer and with the previous
+pixel-by-pixel implementation, verifies that both produce byte-identical PNGs and prints the timings.
+
+Afterward, renders a typical map view of 8x6 tiles tile by tile and as metatiles and compares the number of
+bounding box queries.
+
+Finally, compares the response size and duration of the rendered PNGs with the vector tiles of the TileVectorService.
+
+Usage (from the repository root):
+    python -m benchmarks.benchmark_TileRenderService
+"""
+
+import io
+import json
+import math
+import random
+import time
+from unittest.mock import Mock
+
+from PIL import Image
+
+from sporttracker.gpx.GpxParser import VisitedTile
+from sporttracker.tileHunting.MaxSquareCache import MaxSquare
+from sporttracker.tileHunting.TileRenderService import TileRenderService, TileRenderColorMode
+from sporttracker.tileHunting.TileVectorService import TileVectorService
+from sporttracker.tileHunting.VisitedTileService import TileColorPosition, TileCountPosition
+
+BASE_ZOOM_LEVEL = 14
+TILE_SIZE = 256
+CENTER_X = 8799
+CENTER_Y = 5373
+NUMBER_OF_TILES_PER_ZOOM_LEVEL = 20
+BORDER_COLOR = (0, 0, 0, 200)
+MAX_SQUARE_COLOR = (3, 62, 125, 191)
+TILE_COLORS = ['#FFC10796', '#0DCAF080', '#39B856AA']
+
+
+class InMemoryVisitedTileService:
+    """
+    Answers the bounding box queries of VisitedTileService from randomly generated in-memory data.
+    """
+
+    def __init__(self, seed: int) -> None:
+        randomGenerator = random.Random(seed)
+
+        self._tileColorPositions = []
+        self._tileCountPositions = []
+        self._plannedTiles = []
+        for x in range(CENTER_X - 150, CENTER_X + 150):
+            for y in range(CENTER_Y - 150, CENTER_Y + 150):
+                value = randomGenerator.random()
+                if value < 0.35:
+                    for color in randomGenerator.sample(TILE_COLORS, randomGenerator.choice([1, 1, 1, 2])):
+                        self._tileColorPositions.append(TileColorPosition(color, x, y))
+                    self._tileCountPositions.append(TileCountPosition(randomGenerator.randint(1, 120), x, y))
+                elif value < 0.4:
+                    self._plannedTiles.append(VisitedTile(x, y))
+
+        self._maxSquare = MaxSquare(CENTER_X, CENTER_Y, 12)
+
+        # bucket all entries by their x coordinate to keep the cost of the simulated queries negligible
+        self._tileColorPositionsByX = self.__group_by_x(self._tileColorPositions)
+        self._tileCountPositionsByX = self.__group_by_x(self._tileCountPositions)
+        self._plannedTilesByX = self.__group_by_x(self._plannedTiles)
+
+    @staticmethod
+    def __group_by_x(entries: list) -> dict[int, list]:
+        entriesByX: dict[int, list] = {}
+        for entry in entries:
+            entriesByX.setdefault(entry.x, []).append(entry)
+        return entriesByX
+
+    @staticmethod
+    def __query(entriesByX: dict[int, list], min_x: int, max_x: int, min_y: int, max_y: int) -> list:
+        result: list = []
+        for x in range(min_x, max_x + 1):
+            result.extend(t for t in entriesByX.get(x, []) if min_y <= t.y <= max_y)
+        return result
+
+    def determine_tile_colors_of_workouts_that_visit_tiles(self, min_x, max_x, min_y, max_y, user_id):
+        return self.__query(self._tileColorPositionsByX, min_x, max_x, min_y, max_y)
+
+    def determine_planned_tiles(self, min_x, max_x, min_y, max_y, user_id):
+        return self.__query(self._plannedTilesByX, min_x, max_x, min_y, max_y)
+
+    def determine_number_of_visits(self, min_x, max_x, min_y, max_y, user_id):
+        return self.__query(self._tileCountPositionsByX, min_x, max_x, min_y, max_y)
+
+    def get_max_square(self):
+        return self._maxSquare
+
+
+class PixelByPixelTileRenderService(TileRenderService):
+    """
+    The previous implementation of render_image, which fills every pixel separately.
+    Only used as reference to verify the output of the current implementation.
+    """
+
+    def __transform_tile_positions_to_base_zoom_level(self, x: int, y: int, zoom: int) -> list[tuple[int, int]]:
+        if zoom == self._baseZoomLevel:
+            return [(x, y)]
+
+        transformerFunction = self.transform_position_zoom_in
+        step = 1
+        if zoom > self._baseZoomLevel:
+            transformerFunction = self.transform_position_zoom_out
+            step = -1
+
+        positions = [(x, y)]
+        newPositions: set[tuple[int, int]] = set()
+        while zoom != self._baseZoomLevel:
+            newPositions = set()
+            for position in positions:
+                newPositions = newPositions.union(set(transformerFunction(position[0], position[1])))
+            positions = list(newPositions)
+            zoom += step
+
+        return sorted(list(newPositions), key=lambda p: (p[0], p[1]))
+
+    def render_image(self, x, y, zoom, user_id, tileRenderColorMode, borderColor, maxSquareColor):
+        img = Image.new('RGBA', (self._tileSize, self._tileSize))
+        pixels = img.load()
+
+        positions = self.__transform_tile_positions_to_base_zoom_level(x, y, zoom)
+        numberOfElementsPerAxis = int(math.sqrt(len(positions)))
+        boxSize = int(self._tileSize / numberOfElementsPerAxis)
+        zoomDifference = zoom - self._baseZoomLevel
+
+        min_x = min(p[0] for p in positions)
+        max_x = max(p[0] for p in positions)
+        min_y = min(p[1] for p in positions)
+        max_y = max(p[1] for p in positions)
+
+        tileColorPositions = []
+        tileCountPositions = []
+        plannedTilePositions = []
+        if tileRenderColorMode == TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES:
+            tileColorPositions = self._visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles(
+                min_x, max_x, min_y, max_y, user_id
+            )
+            plannedTilePositions = self._visitedTileService.determine_planned_tiles(min_x, max_x, min_y, max_y, user_id)
+        else:
+            tileCountPositions = self._visitedTileService.determine_number_of_visits(
+                min_x, max_x, min_y, max_y, user_id
+            )
+
+        for row in range(0, numberOfElementsPerAxis):
+            for col in range(0, numberOfElementsPerAxis):
+                position = positions[row * numberOfElementsPerAxis + col]
+                if zoomDifference > 0:
+                    isTouchingUpperEdgeOfBaseZoomTile = x / 2**zoomDifference == position[0]
+                    isTouchingLeftEdgeOfBaseZoomTile = y / 2**zoomDifference == position[1]
+                else:
+                    isTouchingUpperEdgeOfBaseZoomTile = True
+                    isTouchingLeftEdgeOfBaseZoomTile = True
+
+                if tileRenderColorMode == TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES:
+                    isVisitPlanned = any([t for t in plannedTilePositions if t.x == position[0] and t.y == position[1]])
+                    colorToUse = TileRenderService.calculate_color(
+                        position[0], position[1], tileColorPositions, isVisitPlanned
+                    )
+                else:
+                    colorToUse = TileRenderService.calculate_heatmap_color(position[0], position[1], tileCountPositions)
+
+                if maxSquareColor is not None:
+                    maxSquare = self._visitedTileService.get_max_square()
+                    if maxSquare is not None and position in maxSquare.get_tile_positions():
+                        colorToUse = maxSquareColor
+
+                for pixelX in range(boxSize):
+                    for pixelY in range(boxSize):
+                        pixels[row * boxSize + pixelX, col * boxSize + pixelY] = colorToUse  # type: ignore[index]
+                        if borderColor is not None:
+                            pixels[row * boxSize + pixelX, col * boxSize + pixelY] = self.calculate_border_color(  # type: ignore[index]
+                                pixelX,
+                                pixelY,
+                                isTouchingUpperEdgeOfBaseZoomTile,
+                                isTouchingLeftEdgeOfBaseZoomTile,
+                                colorToUse,
+                                borderColor,
+                            )
+
+        return img
+
+
+def to_png(image: Image.Image) -> bytes:
+    with io.BytesIO() as output:
+        image.save(output, format='PNG')
+        return output.getvalue()
+
+
+def determine_tiles_for_zoom_level(zoom: int, randomGenerator: random.Random) -> list[tuple[int, int]]:
+    centerX = int(CENTER_X * 2.0 ** (zoom - BASE_ZOOM_LEVEL))
+    centerY = int(CENTER_Y * 2.0 ** (zoom - BASE_ZOOM_LEVEL))
+    return [
+        (centerX + randomGenerator.randint(-3, 3), centerY + randomGenerator.randint(-3, 3))
+        for _ in range(NUMBER_OF_TILES_PER_ZOOM_LEVEL)
+    ]
+
+
+def run_benchmark() -> None:
+    visitedTileService = InMemoryVisitedTileService(seed=42)
+    currentRenderer = TileRenderService(BASE_ZOOM_LEVEL, TILE_SIZE, visitedTileService)  # type: ignore[arg-type]
+    referenceRenderer = PixelByPixelTileRenderService(BASE_ZOOM_LEVEL, TILE_SIZE, visitedTileService)  # type: ignore[arg-type]
+    randomGenerator = random.Random(0)
+
+    renderVariants = [
+        (TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, BORDER_COLOR, MAX_SQUARE_COLOR),
+        (TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, None, None),
+        (TileRenderColorMode.NUMBER_OF_VISITS, BORDER_COLOR, None),
+    ]
+
+    print(f'{"zoom":>4} | {"reference [ms/tile]":>20} | {"current [ms/tile]":>18} | {"speedup":>8}')
+    for zoom in range(9, 19):
+        tiles = determine_tiles_for_zoom_level(zoom, randomGenerator)
+        referenceDuration = 0.0
+        currentDuration = 0.0
+        numberOfRenderedTiles = 0
+
+        for colorMode, borderColor, maxSquareColor in renderVariants:
+            for x, y in tiles:
+                startTime = time.perf_counter()
+                referenceImage = referenceRenderer.render_image(x, y, zoom, 1, colorMode, borderColor, maxSquareColor)
+                referenceDuration += time.perf_counter() - startTime
+
+                startTime = time.perf_counter()
+                currentImage = currentRenderer.render_image(x, y, zoom, 1, colorMode, borderColor, maxSquareColor)
+                currentDuration += time.perf_counter() - startTime
+
+                if to_png(referenceImage) != to_png(currentImage):
+                    raise AssertionError(f'Rendered PNGs differ for tile x: {x}, y: {y}, zoom: {zoom} ({colorMode})')
+
+                numberOfRenderedTiles += 1
+
+        referenceMilliseconds = referenceDuration / numberOfRenderedTiles * 1000
+        currentMilliseconds = currentDuration / numberOfRenderedTiles * 1000
+        print(
+            f'{zoom:>4} | {referenceMilliseconds:>20.2f} | {currentMilliseconds:>18.2f} | '
+            f'{referenceMilliseconds / currentMilliseconds:>7.1f}x'
+        )
+
+    print('All rendered PNGs are byte-identical.')
+
+
+def run_meta_tile_benchmark() -> None:
+    visitedTileService = InMemoryVisitedTileService(seed=42)
+    visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles = Mock(  # type: ignore[method-assign]
+        wraps=visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles
+    )
+    renderer = TileRenderService(BASE_ZOOM_LEVEL, TILE_SIZE, visitedTileService)  # type: ignore[arg-type]
+
+    print(f'\n{"zoom":>4} | {"metatile size":>13} | {"queries":>7} | {"duration [ms]":>13}')
+    for zoom in [12, 14, 16]:
+        centerX = int(CENTER_X * 2.0 ** (zoom - BASE_ZOOM_LEVEL))
+        centerY = int(CENTER_Y * 2.0 ** (zoom - BASE_ZOOM_LEVEL))
+        view = [(x, y) for x in range(centerX - 4, centerX + 4) for y in range(centerY - 3, centerY + 3)]
+
+        for metaTileSize in [1, 4]:
+            visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.reset_mock()
+            renderedImages: dict[tuple[int, int], Image.Image] = {}
+
+            startTime = time.perf_counter()
+            for x, y in view:
+                if (x, y) not in renderedImages:
+                    renderedImages.update(
+                        renderer.render_meta_tile(
+                            x,
+                            y,
+                            zoom,
+                            metaTileSize,
+                            1,
+                            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+                            BORDER_COLOR,
+                            MAX_SQUARE_COLOR,
+                        )
+                    )
+            duration = time.perf_counter() - startTime
+
+            numberOfQueries = visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.call_count
+            print(f'{zoom:>4} | {metaTileSize:>13} | {numberOfQueries:>7} | {duration * 1000:>13.1f}')
+
+
+def run_vector_benchmark() -> None:
+    visitedTileService = InMemoryVisitedTileService(seed=42)
+    renderer = TileRenderService(BASE_ZOOM_LEVEL, TILE_SIZE, visitedTileService)  # type: ignore[arg-type]
+    vectorService = TileVectorService(BASE_ZOOM_LEVEL, visitedTileService)  # type: ignore[arg-type]
+    borderColor = '#{:02X}{:02X}{:02X}{:02X}'.format(*BORDER_COLOR)
+    maxSquareColor = '#{:02X}{:02X}{:02X}{:02X}'.format(*MAX_SQUARE_COLOR)
+    randomGenerator = random.Random(0)
+
+    print(f'\n{"zoom":>4} | {"png [bytes]":>11} | {"png [ms]":>8} | {"json [bytes]":>12} | {"json [ms]":>9}')
+    for zoom in [9, 11, 12, 14, 16]:
+        tiles = determine_tiles_for_zoom_level(zoom, randomGenerator)
+        pngSize = 0
+        pngDuration = 0.0
+        jsonSize = 0
+        jsonDuration = 0.0
+
+        for x, y in tiles:
+            startTime = time.perf_counter()
+            pngSize += len(
+                to_png(
+                    renderer.render_image(
+                        x,
+                        y,
+                        zoom,
+                        1,
+                        TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+                        BORDER_COLOR,
+                        MAX_SQUARE_COLOR,
+                    )
+                )
+            )
+            pngDuration += time.perf_counter() - startTime
+
+            startTime = time.perf_counter()
+            data = vectorService.get_vector_tile(
+                x, y, zoom, 1, TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, borderColor, maxSquareColor
+            )
+            jsonSize += len(json.dumps(data, separators=(',', ':')))
+            jsonDuration += time.perf_counter() - startTime
+
+        numberOfTiles = len(tiles)
+        print(
+            f'{zoom:>4} | {pngSize // numberOfTiles:>11} | {pngDuration / numberOfTiles * 1000:>8.2f} | '
+            f'{jsonSize // numberOfTiles:>12} | {jsonDuration / numberOfTiles * 1000:>9.2f}'
+        )
+
+
+if __name__ == '__main__':
+    run_benchmark()
+    run_meta_tile_benchmark()
+    run_vector_benchmark()
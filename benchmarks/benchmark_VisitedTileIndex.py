@@ -0,0 +1,161 @@
+"""
+Benchmark for the bounding box and point queries of the tile hunting maps.
+
+Compares the previous approach (a join plus GROUP BY against the database for every query) with the in-memory
+VisitedTileIndex. The index is created once from the database (cold start) and then answers all queries.
+
+By default a temporary SQLite database file is used. Set the environment variable BENCHMARK_DATABASE_URI to run
+against another database, e.g. PostgreSQL. All rows written by the benchmark are deleted afterward.
+
+Usage (from the repository root):
+    python -m benchmarks.benchmark_VisitedTileIndex
+"""
+
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from flask import Flask
+from sqlalchemy import delete, extract, func
+
+from sporttracker.db import db
+from sporttracker.tileHunting.BulkTileWriter import BulkTileWriter
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache, PackedTileIndex
+from sporttracker.user import CustomWorkoutFieldEntity  # noqa: F401 (required to configure all mappers)
+from sporttracker.workout.heartRate import HeartRateEntity  # noqa: F401 (required to configure all mappers)
+from sporttracker.workout.WorkoutEntity import Workout
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+
+BENCHMARK_USER_ID = 900_000_000
+NUMBER_OF_WORKOUTS = 200
+NUMBER_OF_TILES_PER_WORKOUT = 500
+NUMBER_OF_QUERIES = 200
+CENTER_X = 8800
+CENTER_Y = 5370
+WORKOUT_TYPES = [WorkoutType.BIKING, WorkoutType.RUNNING, WorkoutType.HIKING]
+YEARS = [2023, 2024, 2025]
+
+
+def create_workouts(randomGenerator: random.Random) -> None:
+    for _ in range(NUMBER_OF_WORKOUTS):
+        workout = DistanceWorkout(
+            type=randomGenerator.choice(WORKOUT_TYPES),
+            name='Benchmark',
+            start_time=datetime(randomGenerator.choice(YEARS), 6, 1),
+            duration=3600,
+            distance=10000,
+            user_id=BENCHMARK_USER_ID,
+            custom_fields={},
+        )
+        db.session.add(workout)
+        db.session.flush()
+
+        x = CENTER_X + randomGenerator.randint(-300, 300)
+        y = CENTER_Y + randomGenerator.randint(-300, 300)
+        tiles = set()
+        for _ in range(NUMBER_OF_TILES_PER_WORKOUT):
+            x += randomGenerator.choice([-1, 0, 1])
+            y += randomGenerator.choice([-1, 0, 1])
+            tiles.add((x, y))
+
+        BulkTileWriter.insert_visited_tiles(db.session, workout.id, tiles)
+
+    db.session.commit()
+
+
+def query_database(min_x: int, max_x: int, min_y: int, max_y: int) -> int:
+    rows = (
+        DistanceWorkout.query.select_from(DistanceWorkout)
+        .join(GpxVisitedTile, GpxVisitedTile.workout_id == DistanceWorkout.id)
+        .with_entities(func.count(), GpxVisitedTile.x, GpxVisitedTile.y)
+        .filter(DistanceWorkout.user_id == BENCHMARK_USER_ID)
+        .filter(DistanceWorkout.type.in_(WORKOUT_TYPES))
+        .filter(extract('year', DistanceWorkout.start_time).in_(YEARS))
+        .filter(GpxVisitedTile.x >= min_x)
+        .filter(GpxVisitedTile.x <= max_x)
+        .filter(GpxVisitedTile.y >= min_y)
+        .filter(GpxVisitedTile.y <= max_y)
+        .group_by(GpxVisitedTile.x, GpxVisitedTile.y)
+        .all()
+    )
+    return len(rows)
+
+
+def query_index(index: PackedTileIndex, min_x: int, max_x: int, min_y: int, max_y: int) -> int:
+    tiles = index.get_tiles_in_bounding_box(
+        min_x, max_x, min_y, max_y, PackedTileIndex.get_type_mask(WORKOUT_TYPES), set(YEARS)
+    )
+    return len(tiles)
+
+
+def measure(queryFunction, boundingBoxes: list[tuple[int, int, int, int]]) -> tuple[float, int]:
+    numberOfTiles = 0
+    startTime = time.perf_counter()
+    for boundingBox in boundingBoxes:
+        numberOfTiles += queryFunction(*boundingBox)
+    duration = time.perf_counter() - startTime
+    return duration / len(boundingBoxes), numberOfTiles
+
+
+def create_bounding_boxes(randomGenerator: random.Random, size: int) -> list[tuple[int, int, int, int]]:
+    boundingBoxes = []
+    for _ in range(NUMBER_OF_QUERIES):
+        min_x = (CENTER_X + randomGenerator.randint(-300, 300)) // size * size
+        min_y = (CENTER_Y + randomGenerator.randint(-300, 300)) // size * size
+        boundingBoxes.append((min_x, min_x + size - 1, min_y, min_y + size - 1))
+    return boundingBoxes
+
+
+def run_benchmark(databaseUri: str) -> None:
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = databaseUri
+    db.init_app(app)
+
+    with app.app_context():
+        db.metadata.create_all(
+            db.engine, tables=[Workout.__table__, DistanceWorkout.__table__, GpxVisitedTile.__table__]
+        )
+
+        randomGenerator = random.Random(42)
+        try:
+            create_workouts(randomGenerator)
+
+            startTime = time.perf_counter()
+            index = VisitedTileIndexCache().get_visited_tile_index(BENCHMARK_USER_ID)
+            print(
+                f'cold start: created index with {index.get_number_of_entries()} entries '
+                f'in {(time.perf_counter() - startTime) * 1000:.1f} ms\n'
+            )
+
+            print(f'{"bbox size":>9} | {"database [µs]":>14} | {"index [µs]":>11} | {"speedup":>8}')
+            for size in [1, 16, 256]:
+                boundingBoxes = create_bounding_boxes(randomGenerator, size)
+
+                databaseDuration, databaseNumberOfTiles = measure(query_database, boundingBoxes)
+                indexDuration, indexNumberOfTiles = measure(
+                    lambda *boundingBox: query_index(index, *boundingBox), boundingBoxes
+                )
+
+                if databaseNumberOfTiles != indexNumberOfTiles:
+                    raise AssertionError(f'Different results for bounding box size {size}')
+
+                print(
+                    f'{size:>9} | {databaseDuration * 1_000_000:>14.1f} | {indexDuration * 1_000_000:>11.1f} | '
+                    f'{databaseDuration / indexDuration:>7.1f}x'
+                )
+        finally:
+            workoutIds = [w.id for w in DistanceWorkout.query.filter(DistanceWorkout.user_id == BENCHMARK_USER_ID)]
+            db.session.execute(delete(GpxVisitedTile).where(GpxVisitedTile.workout_id.in_(workoutIds)))
+            db.session.execute(delete(DistanceWorkout.__table__).where(DistanceWorkout.id.in_(workoutIds)))
+            db.session.execute(delete(Workout.__table__).where(Workout.id.in_(workoutIds)))
+            db.session.commit()
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        defaultDatabaseUri = f'sqlite:///{os.path.join(temporaryDirectory, "benchmark.db")}'
+        run_benchmark(os.environ.get('BENCHMARK_DATABASE_URI', defaultDatabaseUri))
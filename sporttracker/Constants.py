@@ -1,5 +1,5 @@
 APP_NAME = 'SportTracker'
 INITIAL_DATABASE_REVISION = '96da36733178'
-LATEST_DATABASE_REVISION = '4a7f81133876'
+LATEST_DATABASE_REVISION = '5d0b7e2a9c41'
 
 MIN_PASSWORD_LENGTH = 3
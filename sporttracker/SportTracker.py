@@ -3,6 +3,7 @@ import os
 import secrets
 import string
 import tempfile
+import time
 from datetime import datetime
 from http import HTTPStatus
 from typing import Any
@@ -30,13 +31,29 @@ from sporttracker.achievement import AchievementBlueprint, AnnualAchievementBlue
 from sporttracker.notification import NotificationBlueprint
 from sporttracker.quickFilter import QuickFilterBlueprint
 from sporttracker.helpers import Helpers
+from sporttracker.helpers.SharedCacheBackend import SharedCacheBackend, DatabaseSharedCacheBackend
 from sporttracker.helpers.SettingsChecker import SettingsChecker
+from sporttracker.helpers.StageTimer import format_stage_durations
 from sporttracker import Constants
 from sporttracker.dummyData.DummyDataGenerator import DummyDataGenerator
+from sporttracker.gpx.GpxArchiveCompression import (
+    GpxArchiveCodec,
+    GpxArchiveCompression,
+    GpxArchiveRecompressionReport,
+    GpxArchiveRecompressor,
+)
+from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.gpx.GpxParser import TileExtractionMode
 from sporttracker.gpx.GpxService import GpxService
+from sporttracker.gpx.PreviewImageJobService import PreviewImageJobService
 from sporttracker.user.CustomWorkoutFieldEntity import CustomWorkoutFieldType
 from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
 from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
+from sporttracker.tileHunting.TileCacheWarmUpService import TileCacheWarmUpService
+from sporttracker.tileHunting.TileImageCache import TileImageCache
+from sporttracker.tileHunting.TileOverlayExportService import TileOverlayExportService
+from sporttracker.tileHunting.TilePyramidCache import TilePyramidCache
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache
 from sporttracker.workout import WorkoutBlueprint
 from sporttracker.workout.distance import DistanceWorkoutBlueprint
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
@@ -58,6 +75,11 @@ from sporttracker.user.UserEntity import (
 from sporttracker.workout.WorkoutType import WorkoutType
 from sporttracker.db import db, migrate
 from sporttracker.workout.distance.DistanceWorkoutService import DistanceWorkoutService
+from sporttracker.workout.distance.DistanceWorkoutImportService import (
+    DistanceWorkoutImportService,
+    WorkoutImportResult,
+    find_import_files,
+)
 from sporttracker.workout.fitness.FitnessWorkoutService import FitnessWorkoutService
 from sporttracker.longDistanceTour.LongDistanceTourService import LongDistanceTourService
 from sporttracker.notification.NotificationService import NotificationService
@@ -95,6 +117,8 @@ class SportTracker(FlaskBaseApp):
         self._isStage = isStage
         self._generateDummyData = generateDummyData
         self._prepareDatabase = prepareDatabase
+        self._flaskApp: Flask | None = None
+        self._isServerStarted = False
 
         SettingsChecker(self._settings).check()
 
@@ -121,12 +145,48 @@ class SportTracker(FlaskBaseApp):
         app.config['DATA_FOLDER'] = os.path.join(rootDirectory, 'data')
         app.config['TEMP_FOLDER'] = os.path.join(tempfile.gettempdir(), 'sporttracker_temp')
 
-        app.config['NEW_VISITED_TILE_CACHE'] = NewVisitedTileCache()
-        app.config['MAX_SQUARE_CACHE'] = MaxSquareCache()
+        sharedCacheBackend = self.__create_shared_cache_backend()
+        newVisitedTileCacheSettings = self._settings['tileHunting'].get('newVisitedTileCache', {})
+        app.config['NEW_VISITED_TILE_CACHE'] = NewVisitedTileCache(
+            newVisitedTileCacheSettings.get('maxSizeInBytes', 32 * 1024 * 1024),
+            newVisitedTileCacheSettings.get('timeToLiveInSeconds', None),
+            sharedCacheBackend,
+        )
+        maxSquareCacheSettings = self._settings['tileHunting'].get('maxSquareCache', {})
+        app.config['MAX_SQUARE_CACHE'] = MaxSquareCache(
+            maxSquareCacheSettings.get('maxSizeInBytes', 128 * 1024 * 1024),
+            maxSquareCacheSettings.get('timeToLiveInSeconds', None),
+            sharedCacheBackend,
+        )
+        app.config['TILE_IMAGE_CACHE'] = self.__create_tile_image_cache(app.config['TEMP_FOLDER'], sharedCacheBackend)
+        app.config['VISITED_TILE_INDEX_CACHE'] = VisitedTileIndexCache(sharedCacheBackend)
+        app.config['TILE_PYRAMID_CACHE'] = TilePyramidCache(
+            self._settings['tileHunting']['baseZoomLevel'],
+            self._settings['tileHunting']['mapMinZoomLevel'],
+            app.config['VISITED_TILE_INDEX_CACHE'],
+            sharedCacheBackend,
+        )
+        app.config['TILE_OVERLAY_EXPORT_SERVICE'] = TileOverlayExportService(
+            app.config['DATA_FOLDER'], self._settings['tileHunting'], app.config['VISITED_TILE_INDEX_CACHE']
+        )
+        app.config['TILE_CACHE_WARM_UP_SERVICE'] = TileCacheWarmUpService(
+            app.config['NEW_VISITED_TILE_CACHE'],
+            app.config['MAX_SQUARE_CACHE'],
+            self._settings['tileHunting'].get('isCacheWarmUpEnabled', False),
+        )
+        archiveCompression = GpxArchiveCompression.from_settings(self._settings.get('gpxArchive', {}))
         app.config['GPX_SERVICE'] = GpxService(
             app.config['DATA_FOLDER'],
             app.config['NEW_VISITED_TILE_CACHE'],
             app.config['MAX_SQUARE_CACHE'],
+            app.config['TILE_IMAGE_CACHE'],
+            app.config['TILE_PYRAMID_CACHE'],
+            app.config['VISITED_TILE_INDEX_CACHE'],
+            app.config['TILE_CACHE_WARM_UP_SERVICE'],
+            TileExtractionMode(
+                self._settings['tileHunting'].get('tileExtractionMode', TileExtractionMode.POINTS.value)
+            ),
+            archiveCompression,
         )
         notificationService = NotificationService()
         app.config['NOTIFICATION_SERVICE'] = notificationService
@@ -135,22 +195,29 @@ class SportTracker(FlaskBaseApp):
             app.config['GPX_SERVICE'], app.config['TEMP_FOLDER'], self._settings['tileHunting'], notificationService
         )
         app.config['DISTANCE_WORKOUT_SERVICE'] = distanceWorkoutService
+        app.config['DISTANCE_WORKOUT_IMPORT_SERVICE'] = DistanceWorkoutImportService(
+            app.config['GPX_SERVICE'], notificationService, self._settings['tileHunting']
+        )
 
         ntfyService = NtfyService()
         notificationService.add_listener(ntfyService)
 
         app.config['FITNESS_WORKOUT_SERVICE'] = FitnessWorkoutService(notificationService)
 
+        app.config['PREVIEW_IMAGE_JOB_SERVICE'] = PreviewImageJobService(
+            app.config['GPX_SERVICE'], self._settings['gpxPreviewImages']
+        )
+
         app.config['PLANNED_TOUR_SERVICE'] = PlannedTourService(
             app.config['GPX_SERVICE'],
-            self._settings['gpxPreviewImages'],
+            app.config['PREVIEW_IMAGE_JOB_SERVICE'],
             self._settings['tileHunting'],
             notificationService,
         )
 
         app.config['LONG_DISTANCE_TOUR_SERVICE'] = LongDistanceTourService(
             app.config['GPX_SERVICE'],
-            self._settings['gpxPreviewImages'],
+            app.config['PREVIEW_IMAGE_JOB_SERVICE'],
             app.config['PLANNED_TOUR_SERVICE'],
             notificationService,
         )
@@ -189,6 +256,7 @@ class SportTracker(FlaskBaseApp):
                 'isStage': self._isStage,
                 'notificationTypes': NotificationType.get_sorted(),
                 'mapMinZoomLevel': self._settings['tileHunting']['mapMinZoomLevel'],
+                'tileRenderFormat': self._settings['tileHunting'].get('tileRenderFormat', 'png'),
             }
 
         def format_decimal(value: int | float, decimals: int = 1) -> str:
@@ -262,6 +330,164 @@ class SportTracker(FlaskBaseApp):
 
         Babel(app, locale_selector=get_locale)
 
+        @app.cli.command('export-tile-overlay')
+        @click.argument('username')
+        def export_tile_overlay(username: str) -> None:
+            """
+            Exports the shared tile hunting overlay of the user into an MBTiles file.
+            """
+            user = User.query.filter(User.username == username).first()
+            if user is None:
+                raise click.ClickException(f'Unknown user "{username}"')
+
+            result = app.config['TILE_OVERLAY_EXPORT_SERVICE'].export(
+                user.id, user.isTileHuntingShowPlannedTilesActivated
+            )
+            click.echo(
+                f'Rendered {result.numberOfRenderedTiles} tiles and deleted {result.numberOfDeletedTiles} tiles '
+                f'({"incremental" if result.isIncremental else "full"} export) in {result.duration:.1f} s: '
+                f'{app.config["TILE_OVERLAY_EXPORT_SERVICE"].get_file_path(user.id)}'
+            )
+
+        @app.cli.command('backfill-track-points')
+        @click.option('--overwrite', is_flag=True, help='Rewrite all track points files, even if they are up to date')
+        def backfill_track_points(overwrite: bool) -> None:
+            """
+            Writes the missing track points files of all existing gpx tracks.
+            """
+            gpxService: GpxService = app.config['GPX_SERVICE']
+            gpxFileNames = [row[0] for row in GpxMetadata.query.with_entities(GpxMetadata.gpx_file_name).all()]
+
+            numberOfWrittenFiles = 0
+            numberOfTrackPoints = 0
+            failedGpxFileNames = []
+            startTime = time.perf_counter()
+            with click.progressbar(gpxFileNames, label='Writing track points files') as progress:
+                for gpxFileName in progress:
+                    try:
+                        result = gpxService.backfill_track_points(gpxFileName, overwrite)
+                    except Exception as e:
+                        LOGGER.error(f'Could not write track points of gpx "{gpxFileName}": {e}')
+                        failedGpxFileNames.append(gpxFileName)
+                        continue
+
+                    if result is not None:
+                        numberOfWrittenFiles += 1
+                        numberOfTrackPoints += result
+
+            click.echo(
+                f'Wrote {numberOfWrittenFiles} track points files with {numberOfTrackPoints} points, '
+                f'{len(gpxFileNames) - numberOfWrittenFiles - len(failedGpxFileNames)} were up to date, '
+                f'{len(failedGpxFileNames)} failed ({time.perf_counter() - startTime:.1f} s)'
+            )
+            for gpxFileName in failedGpxFileNames:
+                click.echo(f'Failed: {gpxFileName}')
+
+        @app.cli.command('recompress-gpx-archives')
+        @click.option('--codec', type=click.Choice([codec.value for codec in GpxArchiveCodec]), default=None)
+        @click.option('--level', type=int, default=None, help='Compression level (deflated: 0-9, bzip2: 1-9)')
+        @click.option('--processes', type=int, default=os.cpu_count() or 1, show_default=True)
+        @click.option('--dry-run', is_flag=True, help='Only report the sizes and durations, keep all archives')
+        @click.option('--force', is_flag=True, help='Also recompress archives that already use the codec and level')
+        def recompress_gpx_archives(
+            codec: str | None, level: int | None, processes: int, dry_run: bool, force: bool
+        ) -> None:
+            """
+            Recompresses all gpx archives in the data folder (default: codec and level of the settings.json).
+            """
+            compression = archiveCompression
+            if codec is not None or level is not None:
+                try:
+                    compression = GpxArchiveCompression.from_settings(
+                        {
+                            'codec': codec or archiveCompression.codec.value,
+                            **({} if level is None else {'level': level}),
+                        }
+                    )
+                except ValueError as e:
+                    raise click.ClickException(str(e))
+
+            recompressor = GpxArchiveRecompressor(app.config['DATA_FOLDER'], GpxService.ZIP_FILE_EXTENSION, processes)
+            zipFilePaths = recompressor.find_archives()
+
+            report = GpxArchiveRecompressionReport()
+            startTime = time.perf_counter()
+            with click.progressbar(
+                recompressor.recompress(zipFilePaths, compression, dry_run, force),
+                length=len(zipFilePaths),
+                label=f'Recompressing gpx archives with {compression}',
+            ) as progress:
+                for result in progress:
+                    report.add(result)
+            report.duration = time.perf_counter() - startTime
+
+            ratio = report.sizeAfter / report.sizeBefore * 100 if report.sizeBefore else 100.0
+            click.echo(
+                f'{"Tested" if dry_run else "Recompressed"} {report.numberOfArchives} archives with {compression}, '
+                f'{report.numberOfSkippedArchives} were up to date, {len(report.failedArchives)} failed '
+                f'({report.duration:.1f} s)'
+            )
+            click.echo(
+                f'Size: {report.sizeBefore / 1024 / 1024:.1f} MB -> {report.sizeAfter / 1024 / 1024:.1f} MB '
+                f'({ratio:.1f} %)'
+            )
+            click.echo(
+                f'Compression: {report.compressDuration:.2f} s, reading: {report.readDurationBefore:.2f} s -> '
+                f'{report.readDurationAfter:.2f} s (summed up over all processes)'
+            )
+            for zipFilePath, error in report.failedArchives:
+                click.echo(f'Failed: {zipFilePath} ({error})')
+
+        @app.cli.command('import-workouts')
+        @click.argument('username')
+        @click.argument('path', type=click.Path(exists=True))
+        @click.option(
+            '--type',
+            'workoutTypeName',
+            type=click.Choice([workoutType.name for workoutType in WorkoutType.get_distance_workout_types()]),
+            default=WorkoutType.BIKING.name,
+            show_default=True,
+            help='Workout type of gpx files and fit files without supported sport',
+        )
+        @click.option('--processes', type=int, default=os.cpu_count() or 1, show_default=True)
+        @click.option('--batch-size', type=click.IntRange(min=1), default=100, show_default=True)
+        def import_workouts(username: str, path: str, workoutTypeName: str, processes: int, batch_size: int) -> None:
+            """
+            Imports all gpx and fit files of a directory or zip archive as distance workouts of the user.
+            """
+            user = User.query.filter(User.username == username).first()
+            if user is None:
+                raise click.ClickException(f'Unknown user "{username}"')
+
+            try:
+                importFiles = find_import_files(path)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+
+            with click.progressbar(length=len(importFiles), label='Importing workouts') as progress:
+
+                def on_progress(_: WorkoutImportResult) -> None:
+                    progress.update(1)
+
+                # notifications are created in the language of the user
+                with flask_babel.force_locale(user.language.shortCode):
+                    report = app.config['DISTANCE_WORKOUT_IMPORT_SERVICE'].import_workouts(
+                        importFiles, user.id, WorkoutType[workoutTypeName], processes, batch_size, on_progress
+                    )
+
+            click.echo(
+                f'Imported {report.numberOfImportedWorkouts} of {report.numberOfFiles} files with '
+                f'{report.numberOfVisitedTiles} visited tiles, {len(report.failedFiles)} failed '
+                f'({report.duration:.1f} s, {report.get_files_per_second():.1f} files/s)'
+            )
+            click.echo(
+                f'Database: {report.databaseDuration:.2f} s, cache invalidation and notifications: '
+                f'{report.finishDuration:.2f} s'
+            )
+            click.echo(f'Stages (summed up over all processes): {format_stage_durations(report.stageDurations)}')
+            for fileName, error in report.failedFiles:
+                click.echo(f'Failed: {fileName} ({error})')
+
         if self._prepareDatabase:
             with app.app_context():
                 self.__create_admin_user()
@@ -295,7 +521,15 @@ class SportTracker(FlaskBaseApp):
 
     def _register_blueprints(self, app):
         app.register_blueprint(AuthenticationBlueprint.construct_blueprint())
-        app.register_blueprint(GeneralBlueprint.construct_blueprint())
+        app.register_blueprint(
+            GeneralBlueprint.construct_blueprint(
+                app.config['NEW_VISITED_TILE_CACHE'],
+                app.config['MAX_SQUARE_CACHE'],
+                app.config['TILE_IMAGE_CACHE'],
+                app.config['GPX_SERVICE'].get_ingest_statistics(),
+                self._settings.get('metrics', {}),
+            )
+        )
         app.register_blueprint(WorkoutBlueprint.construct_blueprint())
         app.register_blueprint(
             DistanceWorkoutBlueprint.construct_blueprint(
@@ -313,11 +547,13 @@ class SportTracker(FlaskBaseApp):
             ChartBlueprint.construct_blueprint(
                 app.config['NEW_VISITED_TILE_CACHE'],
                 app.config['MAX_SQUARE_CACHE'],
+                app.config['TILE_PYRAMID_CACHE'],
+                app.config['VISITED_TILE_INDEX_CACHE'],
                 app.config['DISTANCE_WORKOUT_SERVICE'],
             )
         )
         app.register_blueprint(UserBlueprint.construct_blueprint())
-        app.register_blueprint(SettingsBlueprint.construct_blueprint())
+        app.register_blueprint(SettingsBlueprint.construct_blueprint(app.config['TILE_OVERLAY_EXPORT_SERVICE']))
         app.register_blueprint(
             Api.construct_blueprint(
                 app.config['GPX_SERVICE'],
@@ -329,18 +565,21 @@ class SportTracker(FlaskBaseApp):
         app.register_blueprint(AchievementBlueprint.construct_blueprint())
         app.register_blueprint(SearchBlueprint.construct_blueprint())
         app.register_blueprint(
-            GpxBlueprint.construct_blueprint(
-                app.config['GPX_SERVICE'], app.config['DISTANCE_WORKOUT_SERVICE'], app.config['PLANNED_TOUR_SERVICE']
-            )
+            GpxBlueprint.construct_blueprint(app.config['GPX_SERVICE'], app.config['DISTANCE_WORKOUT_SERVICE'])
         )
         app.register_blueprint(
             MapBlueprint.construct_blueprint(
                 self._settings['tileHunting'],
                 app.config['NEW_VISITED_TILE_CACHE'],
                 app.config['MAX_SQUARE_CACHE'],
+                app.config['TILE_IMAGE_CACHE'],
+                app.config['TILE_PYRAMID_CACHE'],
+                app.config['VISITED_TILE_INDEX_CACHE'],
                 app.config['DISTANCE_WORKOUT_SERVICE'],
                 self._settings['gpxPreviewImages'],
                 app.config['PLANNED_TOUR_SERVICE'],
+                app.config['TILE_OVERLAY_EXPORT_SERVICE'],
+                app.config['GPX_SERVICE'],
             )
         )
         app.register_blueprint(QuickFilterBlueprint.construct_blueprint())
@@ -359,6 +598,50 @@ class SportTracker(FlaskBaseApp):
         app.register_blueprint(AnnualAchievementBlueprint.construct_blueprint())
         app.register_blueprint(NotificationBlueprint.construct_blueprint(app.config['NOTIFICATION_SERVICE']))
 
+    def __create_shared_cache_backend(self) -> SharedCacheBackend | None:
+        sharedCacheSettings = self._settings['tileHunting'].get('sharedCache', {})
+        if not sharedCacheSettings.get('isEnabled', False):
+            return None
+
+        return DatabaseSharedCacheBackend(
+            sharedCacheSettings['databaseUri'], sharedCacheSettings.get('pollIntervalInSeconds', 1.0)
+        )
+
+    def __create_tile_image_cache(
+        self, tempFolder: str, sharedCacheBackend: SharedCacheBackend | None
+    ) -> TileImageCache:
+        tileImageCacheSettings = self._settings['tileHunting'].get('tileImageCache', {})
+
+        diskCacheFolder = None
+        if tileImageCacheSettings.get('isDiskCacheEnabled', False):
+            diskCacheFolder = os.path.join(tempFolder, 'tileImageCache')
+
+        return TileImageCache(
+            tileImageCacheSettings.get('maxNumberOfEntries', 10000),
+            diskCacheFolder,
+            tileImageCacheSettings.get('maxDiskSizeInBytes', 512 * 1024 * 1024),
+            sharedCacheBackend,
+        )
+
+    def init_app(self) -> Flask:
+        self._flaskApp = super().init_app()
+        if self._isServerStarted:
+            self.__start_preview_image_workers(self._flaskApp)
+        return self._flaskApp
+
+    def start_server(self):
+        # only the server renders preview images, the flask cli and the creation of database revisions must not
+        self._isServerStarted = True
+        if self._flaskApp is not None:
+            # the app was built before the server was started
+            self.__start_preview_image_workers(self._flaskApp)
+
+        super().start_server()
+
+    @staticmethod
+    def __start_preview_image_workers(app: Flask) -> None:
+        app.config['PREVIEW_IMAGE_JOB_SERVICE'].start(app)
+
     def __prepare_database(self, app):
         with app.app_context():
             db.create_all()
@@ -296,14 +296,16 @@ def construct_blueprint(
         if workout is None:
             abort(404)
 
-        gpxMetadataId = gpxService.handle_gpx_upload_for_workout(request.files)
-        if gpxMetadataId is None:
+        uploadResult = gpxService.handle_gpx_upload_for_workout(request.files)
+        if uploadResult is None:
             abort(400)
 
         gpxService.delete_gpx(workout, current_user.id)
 
-        workout.gpx_metadata_id = gpxMetadataId
+        workout.gpx_metadata_id = uploadResult.gpxMetadataId
         db.session.add(workout)
+        if uploadResult.heartRateSamples:
+            HeartRateService.replace_heart_rate_data(workout.id, uploadResult.heartRateSamples)
         db.session.commit()
 
         gpxService.add_visited_tiles_for_workout(workout, tileHuntingSettings['baseZoomLevel'], current_user.id)
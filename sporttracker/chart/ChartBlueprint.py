@@ -20,6 +20,8 @@ from sporttracker.user.CustomWorkoutFieldEntity import (
     get_custom_fields_grouped_by_distance_workout_types_with_values,
 )
 from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
+from sporttracker.tileHunting.TilePyramidCache import TilePyramidCache
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache
 from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
 from sporttracker.tileHunting.VisitedTileService import VisitedTileService
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
@@ -52,6 +54,8 @@ NO_START_TIME_PLACEHOLDER = time(hour=12, minute=0, second=0, microsecond=0)
 def construct_blueprint(
     newVisitedTileCache: NewVisitedTileCache,
     maxSquareCache: MaxSquareCache,
+    tilePyramidCache: TilePyramidCache,
+    visitedTileIndexCache: VisitedTileIndexCache,
     distanceWorkoutService: DistanceWorkoutService,
 ):
     charts = Blueprint('charts', __name__, static_folder='static', url_prefix='/charts')
@@ -574,6 +578,8 @@ def construct_blueprint(
             visitedTileService = VisitedTileService(
                 newVisitedTileCache,
                 maxSquareCache,
+                tilePyramidCache,
+                visitedTileIndexCache,
                 QuickFilterState().reset(DistanceWorkoutService.get_available_years(current_user.id)),
                 TileHuntingFilterState().reset(),
                 distanceWorkoutService,
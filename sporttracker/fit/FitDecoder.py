@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import logging
+import math
+from array import array
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import IO, Any
+
+import fitdecode  # type: ignore[import-untyped]
+
+from sporttracker import Constants
+from sporttracker.fit.FitSessionParser import FitSession, FitSessionParser
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+@dataclass
+class FitActivity:
+    """
+    Everything SportTracker uses from a FIT file.
+    Track points and heart rate samples are stored column-wise in typed arrays, times as seconds since the epoch.
+    Missing altitudes and times of track points are stored as NaN.
+    """
+
+    session: FitSession | None = None
+    latitudes: array[float] = field(default_factory=lambda: array('d'))
+    longitudes: array[float] = field(default_factory=lambda: array('d'))
+    altitudes: array[float] = field(default_factory=lambda: array('d'))
+    times: array[float] = field(default_factory=lambda: array('d'))
+    heartRateTimes: array[float] = field(default_factory=lambda: array('d'))
+    heartRateValues: array[int] = field(default_factory=lambda: array('H'))
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    def get_heart_rate_samples(self) -> list[tuple[datetime, int]]:
+        """
+        Returns the heart rate samples with local timestamps (like the session start time).
+        Duplicate samples are skipped, as they would violate the primary key of the heart rate data.
+        """
+        samples = []
+        knownSamples = set()
+        for timestamp, bpm in zip(self.heartRateTimes, self.heartRateValues):
+            sample = (datetime.fromtimestamp(int(timestamp)), bpm)
+            if sample not in knownSamples:
+                knownSamples.add(sample)
+                samples.append(sample)
+
+        return samples
+
+
+class FitDecoder:
+    """
+    Decodes the session, the track points and the heart rate samples of a FIT file in a single pass.
+    Only the first session will be parsed.
+    """
+
+    # converts latitude and longitude from semicircles to degrees
+    CONVERSION_FACTOR = (2**32) / 360
+
+    @staticmethod
+    def decode(fitFile: str | IO[bytes], fileName: str) -> FitActivity:
+        activity = FitActivity()
+        isSessionParsed = False
+
+        with fitdecode.FitReader(fitFile) as reader:
+            for frame in reader:
+                if not isinstance(frame, fitdecode.records.FitDataMessage):
+                    continue
+
+                if frame.name == 'record':
+                    FitDecoder.__add_record(activity, frame)
+                elif frame.name == 'session' and not isSessionParsed:
+                    isSessionParsed = True
+                    try:
+                        activity.session = FitSessionParser.parse_frame(frame, fileName)
+                    except ValueError as e:
+                        # e.g. an unsupported sport, the track and heart rate data are still usable
+                        LOGGER.warning(f'Could not parse session of fit file "{fileName}": {e}')
+
+        LOGGER.debug(
+            f'Decoded fit file "{fileName}" with {len(activity)} track points '
+            f'and {len(activity.heartRateValues)} heart rate samples'
+        )
+        return activity
+
+    @staticmethod
+    def __add_record(activity: FitActivity, frame: fitdecode.records.FitDataMessage) -> None:
+        # a single pass over the fields instead of one lookup per field (same precedence as frame.get_value)
+        values: dict[str, Any] = {}
+        for fieldData in frame.fields:
+            if fieldData.name not in values:
+                values[fieldData.name] = fieldData.value
+
+        timestamp = values.get('timestamp')
+        time = math.nan if timestamp is None else timestamp.timestamp()
+
+        heartRate = values.get('heart_rate')
+        if heartRate is not None and timestamp is not None:
+            activity.heartRateTimes.append(time)
+            activity.heartRateValues.append(int(heartRate))
+
+        latitude = values.get('position_lat')
+        longitude = values.get('position_long')
+        if latitude is None or longitude is None:
+            return
+
+        altitude = values.get('altitude')
+        if altitude is None:
+            altitude = values.get('enhanced_altitude')
+
+        activity.latitudes.append(latitude / FitDecoder.CONVERSION_FACTOR)
+        activity.longitudes.append(longitude / FitDecoder.CONVERSION_FACTOR)
+        activity.altitudes.append(math.nan if altitude is None else altitude)
+        activity.times.append(time)
@@ -64,32 +64,39 @@ class FitSessionParser:
                 if frame.name != 'session':
                     continue
 
-                start_time = frame.get_value('start_time').replace(tzinfo=UTC).astimezone()
-                start_time = datetime(
-                    year=start_time.year,
-                    month=start_time.month,
-                    day=start_time.day,
-                    hour=start_time.hour,
-                    minute=start_time.minute,
-                    second=start_time.second,
-                    microsecond=0,
-                )
-                distance = frame.get_value('total_distance', fallback=None)
-                total_ascent = frame.get_value('total_ascent', fallback=None)
-                average_heart_rate = frame.get_value('avg_heart_rate', fallback=None)
-
-                return FitSession(
-                    file_name=os.path.splitext(os.path.basename(fit_file_path))[0],
-                    start_time=start_time,
-                    duration=int(frame.get_value('total_timer_time')),
-                    workout_type=FitSessionParser.__parse_sport(frame.get_value('sport')),
-                    distance=None if distance is None else int(distance),
-                    total_ascent=None if total_ascent is None else int(total_ascent),
-                    average_heart_rate=None if average_heart_rate is None else int(average_heart_rate),
-                )
+                return FitSessionParser.parse_frame(frame, os.path.splitext(os.path.basename(fit_file_path))[0])
 
         return None
 
+    @staticmethod
+    def parse_frame(frame: fitdecode.records.FitDataMessage, file_name: str) -> FitSession:
+        """
+        Parses a single session frame, e.g. while decoding all other frames of the FIT file in the same pass.
+        """
+        start_time = frame.get_value('start_time').replace(tzinfo=UTC).astimezone()
+        start_time = datetime(
+            year=start_time.year,
+            month=start_time.month,
+            day=start_time.day,
+            hour=start_time.hour,
+            minute=start_time.minute,
+            second=start_time.second,
+            microsecond=0,
+        )
+        distance = frame.get_value('total_distance', fallback=None)
+        total_ascent = frame.get_value('total_ascent', fallback=None)
+        average_heart_rate = frame.get_value('avg_heart_rate', fallback=None)
+
+        return FitSession(
+            file_name=file_name,
+            start_time=start_time,
+            duration=int(frame.get_value('total_timer_time')),
+            workout_type=FitSessionParser.__parse_sport(frame.get_value('sport')),
+            distance=None if distance is None else int(distance),
+            total_ascent=None if total_ascent is None else int(total_ascent),
+            average_heart_rate=None if average_heart_rate is None else int(average_heart_rate),
+        )
+
     @staticmethod
     def __parse_sport(sport: str) -> WorkoutType:
         if sport.strip().lower() == 'cycling':
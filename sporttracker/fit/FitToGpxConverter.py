@@ -1,91 +1,86 @@
-from dataclasses import dataclass
-from datetime import datetime
+import io
+import math
+from datetime import datetime, timezone
+from typing import Protocol
 
-import fitdecode  # type: ignore[import-untyped]
-import gpxpy.gpx
+from sporttracker.fit.FitDecoder import FitActivity, FitDecoder
 
 
-@dataclass
-class TrackPoint:
-    latitude: float
-    longitude: float
-    timestamp: datetime
-    altitude: float | None
+class WritableStream(Protocol):
+    def write(self, data: bytes, /) -> int: ...
 
 
 class FitToGpxConverter:
-    CONVERSION_FACTOR = (2**32) / 360
+    """
+    Writes the track points of a decoded FIT file as gpx (a single track with a single segment).
+
+    The xml is written in chunks of POINTS_PER_CHUNK track points (e.g. directly into a zip entry),
+    so the memory usage does not depend on the length of the recording.
+    The layout and the number formats are identical to the gpx created by gpxpy.
+    """
+
+    POINTS_PER_CHUNK = 1000
+
+    HEADER = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<gpx xmlns="http://www.topografix.com/GPX/1/1" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+        'xsi:schemaLocation="http://www.topografix.com/GPX/1/1 http://www.topografix.com/GPX/1/1/gpx.xsd" '
+        'version="1.1" creator="SportTracker">\n'
+        '  <trk>\n'
+        '    <trkseg>\n'
+    )
+    FOOTER = '    </trkseg>\n  </trk>\n</gpx>'
 
     @staticmethod
-    def __parse_track_point(frame: fitdecode.records.FitDataMessage) -> TrackPoint | None:
-        if not frame.has_field('position_lat') or not frame.has_field('position_long'):
-            return None
-
-        latitude = frame.get_value('position_lat')
-        longitude = frame.get_value('position_long')
-        if latitude is None or longitude is None:
-            return None
-
-        # convert latitude and longitude from integer to degrees
-        latitude = latitude / FitToGpxConverter.CONVERSION_FACTOR
-        longitude = longitude / FitToGpxConverter.CONVERSION_FACTOR
-
-        timestamp = frame.get_value('timestamp')
-
-        altitude = None
-        if frame.has_field('altitude'):
-            altitude = frame.get_value('altitude')
-
-        if frame.has_field('enhanced_altitude'):
-            enhancedAltitude = frame.get_value('enhanced_altitude')
+    def write_gpx(activity: FitActivity, target: WritableStream) -> int:
+        """
+        Returns the number of written bytes.
+        """
+        numberOfBytes = target.write(FitToGpxConverter.HEADER.encode('utf-8'))
+
+        lines: list[str] = []
+        points = zip(activity.latitudes, activity.longitudes, activity.altitudes, activity.times)
+        for index, (latitude, longitude, altitude, time) in enumerate(points, start=1):
+            lines.append(
+                f'      <trkpt lat="{FitToGpxConverter.__format_number(latitude)}" '
+                f'lon="{FitToGpxConverter.__format_number(longitude)}">\n'
+            )
+            if not math.isnan(altitude):
+                lines.append(f'        <ele>{FitToGpxConverter.__format_number(altitude)}</ele>\n')
+            if not math.isnan(time):
+                lines.append(f'        <time>{FitToGpxConverter.__format_time(time)}</time>\n')
+            lines.append('      </trkpt>\n')
 
-            if altitude is None and enhancedAltitude is not None:
-                altitude = enhancedAltitude
+            if index % FitToGpxConverter.POINTS_PER_CHUNK == 0:
+                numberOfBytes += target.write(''.join(lines).encode('utf-8'))
+                lines.clear()
 
-        return TrackPoint(latitude=latitude, longitude=longitude, timestamp=timestamp, altitude=altitude)
+        lines.append(FitToGpxConverter.FOOTER)
+        numberOfBytes += target.write(''.join(lines).encode('utf-8'))
+        return numberOfBytes
 
     @staticmethod
-    def __parse_track_points_from_fit_file(filePath: str) -> list[TrackPoint]:
-        trackPoints = []
-        with fitdecode.FitReader(filePath) as fit_file:
-            for frame in fit_file:
-                if not isinstance(frame, fitdecode.records.FitDataMessage):
-                    continue
+    def __format_number(value: float) -> str:
+        # same as gpxpy: scientific notation is not allowed in gpx
+        result = str(value)
+        if 'e' not in result:
+            return result
 
-                if frame.name != 'record':
-                    continue
-
-                trackPoint = FitToGpxConverter.__parse_track_point(frame)
-                if trackPoint is not None:
-                    trackPoints.append(trackPoint)
-
-        return trackPoints
+        return format(value, '.10f').rstrip('0').rstrip('.')
 
     @staticmethod
-    def __create_gpx(trackPoints: list[TrackPoint]) -> gpxpy.gpx.GPX:
-        gpx = gpxpy.gpx.GPX()
-        gpx_track = gpxpy.gpx.GPXTrack()
-        gpx.tracks.append(gpx_track)
-
-        gpx_segment = gpxpy.gpx.GPXTrackSegment()
-        gpx_track.segments.append(gpx_segment)
-
-        for point in trackPoints:
-            gpxTrackPoint = gpxpy.gpx.GPXTrackPoint(
-                latitude=point.latitude,
-                longitude=point.longitude,
-                time=point.timestamp,
-                elevation=point.altitude,
-            )
+    def __format_time(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace('+00:00', 'Z')
 
-            gpx_segment.points.append(gpxTrackPoint)
-
-        return gpx
+    @staticmethod
+    def create_gpx_xml(activity: FitActivity) -> str:
+        gpxContent = io.BytesIO()
+        FitToGpxConverter.write_gpx(activity, gpxContent)
+        return gpxContent.getvalue().decode('utf-8')
 
     @staticmethod
     def convert_fit_to_gpx(fitFilePath: str, gpxFilePath: str) -> None:
-        trackPoints = FitToGpxConverter.__parse_track_points_from_fit_file(fitFilePath)
-        gpxObject = FitToGpxConverter.__create_gpx(trackPoints=trackPoints)
+        activity = FitDecoder.decode(fitFilePath, fitFilePath)
 
-        with open(gpxFilePath, 'w', encoding='utf-8') as f:
-            f.write(gpxObject.to_xml())
+        with open(gpxFilePath, 'wb') as f:
+            FitToGpxConverter.write_gpx(activity, f)
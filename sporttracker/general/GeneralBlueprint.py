@@ -1,16 +1,29 @@
+import hmac
 import logging
 import os
+from typing import Any
 
-from flask import Blueprint, redirect, url_for, render_template
+from flask import Blueprint, redirect, url_for, render_template, Response, request
 from flask_login import login_required, current_user
 
 from sporttracker import Constants
+from sporttracker.helpers.BoundedCache import format_statistics_as_prometheus
 from sporttracker.helpers.ChangelogParser import ChangelogParser
+from sporttracker.helpers.StageTimer import StageStatistics
+from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
+from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
+from sporttracker.tileHunting.TileImageCache import TileImageCache
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
 
-def construct_blueprint():
+def construct_blueprint(
+    newVisitedTileCache: NewVisitedTileCache,
+    maxSquareCache: MaxSquareCache,
+    tileImageCache: TileImageCache,
+    gpxIngestStatistics: StageStatistics,
+    metricsSettings: dict[str, Any],
+):
     general = Blueprint('general', __name__, static_folder='static')
 
     @general.route('/')
@@ -38,4 +51,33 @@ def construct_blueprint():
     def api():
         return redirect(url_for('api.docs'))
 
+    @general.route('/metrics')
+    def metrics():
+        if not __is_metrics_access_allowed():
+            return Response('Unauthorized', status=401, headers={'WWW-Authenticate': 'Bearer'})
+
+        statistics = [
+            newVisitedTileCache.get_statistics(),
+            maxSquareCache.get_statistics(),
+            *tileImageCache.get_statistics(),
+        ]
+        return Response(
+            format_statistics_as_prometheus(statistics) + gpxIngestStatistics.format_as_prometheus(),
+            mimetype='text/plain; version=0.0.4',
+        )
+
+    def __is_metrics_access_allowed() -> bool:
+        """
+        Scrapers authenticate with the bearer token from the settings.json, admins may also use their session.
+        """
+        if current_user.is_authenticated and current_user.isAdmin:
+            return True
+
+        bearerToken = metricsSettings.get('bearerToken')
+        if not bearerToken:
+            return False
+
+        authorization = request.headers.get('Authorization', '')
+        return hmac.compare_digest(authorization.encode('utf-8'), f'Bearer {bearerToken}'.encode('utf-8'))
+
     return general
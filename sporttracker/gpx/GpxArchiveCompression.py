@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Iterator
+from zipfile import ZipFile, ZipInfo, ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA
+
+from sporttracker import Constants
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class GpxArchiveCodec(Enum):
+    STORED = 'stored'
+    DEFLATED = 'deflated'
+    BZIP2 = 'bzip2'
+    LZMA = 'lzma'
+
+    @property
+    def compressionMethod(self) -> int:
+        return {
+            GpxArchiveCodec.STORED: ZIP_STORED,
+            GpxArchiveCodec.DEFLATED: ZIP_DEFLATED,
+            GpxArchiveCodec.BZIP2: ZIP_BZIP2,
+            GpxArchiveCodec.LZMA: ZIP_LZMA,
+        }[self]
+
+    @property
+    def levelRange(self) -> tuple[int, int] | None:
+        """
+        Returns the allowed compression levels or None if the codec has no levels.
+        The zipfile module always uses the default preset for lzma.
+        """
+        return {
+            GpxArchiveCodec.DEFLATED: (0, 9),
+            GpxArchiveCodec.BZIP2: (1, 9),
+        }.get(self)
+
+
+@dataclass(frozen=True)
+class GpxArchiveCompression:
+    """
+    Codec and level used to compress the gpx archives.
+
+    The zip format stores the compression method per entry, so archives with different codecs can be read alike.
+    Additionally, the codec and level are recorded in the archive comment to recognize archives that are
+    already compressed with the configured settings.
+    """
+
+    COMMENT_PREFIX = 'sporttracker-compression='
+    DEFAULT_DEFLATE_LEVEL = 6
+
+    codec: GpxArchiveCodec = GpxArchiveCodec.DEFLATED
+    level: int | None = DEFAULT_DEFLATE_LEVEL
+
+    def __post_init__(self) -> None:
+        levelRange = self.codec.levelRange
+        if levelRange is None:
+            if self.level is not None:
+                raise ValueError(f'The codec "{self.codec.value}" does not support a compression level')
+        elif self.level is not None and not levelRange[0] <= self.level <= levelRange[1]:
+            raise ValueError(
+                f'Invalid compression level {self.level} for codec "{self.codec.value}" '
+                f'(allowed: {levelRange[0]} to {levelRange[1]})'
+            )
+
+    @staticmethod
+    def from_settings(archiveSettings: dict[str, Any]) -> GpxArchiveCompression:
+        codec = GpxArchiveCodec(archiveSettings.get('codec', GpxArchiveCodec.DEFLATED.value))
+        defaultLevel = GpxArchiveCompression.DEFAULT_DEFLATE_LEVEL if codec == GpxArchiveCodec.DEFLATED else None
+        return GpxArchiveCompression(codec, archiveSettings.get('level', defaultLevel))
+
+    def open(self, zipFilePath: str) -> ZipFile:
+        """
+        Opens a new archive for writing with this codec and level.
+        """
+        zipObject = ZipFile(zipFilePath, mode='w', compression=self.codec.compressionMethod, compresslevel=self.level)
+        zipObject.comment = self.to_comment()
+        return zipObject
+
+    def to_comment(self) -> bytes:
+        level = '' if self.level is None else f':{self.level}'
+        return f'{self.COMMENT_PREFIX}{self.codec.value}{level}'.encode('ascii')
+
+    @staticmethod
+    def from_comment(comment: bytes) -> GpxArchiveCompression | None:
+        try:
+            text = comment.decode('ascii')
+            if not text.startswith(GpxArchiveCompression.COMMENT_PREFIX):
+                return None
+
+            codec, _, level = text.removeprefix(GpxArchiveCompression.COMMENT_PREFIX).partition(':')
+            return GpxArchiveCompression(GpxArchiveCodec(codec), int(level) if level else None)
+        except ValueError:
+            return None
+
+    def __str__(self) -> str:
+        return self.codec.value if self.level is None else f'{self.codec.value} (level {self.level})'
+
+
+@dataclass
+class GpxArchiveRecompressionResult:
+    zipFilePath: str
+    isSkipped: bool
+    sizeBefore: int
+    sizeAfter: int
+    readDurationBefore: float
+    readDurationAfter: float
+    compressDuration: float
+    error: str | None = None
+
+
+@dataclass
+class GpxArchiveRecompressionReport:
+    numberOfArchives: int = 0
+    numberOfSkippedArchives: int = 0
+    failedArchives: list[tuple[str, str]] = field(default_factory=list)
+    sizeBefore: int = 0
+    sizeAfter: int = 0
+    readDurationBefore: float = 0.0
+    readDurationAfter: float = 0.0
+    compressDuration: float = 0.0
+    duration: float = 0.0
+
+    def add(self, result: GpxArchiveRecompressionResult) -> None:
+        if result.error is not None:
+            self.failedArchives.append((result.zipFilePath, result.error))
+            return
+
+        if result.isSkipped:
+            self.numberOfSkippedArchives += 1
+            return
+
+        self.numberOfArchives += 1
+        self.sizeBefore += result.sizeBefore
+        self.sizeAfter += result.sizeAfter
+        self.readDurationBefore += result.readDurationBefore
+        self.readDurationAfter += result.readDurationAfter
+        self.compressDuration += result.compressDuration
+
+
+def recompress_archive(
+    zipFilePath: str, compression: GpxArchiveCompression, isDryRun: bool = False, isForced: bool = False
+) -> GpxArchiveRecompressionResult:
+    """
+    Rewrites all entries of the archive with the given compression.
+    The new archive is written to a temporary file that replaces the archive afterwards (or is removed on a dry run),
+    so the archive stays readable at any time.
+    """
+    sizeBefore = os.path.getsize(zipFilePath)
+    try:
+        startTime = time.perf_counter()
+        with ZipFile(zipFilePath, 'r') as zipObject:
+            if not isForced and GpxArchiveCompression.from_comment(zipObject.comment) == compression:
+                return GpxArchiveRecompressionResult(zipFilePath, True, sizeBefore, sizeBefore, 0.0, 0.0, 0.0)
+
+            entries = [(info, zipObject.read(info)) for info in zipObject.infolist()]
+        readDurationBefore = time.perf_counter() - startTime
+
+        temporaryFilePath = f'{zipFilePath}.tmp'
+        try:
+            startTime = time.perf_counter()
+            with compression.open(temporaryFilePath) as zipObject:
+                for info, data in entries:
+                    newInfo = ZipInfo(info.filename, info.date_time)
+                    newInfo.external_attr = info.external_attr
+                    newInfo.compress_type = compression.codec.compressionMethod
+                    zipObject.writestr(newInfo, data, compresslevel=compression.level)
+            compressDuration = time.perf_counter() - startTime
+
+            startTime = time.perf_counter()
+            with ZipFile(temporaryFilePath, 'r') as zipObject:
+                for info, data in entries:
+                    if zipObject.read(info.filename) != data:
+                        raise ValueError(f'Content of entry "{info.filename}" differs after recompression')
+            readDurationAfter = time.perf_counter() - startTime
+
+            sizeAfter = os.path.getsize(temporaryFilePath)
+            if isDryRun:
+                os.remove(temporaryFilePath)
+            else:
+                os.replace(temporaryFilePath, zipFilePath)
+        except Exception:
+            if os.path.exists(temporaryFilePath):
+                os.remove(temporaryFilePath)
+            raise
+    except Exception as e:
+        LOGGER.error(f'Could not recompress gpx archive "{zipFilePath}": {e}')
+        return GpxArchiveRecompressionResult(zipFilePath, False, sizeBefore, sizeBefore, 0.0, 0.0, 0.0, str(e))
+
+    return GpxArchiveRecompressionResult(
+        zipFilePath, False, sizeBefore, sizeAfter, readDurationBefore, readDurationAfter, compressDuration
+    )
+
+
+def _recompress_in_worker(arguments: tuple[str, GpxArchiveCompression, bool, bool]) -> GpxArchiveRecompressionResult:
+    return recompress_archive(*arguments)
+
+
+class GpxArchiveRecompressor:
+    """
+    Recompresses all gpx archives in the data folder with several processes.
+    """
+
+    def __init__(self, dataPath: str, zipFileExtension: str, numberOfProcesses: int) -> None:
+        self._dataPath = dataPath
+        self._zipFileExtension = zipFileExtension
+        self._numberOfProcesses = max(1, numberOfProcesses)
+
+    def find_archives(self) -> list[str]:
+        """
+        Returns the paths of all gpx archives (stored as <data>/<name>/<name>.gpx.zip).
+        """
+        zipFilePaths = []
+        with os.scandir(self._dataPath) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+
+                zipFilePath = os.path.join(entry.path, f'{entry.name}.{self._zipFileExtension}')
+                if os.path.isfile(zipFilePath):
+                    zipFilePaths.append(zipFilePath)
+
+        return sorted(zipFilePaths)
+
+    def recompress(
+        self,
+        zipFilePaths: list[str],
+        compression: GpxArchiveCompression,
+        isDryRun: bool = False,
+        isForced: bool = False,
+    ) -> Iterator[GpxArchiveRecompressionResult]:
+        """
+        Yields the result of each archive in the order of the given paths.
+        """
+        if self._numberOfProcesses == 1 or len(zipFilePaths) <= 1:
+            for zipFilePath in zipFilePaths:
+                yield recompress_archive(zipFilePath, compression, isDryRun, isForced)
+            return
+
+        # spawn instead of fork, since the server process may hold open database connections and greenlets
+        with ProcessPoolExecutor(
+            max_workers=self._numberOfProcesses, mp_context=multiprocessing.get_context('spawn')
+        ) as executor:
+            chunkSize = max(1, len(zipFilePaths) // (self._numberOfProcesses * 4))
+            yield from executor.map(
+                _recompress_in_worker,
+                [(zipFilePath, compression, isDryRun, isForced) for zipFilePath in zipFilePaths],
+                chunksize=chunkSize,
+            )
@@ -15,9 +15,7 @@ from sporttracker.plannedTour.PlannedTourService import PlannedTourService
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
 
-def construct_blueprint(
-    gpxService: GpxService, distanceWorkoutService: DistanceWorkoutService, plannedTourService: PlannedTourService
-):
+def construct_blueprint(gpxService: GpxService, distanceWorkoutService: DistanceWorkoutService):
     gpxTracks = Blueprint('gpxTracks', __name__, static_folder='static', url_prefix='/gpxTracks')
 
     @gpxTracks.route('/workout/<string:file_format>/<int:workout_id>')
@@ -73,6 +71,34 @@ def construct_blueprint(
 
         abort(404)
 
+    @gpxTracks.route('/geometry/<int:zoom>/workout/<int:workout_id>')
+    @login_required
+    def getGeometryByWorkoutId(zoom: int, workout_id: int):
+        workout = distanceWorkoutService.get_distance_workout_by_id(workout_id, current_user.id)
+
+        if workout is None:
+            abort(404)
+
+        response = __sendGeometry(gpxService, workout, zoom)
+        if response is not None:
+            return response
+
+        abort(404)
+
+    @gpxTracks.route('/geometry/<int:zoom>/plannedTour/<int:tour_id>')
+    @login_required
+    def getGeometryByPlannedTourId(zoom: int, tour_id: int):
+        plannedTour = PlannedTourService.get_planned_tour_by_id(tour_id)
+
+        if plannedTour is None:
+            abort(404)
+
+        response = __sendGeometry(gpxService, plannedTour, zoom)
+        if response is not None:
+            return response
+
+        abort(404)
+
     @gpxTracks.route('/delete/workout/<int:workout_id>')
     @login_required
     def deleteGpxTrackByWorkoutId(workout_id: int):
@@ -109,7 +135,7 @@ def construct_blueprint(
 
         gpxPreviewImageService = GpxPreviewImageService(gpxMetadata.gpx_file_name, gpxService)
         if not gpxPreviewImageService.is_image_existing():
-            return send_from_directory('static', path='images/map_placeholder.png', mimetype='image/png')
+            return __sendPreviewImagePlaceholder()
 
         gpxPreviewImageFileName = gpxPreviewImageService.get_preview_image_path()
         return send_file(gpxPreviewImageFileName, mimetype='image/jpg')
@@ -122,12 +148,10 @@ def construct_blueprint(
         if longDistanceTour is None:
             abort(404)
 
-        gpxPreviewImageService = LongDistanceTourGpxPreviewImageService(
-            longDistanceTour, gpxService, plannedTourService
-        )
+        gpxPreviewImageService = LongDistanceTourGpxPreviewImageService(longDistanceTour, gpxService)
 
         if not gpxPreviewImageService.is_image_existing():
-            return send_from_directory('static', path='images/map_placeholder.png', mimetype='image/png')
+            return __sendPreviewImagePlaceholder()
 
         gpxPreviewImageFileName = gpxPreviewImageService.get_preview_image_path()
         return send_file(gpxPreviewImageFileName, mimetype='image/jpg')
@@ -135,6 +159,13 @@ def construct_blueprint(
     return gpxTracks
 
 
+def __sendPreviewImagePlaceholder() -> Response:
+    # the image is rendered in the background, so the browser must not keep the placeholder
+    response = send_from_directory('static', path='images/map_placeholder.png', mimetype='image/png')
+    response.cache_control.no_cache = True
+    return response
+
+
 def __downloadTrackFile(gpxService: GpxService, item: DistanceWorkout, fileFormat: str) -> Response | None:
     if fileFormat == GpxService.GPX_FILE_EXTENSION:
         return __downloadGpxTrack(gpxService, item, item.get_download_name())
@@ -149,12 +180,14 @@ def __downloadGpxTrack(gpxService: GpxService, item: DistanceWorkout, downloadNa
     if gpxMetadata is None:
         return None
 
-    modifiedGpxXml = gpxService.get_joined_tracks_and_segments(gpxMetadata.gpx_file_name, downloadName)
-    fileName = f'{downloadName}.gpx'
-    return Response(
-        modifiedGpxXml,
+    # streamed from the cached file, conditional requests are answered with 304 via ETag and Last-Modified
+    downloadFilePath = gpxService.get_download_file_path(gpxMetadata.gpx_file_name, downloadName)
+    return send_file(
+        downloadFilePath,
         mimetype='application/gpx',
-        headers={'content-disposition': f'attachment; filename={fileName}'},
+        as_attachment=True,
+        download_name=f'{downloadName}.gpx',
+        conditional=True,
     )
 
 
@@ -163,10 +196,20 @@ def __downloadFitTrack(gpxService: GpxService, item: DistanceWorkout, downloadNa
     if gpxMetadata is None:
         return None
 
-    fitContent = gpxService.get_fit_content(gpxMetadata.gpx_file_name)
-    fileName = f'{downloadName}.fit'
-    return Response(
-        fitContent,
+    fitFilePath = gpxService.get_fit_file_path(gpxMetadata.gpx_file_name)
+    return send_file(
+        fitFilePath,
         mimetype='application/octet-stream',
-        headers={'content-disposition': f'attachment; filename={fileName}'},
+        as_attachment=True,
+        download_name=f'{downloadName}.fit',
+        conditional=True,
     )
+
+
+def __sendGeometry(gpxService: GpxService, item: DistanceWorkout, zoom: int) -> Response | None:
+    gpxMetadata = item.get_gpx_metadata()
+    if gpxMetadata is None:
+        return None
+
+    geometryFilePath = gpxService.get_geometry_file_path(gpxMetadata.gpx_file_name, zoom)
+    return send_file(geometryFilePath, mimetype='application/json', conditional=True)
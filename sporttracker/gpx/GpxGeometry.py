@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import math
+from typing import Any, Sequence
+
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+
+TILE_SIZE = 256
+
+# zoom levels of the precomputed geometries, a geometry is used up to its zoom level
+ZOOM_LEVELS = (8, 11, 14, 16)
+
+# maximum deviation of a simplified line from the track in pixels at the zoom level of the geometry
+TOLERANCE_IN_PIXELS = 0.5
+
+COORDINATE_PRECISION = 1e5
+ELEVATION_PRECISION = 1e1
+
+
+def get_zoom_level(zoom: int) -> int:
+    """
+    Returns the zoom level of the precomputed geometry that is detailed enough for the requested zoom level.
+    """
+    for zoomLevel in ZOOM_LEVELS:
+        if zoom <= zoomLevel:
+            return zoomLevel
+
+    return ZOOM_LEVELS[-1]
+
+
+def create_geometries(trackPoints: GpxTrackPoints) -> dict[int, dict[str, Any]]:
+    """
+    Simplifies every track segment for all zoom levels and encodes the coordinates as Google polylines.
+    The coarser geometries are simplified from the next finer one instead of all track points.
+    """
+    geometries: dict[int, list[dict[str, str | None]]] = {zoomLevel: [] for zoomLevel in ZOOM_LEVELS}
+
+    for start, end in trackPoints.get_segment_ranges():
+        latitudes = trackPoints.latitudes[start:end]
+        longitudes = trackPoints.longitudes[start:end]
+        elevations = _fill_missing_elevations(trackPoints.elevations[start:end])
+        xCoordinates, yCoordinates = _project(latitudes, longitudes)
+
+        indices = list(range(end - start))
+        for zoomLevel in reversed(ZOOM_LEVELS):
+            tolerance = TOLERANCE_IN_PIXELS / (TILE_SIZE * (1 << zoomLevel))
+            indices = simplify(xCoordinates, yCoordinates, indices, tolerance)
+
+            geometries[zoomLevel].append(
+                {
+                    'polyline': encode_polyline(
+                        [latitudes[index] for index in indices], [longitudes[index] for index in indices]
+                    ),
+                    'elevations': None
+                    if elevations is None
+                    else encode_values([elevations[index] for index in indices], ELEVATION_PRECISION),
+                }
+            )
+
+    return {zoomLevel: {'zoom': zoomLevel, 'segments': segments} for zoomLevel, segments in geometries.items()}
+
+
+def simplify(
+    xCoordinates: Sequence[float], yCoordinates: Sequence[float], indices: list[int], tolerance: float
+) -> list[int]:
+    """
+    Returns the indices of the points that are kept if the line through the given points is simplified.
+    Points closer than the tolerance to the previous kept point are dropped first (cheap radial distance filter),
+    the remaining points are simplified with the Douglas-Peucker algorithm.
+    """
+    if len(indices) <= 2:
+        return list(indices)
+
+    squaredTolerance = tolerance * tolerance
+
+    lastIndex = indices[0]
+    radialIndices = [lastIndex]
+    for index in indices[1:-1]:
+        dx = xCoordinates[index] - xCoordinates[lastIndex]
+        dy = yCoordinates[index] - yCoordinates[lastIndex]
+        if dx * dx + dy * dy > squaredTolerance:
+            radialIndices.append(index)
+            lastIndex = index
+    radialIndices.append(indices[-1])
+
+    return _simplify_douglas_peucker(xCoordinates, yCoordinates, radialIndices, squaredTolerance)
+
+
+def _simplify_douglas_peucker(
+    xCoordinates: Sequence[float], yCoordinates: Sequence[float], indices: list[int], squaredTolerance: float
+) -> list[int]:
+    isKept = [False] * len(indices)
+    isKept[0] = True
+    isKept[-1] = True
+
+    # iterative instead of recursive to support tracks with hundreds of thousands of points
+    stack = [(0, len(indices) - 1)]
+    while stack:
+        first, last = stack.pop()
+
+        x1 = xCoordinates[indices[first]]
+        y1 = yCoordinates[indices[first]]
+        dx = xCoordinates[indices[last]] - x1
+        dy = yCoordinates[indices[last]] - y1
+        squaredLength = dx * dx + dy * dy
+
+        maxSquaredDistance = squaredTolerance
+        maxPosition = -1
+        for position in range(first + 1, last):
+            px = xCoordinates[indices[position]] - x1
+            py = yCoordinates[indices[position]] - y1
+
+            # squared distance between the point and the line segment from first to last
+            if squaredLength > 0:
+                t = (px * dx + py * dy) / squaredLength
+                if t > 1:
+                    px -= dx
+                    py -= dy
+                elif t > 0:
+                    px -= t * dx
+                    py -= t * dy
+
+            squaredDistance = px * px + py * py
+            if squaredDistance > maxSquaredDistance:
+                maxSquaredDistance = squaredDistance
+                maxPosition = position
+
+        if maxPosition != -1:
+            isKept[maxPosition] = True
+            stack.append((first, maxPosition))
+            stack.append((maxPosition, last))
+
+    return [index for index, kept in zip(indices, isKept) if kept]
+
+
+def encode_polyline(latitudes: Sequence[float], longitudes: Sequence[float]) -> str:
+    """
+    Encodes the coordinates in the Google encoded polyline format (precision of 5 decimal places).
+    """
+    parts = []
+    previousLatitude = 0
+    previousLongitude = 0
+    for latitude, longitude in zip(latitudes, longitudes):
+        roundedLatitude = _round(latitude * COORDINATE_PRECISION)
+        roundedLongitude = _round(longitude * COORDINATE_PRECISION)
+        parts.append(_encode_signed(roundedLatitude - previousLatitude))
+        parts.append(_encode_signed(roundedLongitude - previousLongitude))
+        previousLatitude = roundedLatitude
+        previousLongitude = roundedLongitude
+
+    return ''.join(parts)
+
+
+def encode_values(values: Sequence[float], precision: float) -> str:
+    """
+    Encodes a single column (e.g. elevations) with the delta and character encoding of Google polylines.
+    """
+    parts = []
+    previousValue = 0
+    for value in values:
+        roundedValue = _round(value * precision)
+        parts.append(_encode_signed(roundedValue - previousValue))
+        previousValue = roundedValue
+
+    return ''.join(parts)
+
+
+def decode_values(encoded: str, numberOfColumns: int, precision: float) -> list[tuple[float, ...]]:
+    """
+    Decodes polylines (two columns) or encoded single columns.
+    """
+    values = []
+    previous = [0] * numberOfColumns
+    position = 0
+    while position < len(encoded):
+        point = []
+        for column in range(numberOfColumns):
+            result = 0
+            shift = 0
+            while True:
+                byte = ord(encoded[position]) - 63
+                position += 1
+                result |= (byte & 0x1F) << shift
+                shift += 5
+                if byte < 0x20:
+                    break
+
+            previous[column] += ~(result >> 1) if result & 1 else result >> 1
+            point.append(previous[column] / precision)
+        values.append(tuple(point))
+
+    return values
+
+
+def _round(value: float) -> int:
+    # rounds halves away from zero like the reference implementation of the format
+    return int(math.floor(abs(value) + 0.5)) * (1 if value >= 0 else -1)
+
+
+def _encode_signed(value: int) -> str:
+    value = ~(value << 1) if value < 0 else value << 1
+
+    characters = []
+    while value >= 0x20:
+        characters.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    characters.append(chr(value + 63))
+    return ''.join(characters)
+
+
+def _project(latitudes: Sequence[float], longitudes: Sequence[float]) -> tuple[list[float], list[float]]:
+    """
+    Projects the coordinates to web mercator coordinates between 0 and 1, as displayed on the map.
+    """
+    radians = math.radians
+    asinh = math.asinh
+    tan = math.tan
+    pi = math.pi
+
+    xCoordinates = [(longitude + 180.0) / 360.0 for longitude in longitudes]
+    yCoordinates = [(1.0 - asinh(tan(radians(latitude))) / pi) / 2.0 for latitude in latitudes]
+    return xCoordinates, yCoordinates
+
+
+def _fill_missing_elevations(elevations: Sequence[float]) -> list[float] | None:
+    """
+    Replaces missing elevations with the previous (or at the beginning with the first) known elevation.
+    Returns None if no point has an elevation.
+    """
+    firstElevation = next((elevation for elevation in elevations if not math.isnan(elevation)), None)
+    if firstElevation is None:
+        return None
+
+    filledElevations = []
+    previousElevation = firstElevation
+    for elevation in elevations:
+        if not math.isnan(elevation):
+            previousElevation = elevation
+        filledElevations.append(previousElevation)
+
+    return filledElevations
@@ -0,0 +1,21 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class ElevationExtremes:
+    minimum: int | None
+    maximum: int | None
+
+
+@dataclass
+class UphillDownhill:
+    uphill: int | None
+    downhill: int | None
+
+
+@dataclass
+class GpxMetaInfo:
+    distance: float
+    elevationExtremes: ElevationExtremes
+    uphillDownhill: UphillDownhill
+    editorLink: str | None
@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import logging
+import math
+import re
+from array import array
+from dataclasses import dataclass
+from enum import Enum
+from typing import Iterable, Sequence
+
+import gpxpy
+from gpxpy.gpx import GPX, GPXTrack, GPXTrackPoint
+
+from sporttracker import Constants
+from sporttracker.gpx.GpxMetaInfo import ElevationExtremes, GpxMetaInfo, UphillDownhill
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+@dataclass(frozen=True)
+class VisitedTile:
+    x: int
+    y: int
+
+
+class TileExtractionMode(Enum):
+    # only the tiles that contain a track point
+    POINTS = 'points'
+    # all tiles crossed by the lines between consecutive track points
+    SEGMENTS = 'segments'
+
+
+class GpxParser:
+    def __init__(self, gpxContent: bytes) -> None:
+        self._gpx = self.__parse_gpx(gpxContent)
+
+    @staticmethod
+    def from_file_path(gpxFilePath: str) -> GpxParser:
+        LOGGER.debug(f'Parse gpx "{gpxFilePath}"')
+        with open(gpxFilePath, mode='rb', encoding='utf-8') as f:
+            gpxContent = f.read()
+
+        return GpxParser(gpxContent)
+
+    @staticmethod
+    def __parse_gpx(gpxContent: bytes) -> GPX:
+        return gpxpy.parse(gpxContent)
+
+    def join_tracks_and_segments(self, downloadName: str) -> str:
+        self.__join_tracks(self._gpx)
+
+        self.__fix_missing_elevation_for_first_points(self._gpx)
+
+        self._gpx.name = downloadName
+
+        return self._gpx.to_xml(prettyprint=False)
+
+    @staticmethod
+    def __fix_missing_elevation_for_first_points(gpx: GPX):
+        if gpx.get_points_no() == 0:
+            return
+
+        # only safe if the gpx tracks and segments were joined before
+        points = gpx.tracks[0].segments[0].points
+
+        indexFirstElevation = GpxParser.__find_index_of_first_point_with_elevation(points)
+        if indexFirstElevation is None:
+            # no elevation data in any point
+            return
+
+        if indexFirstElevation < 2:
+            # at least the first or second point contains elevation data
+            return
+
+        firstElevation = points[indexFirstElevation].elevation
+
+        distanceBetweenFirstPointAndFirstElevation = points[0].distance_2d(points[indexFirstElevation])
+        LOGGER.debug(
+            f'Detected missing elevation for the gpx data points 0 to {indexFirstElevation}. '
+            f'First elevation is at index {indexFirstElevation} with value {firstElevation:.2f}. '
+            f'Elevation will be copied for {distanceBetweenFirstPointAndFirstElevation:.2f}m.'
+        )
+        for index in range(0, indexFirstElevation):
+            points[index].elevation = firstElevation
+
+    @staticmethod
+    def __find_index_of_first_point_with_elevation(points: list[GPXTrackPoint]) -> int | None:
+        for index, point in enumerate(points):
+            if point.has_elevation():
+                return index
+
+        return None
+
+    @staticmethod
+    def __join_tracks(gpx: GPX) -> GPXTrack:
+        joinedTrack = gpxpy.gpx.GPXTrack()
+        numberOfTracks = len(gpx.tracks)
+        for track in gpx.tracks:
+            joinedTrack.segments.extend(track.segments)
+            joinedTrack.link = GpxParser.escape_ampersands(track.link)
+
+        if numberOfTracks > 1:
+            LOGGER.debug(f'Joined {numberOfTracks} tracks')
+
+        gpx.tracks.clear()
+        gpx.tracks.append(joinedTrack)
+
+        GpxParser.__join_track_segments(joinedTrack)
+        return joinedTrack
+
+    @staticmethod
+    def __join_track_segments(track: GPXTrack) -> None:
+        joinedSegment = gpxpy.gpx.GPXTrackSegment()
+
+        numberOfSegments = len(track.segments)
+        for segment in track.segments:
+            for point in segment.points:
+                joinedSegment.points.append(point)
+
+        if numberOfSegments > 1:
+            LOGGER.debug(f'Joined {numberOfSegments} segments')
+            track.segments.clear()
+            track.segments.append(joinedSegment)
+
+    def __get_length(self) -> float:
+        return self._gpx.length_2d()
+
+    def __get_elevation_extremes(self) -> ElevationExtremes:
+        elevationExtremes = self._gpx.get_elevation_extremes()
+        minimum = elevationExtremes.minimum
+        maximum = elevationExtremes.maximum
+        if minimum is None or maximum is None:
+            return ElevationExtremes(None, None)
+
+        return ElevationExtremes(int(minimum), int(maximum))
+
+    def __get_uphill_downhill(self) -> UphillDownhill:
+        uphillDownhill = self._gpx.get_uphill_downhill()
+        uphill = uphillDownhill.uphill
+        downhill = uphillDownhill.downhill
+        if uphill is None or downhill is None:
+            return UphillDownhill(None, None)
+
+        return UphillDownhill(int(uphill), int(downhill))
+
+    def __get_editor_link(self) -> str | None:
+        for track in self._gpx.tracks:
+            if track.link is not None and track.link:
+                return track.link
+
+        return None
+
+    def get_visited_tiles(
+        self, baseZoomLevel: int, tileExtractionMode: TileExtractionMode = TileExtractionMode.POINTS
+    ) -> set[VisitedTile]:
+        segments = (
+            ([point.latitude for point in segment.points], [point.longitude for point in segment.points])
+            for track in self._gpx.tracks
+            for segment in track.segments
+        )
+        return GpxParser.get_visited_tiles_of_segments(segments, baseZoomLevel, tileExtractionMode)
+
+    @staticmethod
+    def get_visited_tiles_of_segments(
+        segments: Iterable[tuple[Sequence[float], Sequence[float]]],
+        baseZoomLevel: int,
+        tileExtractionMode: TileExtractionMode = TileExtractionMode.POINTS,
+    ) -> set[VisitedTile]:
+        """
+        Extracts the visited tiles of track segments given as latitudes and longitudes.
+        Shared by GpxParser and GpxStreamParser.
+        """
+        GpxParser.__check_zoom_level(baseZoomLevel)
+
+        tilePositions: set[tuple[int, int]] = set()
+        numberOfPoints = 0
+        for latitudes, longitudes in segments:
+            xCoordinates, yCoordinates = GpxParser.__convert_coordinates_to_tile_coordinates(
+                latitudes, longitudes, baseZoomLevel
+            )
+            numberOfPoints += len(xCoordinates)
+
+            if tileExtractionMode == TileExtractionMode.SEGMENTS:
+                GpxParser.__add_tiles_crossed_by_segments(xCoordinates, yCoordinates, 1 << baseZoomLevel, tilePositions)
+            else:
+                tilePositions.update(zip(map(int, xCoordinates), map(int, yCoordinates)))
+
+        LOGGER.debug(
+            f'{numberOfPoints} points in gpx track resulted in {len(tilePositions)} distinct tiles '
+            f'({tileExtractionMode.value})'
+        )
+        return {VisitedTile(x, y) for x, y in tilePositions}
+
+    @staticmethod
+    def __convert_coordinates_to_tile_coordinates(
+        latitudes: Sequence[float], longitudes: Sequence[float], zoom: int
+    ) -> tuple[array[float], array[float]]:
+        """
+        Converts all points into fractional tile coordinates at once.
+        The integer part is the tile position, identical to convert_coordinate_to_tile_position.
+        """
+        n = 1 << zoom
+        radians = math.radians
+        asinh = math.asinh
+        tan = math.tan
+        pi = math.pi
+
+        xCoordinates = array('d', [(longitude + 180.0) / 360.0 * n for longitude in longitudes])
+        yCoordinates = array('d', [(1.0 - asinh(tan(radians(latitude))) / pi) / 2.0 * n for latitude in latitudes])
+        return xCoordinates, yCoordinates
+
+    @staticmethod
+    def __add_tiles_crossed_by_segments(
+        xCoordinates: array[float], yCoordinates: array[float], n: int, tilePositions: set[tuple[int, int]]
+    ) -> None:
+        """
+        Adds all tiles that are crossed by the straight lines between consecutive points (grid supercover).
+        The grid is traversed tile by tile (Amanatides & Woo). If a line passes exactly through a tile corner,
+        both neighbouring tiles are added as well.
+        """
+        if not xCoordinates:
+            return
+
+        previousX = xCoordinates[0]
+        previousY = yCoordinates[0]
+        tilePositions.add((int(previousX), int(previousY)))
+
+        for x, y in zip(xCoordinates, yCoordinates):
+            tileX = int(previousX)
+            tileY = int(previousY)
+            endTileX = int(x)
+            endTileY = int(y)
+
+            if tileX == endTileX and tileY == endTileY:
+                previousX = x
+                previousY = y
+                continue
+
+            deltaX = x - previousX
+            deltaY = y - previousY
+            if abs(deltaX) > n / 2:
+                # the line crosses the antimeridian, only the point itself is added
+                tilePositions.add((endTileX, endTileY))
+                previousX = x
+                previousY = y
+                continue
+
+            stepX = 1 if deltaX > 0 else -1
+            stepY = 1 if deltaY > 0 else -1
+            # parameter t along the line (0 to 1) at which the next vertical/horizontal tile border is crossed
+            if deltaX != 0:
+                tDeltaX = abs(1.0 / deltaX)
+                tMaxX = ((tileX + 1 - previousX) if deltaX > 0 else (previousX - tileX)) * tDeltaX
+            else:
+                tDeltaX = math.inf
+                tMaxX = math.inf
+            if deltaY != 0:
+                tDeltaY = abs(1.0 / deltaY)
+                tMaxY = ((tileY + 1 - previousY) if deltaY > 0 else (previousY - tileY)) * tDeltaY
+            else:
+                tDeltaY = math.inf
+                tMaxY = math.inf
+
+            numberOfRemainingSteps = abs(endTileX - tileX) + abs(endTileY - tileY)
+            while numberOfRemainingSteps > 0:
+                if tMaxX < tMaxY:
+                    tileX += stepX
+                    tMaxX += tDeltaX
+                    numberOfRemainingSteps -= 1
+                elif tMaxY < tMaxX:
+                    tileY += stepY
+                    tMaxY += tDeltaY
+                    numberOfRemainingSteps -= 1
+                else:
+                    # exactly through a corner
+                    tilePositions.add((tileX + stepX, tileY))
+                    tilePositions.add((tileX, tileY + stepY))
+                    tileX += stepX
+                    tileY += stepY
+                    tMaxX += tDeltaX
+                    tMaxY += tDeltaY
+                    numberOfRemainingSteps -= 2
+
+                tilePositions.add((tileX, tileY))
+
+            # guards against rounding errors in the traversal
+            tilePositions.add((endTileX, endTileY))
+            previousX = x
+            previousY = y
+
+    @staticmethod
+    def __check_zoom_level(zoom: int) -> None:
+        if zoom < 0 or zoom > 20:
+            raise ValueError(f'Zoom level {zoom} is not valid. Must be between 0 and 20')
+
+    @staticmethod
+    def convert_coordinate_to_tile_position(lat_deg: float, lon_deg: float, zoom: int) -> VisitedTile:
+        GpxParser.__check_zoom_level(zoom)
+
+        lat_rad = math.radians(lat_deg)
+        n = 1 << zoom
+        x = int((lon_deg + 180.0) / 360.0 * n)
+        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+        return VisitedTile(x, y)
+
+    def get_meta_info(self) -> GpxMetaInfo:
+        return GpxMetaInfo(
+            self.__get_length(),
+            self.__get_elevation_extremes(),
+            self.__get_uphill_downhill(),
+            self.__get_editor_link(),
+        )
+
+    @staticmethod
+    def escape_ampersands(url):
+        if url is None:
+            return None
+
+        # Match '&' that is not followed by a valid HTML entity like &amp;, &lt;, etc.
+        return re.sub(r'&(?!#?\w+;)', '%26', url)
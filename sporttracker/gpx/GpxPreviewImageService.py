@@ -1,6 +1,5 @@
 import logging
 import os
-import tempfile
 from typing import Any
 
 import requests
@@ -9,6 +8,35 @@ from sporttracker import Constants
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
+DEFAULT_REQUEST_TIMEOUT_IN_SECONDS = 60
+
+
+class ImageGenerationException(Exception):
+    pass
+
+
+def render_preview_image(
+    gpxContent: bytes, gpxFileName: str, imagePath: str, gpxPreviewImageSettings: dict[str, Any]
+) -> None:
+    """
+    Sends the gpx to georender and stores the returned image.
+    The image is written to a temporary file first, so a preview image is never served half-written.
+    Raises an ImageGenerationException if georender is unreachable or responds with an error.
+    """
+    timeout = gpxPreviewImageSettings.get('requestTimeoutInSeconds', DEFAULT_REQUEST_TIMEOUT_IN_SECONDS)
+    try:
+        response = requests.post(
+            gpxPreviewImageSettings['geoRenderUrl'], files={'gpx': (gpxFileName, gpxContent)}, timeout=timeout
+        )
+        response.raise_for_status()
+    except requests.exceptions.RequestException as err:
+        raise ImageGenerationException(f'Could not render preview image "{imagePath}": {err}') from err
+
+    tempImagePath = f'{imagePath}.tmp'
+    with open(tempImagePath, 'wb') as f:
+        f.write(response.content)
+    os.replace(tempImagePath, imagePath)
+
 
 class GpxPreviewImageService:
     def __init__(self, gpxFileName: str, gpxService) -> None:
@@ -30,18 +58,10 @@ class GpxPreviewImageService:
         if os.path.exists(self.get_preview_image_path()):
             return
 
-        try:
-            with tempfile.TemporaryDirectory() as tempDirectory:
-                tempGpxFilePath = os.path.join(tempDirectory, f'{self._gpxFileName}.gpx')
-                with open(tempGpxFilePath, 'wb') as tempGpxFile:
-                    tempGpxFile.write(self._gpxService.get_gpx_content(self._gpxFileName))
-
-                with open(tempGpxFilePath, 'rb') as fd:
-                    files = {'gpx': fd}
-                    response = requests.post(gpxPreviewImageSettings['geoRenderUrl'], files=files)
-                    response.raise_for_status()
-
-                    with open(self.get_preview_image_path(), 'wb') as f:
-                        f.write(response.content)
-        except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as err:
-            LOGGER.error(err)
+        render_preview_image(
+            self._gpxService.join_multiple_gpx([self._gpxFileName]),
+            f'{self._gpxFileName}.gpx',
+            self.get_preview_image_path(),
+            gpxPreviewImageSettings,
+        )
+        LOGGER.debug(f'Generated gpx preview image {self.get_preview_image_path()}')
@@ -1,26 +1,37 @@
 from __future__ import annotations
 
+import hashlib
+import json
 import logging
 import math
 import os
-import re
 import shutil
 import uuid
 from dataclasses import dataclass
-from typing import Any
-from zipfile import ZipFile, ZIP_DEFLATED
+from datetime import datetime
+from typing import Iterator
+from zipfile import ZipFile
 
-import gpxpy
-from gpxpy.gpx import GPX, GPXTrack, GPXTrackPoint
 from sqlalchemy import delete
 from werkzeug.datastructures.file_storage import FileStorage
 
 from sporttracker import Constants
-from sporttracker.fit.FitToGpxConverter import FitToGpxConverter
-from sporttracker.gpx.GpxPreviewImageService import GpxPreviewImageService
+from sporttracker.gpx import GpxGeometry
+from sporttracker.gpx.GpxArchiveCompression import GpxArchiveCompression
+from sporttracker.gpx.GpxParser import GpxParser, TileExtractionMode, VisitedTile
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser, ReadableStream
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+from sporttracker.helpers.StageTimer import StageTimer, StageStatistics, format_stage_durations
+from sporttracker.tileHunting.BulkTileWriter import BulkTileWriter
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
 from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
 from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
+from sporttracker.tileHunting.TileCacheWarmUpService import TileCacheWarmUpService
+from sporttracker.tileHunting.TileImageCache import TileImageCache
+from sporttracker.tileHunting.TilePyramidCache import TilePyramidCache
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+from sporttracker.workout.distance.GpxIngestService import GpxIngestResult, GpxIngestService
 from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
 from sporttracker.tileHunting.GpxPlannedTileEntity import GpxPlannedTile
 from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
@@ -31,51 +42,115 @@ LOGGER = logging.getLogger(Constants.APP_NAME)
 
 
 @dataclass
-class ElevationExtremes:
-    minimum: int | None
-    maximum: int | None
+class GpxUploadResult:
+    gpxMetadataId: int
+    # heart rate samples of an uploaded fit file, stored once the workout exists
+    heartRateSamples: list[tuple[datetime, int]]
 
 
 @dataclass
-class UphillDownhill:
-    uphill: int | None
-    downhill: int | None
+class GpxGeometryTrack:
+    id: int
+    type: str
+    color: str
+    gpxFileName: str
+
+
+class GpxGeometryCollection:
+    """
+    Simplified geometries of several tracks that are sent to the map in a single response.
+    The json is assembled from the stored geometry files without parsing them and is streamed track by track.
+    """
+
+    def __init__(self, zoomLevel: int, tracksWithFilePaths: list[tuple[GpxGeometryTrack, str]]) -> None:
+        self._zoomLevel = zoomLevel
+        self._tracksWithFilePaths = tracksWithFilePaths
+
+    def get_number_of_tracks(self) -> int:
+        return len(self._tracksWithFilePaths)
+
+    def get_etag(self) -> str:
+        """
+        Changes if any track is added, removed or its geometry is recreated.
+        """
+        hashObject = hashlib.sha256(str(self._zoomLevel).encode('ascii'))
+        for track, filePath in self._tracksWithFilePaths:
+            try:
+                modificationTime = os.stat(filePath).st_mtime_ns
+            except FileNotFoundError:
+                modificationTime = 0
+            hashObject.update(f'|{track.id},{track.type},{track.color},{modificationTime}'.encode('utf-8'))
+
+        return hashObject.hexdigest()[:32]
 
+    def stream(self) -> Iterator[bytes]:
+        yield f'{{"zoom":{self._zoomLevel},"tracks":['.encode('ascii')
 
-@dataclass(frozen=True)
-class VisitedTile:
-    x: int
-    y: int
+        isFirstTrack = True
+        for track, filePath in self._tracksWithFilePaths:
+            try:
+                with open(filePath, 'rb') as geometryFile:
+                    geometry = geometryFile.read()
+            except FileNotFoundError:
+                # the track was deleted in the meantime
+                continue
 
+            trackInfo = json.dumps({'id': track.id, 'type': track.type, 'color': track.color})
+            yield f'{"" if isFirstTrack else ","}{trackInfo[:-1]},"geometry":'.encode('utf-8') + geometry + b'}'
+            isFirstTrack = False
 
-@dataclass
-class GpxMetaInfo:
-    distance: float
-    elevationExtremes: ElevationExtremes
-    uphillDownhill: UphillDownhill
-    editorLink: str | None
+        yield b']}'
 
 
 class GpxService:
-    ZIP_FILE_EXTENSION = 'gpx.zip'
-    GPX_FILE_EXTENSION = 'gpx'
-    FIT_FILE_EXTENSION = 'fit'
+    ZIP_FILE_EXTENSION = GpxIngestService.ZIP_FILE_EXTENSION
+    GPX_FILE_EXTENSION = GpxIngestService.GPX_FILE_EXTENSION
+    FIT_FILE_EXTENSION = GpxIngestService.FIT_FILE_EXTENSION
+    TRACK_POINTS_FILE_EXTENSION = GpxIngestService.TRACK_POINTS_FILE_EXTENSION
+    DOWNLOAD_FOLDER_NAME = 'downloads'
+    GEOMETRY_FOLDER_NAME = GpxIngestService.GEOMETRY_FOLDER_NAME
 
     def __init__(
         self,
         dataPath: str,
         newVisitedTileCache: NewVisitedTileCache,
         maxSquareCache: MaxSquareCache,
+        tileImageCache: TileImageCache,
+        tilePyramidCache: TilePyramidCache,
+        visitedTileIndexCache: VisitedTileIndexCache,
+        tileCacheWarmUpService: TileCacheWarmUpService,
+        tileExtractionMode: TileExtractionMode = TileExtractionMode.POINTS,
+        archiveCompression: GpxArchiveCompression = GpxArchiveCompression(),
     ) -> None:
         self._dataPath = dataPath
         self._newVisitedTileCache = newVisitedTileCache
         self._maxSquareCache = maxSquareCache
+        self._tileImageCache = tileImageCache
+        self._tilePyramidCache = tilePyramidCache
+        self._visitedTileIndexCache = visitedTileIndexCache
+        self._tileCacheWarmUpService = tileCacheWarmUpService
+        self._tileExtractionMode = tileExtractionMode
+        self._archiveCompression = archiveCompression
+        self._ingestService = GpxIngestService(dataPath, archiveCompression)
+        self._ingestStatistics = StageStatistics('gpx_ingest')
 
     def get_folder_path(self, gpxFileName: str) -> str:
-        return os.path.join(self._dataPath, gpxFileName)
+        return self._ingestService.get_folder_path(gpxFileName)
 
     def __get_zip_file_path(self, gpxFileName: str) -> str:
-        return os.path.join(self.get_folder_path(gpxFileName), f'{gpxFileName}.{self.ZIP_FILE_EXTENSION}')
+        return self._ingestService.get_zip_file_path(gpxFileName)
+
+    def __get_track_points_file_path(self, gpxFileName: str) -> str:
+        return self._ingestService.get_track_points_file_path(gpxFileName)
+
+    def get_ingest_service(self) -> GpxIngestService:
+        return self._ingestService
+
+    def get_tile_extraction_mode(self) -> TileExtractionMode:
+        return self._tileExtractionMode
+
+    def get_ingest_statistics(self) -> StageStatistics:
+        return self._ingestStatistics
 
     def get_gpx_content(self, gpxFileName: str) -> bytes:
         zipFilePath = self.__get_zip_file_path(gpxFileName)
@@ -87,62 +162,120 @@ class GpxService:
             with zipObject.open(f'{gpxFileName}.{self.GPX_FILE_EXTENSION}') as gpxFile:
                 return gpxFile.read()
 
+    def get_gpx_stream_parser(self, gpxFileName: str) -> GpxStreamParser:
+        """
+        Parses the gpx while it is decompressed, without reading the whole file into memory.
+        """
+        zipFilePath = self.__get_zip_file_path(gpxFileName)
+
+        if not os.path.exists(zipFilePath):
+            raise FileNotFoundError(zipFilePath)
+
+        with ZipFile(zipFilePath, 'r') as zipObject:
+            with zipObject.open(f'{gpxFileName}.{self.GPX_FILE_EXTENSION}') as gpxFile:
+                return GpxStreamParser(gpxFile)
+
     def get_joined_tracks_and_segments(self, gpxFileName: str, downloadName: str) -> str:
         return GpxParser(self.get_gpx_content(gpxFileName)).join_tracks_and_segments(downloadName)
 
-    def handle_gpx_upload_for_workout(self, files: dict[str, FileStorage]) -> int | None:
-        gpxFileName = self.__handle_gpx_upload(
+    def get_download_file_path(self, gpxFileName: str, downloadName: str) -> str:
+        """
+        Returns the path of the gpx with joined tracks and segments that is offered for download.
+        The file is created on the first download and reused until the gpx archive is replaced.
+        Each download name (e.g. shared link or planned tour name) has its own file, files created from a previous
+        gpx archive are removed.
+        """
+        zipFilePath = self.__get_zip_file_path(gpxFileName)
+        zipModificationTime = os.stat(zipFilePath).st_mtime_ns
+
+        downloadFolderPath = os.path.join(self.get_folder_path(gpxFileName), self.DOWNLOAD_FOLDER_NAME)
+        downloadNameHash = hashlib.sha256(downloadName.encode('utf-8')).hexdigest()[:16]
+        downloadFilePath = os.path.join(downloadFolderPath, f'{downloadNameHash}.{self.GPX_FILE_EXTENSION}')
+
+        try:
+            if os.stat(downloadFilePath).st_mtime_ns >= zipModificationTime:
+                return downloadFilePath
+        except FileNotFoundError:
+            pass
+
+        # concurrent downloads may create the file at the same time, but only complete files are moved into place
+        os.makedirs(downloadFolderPath, exist_ok=True)
+        temporaryFilePath = f'{downloadFilePath}.{uuid.uuid4().hex}.tmp'
+        with open(temporaryFilePath, 'w', encoding='utf-8') as downloadFile:
+            downloadFile.write(self.get_joined_tracks_and_segments(gpxFileName, downloadName))
+        os.replace(temporaryFilePath, downloadFilePath)
+
+        self.__remove_outdated_download_files(downloadFolderPath, downloadFilePath, zipModificationTime)
+
+        LOGGER.debug(f'Created download file for gpx "{gpxFileName}"')
+        return downloadFilePath
+
+    @staticmethod
+    def __remove_outdated_download_files(
+        downloadFolderPath: str, downloadFilePath: str, zipModificationTime: int
+    ) -> None:
+        """
+        Removes the download files that were created from a previous gpx archive.
+        These are never served again, so a download of another name running at the same time is not affected.
+        """
+        for entry in os.scandir(downloadFolderPath):
+            if entry.path == downloadFilePath or entry.name.endswith('.tmp'):
+                continue
+
+            try:
+                if entry.stat().st_mtime_ns < zipModificationTime:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                # already removed by a concurrent download
+                pass
+
+    def handle_gpx_upload_for_workout(self, files: dict[str, FileStorage]) -> GpxUploadResult | None:
+        ingestResult = self.__handle_gpx_upload(
             files,
-            False,
-            {},
             [
                 self.GPX_FILE_EXTENSION,
                 self.FIT_FILE_EXTENSION,
             ],
         )
-        if gpxFileName is None:
+        if ingestResult is None:
             return None
 
-        return self.__create_gpx_metadata(gpxFileName)
+        heartRateSamples = []
+        if ingestResult.fitActivity is not None:
+            heartRateSamples = ingestResult.fitActivity.get_heart_rate_samples()
+
+        return GpxUploadResult(self.__create_gpx_metadata(ingestResult), heartRateSamples)
 
-    def handle_gpx_upload_for_planned_tour(
-        self, files: dict[str, FileStorage], gpxPreviewImageSettings: dict[str, Any]
-    ) -> int | None:
-        gpxFileName = self.__handle_gpx_upload(
+    def handle_gpx_upload_for_planned_tour(self, files: dict[str, FileStorage]) -> int | None:
+        ingestResult = self.__handle_gpx_upload(
             files,
-            gpxPreviewImageSettings['enabled'],
-            gpxPreviewImageSettings,
             [
                 self.GPX_FILE_EXTENSION,
                 self.FIT_FILE_EXTENSION,
             ],
         )
-        if gpxFileName is None:
+        if ingestResult is None:
             return None
 
-        return self.__create_gpx_metadata(gpxFileName)
+        return self.__create_gpx_metadata(ingestResult)
 
     def handle_fit_upload_for_fit_import(self, files: dict[str, FileStorage]) -> int | None:
-        gpxFileName = self.__handle_gpx_upload(
+        ingestResult = self.__handle_gpx_upload(
             files,
-            False,
-            {},
             [
                 self.FIT_FILE_EXTENSION,
             ],
         )
-        if gpxFileName is None:
+        if ingestResult is None:
             return None
 
-        return self.__create_gpx_metadata(gpxFileName)
+        return self.__create_gpx_metadata(ingestResult)
 
     def __handle_gpx_upload(
         self,
         files: dict[str, FileStorage],
-        generatePreviewImage: bool,
-        gpxPreviewImageSettings: dict[str, Any],
         allowedFileExtensions: list[str],
-    ) -> str | None:
+    ) -> GpxIngestResult | None:
         if 'gpxTrack' not in files:
             return None
 
@@ -155,38 +288,36 @@ class GpxService:
             destinationFolderPath = os.path.join(self._dataPath, filename)
             os.makedirs(destinationFolderPath)
 
+            stageTimer = StageTimer()
+            ingestResult = None
             if file.filename.endswith(f'.{self.GPX_FILE_EXTENSION}'):
-                zipFilePath = self.create_zip(filename, file.stream.read())
-                LOGGER.debug(f'Saved uploaded gpx file "{file.filename}" to "{zipFilePath}"')
+                ingestResult = self.ingest_gpx(filename, file.stream, stageTimer)
+                LOGGER.debug(f'Saved uploaded gpx file "{file.filename}" to "{self.__get_zip_file_path(filename)}"')
             elif file.filename.endswith(f'.{self.FIT_FILE_EXTENSION}'):
-                self.__handle_fit_upload(destinationFolderPath, file, filename)
+                ingestResult = self.__handle_fit_upload(file, filename, stageTimer)
 
-            if generatePreviewImage:
-                gpxPreviewImageService = GpxPreviewImageService(filename, self)
-                gpxPreviewImagePath = gpxPreviewImageService.get_preview_image_path()
-                gpxPreviewImageService.generate_image(gpxPreviewImageSettings)
-                LOGGER.debug(f'Generated gpx preview image {gpxPreviewImagePath}')
+            if ingestResult is None:
+                shutil.rmtree(destinationFolderPath, ignore_errors=True)
+                return None
 
-            return filename
+            ingestResult.stageDurations = stageTimer.get_durations()
+            return ingestResult
 
         return None
 
-    def __handle_fit_upload(self, destinationFolderPath: str, file: FileStorage, filename: str):
-        fitFilePath = os.path.join(destinationFolderPath, f'{filename}.{self.FIT_FILE_EXTENSION}')
-        file.save(fitFilePath)
-        LOGGER.debug(f'Saved uploaded fit file "{file.filename}" to "{fitFilePath}"')
-
-        gpxFilePath = os.path.join(destinationFolderPath, f'{filename}.{self.GPX_FILE_EXTENSION}')
+    def __handle_fit_upload(self, file: FileStorage, filename: str, stageTimer: StageTimer) -> GpxIngestResult | None:
         try:
-            FitToGpxConverter.convert_fit_to_gpx(fitFilePath, gpxFilePath)
-
-            with open(gpxFilePath, 'rb') as gpxFile:
-                self.create_zip(filename, gpxFile.read())
-
-            os.remove(gpxFilePath)
-            LOGGER.debug(f'Converted uploaded fit file "{file.filename}" to gpx')
+            ingestResult = self._ingestService.ingest_fit(filename, file.stream, stageTimer)
+            LOGGER.debug(f'Decoded uploaded fit file "{file.filename}"')
+            return ingestResult
         except Exception as e:
-            LOGGER.error(f'Error while converting {fitFilePath} to gpx', e)
+            LOGGER.error(f'Error while decoding fit file "{file.filename}": {e}')
+            return None
+
+    def ingest_gpx(
+        self, gpxFileName: str, stream: ReadableStream, stageTimer: StageTimer | None = None
+    ) -> GpxIngestResult:
+        return self._ingestService.ingest_gpx(gpxFileName, stream, stageTimer)
 
     @staticmethod
     def is_allowed_file(filename: str, allowedFileExtensions: list[str]) -> bool:
@@ -200,28 +331,36 @@ class GpxService:
         os.makedirs(destinationFolderPath, exist_ok=True)
 
         zipFilePath = self.__get_zip_file_path(gpxFileName)
-        with ZipFile(zipFilePath, mode='w', compression=ZIP_DEFLATED, compresslevel=9) as zipObject:
+        with self._archiveCompression.open(zipFilePath) as zipObject:
             zipObject.writestr(f'{gpxFileName}.{self.GPX_FILE_EXTENSION}', data)
         return zipFilePath
 
-    def __create_gpx_metadata(self, gpxFileName: str) -> int:
-        gpxParser = GpxParser(self.get_gpx_content(gpxFileName))
-        metaInfo = gpxParser.get_meta_info()
-
-        gpxMetadata = GpxMetadata(
-            gpx_file_name=gpxFileName,
-            length=metaInfo.distance,
-            elevation_minimum=metaInfo.elevationExtremes.minimum,
-            elevation_maximum=metaInfo.elevationExtremes.maximum,
-            uphill=metaInfo.uphillDownhill.uphill,
-            downhill=metaInfo.uphillDownhill.downhill,
-            editor_link=metaInfo.editorLink,
-        )
-
-        db.session.add(gpxMetadata)
-        db.session.commit()
+    def __create_gpx_metadata(self, ingestResult: GpxIngestResult) -> int:
+        metaInfo = ingestResult.metaInfo
+        stageTimer = StageTimer()
+
+        with stageTimer.measure('metadata'):
+            gpxMetadata = GpxMetadata(
+                gpx_file_name=ingestResult.gpxFileName,
+                length=metaInfo.distance,
+                elevation_minimum=metaInfo.elevationExtremes.minimum,
+                elevation_maximum=metaInfo.elevationExtremes.maximum,
+                uphill=metaInfo.uphillDownhill.uphill,
+                downhill=metaInfo.uphillDownhill.downhill,
+                editor_link=metaInfo.editorLink,
+            )
+
+            db.session.add(gpxMetadata)
+            db.session.commit()
         LOGGER.debug(f'Saved new GpxMetadata: {gpxMetadata}')
 
+        ingestResult.stageDurations.update(stageTimer.get_durations())
+        self._ingestStatistics.add(ingestResult.stageDurations)
+        LOGGER.debug(
+            f'Ingested gpx "{ingestResult.gpxFileName}" with {len(ingestResult.trackPoints)} points '
+            f'({format_stage_durations(ingestResult.stageDurations)})'
+        )
+
         return gpxMetadata.id
 
     def delete_gpx(self, item: DistanceWorkout | PlannedTour, userId: int) -> None:
@@ -233,17 +372,33 @@ class GpxService:
             db.session.commit()
 
             if isinstance(item, DistanceWorkout):
+                tilePositions = [
+                    (row[0], row[1])
+                    for row in GpxVisitedTile.query.with_entities(GpxVisitedTile.x, GpxVisitedTile.y)
+                    .filter(GpxVisitedTile.workout_id == item.id)
+                    .all()
+                ]
+
                 db.session.execute(delete(GpxVisitedTile).where(GpxVisitedTile.workout_id == item.id))
                 LOGGER.debug(f'Deleted gpx visited tiles for workout with id {item.id}')
                 db.session.commit()
 
+                FirstVisitedTileService.remove_workout(item)
+
+                # only the removed visits are subtracted from the tile pyramid instead of rebuilding it
                 self._newVisitedTileCache.invalidate_cache_entry_by_user(userId)
                 self._maxSquareCache.invalidate_cache_entry_by_user(userId)
+                self._tileImageCache.invalidate_cache_entry_by_user(userId)
+                self._visitedTileIndexCache.invalidate_visited_tiles_by_user(userId)
+                self._tilePyramidCache.remove_visited_tiles(userId, item.type, item.start_time.year, tilePositions)  # type: ignore[attr-defined]
+                self._tileCacheWarmUpService.start_warm_up(userId)
             else:
                 db.session.execute(delete(GpxPlannedTile).where(GpxPlannedTile.planned_tour_id == item.id))
                 LOGGER.debug(f'Deleted gpx planned tiles for planned tour with id {item.id}')
                 db.session.commit()
 
+                self.invalidate_rendered_tiles_by_planned_tour(item)
+
             try:
                 shutil.rmtree(self.get_folder_path(gpxMetadata.gpx_file_name))
                 LOGGER.debug(
@@ -254,225 +409,163 @@ class GpxService:
 
     def add_visited_tiles_for_workout(self, workout: DistanceWorkout, baseZoomLevel: int, userId: int):
         visitedTiles = self.get_visited_tiles(workout.get_gpx_metadata().gpx_file_name, baseZoomLevel)  # type: ignore[union-attr]
+        tilePositions = [(tile.x, tile.y) for tile in visitedTiles]
 
-        for tile in visitedTiles:
-            gpxVisitedTile = GpxVisitedTile(workout_id=workout.id, x=tile.x, y=tile.y)
-            db.session.add(gpxVisitedTile)
-            db.session.commit()
+        # visited tiles and first visited tiles are committed together
+        BulkTileWriter.insert_visited_tiles(db.session, workout.id, tilePositions)
+        FirstVisitedTileService.add_workout(workout, tilePositions)
 
+        # added tiles can only enlarge the max square, so the cached state is updated instead of recalculated
         self._newVisitedTileCache.invalidate_cache_entry_by_user(userId)
-        self._maxSquareCache.invalidate_cache_entry_by_user(userId)
+        self._maxSquareCache.add_visited_tiles(userId, workout.type, workout.start_time.year, tilePositions)  # type: ignore[attr-defined]
+        self._tileImageCache.invalidate_cache_entry_by_user(userId)
+        self._visitedTileIndexCache.invalidate_visited_tiles_by_user(userId)
+        self._tilePyramidCache.add_visited_tiles(userId, workout.type, workout.start_time.year, tilePositions)  # type: ignore[attr-defined]
+        self._tileCacheWarmUpService.start_warm_up(userId)
 
     def add_planned_tiles_for_planned_tour(self, plannedTour: PlannedTour, baseZoomLevel: int, userId: int):
         visitedTiles = self.get_visited_tiles(plannedTour.get_gpx_metadata().gpx_file_name, baseZoomLevel)  # type: ignore[union-attr]
 
-        for tile in visitedTiles:
-            gpxPlannedTile = GpxPlannedTile(planned_tour_id=plannedTour.id, x=tile.x, y=tile.y)
-            db.session.add(gpxPlannedTile)
-            db.session.commit()
-
-    def get_visited_tiles(self, gpxFileName: str, baseZoomLevel: int) -> list[VisitedTile]:
-        gpxParser = GpxParser(self.get_gpx_content(gpxFileName))  # type: ignore[union-attr]
-        return list(gpxParser.get_visited_tiles(baseZoomLevel))
-
-    def has_fit_file(self, gpxFileName: str | None) -> bool:
-        if gpxFileName is None:
-            return False
-
-        fitFilePath = os.path.join(self.get_folder_path(gpxFileName), f'{gpxFileName}.{self.FIT_FILE_EXTENSION}')
-
-        return os.path.exists(fitFilePath)
-
-    def get_fit_content(self, gpxFileName: str) -> bytes:
-        if gpxFileName is None:
-            raise FileNotFoundError(gpxFileName)
-
-        fitFilePath = os.path.join(self.get_folder_path(gpxFileName), f'{gpxFileName}.{self.FIT_FILE_EXTENSION}')
-
-        if not os.path.exists(fitFilePath):
-            raise FileNotFoundError(fitFilePath)
-
-        with open(fitFilePath, 'rb') as f:
-            return f.read()
-
-    def join_multiple_gpx(self, gpxFileNames: list[str]) -> bytes:
-        joinedGpx = gpxpy.gpx.GPX()
-        joinedTrack = gpxpy.gpx.GPXTrack()
-
-        for gpxFileName in gpxFileNames:
-            gpxParser = GpxParser(self.get_gpx_content(gpxFileName))
-            joinedGpx.nsmap.update(gpxParser.get_namespaces())
-
-            for segment in gpxParser.get_joined_track().segments:
-                joinedTrack.segments.append(segment)
-
-        joinedGpx.tracks.append(joinedTrack)
-        return joinedGpx.to_xml(prettyprint=False).encode('utf-8')
-
-
-class GpxParser:
-    def __init__(self, gpxContent: bytes) -> None:
-        self._gpx = self.__parse_gpx(gpxContent)
-
-    @staticmethod
-    def from_file_path(gpxFilePath: str) -> GpxParser:
-        LOGGER.debug(f'Parse gpx "{gpxFilePath}"')
-        with open(gpxFilePath, mode='rb', encoding='utf-8') as f:
-            gpxContent = f.read()
-
-        return GpxParser(gpxContent)
-
-    @staticmethod
-    def __parse_gpx(gpxContent: bytes) -> GPX:
-        return gpxpy.parse(gpxContent)
-
-    def join_tracks_and_segments(self, downloadName: str) -> str:
-        self.__join_tracks(self._gpx)
-
-        self.__fix_missing_elevation_for_first_points(self._gpx)
-
-        self._gpx.name = downloadName
-
-        return self._gpx.to_xml(prettyprint=False)
-
-    def get_joined_track(self) -> GPXTrack:
-        return self.__join_tracks(self._gpx)
-
-    def get_namespaces(self) -> dict[str, str]:
-        return self._gpx.nsmap
-
-    @staticmethod
-    def __fix_missing_elevation_for_first_points(gpx: GPX):
-        if gpx.get_points_no() == 0:
-            return
+        BulkTileWriter.insert_planned_tiles(db.session, plannedTour.id, [(tile.x, tile.y) for tile in visitedTiles])
+        db.session.commit()
 
-        # only safe if the gpx tracks and segments were joined before
-        points = gpx.tracks[0].segments[0].points
+        self.invalidate_rendered_tiles_by_planned_tour(plannedTour)
 
-        indexFirstElevation = GpxParser.__find_index_of_first_point_with_elevation(points)
-        if indexFirstElevation is None:
-            # no elevation data in any point
-            return
+    def invalidate_tile_caches_by_user(self, userId: int) -> None:
+        self._newVisitedTileCache.invalidate_cache_entry_by_user(userId)
+        self._maxSquareCache.invalidate_cache_entry_by_user(userId)
+        self._tileImageCache.invalidate_cache_entry_by_user(userId)
+        self._visitedTileIndexCache.invalidate_visited_tiles_by_user(userId)
+        self._tilePyramidCache.invalidate_cache_entry_by_user(userId)
 
-        if indexFirstElevation < 2:
-            # at least the first or second point contains elevation data
-            return
+    def invalidate_rendered_tiles_by_planned_tour(
+        self, plannedTour: PlannedTour, additionalUserIds: list[int] | None = None
+    ) -> None:
+        userIds = {plannedTour.user_id}
+        userIds.update(user.id for user in plannedTour.shared_users)
+        if additionalUserIds is not None:
+            userIds.update(additionalUserIds)
 
-        firstElevation = points[indexFirstElevation].elevation
+        for userId in userIds:
+            self._tileImageCache.invalidate_cache_entry_by_user(userId)
+            self._visitedTileIndexCache.invalidate_planned_tiles_by_user(userId)
 
-        distanceBetweenFirstPointAndFirstElevation = points[0].distance_2d(points[indexFirstElevation])
-        LOGGER.debug(
-            f'Detected missing elevation for the gpx data points 0 to {indexFirstElevation}. '
-            f'First elevation is at index {indexFirstElevation} with value {firstElevation:.2f}. '
-            f'Elevation will be copied for {distanceBetweenFirstPointAndFirstElevation:.2f}m.'
+    def get_visited_tiles(self, gpxFileName: str, baseZoomLevel: int) -> list[VisitedTile]:
+        return list(
+            GpxParser.get_visited_tiles_of_segments(
+                self.get_track_points(gpxFileName).get_segments(), baseZoomLevel, self._tileExtractionMode
+            )
         )
-        for index in range(0, indexFirstElevation):
-            points[index].elevation = firstElevation
 
-    @staticmethod
-    def __find_index_of_first_point_with_elevation(points: list[GPXTrackPoint]) -> int | None:
-        for index, point in enumerate(points):
-            if point.has_elevation():
-                return index
-
-        return None
-
-    @staticmethod
-    def __join_tracks(gpx: GPX) -> GPXTrack:
-        joinedTrack = gpxpy.gpx.GPXTrack()
-        numberOfTracks = len(gpx.tracks)
-        for track in gpx.tracks:
-            joinedTrack.segments.extend(track.segments)
-            joinedTrack.link = GpxParser.escape_ampersands(track.link)
-
-        if numberOfTracks > 1:
-            LOGGER.debug(f'Joined {numberOfTracks} tracks')
-
-        gpx.tracks.clear()
-        gpx.tracks.append(joinedTrack)
-
-        GpxParser.__join_track_segments(joinedTrack)
-        return joinedTrack
-
-    @staticmethod
-    def __join_track_segments(track: GPXTrack) -> None:
-        joinedSegment = gpxpy.gpx.GPXTrackSegment()
-
-        numberOfSegments = len(track.segments)
-        for segment in track.segments:
-            for point in segment.points:
-                joinedSegment.points.append(point)
+    def get_track_points(self, gpxFileName: str) -> GpxTrackPoints:
+        """
+        Returns the track points from the track points file written during the upload.
+        For older tracks the gpx is parsed once and the missing track points file is written.
+        """
+        trackPointsFilePath = self.__get_track_points_file_path(gpxFileName)
+        if os.path.exists(trackPointsFilePath):
+            try:
+                return GpxTrackPoints.load(trackPointsFilePath)
+            except (OSError, ValueError) as e:
+                LOGGER.warning(f'Could not read track points of gpx "{gpxFileName}": {e}')
 
-        if numberOfSegments > 1:
-            LOGGER.debug(f'Joined {numberOfSegments} segments')
-            track.segments.clear()
-            track.segments.append(joinedSegment)
+        trackPoints = self.get_gpx_stream_parser(gpxFileName).get_track_points()
+        try:
+            trackPoints.save(trackPointsFilePath)
+        except OSError as e:
+            LOGGER.error(f'Could not save track points of gpx "{gpxFileName}": {e}')
 
-    def __get_length(self) -> float:
-        return self._gpx.length_2d()
+        return trackPoints
 
-    def __get_elevation_extremes(self) -> ElevationExtremes:
-        elevationExtremes = self._gpx.get_elevation_extremes()
-        minimum = elevationExtremes.minimum
-        maximum = elevationExtremes.maximum
-        if minimum is None or maximum is None:
-            return ElevationExtremes(None, None)
+    def get_geometry_file_path(self, gpxFileName: str, zoom: int) -> str:
+        """
+        Returns the path of the simplified geometry (json with Google encoded polylines) for the zoom level.
+        The geometries are created during the upload, for older tracks on the first request.
+        """
+        zipModificationTime = os.stat(self.__get_zip_file_path(gpxFileName)).st_mtime_ns
+        geometryFilePath = self._ingestService.get_geometry_file_path(gpxFileName, GpxGeometry.get_zoom_level(zoom))
 
-        return ElevationExtremes(int(minimum), int(maximum))
+        try:
+            if os.stat(geometryFilePath).st_mtime_ns >= zipModificationTime:
+                return geometryFilePath
+        except FileNotFoundError:
+            pass
+
+        self._ingestService.save_geometries(gpxFileName, self.get_track_points(gpxFileName))
+        return geometryFilePath
+
+    def get_geometry_collection(self, tracks: list[GpxGeometryTrack], zoom: int) -> GpxGeometryCollection:
+        """
+        Collects the geometry files of all tracks for the zoom level. Tracks without gpx archive are skipped.
+        """
+        tracksWithFilePaths = []
+        for track in tracks:
+            try:
+                tracksWithFilePaths.append((track, self.get_geometry_file_path(track.gpxFileName, zoom)))
+            except FileNotFoundError as e:
+                LOGGER.warning(f'Could not load geometry of gpx "{track.gpxFileName}": {e}')
+
+        return GpxGeometryCollection(GpxGeometry.get_zoom_level(zoom), tracksWithFilePaths)
+
+    def backfill_track_points(self, gpxFileName: str, overwrite: bool = False) -> int | None:
+        """
+        Writes the track points file of an existing gpx if it is missing or outdated.
+        Returns the number of track points or None if the existing file is up to date.
+        """
+        trackPointsFilePath = self.__get_track_points_file_path(gpxFileName)
+        if not overwrite and GpxTrackPoints.is_file_up_to_date(trackPointsFilePath):
+            return None
 
-    def __get_uphill_downhill(self) -> UphillDownhill:
-        uphillDownhill = self._gpx.get_uphill_downhill()
-        uphill = uphillDownhill.uphill
-        downhill = uphillDownhill.downhill
-        if uphill is None or downhill is None:
-            return UphillDownhill(None, None)
+        trackPoints = self.get_gpx_stream_parser(gpxFileName).get_track_points()
+        trackPoints.save(trackPointsFilePath)
+        return len(trackPoints)
 
-        return UphillDownhill(int(uphill), int(downhill))
+    def has_fit_file(self, gpxFileName: str | None) -> bool:
+        if gpxFileName is None:
+            return False
 
-    def __get_editor_link(self) -> str | None:
-        for track in self._gpx.tracks:
-            if track.link is not None and track.link:
-                return track.link
+        fitFilePath = self._ingestService.get_fit_file_path(gpxFileName)
 
-        return None
+        return os.path.exists(fitFilePath)
 
-    def get_visited_tiles(self, baseZoomLevel: int) -> set[VisitedTile]:
-        visitedTiles = set()
+    def get_fit_file_path(self, gpxFileName: str) -> str:
+        if gpxFileName is None:
+            raise FileNotFoundError(gpxFileName)
 
-        numberOfPoints = self._gpx.get_points_no()
-        for track in self._gpx.tracks:
-            for segment in track.segments:
-                for point in segment.points:
-                    visitedTiles.add(
-                        self.convert_coordinate_to_tile_position(point.latitude, point.longitude, baseZoomLevel)
-                    )
+        fitFilePath = self._ingestService.get_fit_file_path(gpxFileName)
 
-        LOGGER.debug(f'{numberOfPoints} points in gpx track resulted in {len(visitedTiles)} distinct tiles')
-        return visitedTiles
+        if not os.path.exists(fitFilePath):
+            raise FileNotFoundError(fitFilePath)
 
-    @staticmethod
-    def convert_coordinate_to_tile_position(lat_deg: float, lon_deg: float, zoom: int) -> VisitedTile:
-        if zoom < 0 or zoom > 20:
-            raise ValueError(f'Zoom level {zoom} is not valid. Must be between 0 and 20')
-
-        lat_rad = math.radians(lat_deg)
-        n = 1 << zoom
-        x = int((lon_deg + 180.0) / 360.0 * n)
-        y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
-        return VisitedTile(x, y)
-
-    def get_meta_info(self) -> GpxMetaInfo:
-        return GpxMetaInfo(
-            self.__get_length(),
-            self.__get_elevation_extremes(),
-            self.__get_uphill_downhill(),
-            self.__get_editor_link(),
-        )
+        return fitFilePath
 
-    @staticmethod
-    def escape_ampersands(url):
-        if url is None:
-            return None
+    def join_multiple_gpx(self, gpxFileNames: list[str]) -> bytes:
+        """
+        Joins the track segments of all gpx into a single track that only contains coordinates and elevations.
+        Created from the track points files, e.g. to render preview images, without parsing any gpx.
+        """
+        parts = [
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<gpx xmlns="http://www.topografix.com/GPX/1/1" version="1.1" creator="SportTracker"><trk>'
+        ]
 
-        # Match '&' that is not followed by a valid HTML entity like &amp;, &lt;, etc.
-        return re.sub(r'&(?!#?\w+;)', '%26', url)
+        for gpxFileName in gpxFileNames:
+            trackPoints = self.get_track_points(gpxFileName)
+            latitudes = trackPoints.latitudes
+            longitudes = trackPoints.longitudes
+            elevations = trackPoints.elevations
+
+            for startIndex, endIndex in trackPoints.get_segment_ranges():
+                parts.append('<trkseg>')
+                for index in range(startIndex, endIndex):
+                    elevation = elevations[index]
+                    if math.isnan(elevation):
+                        parts.append(f'<trkpt lat="{latitudes[index]}" lon="{longitudes[index]}"></trkpt>')
+                    else:
+                        parts.append(
+                            f'<trkpt lat="{latitudes[index]}" lon="{longitudes[index]}"><ele>{elevation}</ele></trkpt>'
+                        )
+                parts.append('</trkseg>')
+
+        parts.append('</trk></gpx>')
+        return ''.join(parts).encode('utf-8')
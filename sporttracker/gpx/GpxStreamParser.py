@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import io
+import logging
+import math
+from array import array
+from datetime import datetime, timezone
+from typing import Protocol
+from xml.parsers import expat
+
+import gpxpy
+import gpxpy.geo
+from gpxpy.gpxfield import parse_time
+
+from sporttracker import Constants
+from sporttracker.gpx.GpxMetaInfo import ElevationExtremes, GpxMetaInfo, UphillDownhill
+from sporttracker.gpx.GpxParser import GpxParser, TileExtractionMode, VisitedTile
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class ReadableStream(Protocol):
+    def read(self, size: int = -1, /) -> bytes: ...
+
+
+class GpxStreamParser:
+    """
+    Low-memory alternative to GpxParser for the metadata and the visited tiles.
+
+    The gpx is read incrementally with expat (e.g. directly from the zip entry) instead of building the gpxpy object
+    tree with one object per track point. All values of GpxMetaInfo are calculated during this single pass with the
+    same gpxpy.geo functions as GpxParser, the track points are kept in GpxTrackPoints.
+    GpxParser is still required whenever the gpx must be modified or written again.
+    """
+
+    READ_CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream: ReadableStream) -> None:
+        self._latitudes: array[float] = array('d')
+        self._longitudes: array[float] = array('d')
+        self._elevations: array[float] = array('d')
+        self._times: array[float] = array('d')
+        self._segmentStartIndices: array[int] = array('I')
+
+        self._namespace: str | None = None
+        self._version: str | None = None
+        # local names of all open elements, None for elements of other namespaces (e.g. extensions)
+        self._elementStack: list[str | None] = []
+        self._text: list[str] | None = None
+
+        self._latitude = 0.0
+        self._longitude = 0.0
+        self._elevation = math.nan
+        self._time = math.nan
+
+        self._distance = 0.0
+        self._trackDistance = 0.0
+        self._segmentDistance = 0.0
+        self._uphill = 0.0
+        self._downhill = 0.0
+        self._trackUphill = 0.0
+        self._trackDownhill = 0.0
+        self._segmentStartIndex = 0
+        self._trackLinks: list[str | None] = []
+        self._trackLink: str | None = None
+
+        self.__parse(stream)
+
+    @staticmethod
+    def from_bytes(gpxContent: bytes) -> GpxStreamParser:
+        return GpxStreamParser(io.BytesIO(gpxContent))
+
+    def __parse(self, stream: ReadableStream) -> None:
+        parser = expat.ParserCreate(namespace_separator=' ')
+        parser.buffer_text = True
+        parser.StartElementHandler = self.__handle_start_element
+        parser.EndElementHandler = self.__handle_end_element
+        parser.CharacterDataHandler = self.__handle_character_data
+
+        try:
+            while chunk := stream.read(self.READ_CHUNK_SIZE):
+                parser.Parse(chunk, False)
+            parser.Parse(b'', True)
+        except expat.ExpatError as e:
+            raise gpxpy.gpx.GPXXMLSyntaxException(f'Error parsing XML: {e}', e)
+
+        self._trackPoints = GpxTrackPoints(
+            self._latitudes, self._longitudes, self._elevations, self._times, self._segmentStartIndices
+        )
+        LOGGER.debug(f'Parsed {len(self._trackPoints)} gpx track points')
+
+    def __handle_start_element(self, name: str, attributes: dict[str, str]) -> None:
+        namespace, _, localName = name.rpartition(' ')
+        if self._namespace is None:
+            self._namespace = namespace
+            self._version = attributes.get('version')
+
+        if namespace != self._namespace:
+            self._elementStack.append(None)
+            return
+
+        parentName = self._elementStack[-1] if self._elementStack else None
+        self._elementStack.append(localName)
+
+        if localName == 'trkpt' and parentName == 'trkseg':
+            self._latitude = self.__parse_coordinate(attributes, 'lat')
+            self._longitude = self.__parse_coordinate(attributes, 'lon')
+            self._elevation = math.nan
+            self._time = math.nan
+        elif localName in ('ele', 'time') and parentName == 'trkpt':
+            self._text = []
+        elif localName == 'trkseg' and parentName == 'trk':
+            self._segmentStartIndex = len(self._latitudes)
+            self._segmentDistance = 0.0
+            self._segmentStartIndices.append(self._segmentStartIndex)
+        elif localName == 'trk' and parentName == 'gpx':
+            self._trackDistance = 0.0
+            self._trackUphill = 0.0
+            self._trackDownhill = 0.0
+            self._trackLink = None
+        elif parentName == 'trk' and self._trackLink is None:
+            # same fields as gpxpy: <link href="..."> for gpx 1.1, <url> otherwise
+            if self._version == '1.1' and localName == 'link':
+                self._trackLink = attributes.get('href')
+            elif self._version != '1.1' and localName == 'url':
+                self._text = []
+
+    def __handle_end_element(self, name: str) -> None:
+        localName = self._elementStack.pop()
+        if localName is None:
+            return
+
+        parentName = self._elementStack[-1] if self._elementStack else None
+        text = None
+        if self._text is not None:
+            text = ''.join(self._text).strip()
+            self._text = None
+
+        if localName == 'trkpt' and parentName == 'trkseg':
+            self.__add_point()
+        elif localName == 'ele' and parentName == 'trkpt':
+            self._elevation = self.__parse_elevation(text)
+        elif localName == 'time' and parentName == 'trkpt':
+            self._time = self.__parse_time(text)
+        elif localName == 'trkseg' and parentName == 'trk':
+            self.__finish_segment()
+        elif localName == 'trk' and parentName == 'gpx':
+            self.__finish_track()
+        elif localName == 'url' and parentName == 'trk' and text is not None:
+            self._trackLink = text
+
+    def __handle_character_data(self, data: str) -> None:
+        if self._text is not None:
+            self._text.append(data)
+
+    def __add_point(self) -> None:
+        if len(self._latitudes) > self._segmentStartIndex:
+            # identical to GPXTrackSegment.length_2d
+            distance = gpxpy.geo.distance(
+                self._latitude,
+                self._longitude,
+                None,
+                self._latitudes[-1],
+                self._longitudes[-1],
+                None,
+            )
+            if distance:
+                self._segmentDistance += distance
+
+        self._latitudes.append(self._latitude)
+        self._longitudes.append(self._longitude)
+        self._elevations.append(self._elevation)
+        self._times.append(self._time)
+
+    def __finish_segment(self) -> None:
+        if self._segmentDistance:
+            self._trackDistance += self._segmentDistance
+
+        elevations: list[float | None] = [
+            elevation for elevation in self._elevations[self._segmentStartIndex :] if not math.isnan(elevation)
+        ]
+        uphill, downhill = gpxpy.geo.calculate_uphill_downhill(elevations)
+        self._trackUphill += uphill or 0.0
+        self._trackDownhill += downhill or 0.0
+
+    def __finish_track(self) -> None:
+        if self._trackDistance:
+            self._distance += self._trackDistance
+
+        self._uphill += self._trackUphill
+        self._downhill += self._trackDownhill
+        self._trackLinks.append(self._trackLink)
+
+    @staticmethod
+    def __parse_coordinate(attributes: dict[str, str], name: str) -> float:
+        try:
+            return float(attributes[name])
+        except (KeyError, ValueError):
+            raise gpxpy.gpx.GPXException(f'Invalid or missing attribute "{name}" of track point')
+
+    @staticmethod
+    def __parse_elevation(text: str | None) -> float:
+        if not text:
+            return math.nan
+
+        try:
+            return float(text)
+        except ValueError:
+            return math.nan
+
+    @staticmethod
+    def __parse_time(text: str | None) -> float:
+        if not text:
+            return math.nan
+
+        try:
+            # fast path for ISO 8601 timestamps, gpxpy also accepts some variants
+            time: datetime | None = datetime.fromisoformat(text)
+        except ValueError:
+            try:
+                time = parse_time(text)
+            except gpxpy.gpx.GPXException:
+                return math.nan
+
+        if time is None:
+            return math.nan
+
+        if time.tzinfo is None:
+            time = time.replace(tzinfo=timezone.utc)
+
+        return time.timestamp()
+
+    def __get_elevation_extremes(self) -> ElevationExtremes:
+        elevations = [elevation for elevation in self._elevations if not math.isnan(elevation)]
+        if not elevations:
+            return ElevationExtremes(None, None)
+
+        return ElevationExtremes(int(min(elevations)), int(max(elevations)))
+
+    def __get_editor_link(self) -> str | None:
+        for link in self._trackLinks:
+            if link is not None and link:
+                return link
+
+        return None
+
+    def get_meta_info(self) -> GpxMetaInfo:
+        return GpxMetaInfo(
+            self._distance,
+            self.__get_elevation_extremes(),
+            UphillDownhill(int(self._uphill), int(self._downhill)),
+            self.__get_editor_link(),
+        )
+
+    def get_visited_tiles(
+        self, baseZoomLevel: int, tileExtractionMode: TileExtractionMode = TileExtractionMode.POINTS
+    ) -> set[VisitedTile]:
+        return GpxParser.get_visited_tiles_of_segments(
+            self._trackPoints.get_segments(), baseZoomLevel, tileExtractionMode
+        )
+
+    def get_track_points(self) -> GpxTrackPoints:
+        return self._trackPoints
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from dataclasses import dataclass, field
+from typing import Iterator, Sequence
+
+import gpxpy.geo
+
+from sporttracker.gpx.GpxMetaInfo import ElevationExtremes, GpxMetaInfo, UphillDownhill
+
+
+@dataclass
+class GpxTrackPoints:
+    """
+    Column-wise storage of all track points (8 bytes per value instead of one object per point).
+    Missing elevations and times are stored as NaN, times as seconds since the epoch.
+    segmentStartIndices contains the index of the first point of each track segment.
+
+    The columns are typed arrays or, if loaded from a track points file, read-only memoryviews of the mapped file.
+    """
+
+    latitudes: Sequence[float] = field(default_factory=lambda: array('d'))
+    longitudes: Sequence[float] = field(default_factory=lambda: array('d'))
+    elevations: Sequence[float] = field(default_factory=lambda: array('d'))
+    times: Sequence[float] = field(default_factory=lambda: array('d'))
+    segmentStartIndices: Sequence[int] = field(default_factory=lambda: array('I'))
+
+    # Track points file: header (magic, version, number of points, number of segments) followed by the columns
+    # latitudes, longitudes, elevations, times (float64) and segmentStartIndices (uint32), all little endian.
+    # All float64 columns start at a multiple of 8 bytes, so that they can be used directly from the mapped file.
+    FILE_MAGIC = b'STPT'
+    FILE_VERSION = 2
+    FILE_HEADER = struct.Struct('<4sHxxQQ')
+
+    def __len__(self) -> int:
+        return len(self.latitudes)
+
+    def save(self, filePath: str) -> None:
+        """
+        Writes the track points file. The file is replaced atomically.
+        """
+        temporaryFilePath = f'{filePath}.tmp'
+        with open(temporaryFilePath, 'wb') as f:
+            f.write(
+                self.FILE_HEADER.pack(
+                    self.FILE_MAGIC, self.FILE_VERSION, len(self.latitudes), len(self.segmentStartIndices)
+                )
+            )
+            for typecode, column in self.__get_columns():
+                values = array(typecode, column)
+                if sys.byteorder == 'big':
+                    values.byteswap()
+                values.tofile(f)
+
+        os.replace(temporaryFilePath, filePath)
+
+    @staticmethod
+    def load(filePath: str) -> GpxTrackPoints:
+        """
+        Maps the track points file into memory. The columns are read directly from the mapped file without copies.
+        """
+        with open(filePath, 'rb') as f:
+            mappedFile = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        content = memoryview(mappedFile)
+        numberOfPoints, numberOfSegments = GpxTrackPoints.__read_header(content, filePath)
+        if len(content) != GpxTrackPoints.FILE_HEADER.size + numberOfPoints * 4 * 8 + numberOfSegments * 4:
+            raise ValueError(f'Track points file "{filePath}" is incomplete')
+
+        floatColumns: list[Sequence[float]] = []
+        offset = GpxTrackPoints.FILE_HEADER.size
+        for _ in range(4):
+            floatColumn = content[offset : offset + numberOfPoints * 8]
+            floatColumns.append(
+                floatColumn.cast('d') if sys.byteorder == 'little' else GpxTrackPoints.__swap(floatColumn, 'd')
+            )
+            offset += numberOfPoints * 8
+
+        indexColumn = content[offset:]
+        segmentStartIndices = (
+            indexColumn.cast('I') if sys.byteorder == 'little' else GpxTrackPoints.__swap(indexColumn, 'I')
+        )
+
+        latitudes, longitudes, elevations, times = floatColumns
+        return GpxTrackPoints(latitudes, longitudes, elevations, times, segmentStartIndices)
+
+    @staticmethod
+    def __swap(column: memoryview, typecode: str) -> array:
+        # big endian platforms need a converted copy
+        values = array(typecode, column.tobytes())
+        values.byteswap()
+        return values
+
+    @staticmethod
+    def is_file_up_to_date(filePath: str) -> bool:
+        try:
+            with open(filePath, 'rb') as f:
+                header = f.read(GpxTrackPoints.FILE_HEADER.size)
+            GpxTrackPoints.__read_header(memoryview(header), filePath)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    @staticmethod
+    def __read_header(content: memoryview, filePath: str) -> tuple[int, int]:
+        if len(content) < GpxTrackPoints.FILE_HEADER.size:
+            raise ValueError(f'Track points file "{filePath}" is too short')
+
+        magic, version, numberOfPoints, numberOfSegments = GpxTrackPoints.FILE_HEADER.unpack_from(content)
+        if magic != GpxTrackPoints.FILE_MAGIC or version != GpxTrackPoints.FILE_VERSION:
+            raise ValueError(f'Unsupported track points file "{filePath}"')
+
+        return numberOfPoints, numberOfSegments
+
+    def __get_columns(self) -> list[tuple[str, Sequence[float] | Sequence[int]]]:
+        return [
+            ('d', self.latitudes),
+            ('d', self.longitudes),
+            ('d', self.elevations),
+            ('d', self.times),
+            ('I', self.segmentStartIndices),
+        ]
+
+    def get_segment_ranges(self) -> Iterator[tuple[int, int]]:
+        """
+        Yields start index (inclusive) and end index (exclusive) of each track segment.
+        """
+        endIndices = list(self.segmentStartIndices[1:]) + [len(self.latitudes)]
+        yield from zip(self.segmentStartIndices, endIndices)
+
+    def get_segments(self) -> Iterator[tuple[Sequence[float], Sequence[float]]]:
+        """
+        Yields latitudes and longitudes of each track segment.
+        """
+        for startIndex, endIndex in self.get_segment_ranges():
+            yield self.latitudes[startIndex:endIndex], self.longitudes[startIndex:endIndex]
+
+    def get_meta_info(self, editorLink: str | None = None) -> GpxMetaInfo:
+        """
+        Calculates the meta info with the same gpxpy.geo functions as GpxStreamParser,
+        e.g. for track points that were not parsed from a gpx (fit files).
+        """
+        distance = 0.0
+        uphill = 0.0
+        downhill = 0.0
+        for startIndex, endIndex in self.get_segment_ranges():
+            for index in range(startIndex + 1, endIndex):
+                # identical to GPXTrackSegment.length_2d
+                pointDistance = gpxpy.geo.distance(
+                    self.latitudes[index],
+                    self.longitudes[index],
+                    None,
+                    self.latitudes[index - 1],
+                    self.longitudes[index - 1],
+                    None,
+                )
+                if pointDistance:
+                    distance += pointDistance
+
+            segmentElevations: list[float | None] = [
+                elevation for elevation in self.elevations[startIndex:endIndex] if not math.isnan(elevation)
+            ]
+            segmentUphill, segmentDownhill = gpxpy.geo.calculate_uphill_downhill(segmentElevations)
+            uphill += segmentUphill or 0.0
+            downhill += segmentDownhill or 0.0
+
+        elevations = [elevation for elevation in self.elevations if not math.isnan(elevation)]
+        if elevations:
+            elevationExtremes = ElevationExtremes(int(min(elevations)), int(max(elevations)))
+        else:
+            elevationExtremes = ElevationExtremes(None, None)
+
+        return GpxMetaInfo(distance, elevationExtremes, UphillDownhill(int(uphill), int(downhill)), editorLink)
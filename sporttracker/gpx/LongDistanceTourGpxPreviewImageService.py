@@ -1,32 +1,20 @@
-from __future__ import annotations
-
-from typing import Any, TYPE_CHECKING
-
-if TYPE_CHECKING:
-    from sporttracker.plannedTour.PlannedTourService import PlannedTourService
-
 import logging
 import os
-import tempfile
-
-import requests
+from typing import Any
 
 from sporttracker import Constants
+from sporttracker.db import db
+from sporttracker.gpx.GpxPreviewImageService import render_preview_image
 from sporttracker.longDistanceTour.LongDistanceTourEntity import LongDistanceTour
-
+from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
 
-class ImageGenerationException(Exception):
-    pass
-
-
 class LongDistanceTourGpxPreviewImageService:
-    def __init__(self, longDistanceTour: LongDistanceTour, gpxService, plannedTourService: PlannedTourService) -> None:
+    def __init__(self, longDistanceTour: LongDistanceTour, gpxService) -> None:
         self._longDistanceTour = longDistanceTour
         self._gpxService = gpxService
-        self._plannedTourService = plannedTourService
 
         self._uniqueName = f'long_distance_tour_{self._longDistanceTour.id}'
         self._previewImageFileName = f'{self._uniqueName}.jpg'
@@ -38,29 +26,29 @@ class LongDistanceTourGpxPreviewImageService:
         return os.path.exists(self.get_preview_image_path())
 
     def generate_image(self, gpxPreviewImageSettings: dict[str, Any]) -> None:
-        try:
-            if not gpxPreviewImageSettings['enabled']:
-                raise ImageGenerationException()
-
-            os.makedirs(self._gpxService.get_folder_path(self._uniqueName), exist_ok=True)
-
-            linkedPlannedTours = self._longDistanceTour.linked_planned_tours
-            gpxFileNames = self.__determine_gpx_file_names(linkedPlannedTours)
-            if not gpxFileNames:
-                raise ImageGenerationException()
-
-            self.__render_image(gpxFileNames, gpxPreviewImageSettings)
-        except ImageGenerationException:
-            if os.path.exists(self.get_preview_image_path()):
-                try:
-                    os.remove(self.get_preview_image_path())
-                except Exception as err:
-                    LOGGER.error(err)
-
-    def __determine_gpx_file_names(self, linkedPlannedTours) -> list[str]:
+        """
+        Renders the image of all linked planned tours with a gpx track.
+        The image is removed if preview images are disabled or no linked planned tour has a gpx track.
+        Raises an ImageGenerationException if rendering fails, the previous image is kept in this case.
+        """
+        gpxFileNames = self.__determine_gpx_file_names()
+        if not gpxPreviewImageSettings['enabled'] or not gpxFileNames:
+            self.__remove_image()
+            return
+
+        os.makedirs(self._gpxService.get_folder_path(self._uniqueName), exist_ok=True)
+        render_preview_image(
+            self._gpxService.join_multiple_gpx(gpxFileNames),
+            f'{self._uniqueName}.gpx',
+            self.get_preview_image_path(),
+            gpxPreviewImageSettings,
+        )
+        LOGGER.debug(f'Generated gpx preview image {self.get_preview_image_path()}')
+
+    def __determine_gpx_file_names(self) -> list[str]:
         gpxFileNames = []
-        for linkedPlannedTour in linkedPlannedTours:
-            plannedTour = self._plannedTourService.get_planned_tour_by_id(linkedPlannedTour.planned_tour_id)
+        for linkedPlannedTour in self._longDistanceTour.linked_planned_tours:
+            plannedTour = db.session.get(PlannedTour, linkedPlannedTour.planned_tour_id)
             if plannedTour is None:
                 continue
 
@@ -72,20 +60,9 @@ class LongDistanceTourGpxPreviewImageService:
             gpxFileNames.append(gpxMetadata.gpx_file_name)
         return gpxFileNames
 
-    def __render_image(self, gpxFileNames, gpxPreviewImageSettings):
-        try:
-            with tempfile.TemporaryDirectory() as tempDirectory:
-                tempGpxFilePath = os.path.join(tempDirectory, f'{self._uniqueName}.gpx')
-                with open(tempGpxFilePath, 'wb') as tempGpxFile:
-                    tempGpxFile.write(self._gpxService.join_multiple_gpx(gpxFileNames))
-
-                with open(tempGpxFilePath, 'rb') as fd:
-                    files = {'gpx': fd}
-                    response = requests.post(gpxPreviewImageSettings['geoRenderUrl'], files=files)
-                    response.raise_for_status()
-
-                    with open(self.get_preview_image_path(), 'wb') as f:
-                        f.write(response.content)
-        except (requests.exceptions.ConnectionError, requests.exceptions.HTTPError) as err:
-            LOGGER.error(err)
-            raise ImageGenerationException()
+    def __remove_image(self) -> None:
+        if os.path.exists(self.get_preview_image_path()):
+            try:
+                os.remove(self.get_preview_image_path())
+            except Exception as err:
+                LOGGER.error(err)
@@ -0,0 +1,57 @@
+import enum
+
+from sqlalchemy import Integer, DateTime, String, Index, text
+from sqlalchemy.orm import mapped_column, Mapped
+
+from sporttracker.db import db
+
+
+class PreviewImageJobType(enum.Enum):
+    PLANNED_TOUR = 'PLANNED_TOUR'
+    LONG_DISTANCE_TOUR = 'LONG_DISTANCE_TOUR'
+
+
+class PreviewImageJobState(enum.Enum):
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    FAILED = 'FAILED'
+
+
+class PreviewImageJob(db.Model):  # type: ignore[name-defined]
+    """
+    A preview image that still has to be rendered for a planned tour or a long-distance tour.
+    Finished jobs are deleted, failed jobs are kept after the last attempt.
+    """
+
+    __tablename__ = 'preview_image_job'
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    type: Mapped[str] = mapped_column(String, nullable=False)
+    item_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    state: Mapped[str] = mapped_column(String, nullable=False)
+    number_of_attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_time: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+    start_time: Mapped[DateTime] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[str] = mapped_column(String, nullable=True)
+
+    __table_args__ = (
+        # at most one pending job per item, a running job may be accompanied by a pending one for a later change
+        Index(
+            'ix_preview_image_job_pending_item',
+            'type',
+            'item_id',
+            unique=True,
+            sqlite_where=text("state = 'PENDING'"),
+            postgresql_where=text("state = 'PENDING'"),
+        ),
+        Index('ix_preview_image_job_state_next_attempt_time', 'state', 'next_attempt_time'),
+    )
+
+    def __repr__(self):
+        return (
+            f'PreviewImageJob('
+            f'id: {self.id}, '
+            f'type: {self.type}, '
+            f'item_id: {self.item_id}, '
+            f'state: {self.state}, '
+            f'number_of_attempts: {self.number_of_attempts})'
+        )
@@ -0,0 +1,270 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any
+
+from flask import Flask
+from sqlalchemy import and_, delete, exists, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from sporttracker import Constants
+from sporttracker.db import db
+from sporttracker.gpx.GpxPreviewImageService import GpxPreviewImageService
+from sporttracker.gpx.GpxService import GpxService
+from sporttracker.gpx.LongDistanceTourGpxPreviewImageService import LongDistanceTourGpxPreviewImageService
+from sporttracker.gpx.PreviewImageJobEntity import PreviewImageJob, PreviewImageJobState, PreviewImageJobType
+from sporttracker.helpers.DatabaseDialect import DatabaseDialect
+from sporttracker.longDistanceTour.LongDistanceTourEntity import LongDistanceTour
+from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class PreviewImageJobService:
+    """
+    Renders the gpx preview images of planned tours and long-distance tours in the background.
+
+    Jobs are stored in the database, so they survive a restart and can be shared by several processes.
+    There is at most one pending job per item: enqueuing an item that is already waiting only moves its job to the
+    front. A failed job is retried with an exponentially growing delay and kept as failed after the last attempt.
+    A running job whose worker died (e.g. the process was killed) is picked up again after STALE_JOB_TIMEOUT.
+    """
+
+    DEFAULT_NUMBER_OF_WORKERS = 2
+    DEFAULT_MAX_NUMBER_OF_ATTEMPTS = 5
+    DEFAULT_RETRY_DELAY_IN_SECONDS = 30
+    DEFAULT_POLL_INTERVAL_IN_SECONDS = 10
+    MAX_RETRY_DELAY = timedelta(hours=1)
+    STALE_JOB_TIMEOUT = timedelta(minutes=10)
+    MAX_ERROR_LENGTH = 500
+
+    def __init__(self, gpxService: GpxService, gpxPreviewImageSettings: dict[str, Any]) -> None:
+        self._gpxService = gpxService
+        self._gpxPreviewImageSettings = gpxPreviewImageSettings
+
+        self._isEnabled = gpxPreviewImageSettings['enabled']
+        self._numberOfWorkers = gpxPreviewImageSettings.get('numberOfWorkers', self.DEFAULT_NUMBER_OF_WORKERS)
+        self._maxNumberOfAttempts = gpxPreviewImageSettings.get(
+            'maxNumberOfAttempts', self.DEFAULT_MAX_NUMBER_OF_ATTEMPTS
+        )
+        self._retryDelay = timedelta(
+            seconds=gpxPreviewImageSettings.get('retryDelayInSeconds', self.DEFAULT_RETRY_DELAY_IN_SECONDS)
+        )
+        self._pollIntervalInSeconds = gpxPreviewImageSettings.get(
+            'pollIntervalInSeconds', self.DEFAULT_POLL_INTERVAL_IN_SECONDS
+        )
+
+        self._wakeUpEvent = threading.Event()
+        self._stopEvent = threading.Event()
+        self._workers: list[threading.Thread] = []
+
+    def enqueue(self, jobType: PreviewImageJobType, itemId: int) -> None:
+        """
+        Schedules the rendering of the preview image of the item and returns immediately.
+        """
+        if not self._isEnabled:
+            return
+
+        now = datetime.now()
+        result = db.session.execute(
+            update(PreviewImageJob)
+            .where(
+                PreviewImageJob.type == jobType.value,
+                PreviewImageJob.item_id == itemId,
+                PreviewImageJob.state == PreviewImageJobState.PENDING.value,
+            )
+            .values(next_attempt_time=now, number_of_attempts=0, last_error=None)
+        )
+
+        if result.rowcount == 0:  # type: ignore[attr-defined]
+            insert = DatabaseDialect.get_insert_function(db.session)
+            db.session.execute(
+                insert(PreviewImageJob)
+                .values(
+                    type=jobType.value,
+                    item_id=itemId,
+                    state=PreviewImageJobState.PENDING.value,
+                    number_of_attempts=0,
+                    next_attempt_time=now,
+                )
+                .on_conflict_do_nothing()
+            )
+
+        db.session.commit()
+        LOGGER.debug(f'Enqueued preview image job for {jobType.name} {itemId}')
+        self._wakeUpEvent.set()
+
+    def start(self, app: Flask) -> None:
+        if not self._isEnabled or self._workers:
+            return
+
+        self._stopEvent.clear()
+        for index in range(self._numberOfWorkers):
+            worker = threading.Thread(
+                target=self.__run_worker, args=(app,), name=f'PreviewImageWorker-{index}', daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+        LOGGER.info(f'Started {self._numberOfWorkers} preview image workers')
+
+    def stop(self, timeoutInSeconds: float = 10) -> None:
+        self._stopEvent.set()
+        self._wakeUpEvent.set()
+        for worker in self._workers:
+            worker.join(timeoutInSeconds)
+
+        self._workers = []
+
+    def process_next_job(self) -> bool:
+        """
+        Claims and processes the next due job.
+        Returns False if there is no due job.
+        """
+        self.__recover_stale_jobs()
+
+        job = self.__claim_next_job()
+        if job is None:
+            return False
+
+        try:
+            self.__render(job)
+        except Exception as e:
+            db.session.rollback()
+            self.__handle_failure(job, e)
+            return True
+
+        self.__remove_finished_jobs(job)
+        LOGGER.debug(f'Finished preview image job {job}')
+        return True
+
+    def __run_worker(self, app: Flask) -> None:
+        with app.app_context():
+            while not self._stopEvent.is_set():
+                try:
+                    hasProcessedJob = self.process_next_job()
+                except Exception as e:
+                    LOGGER.error(f'Error while processing preview image jobs: {e}')
+                    hasProcessedJob = False
+                finally:
+                    db.session.remove()
+
+                if not hasProcessedJob:
+                    self._wakeUpEvent.wait(self._pollIntervalInSeconds)
+                    self._wakeUpEvent.clear()
+
+    def __claim_next_job(self) -> PreviewImageJob | None:
+        now = datetime.now()
+
+        # jobs of an item that is currently rendered are postponed, so an outdated image can't overwrite a newer one
+        runningJob = aliased(PreviewImageJob)
+        isItemRunning = exists().where(
+            runningJob.type == PreviewImageJob.type,
+            runningJob.item_id == PreviewImageJob.item_id,
+            runningJob.state == PreviewImageJobState.RUNNING.value,
+        )
+        isDue = and_(
+            PreviewImageJob.state == PreviewImageJobState.PENDING.value,
+            PreviewImageJob.next_attempt_time <= now,
+            ~isItemRunning,
+        )
+
+        candidateIds = (
+            db.session.query(PreviewImageJob.id)
+            .filter(isDue)
+            .order_by(PreviewImageJob.next_attempt_time, PreviewImageJob.id)
+            .limit(self._numberOfWorkers + 1)
+            .all()
+        )
+        db.session.commit()
+
+        for (jobId,) in candidateIds:
+            # another worker may have claimed the job in the meantime
+            result = db.session.execute(
+                update(PreviewImageJob)
+                .where(PreviewImageJob.id == jobId, isDue)
+                .values(
+                    state=PreviewImageJobState.RUNNING.value,
+                    start_time=now,
+                    number_of_attempts=PreviewImageJob.number_of_attempts + 1,
+                )
+            )
+            db.session.commit()
+
+            if result.rowcount == 1:  # type: ignore[attr-defined]
+                return db.session.get(PreviewImageJob, jobId)
+
+        return None
+
+    def __recover_stale_jobs(self) -> None:
+        staleJobs = (
+            PreviewImageJob.query.filter(PreviewImageJob.state == PreviewImageJobState.RUNNING.value)
+            .filter(PreviewImageJob.start_time < datetime.now() - self.STALE_JOB_TIMEOUT)
+            .all()
+        )
+
+        for job in staleJobs:
+            LOGGER.warning(f'Preview image job {job} did not finish in time')
+            self.__handle_failure(job, TimeoutError('The worker did not finish the job in time'))
+
+    def __render(self, job: PreviewImageJob) -> None:
+        if job.type == PreviewImageJobType.PLANNED_TOUR.value:
+            plannedTour = db.session.get(PlannedTour, job.item_id)
+            if plannedTour is None:
+                LOGGER.debug(f'Skipped preview image job {job}: planned tour was deleted')
+                return
+
+            gpxMetadata = plannedTour.get_gpx_metadata()
+            if gpxMetadata is None:
+                return
+
+            GpxPreviewImageService(gpxMetadata.gpx_file_name, self._gpxService).generate_image(
+                self._gpxPreviewImageSettings
+            )
+        elif job.type == PreviewImageJobType.LONG_DISTANCE_TOUR.value:
+            longDistanceTour = db.session.get(LongDistanceTour, job.item_id)
+            if longDistanceTour is None:
+                LOGGER.debug(f'Skipped preview image job {job}: long-distance tour was deleted')
+                return
+
+            LongDistanceTourGpxPreviewImageService(longDistanceTour, self._gpxService).generate_image(
+                self._gpxPreviewImageSettings
+            )
+        else:
+            raise ValueError(f'Unknown preview image job type "{job.type}"')
+
+    def __handle_failure(self, job: PreviewImageJob, error: Exception) -> None:
+        job.last_error = str(error)[: self.MAX_ERROR_LENGTH]  # type: ignore[assignment]
+
+        if job.number_of_attempts >= self._maxNumberOfAttempts:
+            job.state = PreviewImageJobState.FAILED.value  # type: ignore[assignment]
+            db.session.commit()
+            LOGGER.error(f'Preview image job {job} failed after {job.number_of_attempts} attempts: {error}')
+            return
+
+        delay = min(self._retryDelay * 2 ** max(job.number_of_attempts - 1, 0), self.MAX_RETRY_DELAY)
+        job.state = PreviewImageJobState.PENDING.value  # type: ignore[assignment]
+        job.next_attempt_time = datetime.now() + delay  # type: ignore[assignment]
+        jobDescription = repr(job)
+        try:
+            db.session.commit()
+            LOGGER.warning(f'Preview image job {jobDescription} failed, retrying in {delay}: {error}')
+        except IntegrityError:
+            # the item was enqueued again in the meantime, the pending job renders the latest state anyway
+            db.session.rollback()
+            db.session.execute(delete(PreviewImageJob).where(PreviewImageJob.id == job.id))
+            db.session.commit()
+            LOGGER.warning(f'Preview image job {jobDescription} failed, a newer job is pending: {error}')
+
+    @staticmethod
+    def __remove_finished_jobs(job: PreviewImageJob) -> None:
+        # previously failed jobs of the item are obsolete as well
+        db.session.execute(
+            delete(PreviewImageJob).where(
+                PreviewImageJob.type == job.type,
+                PreviewImageJob.item_id == job.item_id,
+                or_(PreviewImageJob.id == job.id, PreviewImageJob.state == PreviewImageJobState.FAILED.value),
+            )
+        )
+        db.session.commit()
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, TypeVar
+
+from sporttracker import Constants
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+K = TypeVar('K', bound=Hashable)
+V = TypeVar('V')
+
+
+@dataclass
+class _CacheEntry(Generic[V]):
+    userId: int
+    value: V
+    size: int
+    expirationTime: float | None
+
+
+@dataclass(frozen=True)
+class CacheStatistics:
+    name: str
+    numberOfEntries: int
+    size: int
+    maxSize: int
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+
+
+class BoundedCache(Generic[K, V]):
+    """
+    In-memory cache with a byte budget, least-recently-used eviction and an optional time to live per entry.
+
+    The size of each entry is estimated by the given function when the entry is stored.
+    Entries are additionally grouped by user, so that all entries of a user can be removed without scanning all keys.
+    The optional eviction callback is called for each entry that is evicted due to the size budget.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxSize: int,
+        sizeEstimator: Callable[[V], int],
+        timeToLive: float | None = None,
+        clock: Callable[[], float] = time.monotonic,
+        onEviction: Callable[[K, V], None] | None = None,
+    ) -> None:
+        self._name = name
+        self._maxSize = maxSize
+        self._sizeEstimator = sizeEstimator
+        self._timeToLive = timeToLive
+        self._clock = clock
+        self._onEviction = onEviction
+
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[K, _CacheEntry[V]] = OrderedDict()
+        self._keysByUser: dict[int, set[K]] = {}
+        self._size = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+
+            if entry.expirationTime is not None and entry.expirationTime <= self._clock():
+                self.__remove(key)
+                self._expirations += 1
+                self._misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry.value
+
+    def put(self, userId: int, key: K, value: V) -> None:
+        size = self._sizeEstimator(value)
+
+        with self._lock:
+            if key in self._entries:
+                self.__remove(key)
+
+            if size > self._maxSize:
+                LOGGER.debug(f'Skipping entry of {size} bytes for {self._name} (budget: {self._maxSize} bytes)')
+                return
+
+            expirationTime = None if self._timeToLive is None else self._clock() + self._timeToLive
+            self._entries[key] = _CacheEntry(userId, value, size, expirationTime)
+            self._keysByUser.setdefault(userId, set()).add(key)
+            self._size += size
+
+            self.__evict()
+
+    def get_entries_by_user(self, userId: int) -> list[tuple[K, V]]:
+        """
+        Returns all entries of the user without affecting the least-recently-used order or the statistics.
+        """
+        with self._lock:
+            return [(key, self._entries[key].value) for key in self._keysByUser.get(userId, set())]
+
+    def update_size(self, key: K) -> None:
+        """
+        Estimates the size of an entry again after its value has been modified in place.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+
+            size = self._sizeEstimator(entry.value)
+            self._size += size - entry.size
+            entry.size = size
+
+            self.__evict()
+
+    def invalidate_by_user(self, userId: int) -> int:
+        with self._lock:
+            keys = self._keysByUser.get(userId, set()).copy()
+            for key in keys:
+                self.__remove(key)
+
+            return len(keys)
+
+    def get_statistics(self) -> CacheStatistics:
+        with self._lock:
+            return CacheStatistics(
+                name=self._name,
+                numberOfEntries=len(self._entries),
+                size=self._size,
+                maxSize=self._maxSize,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                expirations=self._expirations,
+            )
+
+    def __evict(self) -> None:
+        while self._size > self._maxSize and self._entries:
+            key = next(iter(self._entries))
+            entry = self._entries[key]
+            self.__remove(key)
+            self._evictions += 1
+
+            if self._onEviction is not None:
+                self._onEviction(key, entry.value)
+
+    def __remove(self, key: K) -> None:
+        entry = self._entries.pop(key)
+        self._size -= entry.size
+
+        keysOfUser = self._keysByUser[entry.userId]
+        keysOfUser.discard(key)
+        if not keysOfUser:
+            del self._keysByUser[entry.userId]
+
+
+def format_statistics_as_prometheus(statistics: list[CacheStatistics]) -> str:
+    """
+    Formats the statistics of all caches in the Prometheus text exposition format.
+    """
+    metrics = [
+        ('sporttracker_cache_entries', 'gauge', 'Number of entries in the cache', 'numberOfEntries'),
+        ('sporttracker_cache_size_bytes', 'gauge', 'Estimated size of all entries in bytes', 'size'),
+        ('sporttracker_cache_max_size_bytes', 'gauge', 'Size budget of the cache in bytes', 'maxSize'),
+        ('sporttracker_cache_hits_total', 'counter', 'Number of cache hits', 'hits'),
+        ('sporttracker_cache_misses_total', 'counter', 'Number of cache misses', 'misses'),
+        (
+            'sporttracker_cache_evictions_total',
+            'counter',
+            'Number of entries evicted due to the size budget',
+            'evictions',
+        ),
+        (
+            'sporttracker_cache_expirations_total',
+            'counter',
+            'Number of entries removed after their time to live',
+            'expirations',
+        ),
+    ]
+
+    lines = []
+    for metricName, metricType, description, attributeName in metrics:
+        lines.append(f'# HELP {metricName} {description}')
+        lines.append(f'# TYPE {metricName} {metricType}')
+        for cacheStatistics in statistics:
+            lines.append(f'{metricName}{{cache="{cacheStatistics.name}"}} {getattr(cacheStatistics, attributeName)}')
+
+    return '\n'.join(lines) + '\n'
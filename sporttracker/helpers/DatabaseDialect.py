@@ -0,0 +1,46 @@
+from typing import Any
+
+from sqlalchemy import Connection
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, scoped_session
+
+
+class DatabaseDialect:
+    """
+    Dialect specific helpers for the supported databases (PostgreSQL and SQLite).
+
+    Accepts a session as well as a plain connection (e.g. inside migrations).
+    """
+
+    CHUNK_SIZE = 1000
+    SQLITE_MAX_NUMBER_OF_VARIABLES = 999
+
+    @staticmethod
+    def get_insert_function(connection: Connection | Session | scoped_session) -> Any:
+        """
+        Returns the dialect specific insert construct that supports ON CONFLICT clauses.
+        """
+        dialectName = DatabaseDialect.get_dialect_name(connection)
+        if dialectName == 'postgresql':
+            return postgresql.insert
+        if dialectName == 'sqlite':
+            return sqlite.insert
+
+        raise ValueError(f'ON CONFLICT inserts are not supported for database dialect "{dialectName}"')
+
+    @staticmethod
+    def get_chunk_size(connection: Connection | Session | scoped_session, numberOfColumns: int) -> int:
+        """
+        Returns the number of rows per INSERT statement without exceeding the parameter limit of the database.
+        """
+        if DatabaseDialect.get_dialect_name(connection) == 'sqlite':
+            return min(DatabaseDialect.CHUNK_SIZE, DatabaseDialect.SQLITE_MAX_NUMBER_OF_VARIABLES // numberOfColumns)
+
+        return DatabaseDialect.CHUNK_SIZE
+
+    @staticmethod
+    def get_dialect_name(connection: Connection | Session | scoped_session) -> str:
+        if isinstance(connection, Connection):
+            return connection.dialect.name
+
+        return connection.get_bind().dialect.name
@@ -0,0 +1,365 @@
+import json
+import logging
+import pickle
+import select
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import SQLAlchemyError
+
+from sporttracker import Constants
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+InvalidationListener = Callable[[str, int], None]
+
+
+class SharedCacheBackend(ABC):
+    """
+    Second cache level that is shared between several SportTracker processes.
+
+    Every entry belongs to a namespace (one per cache) and a user. Each user has a generation per namespace that is
+    increased on every invalidation. Entries are only returned and stored for the current generation, so a process
+    can never publish a result that was calculated before an invalidation.
+    Invalidations are broadcast to the invalidation listeners of all other processes.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, userId: int, key: str) -> tuple[int, bytes | None]:
+        """
+        Returns the current generation of the user and the stored value (or None).
+        """
+        pass
+
+    @abstractmethod
+    def put(self, namespace: str, userId: int, key: str, generation: int, value: bytes) -> bool:
+        """
+        Stores the value if the generation is still the current generation of the user.
+        """
+        pass
+
+    @abstractmethod
+    def invalidate_by_user(self, namespace: str, userId: int) -> int:
+        """
+        Removes all entries of the user, notifies all other processes and returns the new generation of the user.
+        """
+        pass
+
+    @abstractmethod
+    def add_invalidation_listener(self, listener: InvalidationListener) -> None:
+        pass
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class DatabaseSharedCacheBackend(SharedCacheBackend):
+    """
+    Stores the shared cache entries in database tables.
+
+    PostgreSQL: the tables are created as unlogged tables (no write-ahead log, emptied after a crash) and
+    invalidations are broadcast via LISTEN/NOTIFY.
+    SQLite (e.g. a file on the local disk shared by all processes of one host): invalidations are written to an
+    additional table that is polled by all processes.
+    """
+
+    CHANNEL = 'sporttracker_shared_cache'
+    MAX_NUMBER_OF_INVALIDATION_EVENTS = 1000
+    LISTENER_STARTUP_TIMEOUT = 5
+
+    def __init__(self, databaseUri: str, pollInterval: float = 1.0) -> None:
+        self._engine = create_engine(databaseUri)
+        self._isPostgres = self._engine.dialect.name == 'postgresql'
+        self._pollInterval = pollInterval
+        self._senderId = uuid.uuid4().hex
+
+        self._listeners: list[InvalidationListener] = []
+        self._listenerThread: threading.Thread | None = None
+        # set as soon as the listener thread receives all invalidations that are broadcast from then on
+        self._listenerReadyEvent = threading.Event()
+        self._stopEvent = threading.Event()
+
+        self.__create_tables()
+
+    def get(self, namespace: str, userId: int, key: str) -> tuple[int, bytes | None]:
+        try:
+            with self._engine.connect() as connection:
+                generation = self.__get_generation(connection, namespace, userId)
+                row = connection.execute(
+                    text(
+                        'SELECT value FROM shared_cache_entry '
+                        'WHERE namespace = :namespace AND cache_key = :key AND generation = :generation'
+                    ),
+                    {'namespace': namespace, 'key': key, 'generation': generation},
+                ).first()
+        except SQLAlchemyError as e:
+            LOGGER.error(f'Could not read from shared cache: {e}')
+            return -1, None
+
+        if row is None:
+            return generation, None
+
+        return generation, bytes(row[0])
+
+    def put(self, namespace: str, userId: int, key: str, generation: int, value: bytes) -> bool:
+        if generation < 0:
+            return False
+
+        try:
+            with self._engine.begin() as connection:
+                result = connection.execute(
+                    text(
+                        'INSERT INTO shared_cache_entry (namespace, cache_key, user_id, generation, value) '
+                        'SELECT :namespace, :key, :userId, :generation, :value '
+                        'WHERE :generation = COALESCE('
+                        '(SELECT generation FROM shared_cache_generation '
+                        'WHERE namespace = :namespace AND user_id = :userId), 0) '
+                        'ON CONFLICT (namespace, cache_key) DO UPDATE SET '
+                        'user_id = excluded.user_id, generation = excluded.generation, value = excluded.value'
+                    ),
+                    {'namespace': namespace, 'key': key, 'userId': userId, 'generation': generation, 'value': value},
+                )
+                return result.rowcount > 0
+        except SQLAlchemyError as e:
+            LOGGER.error(f'Could not write to shared cache: {e}')
+            return False
+
+    def invalidate_by_user(self, namespace: str, userId: int) -> int:
+        parameters = {'namespace': namespace, 'userId': userId}
+
+        try:
+            with self._engine.begin() as connection:
+                connection.execute(
+                    text(
+                        'INSERT INTO shared_cache_generation (namespace, user_id, generation) '
+                        'VALUES (:namespace, :userId, 1) '
+                        'ON CONFLICT (namespace, user_id) DO UPDATE SET '
+                        'generation = shared_cache_generation.generation + 1'
+                    ),
+                    parameters,
+                )
+                generation = self.__get_generation(connection, namespace, userId)
+                connection.execute(
+                    text('DELETE FROM shared_cache_entry WHERE namespace = :namespace AND user_id = :userId'),
+                    parameters,
+                )
+                self.__broadcast_invalidation(connection, namespace, userId)
+        except SQLAlchemyError as e:
+            LOGGER.error(f'Could not invalidate shared cache: {e}')
+            return -1
+
+        return generation
+
+    def add_invalidation_listener(self, listener: InvalidationListener) -> None:
+        self._listeners.append(listener)
+
+        if self._listenerThread is None:
+            target = self.__listen_for_notifications if self._isPostgres else self.__poll_invalidation_events
+            self._listenerThread = threading.Thread(target=target, daemon=True)
+            self._listenerThread.start()
+            # otherwise invalidations of other processes right after registering the listener could be missed
+            self._listenerReadyEvent.wait(timeout=self.LISTENER_STARTUP_TIMEOUT)
+
+    def close(self) -> None:
+        self._stopEvent.set()
+        if self._listenerThread is not None:
+            self._listenerThread.join(timeout=5)
+        self._engine.dispose()
+
+    def __create_tables(self) -> None:
+        prefix = 'UNLOGGED ' if self._isPostgres else ''
+        binaryType = 'BYTEA' if self._isPostgres else 'BLOB'
+
+        with self._engine.begin() as connection:
+            connection.execute(
+                text(
+                    f'CREATE {prefix}TABLE IF NOT EXISTS shared_cache_generation ('
+                    'namespace VARCHAR NOT NULL, '
+                    'user_id INTEGER NOT NULL, '
+                    'generation INTEGER NOT NULL, '
+                    'PRIMARY KEY (namespace, user_id))'
+                )
+            )
+            connection.execute(
+                text(
+                    f'CREATE {prefix}TABLE IF NOT EXISTS shared_cache_entry ('
+                    'namespace VARCHAR NOT NULL, '
+                    'cache_key VARCHAR NOT NULL, '
+                    'user_id INTEGER NOT NULL, '
+                    'generation INTEGER NOT NULL, '
+                    f'value {binaryType} NOT NULL, '
+                    'PRIMARY KEY (namespace, cache_key))'
+                )
+            )
+            connection.execute(
+                text(
+                    'CREATE INDEX IF NOT EXISTS shared_cache_entry_user_index '
+                    'ON shared_cache_entry (namespace, user_id)'
+                )
+            )
+
+            if not self._isPostgres:
+                connection.execute(
+                    text(
+                        'CREATE TABLE IF NOT EXISTS shared_cache_invalidation ('
+                        'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                        'namespace VARCHAR NOT NULL, '
+                        'user_id INTEGER NOT NULL, '
+                        'sender VARCHAR NOT NULL)'
+                    )
+                )
+
+    @staticmethod
+    def __get_generation(connection: Connection, namespace: str, userId: int) -> int:
+        generation = connection.execute(
+            text('SELECT generation FROM shared_cache_generation WHERE namespace = :namespace AND user_id = :userId'),
+            {'namespace': namespace, 'userId': userId},
+        ).scalar()
+        return 0 if generation is None else int(generation)
+
+    def __broadcast_invalidation(self, connection: Connection, namespace: str, userId: int) -> None:
+        if self._isPostgres:
+            # notifications are delivered once the transaction is committed
+            payload = json.dumps({'namespace': namespace, 'userId': userId, 'sender': self._senderId})
+            connection.execute(
+                text('SELECT pg_notify(:channel, :payload)'), {'channel': self.CHANNEL, 'payload': payload}
+            )
+            return
+
+        eventId: int = connection.execute(
+            text(
+                'INSERT INTO shared_cache_invalidation (namespace, user_id, sender) '
+                'VALUES (:namespace, :userId, :sender) RETURNING id'
+            ),
+            {'namespace': namespace, 'userId': userId, 'sender': self._senderId},
+        ).scalar_one()
+        connection.execute(
+            text('DELETE FROM shared_cache_invalidation WHERE id <= :id'),
+            {'id': eventId - self.MAX_NUMBER_OF_INVALIDATION_EVENTS},
+        )
+
+    def __notify_listeners(self, namespace: str, userId: int, sender: str) -> None:
+        if sender == self._senderId:
+            return
+
+        LOGGER.debug(f'Received shared cache invalidation for {namespace} and user {userId}')
+        for listener in self._listeners:
+            try:
+                listener(namespace, userId)
+            except Exception as e:
+                LOGGER.error(f'Shared cache invalidation listener failed: {e}')
+
+    def __poll_invalidation_events(self) -> None:
+        lastEventId = None
+        while not self._stopEvent.is_set():
+            rows: list[Any] = []
+            try:
+                with self._engine.connect() as connection:
+                    if lastEventId is None:
+                        lastEventId = connection.execute(
+                            text('SELECT COALESCE(MAX(id), 0) FROM shared_cache_invalidation')
+                        ).scalar_one()
+                        self._listenerReadyEvent.set()
+
+                    rows = list(
+                        connection.execute(
+                            text(
+                                'SELECT id, namespace, user_id, sender FROM shared_cache_invalidation '
+                                'WHERE id > :id ORDER BY id'
+                            ),
+                            {'id': lastEventId},
+                        )
+                    )
+            except SQLAlchemyError as e:
+                LOGGER.error(f'Could not read shared cache invalidations: {e}')
+
+            for eventId, namespace, userId, sender in rows:
+                lastEventId = eventId
+                self.__notify_listeners(namespace, userId, sender)
+
+            self._stopEvent.wait(self._pollInterval)
+
+    def __listen_for_notifications(self) -> None:
+        while not self._stopEvent.is_set():
+            try:
+                rawConnection = self._engine.raw_connection()
+                try:
+                    driverConnection = rawConnection.driver_connection
+                    driverConnection.autocommit = True  # type: ignore[union-attr]
+                    with driverConnection.cursor() as cursor:  # type: ignore[union-attr]
+                        cursor.execute(f'LISTEN {self.CHANNEL}')
+                    self._listenerReadyEvent.set()
+
+                    while not self._stopEvent.is_set():
+                        if select.select([driverConnection], [], [], self._pollInterval) == ([], [], []):
+                            continue
+
+                        driverConnection.poll()  # type: ignore[union-attr]
+                        while driverConnection.notifies:  # type: ignore[union-attr]
+                            notification = driverConnection.notifies.pop(0)  # type: ignore[union-attr]
+                            payload = json.loads(notification.payload)
+                            self.__notify_listeners(payload['namespace'], payload['userId'], payload['sender'])
+                finally:
+                    rawConnection.invalidate()
+            except Exception as e:
+                LOGGER.error(f'Lost connection for shared cache invalidations: {e}')
+                self._stopEvent.wait(self._pollInterval)
+
+
+class SharedCacheNamespace:
+    """
+    Access to the entries of a single cache in an optional SharedCacheBackend.
+    Values are serialized with pickle, therefore the backend must only be accessible by SportTracker itself.
+    Without a backend all methods do nothing.
+    """
+
+    def __init__(
+        self, backend: SharedCacheBackend | None, namespace: str, onRemoteInvalidation: Callable[[int], None]
+    ) -> None:
+        self._backend = backend
+        self._namespace = namespace
+        self._onRemoteInvalidation = onRemoteInvalidation
+
+        if self._backend is not None:
+            self._backend.add_invalidation_listener(self.__on_invalidation)
+
+    def is_enabled(self) -> bool:
+        return self._backend is not None
+
+    def load(self, userId: int, key: str) -> tuple[int, Any | None]:
+        """
+        Returns the current shared generation of the user and the stored value (or None).
+        """
+        if self._backend is None:
+            return -1, None
+
+        generation, value = self._backend.get(self._namespace, userId, key)
+        if value is None:
+            return generation, None
+
+        try:
+            return generation, pickle.loads(value)
+        except Exception as e:
+            LOGGER.error(f'Could not deserialize shared cache entry {key}: {e}')
+            return generation, None
+
+    def store(self, userId: int, key: str, generation: int, value: Any) -> None:
+        if self._backend is None:
+            return
+
+        self._backend.put(self._namespace, userId, key, generation, pickle.dumps(value))
+
+    def invalidate(self, userId: int) -> int:
+        if self._backend is None:
+            return -1
+
+        return self._backend.invalidate_by_user(self._namespace, userId)
+
+    def __on_invalidation(self, namespace: str, userId: int) -> None:
+        if namespace == self._namespace:
+            self._onRemoteInvalidation(userId)
@@ -0,0 +1,55 @@
+import threading
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar('T')
+
+
+class _Flight(Generic[T]):
+    def __init__(self) -> None:
+        self.finished = threading.Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight(Generic[T]):
+    """
+    Ensures that a computation runs only once per key at the same time.
+    The first caller of a key computes the result, all concurrent callers of the same key wait for it and receive the
+    same result (or exception).
+
+    Uses the threading primitives, which are cooperative under gevent's monkey patching, so waiting greenlets
+    do not block the others.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[str, _Flight[T]] = {}
+
+    def run(self, key: str, function: Callable[[], T]) -> T:
+        with self._lock:
+            flight = self._flights.get(key)
+            isLeader = flight is None
+            if flight is None:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not isLeader:
+            flight.finished.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result  # type: ignore[return-value]
+
+        try:
+            flight.result = function()
+            return flight.result
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.finished.set()
+
+    def is_running(self, key: str) -> bool:
+        with self._lock:
+            return key in self._flights
@@ -0,0 +1,76 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+class StageTimer:
+    """
+    Measures the durations of the stages of a single operation (e.g. an upload).
+    A stage may be measured several times, the durations are summed up.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter) -> None:
+        self._clock = clock
+        self._durations: dict[str, float] = {}
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        startTime = self._clock()
+        try:
+            yield
+        finally:
+            self.add(stage, self._clock() - startTime)
+
+    def add(self, stage: str, duration: float) -> None:
+        self._durations[stage] = self._durations.get(stage, 0.0) + duration
+
+    def get_durations(self) -> dict[str, float]:
+        return dict(self._durations)
+
+
+class StageStatistics:
+    """
+    Sums up the stage durations of all operations of one kind, e.g. to expose them as metrics.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._lock = threading.Lock()
+        self._numberOfOperations = 0
+        self._durations: dict[str, float] = {}
+
+    def add(self, durations: dict[str, float]) -> None:
+        with self._lock:
+            self._numberOfOperations += 1
+            for stage, duration in durations.items():
+                self._durations[stage] = self._durations.get(stage, 0.0) + duration
+
+    def get_number_of_operations(self) -> int:
+        with self._lock:
+            return self._numberOfOperations
+
+    def get_durations(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._durations)
+
+    def format_as_prometheus(self) -> str:
+        """
+        Formats the statistics in the Prometheus text exposition format.
+        """
+        with self._lock:
+            lines = [
+                f'# HELP sporttracker_{self._name}_total Number of completed operations',
+                f'# TYPE sporttracker_{self._name}_total counter',
+                f'sporttracker_{self._name}_total {self._numberOfOperations}',
+                f'# HELP sporttracker_{self._name}_stage_seconds_total Summed up duration of each stage in seconds',
+                f'# TYPE sporttracker_{self._name}_stage_seconds_total counter',
+            ]
+            for stage, duration in self._durations.items():
+                lines.append(f'sporttracker_{self._name}_stage_seconds_total{{stage="{stage}"}} {duration:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def format_stage_durations(durations: dict[str, float]) -> str:
+    return ', '.join(f'{stage}: {duration * 1000:.1f} ms' for stage, duration in durations.items())
@@ -3,13 +3,13 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from sporttracker.gpx.PreviewImageJobService import PreviewImageJobService
     from sporttracker.plannedTour.PlannedTourService import PlannedTourService
     from sporttracker.notification.NotificationService import NotificationService
 
 import logging
 from datetime import datetime
 from operator import attrgetter
-from typing import Any
 
 import natsort
 from flask import request
@@ -20,7 +20,7 @@ from sqlalchemy.sql import or_
 
 from sporttracker import Constants
 from sporttracker.gpx.GpxService import GpxService
-from sporttracker.gpx.LongDistanceTourGpxPreviewImageService import LongDistanceTourGpxPreviewImageService
+from sporttracker.gpx.PreviewImageJobEntity import PreviewImageJobType
 from sporttracker.longDistanceTour.LongDistanceTourEntity import (
     LongDistanceTourPlannedTourAssociation,
     LongDistanceTour,
@@ -45,12 +45,12 @@ class LongDistanceTourService:
     def __init__(
         self,
         gpx_service: GpxService,
-        gpx_preview_image_settings: dict[str, Any],
+        preview_image_job_service: PreviewImageJobService,
         planned_tour_service: PlannedTourService,
         notification_service: NotificationService,
     ) -> None:
         self._gpx_service = gpx_service
-        self._gpx_preview_image_settings = gpx_preview_image_settings
+        self._preview_image_job_service = preview_image_job_service
         self._planned_tour_service = planned_tour_service
         self._notification_service = notification_service
 
@@ -81,10 +81,7 @@ class LongDistanceTourService:
 
         self.__add_shared_users_to_all_linked_planned_tours(longDistanceTour, sharedUsers)
 
-        gpxPreviewImageService = LongDistanceTourGpxPreviewImageService(
-            longDistanceTour, self._gpx_service, self._planned_tour_service
-        )
-        gpxPreviewImageService.generate_image(self._gpx_preview_image_settings)
+        self._preview_image_job_service.enqueue(PreviewImageJobType.LONG_DISTANCE_TOUR, longDistanceTour.id)
 
         self._notification_service.on_long_distance_tour_created(longDistanceTour)
 
@@ -146,10 +143,7 @@ class LongDistanceTourService:
 
         self.__add_shared_users_to_all_linked_planned_tours(longDistanceTour, sharedUsers)
 
-        gpxPreviewImageService = LongDistanceTourGpxPreviewImageService(
-            longDistanceTour, self._gpx_service, self._planned_tour_service
-        )
-        gpxPreviewImageService.generate_image(self._gpx_preview_image_settings)
+        self._preview_image_job_service.enqueue(PreviewImageJobType.LONG_DISTANCE_TOUR, longDistanceTour.id)
 
         self._notification_service.on_long_distance_tour_updated(longDistanceTour, previousSharedUsers)
 
@@ -1,10 +1,11 @@
+import dataclasses
 import io
 import logging
 from datetime import datetime
-from typing import Any
+from typing import Any, Callable
 
 import flask_babel
-from PIL import ImageColor
+from PIL import ImageColor, Image
 from flask import (
     Blueprint,
     render_template,
@@ -14,18 +15,29 @@ from flask import (
     request,
     Response,
     jsonify,
+    current_app,
+    stream_with_context,
 )
 from flask_login import login_required, current_user
 from sqlalchemy import func, extract
 
 from sporttracker.longDistanceTour.LongDistanceTourBlueprint import LongDistanceTourModel
 from sporttracker.plannedTour.PlannedTourBlueprint import PlannedTourModel
+from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
 from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
 from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
+from sporttracker.tileHunting.TileImageCache import TileImageCache
+from sporttracker.tileHunting.TileOverlayExportService import TileOverlayExportService
+from sporttracker.tileHunting.TilePyramidCache import TilePyramidCache
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache, PackedTileIndex
 from sporttracker.tileHunting.TileRenderService import TileRenderService, TileRenderColorMode
+from sporttracker.tileHunting.TileVectorService import TileVectorService
 from sporttracker.tileHunting.VisitedTileService import VisitedTileService
 from sporttracker import Constants
-from sporttracker.gpx.GpxService import GpxService, GpxParser
+from sporttracker.gpx import GpxGeometry
+from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.gpx.GpxParser import GpxParser
+from sporttracker.gpx.GpxService import GpxService, GpxGeometryTrack
 from sporttracker.workout.WorkoutModel import DistanceWorkoutModel
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
 from sporttracker.user.UserEntity import get_user_by_tile_hunting_shared_code
@@ -59,6 +71,8 @@ def createGpxInfo(
             workout_id=workoutId,
             file_format=GpxService.GPX_FILE_EXTENSION,
         ),
+        # the zoom level is replaced by the map
+        'geometryUrl': url_for('gpxTracks.getGeometryByWorkoutId', zoom=0, workout_id=workoutId),
         'workoutUrl': workoutUrl,
         'workoutName': f'{workoutStartTime.strftime("%Y-%m-%d")} - {__escape_name(workoutName)}',
     }
@@ -72,6 +86,8 @@ def createGpxInfoPlannedTour(tourId: int, tourName: str, workoutUrlEndpoint: str
             tour_id=tourId,
             file_format=GpxService.GPX_FILE_EXTENSION,
         ),
+        # the zoom level is replaced by the map
+        'geometryUrl': url_for('gpxTracks.getGeometryByPlannedTourId', zoom=0, tour_id=tourId),
         'workoutUrl': workoutUrlEndpoint,
         'workoutName': __escape_name(tourName),
     }
@@ -81,43 +97,34 @@ def construct_blueprint(
     tileHuntingSettings: dict[str, Any],
     newVisitedTileCache: NewVisitedTileCache,
     maxSquareCache: MaxSquareCache,
+    tileImageCache: TileImageCache,
+    tilePyramidCache: TilePyramidCache,
+    visitedTileIndexCache: VisitedTileIndexCache,
     distanceWorkoutService: DistanceWorkoutService,
     gpxPreviewImageSettings: dict[str, Any],
     plannedTourService: PlannedTourService,
+    tileOverlayExportService: TileOverlayExportService,
+    gpxService: GpxService,
 ) -> Blueprint:
     maps = Blueprint('maps', __name__, static_folder='static')
 
+    # number of neighbouring tiles per axis that are rendered together, 1 disables metatiles
+    metaTileSize = max(1, tileHuntingSettings.get('metaTileSize', 1))
+
     @maps.route('/map')
     @login_required
     def showAllWorkoutsOnMap():
         quickFilterState = get_quick_filter_state_by_user(current_user.id)
 
         gpxInfo = []
-
-        funcStartTime = func.max(DistanceWorkout.start_time)
-        workouts = (
-            DistanceWorkout.query.with_entities(
-                func.max(DistanceWorkout.id),
-                DistanceWorkout.name,
-                funcStartTime,
-                func.max(DistanceWorkout.type),
-            )
-            .filter(DistanceWorkout.user_id == current_user.id)
-            .filter(DistanceWorkout.gpx_metadata_id.isnot(None))
-            .filter(DistanceWorkout.type.in_(quickFilterState.get_active_distance_workout_types()))
-            .filter(extract('year', DistanceWorkout.start_time).in_(quickFilterState.years))
-            .group_by(DistanceWorkout.name)
-            .order_by(funcStartTime.desc())
-            .all()
-        )
-
-        for workout in workouts:
+        for workout in __get_filtered_workouts(quickFilterState):
             workoutId, workoutName, workoutStartTime, workoutType = workout
             gpxInfo.append(createGpxInfo(workoutId, workoutName, workoutStartTime, workoutType))
 
         return render_template(
             'map/mapMultipleWorkouts.jinja2',
             gpxInfo=gpxInfo,
+            geometryCollectionUrl=url_for('maps.getGeometriesOfAllWorkouts'),
             quickFilterState=quickFilterState,
             availableYears=distanceWorkoutService.get_available_years(current_user.id),
             mapMode='workouts',
@@ -272,6 +279,7 @@ def construct_blueprint(
         return render_template(
             'map/mapMultipleWorkouts.jinja2',
             gpxInfo=gpxInfo,
+            geometryCollectionUrl=url_for('maps.getGeometriesOfAllPlannedTours'),
             quickFilterState=quickFilterState,
             mapMode='plannedTours',
             redirectUrl='maps.showAllPlannedToursOnMap',
@@ -298,35 +306,67 @@ def construct_blueprint(
         quickFilterState = get_quick_filter_state_by_user(current_user.id)
         tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
 
+        def render() -> dict[tuple[int, int], Image.Image]:
+            visitedTileService = VisitedTileService(
+                newVisitedTileCache,
+                maxSquareCache,
+                tilePyramidCache,
+                visitedTileIndexCache,
+                quickFilterState,
+                tileHuntingFilterState,
+                distanceWorkoutService,
+                workoutId=workout.id,
+            )
+
+            tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
+
+            borderColor = None
+            if tileHuntingFilterState.is_show_grid_active:
+                borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
+
+            return tileRenderService.render_meta_tile(
+                x,
+                y,
+                zoom,
+                metaTileSize,
+                user_id,
+                TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+                borderColor,  # type: ignore[arg-type]
+                None,
+            )
+
+        filterStateHash = __calculate_filter_state_hash(quickFilterState, tileHuntingFilterState, workout.id)
+        return __get_or_render_tile(user_id, 'workout', filterStateHash, zoom, x, y, render)
+
+    @maps.route('/map/<int:workout_id>/renderTile/<int:user_id>/<int:zoom>/<int:x>/<int:y>.json')
+    def renderTileAsVector(workout_id: int, user_id: int, zoom: int, x: int, y: int):
+        if not current_user.is_authenticated:
+            abort(401)
+
+        if current_user.id != user_id:
+            abort(403)
+
+        workout = distanceWorkoutService.get_distance_workout_by_id(workout_id, current_user.id)
+
+        if workout is None:
+            abort(404)
+
+        tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
         visitedTileService = VisitedTileService(
             newVisitedTileCache,
             maxSquareCache,
-            quickFilterState,
+            tilePyramidCache,
+            visitedTileIndexCache,
+            get_quick_filter_state_by_user(current_user.id),
             tileHuntingFilterState,
             distanceWorkoutService,
             workoutId=workout.id,
         )
 
-        tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
-
-        borderColor = None
-        if tileHuntingFilterState.is_show_grid_active:
-            borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
-
-        image = tileRenderService.render_image(
-            x,
-            y,
-            zoom,
-            user_id,
-            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
-            borderColor,  # type: ignore[arg-type]
-            None,
+        return __get_vector_tile(
+            visitedTileService, tileHuntingFilterState, user_id, zoom, x, y, TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES
         )
 
-        with io.BytesIO() as output:
-            image.save(output, format='PNG')
-            return Response(output.getvalue(), mimetype='image/png')
-
     @maps.route('/map/renderAllTiles/<int:user_id>/<int:zoom>/<int:x>/<int:y>.png')
     def renderAllTiles(user_id: int, zoom: int, x: int, y: int):
         if not current_user.is_authenticated:
@@ -336,7 +376,12 @@ def construct_blueprint(
             abort(403)
 
         return __renderTile(
-            user_id, zoom, x, y, QuickFilterState().reset(distanceWorkoutService.get_available_years(user_id))
+            user_id,
+            zoom,
+            x,
+            y,
+            QuickFilterState().reset(distanceWorkoutService.get_available_years(user_id)),
+            'all',
         )
 
     @maps.route('/map/renderAllTilesWithFilter/<int:user_id>/<int:zoom>/<int:x>/<int:y>.png')
@@ -349,34 +394,84 @@ def construct_blueprint(
 
         quickFilterState = get_quick_filter_state_by_user(current_user.id)
 
-        return __renderTile(user_id, zoom, x, y, quickFilterState)
+        return __renderTile(user_id, zoom, x, y, quickFilterState, 'filtered')
+
+    @maps.route('/map/renderAllTiles/<int:user_id>/<int:zoom>/<int:x>/<int:y>.json')
+    def renderAllTilesAsVector(user_id: int, zoom: int, x: int, y: int):
+        if not current_user.is_authenticated:
+            abort(401)
+
+        if current_user.id != user_id:
+            abort(403)
 
-    def __renderTile(user_id: int, zoom: int, x: int, y: int, quickFilterState: QuickFilterState) -> Response:
+        quickFilterState = QuickFilterState().reset(distanceWorkoutService.get_available_years(user_id))
         tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
         visitedTileService = __create_visited_tile_service(quickFilterState, tileHuntingFilterState)
-        tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
 
-        borderColor = None
-        if tileHuntingFilterState.is_show_grid_active:
-            borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
+        return __get_vector_tile(
+            visitedTileService,
+            tileHuntingFilterState,
+            user_id,
+            zoom,
+            x,
+            y,
+            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+            isMaxSquareAllowed=True,
+        )
 
-        maxSquareColor = None
-        if tileHuntingFilterState.is_show_max_square_active:
-            maxSquareColor = ImageColor.getcolor(tileHuntingSettings['maxSquareColor'], 'RGBA')
+    @maps.route('/map/renderAllTilesWithFilter/<int:user_id>/<int:zoom>/<int:x>/<int:y>.json')
+    def renderAllTilesWithFilterAsVector(user_id: int, zoom: int, x: int, y: int):
+        if not current_user.is_authenticated:
+            abort(401)
+
+        if current_user.id != user_id:
+            abort(403)
+
+        quickFilterState = get_quick_filter_state_by_user(current_user.id)
+        tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
+        visitedTileService = __create_visited_tile_service(quickFilterState, tileHuntingFilterState)
 
-        image = tileRenderService.render_image(
+        return __get_vector_tile(
+            visitedTileService,
+            tileHuntingFilterState,
+            user_id,
+            zoom,
             x,
             y,
-            zoom,
-            user_id,
             TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
-            borderColor,  # type: ignore[arg-type]
-            maxSquareColor,  # type: ignore[arg-type]
+            isMaxSquareAllowed=True,
         )
 
-        with io.BytesIO() as output:
-            image.save(output, format='PNG')
-            return Response(output.getvalue(), mimetype='image/png')
+    def __renderTile(
+        user_id: int, zoom: int, x: int, y: int, quickFilterState: QuickFilterState, renderMode: str
+    ) -> Response:
+        tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
+
+        def render() -> dict[tuple[int, int], Image.Image]:
+            visitedTileService = __create_visited_tile_service(quickFilterState, tileHuntingFilterState)
+            tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
+
+            borderColor = None
+            if tileHuntingFilterState.is_show_grid_active:
+                borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
+
+            maxSquareColor = None
+            if tileHuntingFilterState.is_show_max_square_active:
+                maxSquareColor = ImageColor.getcolor(tileHuntingSettings['maxSquareColor'], 'RGBA')
+
+            return tileRenderService.render_meta_tile(
+                x,
+                y,
+                zoom,
+                metaTileSize,
+                user_id,
+                TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+                borderColor,  # type: ignore[arg-type]
+                maxSquareColor,  # type: ignore[arg-type]
+            )
+
+        filterStateHash = __calculate_filter_state_hash(quickFilterState, tileHuntingFilterState)
+        return __get_or_render_tile(user_id, renderMode, filterStateHash, zoom, x, y, render)
 
     @maps.route('/map/renderHeatmap/<int:user_id>/<int:zoom>/<int:x>/<int:y>.png')
     def renderHeatmap(user_id: int, zoom: int, x: int, y: int):
@@ -388,29 +483,46 @@ def construct_blueprint(
 
         availableYears = distanceWorkoutService.get_available_years(user_id)
 
+        quickFilterState = QuickFilterState().reset(availableYears)
         tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
-        visitedTileService = __create_visited_tile_service(
-            QuickFilterState().reset(availableYears), tileHuntingFilterState
-        )
-        tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
 
-        borderColor = None
-        if tileHuntingFilterState.is_show_grid_active:
-            borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
+        def render() -> dict[tuple[int, int], Image.Image]:
+            visitedTileService = __create_visited_tile_service(quickFilterState, tileHuntingFilterState)
+            tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
+
+            borderColor = None
+            if tileHuntingFilterState.is_show_grid_active:
+                borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
+
+            return tileRenderService.render_meta_tile(
+                x,
+                y,
+                zoom,
+                metaTileSize,
+                user_id,
+                TileRenderColorMode.NUMBER_OF_VISITS,
+                borderColor,  # type: ignore[arg-type]
+                None,
+            )
 
-        image = tileRenderService.render_image(
-            x,
-            y,
-            zoom,
-            user_id,
-            TileRenderColorMode.NUMBER_OF_VISITS,
-            borderColor,  # type: ignore[arg-type]
-            None,
-        )
+        filterStateHash = __calculate_filter_state_hash(quickFilterState, tileHuntingFilterState)
+        return __get_or_render_tile(user_id, 'heatmap', filterStateHash, zoom, x, y, render)
+
+    @maps.route('/map/renderHeatmap/<int:user_id>/<int:zoom>/<int:x>/<int:y>.json')
+    def renderHeatmapAsVector(user_id: int, zoom: int, x: int, y: int):
+        if not current_user.is_authenticated:
+            abort(401)
+
+        if current_user.id != user_id:
+            abort(403)
 
-        with io.BytesIO() as output:
-            image.save(output, format='PNG')
-            return Response(output.getvalue(), mimetype='image/png')
+        quickFilterState = QuickFilterState().reset(distanceWorkoutService.get_available_years(user_id))
+        tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
+        visitedTileService = __create_visited_tile_service(quickFilterState, tileHuntingFilterState)
+
+        return __get_vector_tile(
+            visitedTileService, tileHuntingFilterState, user_id, zoom, x, y, TileRenderColorMode.NUMBER_OF_VISITS
+        )
 
     @maps.route('/map/tileOverlay/<string:share_code>/<int:zoom>/<int:x>/<int:y>.png')
     def renderAllTileHuntingTilesViaShareCode(share_code: str, zoom: int, x: int, y: int):
@@ -418,29 +530,44 @@ def construct_blueprint(
         if user is None:
             abort(404)
 
+        exportedImageBytes = tileOverlayExportService.get_tile(
+            user.id, user.isTileHuntingShowPlannedTilesActivated, zoom, x, y
+        )
+        if exportedImageBytes is not None:
+            return Response(exportedImageBytes, mimetype='image/png')
+
+        if tileOverlayExportService.is_export_outdated(user.id, user.isTileHuntingShowPlannedTilesActivated):
+            # the export is missing or the tiles changed since the last export,
+            # the export is created or updated incrementally in the background
+            tileOverlayExportService.start_export_in_background(
+                current_app._get_current_object(),  # type: ignore[attr-defined]
+                user.id,
+            )
+
         tileHuntingFilterState = TileHuntingFilterState().reset()
         tileHuntingFilterState.is_show_max_square_active = False  # type: ignore[assignment]
         tileHuntingFilterState.is_show_planned_tiles_active = user.isTileHuntingShowPlannedTilesActivated  # type: ignore[assignment]
 
-        visitedTileService = __create_visited_tile_service(
-            QuickFilterState().reset(distanceWorkoutService.get_available_years(user.id)), tileHuntingFilterState
-        )
-        tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
+        quickFilterState = QuickFilterState().reset(distanceWorkoutService.get_available_years(user.id))
 
-        borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
-        image = tileRenderService.render_image(
-            x,
-            y,
-            zoom,
-            user.id,
-            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
-            borderColor,  # type: ignore[arg-type]
-            None,
-        )
+        def render() -> dict[tuple[int, int], Image.Image]:
+            visitedTileService = __create_visited_tile_service(quickFilterState, tileHuntingFilterState)
+            tileRenderService = TileRenderService(tileHuntingSettings['baseZoomLevel'], 256, visitedTileService)
 
-        with io.BytesIO() as output:
-            image.save(output, format='PNG')
-            return Response(output.getvalue(), mimetype='image/png')
+            borderColor = ImageColor.getcolor(tileHuntingSettings['borderColor'], 'RGBA')
+            return tileRenderService.render_meta_tile(
+                x,
+                y,
+                zoom,
+                metaTileSize,
+                user.id,
+                TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+                borderColor,  # type: ignore[arg-type]
+                None,
+            )
+
+        filterStateHash = __calculate_filter_state_hash(quickFilterState, tileHuntingFilterState)
+        return __get_or_render_tile(user.id, 'shared', filterStateHash, zoom, x, y, render)
 
     @maps.route('/map/tileHunting')
     @login_required
@@ -546,18 +673,13 @@ def construct_blueprint(
             latitude, longitude, tileHuntingSettings['baseZoomLevel']
         )
 
-        availableYears = distanceWorkoutService.get_available_years(user_id)
-
-        tileHuntingFilterState = get_tile_hunting_filter_state_by_user(current_user.id)
-        visitedTileService = __create_visited_tile_service(
-            QuickFilterState().reset(availableYears), tileHuntingFilterState
-        )
-        rows = visitedTileService.determine_number_of_visits(
-            visitedTile.x, visitedTile.x, visitedTile.y, visitedTile.y, user_id
+        # all workout types and years are counted
+        indexedTile = visitedTileIndexCache.get_visited_tile_index(user_id).get_tile(
+            visitedTile.x, visitedTile.y, PackedTileIndex.get_type_mask(list(WorkoutType)), None
         )
         numberOfVisits = 0
-        if rows:
-            numberOfVisits = rows[0].count
+        if indexedTile is not None:
+            numberOfVisits = indexedTile.numberOfVisits
 
         return jsonify({'numberOfVisits': numberOfVisits})
 
@@ -595,6 +717,7 @@ def construct_blueprint(
             'map/mapLongDistanceTour.jinja2',
             longDistanceTour=longDistanceTourModel,
             gpxInfo=gpxInfo,
+            geometryCollectionUrl=url_for('maps.getGeometriesOfLongDistanceTour', tour_id=tour_id),
             editUrl=url_for('longDistanceTours.edit', tour_id=tour_id),
             tileRenderUrl=tileRenderUrl,
             tileHuntingFilterState=get_tile_hunting_filter_state_by_user(current_user.id),
@@ -602,6 +725,111 @@ def construct_blueprint(
             maxSquareColor=tileHuntingSettings['maxSquareColor'],
         )
 
+    @maps.route('/map/geometries/workouts')
+    @login_required
+    def getGeometriesOfAllWorkouts():
+        quickFilterState = get_quick_filter_state_by_user(current_user.id)
+        workoutIds = [workout[0] for workout in __get_filtered_workouts(quickFilterState)]
+
+        rows = (
+            DistanceWorkout.query.join(GpxMetadata, DistanceWorkout.gpx_metadata_id == GpxMetadata.id)
+            .with_entities(DistanceWorkout.id, DistanceWorkout.type, GpxMetadata.gpx_file_name)
+            .filter(DistanceWorkout.id.in_(__filter_requested_ids(workoutIds)))
+            .all()
+        )
+        tracksById = {
+            workoutId: GpxGeometryTrack(workoutId, workoutType.name, workoutType.background_color_hex, gpxFileName)
+            for workoutId, workoutType, gpxFileName in rows
+        }
+
+        # same order as the workouts in the map legend
+        return __send_geometries([tracksById[workoutId] for workoutId in workoutIds if workoutId in tracksById])
+
+    @maps.route('/map/geometries/plannedTours')
+    @login_required
+    def getGeometriesOfAllPlannedTours():
+        quickFilterState = get_quick_filter_state_by_user(current_user.id)
+        plannedTourFilterState = get_planned_tour_filter_state_by_user(current_user.id)
+
+        plannedTours = plannedTourService.get_planned_tours_filtered(
+            quickFilterState.get_active_distance_workout_types(), plannedTourFilterState
+        )
+
+        return __send_geometries(__create_geometry_tracks(plannedTours))
+
+    @maps.route('/map/geometries/longDistanceTour/<int:tour_id>')
+    @login_required
+    def getGeometriesOfLongDistanceTour(tour_id: int):
+        longDistanceTour = LongDistanceTourService.get_long_distance_tour_by_id(tour_id)
+
+        if longDistanceTour is None:
+            abort(404)
+
+        plannedTours = [
+            PlannedTourService.get_planned_tour_by_id(linkedPlannedTour.planned_tour_id)
+            for linkedPlannedTour in longDistanceTour.linked_planned_tours
+        ]
+
+        return __send_geometries(__create_geometry_tracks([tour for tour in plannedTours if tour is not None]))
+
+    def __get_filtered_workouts(quickFilterState: QuickFilterState) -> list[tuple[int, str, datetime, WorkoutType]]:
+        funcStartTime = func.max(DistanceWorkout.start_time)
+        return (
+            DistanceWorkout.query.with_entities(
+                func.max(DistanceWorkout.id),
+                DistanceWorkout.name,
+                funcStartTime,
+                func.max(DistanceWorkout.type),
+            )
+            .filter(DistanceWorkout.user_id == current_user.id)
+            .filter(DistanceWorkout.gpx_metadata_id.isnot(None))
+            .filter(DistanceWorkout.type.in_(quickFilterState.get_active_distance_workout_types()))
+            .filter(extract('year', DistanceWorkout.start_time).in_(quickFilterState.years))
+            .group_by(DistanceWorkout.name)
+            .order_by(funcStartTime.desc())
+            .all()
+        )
+
+    def __filter_requested_ids(ids: list[int]) -> list[int]:
+        """
+        Restricts the ids to the optional request parameter "ids" (comma separated), e.g. to load finer geometries
+        only for the tracks visible on the map.
+        """
+        requestedIds = request.args.get('ids')
+        if requestedIds is None:
+            return ids
+
+        try:
+            requestedIdSet = {int(requestedId) for requestedId in requestedIds.split(',') if requestedId}
+        except ValueError:
+            abort(400)
+
+        return [itemId for itemId in ids if itemId in requestedIdSet]
+
+    def __create_geometry_tracks(plannedTours: list[PlannedTour]) -> list[GpxGeometryTrack]:
+        requestedIds = set(__filter_requested_ids([tour.id for tour in plannedTours]))
+
+        tracks = []
+        for tour in plannedTours:
+            if tour.id not in requestedIds:
+                continue
+
+            gpxMetadata = tour.get_gpx_metadata()
+            if gpxMetadata is not None:
+                tracks.append(
+                    GpxGeometryTrack(tour.id, tour.type.name, tour.type.background_color_hex, gpxMetadata.gpx_file_name)
+                )
+
+        return tracks
+
+    def __send_geometries(tracks: list[GpxGeometryTrack]):
+        zoom = request.args.get('zoom', default=GpxGeometry.ZOOM_LEVELS[-1], type=int)
+        geometryCollection = gpxService.get_geometry_collection(tracks, zoom)
+
+        response = Response(stream_with_context(geometryCollection.stream()), mimetype='application/json')
+        response.set_etag(geometryCollection.get_etag())
+        return response.make_conditional(request)
+
     @maps.route('/toggleTileHuntingViewTiles')
     @login_required
     def toggleTileHuntingViewTiles():
@@ -663,11 +891,86 @@ def construct_blueprint(
         return VisitedTileService(
             newVisitedTileCache,
             maxSquareCache,
+            tilePyramidCache,
+            visitedTileIndexCache,
             quickFilterState,
             tileHuntingFilterState,
             distanceWorkoutService,
         )
 
+    def __get_vector_tile(
+        visitedTileService: VisitedTileService,
+        tileHuntingFilterState: TileHuntingFilterState,
+        user_id: int,
+        zoom: int,
+        x: int,
+        y: int,
+        tileRenderColorMode: TileRenderColorMode,
+        isMaxSquareAllowed: bool = False,
+    ) -> Response:
+        borderColor = None
+        if tileHuntingFilterState.is_show_grid_active:
+            borderColor = tileHuntingSettings['borderColor']
+
+        maxSquareColor = None
+        if isMaxSquareAllowed and tileHuntingFilterState.is_show_max_square_active:
+            maxSquareColor = tileHuntingSettings['maxSquareColor']
+
+        tileVectorService = TileVectorService(tileHuntingSettings['baseZoomLevel'], visitedTileService)
+        return jsonify(
+            tileVectorService.get_vector_tile(x, y, zoom, user_id, tileRenderColorMode, borderColor, maxSquareColor)
+        )
+
+    def __calculate_filter_state_hash(
+        quickFilterState: QuickFilterState,
+        tileHuntingFilterState: TileHuntingFilterState,
+        workoutId: int | None = None,
+    ) -> str:
+        return TileImageCache.calculate_filter_state_hash(
+            [
+                sorted(t.name for t in quickFilterState.get_active_distance_workout_types()),
+                sorted(quickFilterState.years),
+                tileHuntingFilterState.is_show_grid_active,
+                tileHuntingFilterState.is_only_highlight_new_tiles_active,
+                tileHuntingFilterState.is_show_max_square_active,
+                tileHuntingFilterState.is_show_planned_tiles_active,
+                workoutId,
+            ]
+        )
+
+    def __get_or_render_tile(
+        userId: int,
+        renderMode: str,
+        filterStateHash: str,
+        zoom: int,
+        x: int,
+        y: int,
+        render: Callable[[], dict[tuple[int, int], Image.Image]],
+    ) -> Response:
+        cacheKey = tileImageCache.create_key(userId, renderMode, filterStateHash, zoom, x, y)
+        imageBytes = tileImageCache.get(cacheKey)
+        if imageBytes is not None:
+            return Response(imageBytes, mimetype='image/png')
+
+        # all tiles of the metatile are stored, so that the following requests for the neighbouring tiles
+        # are served from the cache.
+        # Their keys keep the generation read before rendering, so images rendered while the tiles of the user
+        # changed are discarded by the cache.
+        for (tileX, tileY), image in render().items():
+            tileCacheKey = dataclasses.replace(cacheKey, x=tileX, y=tileY)
+            if (tileX, tileY) != (x, y) and tileImageCache.get(tileCacheKey) is not None:
+                continue
+
+            with io.BytesIO() as output:
+                image.save(output, format='PNG')
+                tileImageBytes = output.getvalue()
+
+            tileImageCache.put(tileCacheKey, tileImageBytes)
+            if (tileX, tileY) == (x, y):
+                imageBytes = tileImageBytes
+
+        return Response(imageBytes, mimetype='image/png')
+
     return maps
 
 
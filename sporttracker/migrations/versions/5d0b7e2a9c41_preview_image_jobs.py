@@ -0,0 +1,55 @@
+"""preview_image_jobs
+
+Revision ID: 5d0b7e2a9c41
+Revises: bf585331ecd7
+Create Date: 2026-10-18 14:03:17.482911
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import Inspector, text
+
+# revision identifiers, used by Alembic.
+revision = '5d0b7e2a9c41'
+down_revision = 'bf585331ecd7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = Inspector.from_engine(op.get_bind().engine)
+    tableNames = inspector.get_table_names()
+
+    if 'preview_image_job' not in tableNames:
+        op.create_table(
+            'preview_image_job',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('type', sa.String(), nullable=False),
+            sa.Column('item_id', sa.Integer(), nullable=False),
+            sa.Column('state', sa.String(), nullable=False),
+            sa.Column('number_of_attempts', sa.Integer(), nullable=False),
+            sa.Column('next_attempt_time', sa.DateTime(), nullable=False),
+            sa.Column('start_time', sa.DateTime(), nullable=True),
+            sa.Column('last_error', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+        )
+        op.create_index(
+            'ix_preview_image_job_pending_item',
+            'preview_image_job',
+            ['type', 'item_id'],
+            unique=True,
+            sqlite_where=text("state = 'PENDING'"),
+            postgresql_where=text("state = 'PENDING'"),
+        )
+        op.create_index(
+            'ix_preview_image_job_state_next_attempt_time', 'preview_image_job', ['state', 'next_attempt_time']
+        )
+
+
+def downgrade():
+    inspector = Inspector.from_engine(op.get_bind().engine)
+    tableNames = inspector.get_table_names()
+
+    if 'preview_image_job' in tableNames:
+        op.drop_table('preview_image_job')
@@ -0,0 +1,68 @@
+"""gpx_first_visited_tiles
+
+Revision ID: bf585331ecd7
+Revises: 4a7f81133876
+Create Date: 2026-10-18 10:12:41.208713
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import Inspector, text
+
+# revision identifiers, used by Alembic.
+revision = 'bf585331ecd7'
+down_revision = '4a7f81133876'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    inspector = Inspector.from_engine(op.get_bind().engine)
+    tableNames = inspector.get_table_names()
+
+    if 'gpx_first_visited_tile' not in tableNames:
+        op.create_table(
+            'gpx_first_visited_tile',
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('workout_type', sa.String(), nullable=False),
+            sa.Column('year', sa.Integer(), nullable=False),
+            sa.Column('x', sa.Integer(), nullable=False),
+            sa.Column('y', sa.Integer(), nullable=False),
+            sa.Column('workout_id', sa.Integer(), nullable=False, index=True),
+            sa.Column('start_time', sa.DateTime(), nullable=False),
+            sa.PrimaryKeyConstraint('user_id', 'workout_type', 'year', 'x', 'y'),
+        )
+        op.create_index('ix_gpx_first_visited_tile_user_id_x_y', 'gpx_first_visited_tile', ['user_id', 'x', 'y'])
+
+    connection = op.get_bind()
+    existingTableEntries = connection.execute(text('SELECT * FROM gpx_first_visited_tile LIMIT 1')).fetchall()
+
+    if len(existingTableEntries) == 0:
+        connection.execute(
+            text("""INSERT INTO gpx_first_visited_tile (user_id, workout_type, year, x, y, workout_id, start_time)
+            SELECT ranked."user_id", ranked."type", ranked."year", ranked."x", ranked."y", ranked."id", ranked."start_time"
+            FROM (SELECT w."user_id",
+                         CAST(w."type" AS VARCHAR) AS "type",
+                         CAST(EXTRACT(year FROM w."start_time") AS INTEGER) AS "year",
+                         t."x",
+                         t."y",
+                         w."id",
+                         w."start_time",
+                         ROW_NUMBER() OVER (
+                             PARTITION BY w."user_id", w."type", EXTRACT(year FROM w."start_time"), t."x", t."y"
+                             ORDER BY w."start_time", w."id"
+                         ) AS rank
+                  FROM gpx_visited_tile AS t
+                  JOIN distance_workout AS d ON d."id" = t."workout_id"
+                  JOIN workout AS w ON w."id" = d."id") AS ranked
+            WHERE ranked.rank = 1;""")
+        )
+
+
+def downgrade():
+    inspector = Inspector.from_engine(op.get_bind().engine)
+    tableNames = inspector.get_table_names()
+
+    if 'gpx_first_visited_tile' in tableNames:
+        op.drop_table('gpx_first_visited_tile')
@@ -104,6 +104,26 @@ class NotificationService(Observable):
         self.__check_longest_distance_workout(user_id, workout, previousLongestDistance)
         self.__check_best_month_distance(user_id, workout, previousBestMonthDistance)
 
+    def on_distance_workouts_imported(
+        self,
+        user_id: int,
+        longestWorkout: DistanceWorkout,
+        bestMonthWorkout: DistanceWorkout,
+        previousLongestDistance: int | None,
+        previousBestMonthDistance: int | None,
+    ) -> None:
+        """
+        Checks the records once for all imported workouts of a workout type instead of once per workout.
+        bestMonthWorkout is any imported workout in the month with the highest distance among the imported months.
+        """
+        user = User.query.filter(User.id == user_id).first()
+        if user is None:
+            return
+
+        self.__check_maintenance_reminder_limits(user_id, longestWorkout.type)
+        self.__check_longest_distance_workout(user_id, longestWorkout, previousLongestDistance)
+        self.__check_best_month_distance(user_id, bestMonthWorkout, previousBestMonthDistance)
+
     def __check_maintenance_reminder_limits(self, user_id: int, workout_type: WorkoutType) -> None:
         quickFilterState = QuickFilterState().reset(DistanceWorkoutService.get_available_years(user_id))
         quickFilterState.update({t: t == workout_type for t in WorkoutType}, quickFilterState.years)
@@ -3,6 +3,7 @@ from __future__ import annotations
 from typing import Any, TYPE_CHECKING
 
 if TYPE_CHECKING:
+    from sporttracker.gpx.PreviewImageJobService import PreviewImageJobService
     from sporttracker.notification.NotificationService import NotificationService
 
 import logging
@@ -14,7 +15,7 @@ import natsort
 from flask_login import current_user
 from natsort import natsorted
 from pydantic import BaseModel
-from sqlalchemy import tuple_, asc, func
+from sqlalchemy import and_, asc, func
 from sqlalchemy.sql import or_
 from werkzeug.datastructures import FileStorage
 
@@ -23,6 +24,8 @@ from sporttracker.gpx.GpxService import GpxService
 from sporttracker.longDistanceTour.LongDistanceTourService import LongDistanceTourService
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
 from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.gpx.PreviewImageJobEntity import PreviewImageJobType
+from sporttracker.tileHunting.GpxPlannedTileEntity import GpxPlannedTile
 from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
 from sporttracker.longDistanceTour.LongDistanceTourEntity import LongDistanceTourPlannedTourAssociation
 from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
@@ -149,12 +152,12 @@ class PlannedTourService:
     def __init__(
         self,
         gpx_service: GpxService,
-        gpx_preview_image_settings: dict[str, Any],
+        preview_image_job_service: PreviewImageJobService,
         tile_hunting_settings: dict[str, Any],
         notification_service: NotificationService,
     ) -> None:
         self._gpx_service = gpx_service
-        self._gpx_preview_image_settings = gpx_preview_image_settings
+        self._preview_image_job_service = preview_image_job_service
         self._tile_hunting_settings = tile_hunting_settings
         self._notification_service = notification_service
 
@@ -165,7 +168,7 @@ class PlannedTourService:
         shared_user_ids: list[int],
         user_id: int,
     ) -> PlannedTour:
-        gpxMetadataId = self._gpx_service.handle_gpx_upload_for_planned_tour(files, self._gpx_preview_image_settings)
+        gpxMetadataId = self._gpx_service.handle_gpx_upload_for_planned_tour(files)
 
         sharedUsers = get_users_by_ids(shared_user_ids)
 
@@ -191,6 +194,7 @@ class PlannedTourService:
             self._gpx_service.add_planned_tiles_for_planned_tour(
                 plannedTour, self._tile_hunting_settings['baseZoomLevel'], user_id
             )
+            self._preview_image_job_service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
 
         LOGGER.debug(f'Saved new planned tour: {plannedTour}')
 
@@ -233,12 +237,12 @@ class PlannedTourService:
             db.session.delete(association)
             db.session.commit()
 
-        self.__update_gpx_preview_image_for_long_distance_tours(linkedLongDistanceTourIds)
-
         LOGGER.debug(f'Deleted planned tour: {plannedTour}')
         db.session.delete(plannedTour)
         db.session.commit()
 
+        self.__update_gpx_preview_image_for_long_distance_tours(linkedLongDistanceTourIds)
+
         self._notification_service.on_planned_tour_deleted(plannedTour)
 
     def edit_planned_tour(
@@ -266,22 +270,18 @@ class PlannedTourService:
         plannedTour.share_code = form_model.share_code if form_model.share_code else None  # type: ignore[assignment]
 
         shouldUpdateVisitedTiles = False
-        newGpxMetadataId = self._gpx_service.handle_gpx_upload_for_planned_tour(files, self._gpx_preview_image_settings)
+        isNewGpxUploaded = False
+        newGpxMetadataId = self._gpx_service.handle_gpx_upload_for_planned_tour(files)
         if plannedTour.gpx_metadata_id is None:
             plannedTour.gpx_metadata_id = newGpxMetadataId
             shouldUpdateVisitedTiles = True
+            isNewGpxUploaded = newGpxMetadataId is not None
         else:
             if newGpxMetadataId is not None:
                 self._gpx_service.delete_gpx(plannedTour, user_id)
                 plannedTour.gpx_metadata_id = newGpxMetadataId
-
-                linkedLongDistanceTours = LongDistanceTourPlannedTourAssociation.query.filter(
-                    LongDistanceTourPlannedTourAssociation.planned_tour_id == plannedTour.id
-                ).all()
-                self.__update_gpx_preview_image_for_long_distance_tours(
-                    [t.long_distance_tour_id for t in linkedLongDistanceTours]
-                )
                 shouldUpdateVisitedTiles = True
+                isNewGpxUploaded = True
 
         sharedUsers = get_users_by_ids(shared_user_ids)
         plannedTour.shared_users = sharedUsers
@@ -310,6 +310,21 @@ class PlannedTourService:
                 plannedTour, self._tile_hunting_settings['baseZoomLevel'], user_id
             )
 
+        if isNewGpxUploaded:
+            self._preview_image_job_service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+
+            linkedLongDistanceTours = LongDistanceTourPlannedTourAssociation.query.filter(
+                LongDistanceTourPlannedTourAssociation.planned_tour_id == plannedTour.id
+            ).all()
+            self.__update_gpx_preview_image_for_long_distance_tours(
+                [t.long_distance_tour_id for t in linkedLongDistanceTours]
+            )
+
+        # type and shared users affect the planned tiles shown on the tile hunting maps
+        self._gpx_service.invalidate_rendered_tiles_by_planned_tour(
+            plannedTour, [user.id for user in previousSharedUsers]
+        )
+
         self._notification_service.on_planned_tour_updated(plannedTour, previousSharedUsers)
 
         return plannedTour
@@ -332,37 +347,32 @@ class PlannedTourService:
         return PlannedTour.query.filter(PlannedTour.share_code == shareCode).first()
 
     def __update_gpx_preview_image_for_long_distance_tours(self, linkedLongDistanceTourIds: list[int]):
+        # the images are rendered in the background, so editing a tour does not wait for georender
         for linkedLongDistanceTourId in linkedLongDistanceTourIds:
-            longDistanceTour = LongDistanceTourService.get_long_distance_tour_by_id(linkedLongDistanceTourId)
-            if longDistanceTour is None:
-                continue
-
-            from sporttracker.gpx.LongDistanceTourGpxPreviewImageService import LongDistanceTourGpxPreviewImageService
+            self._preview_image_job_service.enqueue(PreviewImageJobType.LONG_DISTANCE_TOUR, linkedLongDistanceTourId)
 
-            gpxPreviewImageService = LongDistanceTourGpxPreviewImageService(longDistanceTour, self._gpx_service, self)
-            gpxPreviewImageService.generate_image(self._gpx_preview_image_settings)
-
-    def get_number_of_new_visited_tiles(self, plannedTour: PlannedTour) -> int:
-        gpxMetadata = plannedTour.get_gpx_metadata()
-        if gpxMetadata is None:
+    @staticmethod
+    def get_number_of_new_visited_tiles(plannedTour: PlannedTour) -> int:
+        if plannedTour.get_gpx_metadata() is None:
             return 0
 
-        newVisitedTiles = self._gpx_service.get_visited_tiles(
-            gpxMetadata.gpx_file_name, self._tile_hunting_settings['baseZoomLevel']
-        )
-        newVisitedTilesTuples = [(v.x, v.y) for v in newVisitedTiles]
+        # the planned tiles were stored during the upload, so the gpx is not parsed again
+        numberOfPlannedTiles = GpxPlannedTile.query.filter(GpxPlannedTile.planned_tour_id == plannedTour.id).count()
 
         numberOfAlreadyVisitedTiles = (
-            DistanceWorkout.query.select_from(DistanceWorkout)
-            .join(GpxVisitedTile, GpxVisitedTile.workout_id == DistanceWorkout.id)
-            .with_entities(GpxVisitedTile.x, GpxVisitedTile.y)
+            GpxPlannedTile.query.with_entities(GpxPlannedTile.x, GpxPlannedTile.y)
+            .join(
+                GpxVisitedTile,
+                and_(GpxVisitedTile.x == GpxPlannedTile.x, GpxVisitedTile.y == GpxPlannedTile.y),
+            )
+            .join(DistanceWorkout, DistanceWorkout.id == GpxVisitedTile.workout_id)
+            .filter(GpxPlannedTile.planned_tour_id == plannedTour.id)
             .filter(DistanceWorkout.user_id == current_user.id)
-            .filter(tuple_(GpxVisitedTile.x, GpxVisitedTile.y).in_(newVisitedTilesTuples))
             .distinct()
             .count()
         )
 
-        return len(newVisitedTiles) - numberOfAlreadyVisitedTiles
+        return numberOfPlannedTiles - numberOfAlreadyVisitedTiles
 
     @staticmethod
     def get_planned_tours(workoutTypes: list[WorkoutType]) -> list[PlannedTour]:
@@ -64,4 +64,94 @@ function initMapBase()
     attributionControl.setPrefix('<a href="https://leafletjs.com/" > Leaflet </a>');
 
     return map;
-}
\ No newline at end of file
+}
+
+function createTileHuntingLayer(options)
+{
+    if(tileRenderFormat !== 'json')
+    {
+        return L.tileLayer(tileRenderUrl + '/{z}/{x}/{y}.png', options);
+    }
+
+    // tiles are fetched as compact json and drawn client-side instead of loading server-side rendered images
+    const TileHuntingVectorLayer = L.GridLayer.extend({
+        createTile: function(coords, done)
+        {
+            const tile = document.createElement('canvas');
+            const tileSize = this.getTileSize();
+            tile.width = tileSize.x;
+            tile.height = tileSize.y;
+
+            fetch(tileRenderUrl + '/' + coords.z + '/' + coords.x + '/' + coords.y + '.json')
+                .then(response => response.json())
+                .then(data =>
+                {
+                    drawTileHuntingVectorTile(tile, data);
+                    done(null, tile);
+                })
+                .catch(error => done(error, tile));
+
+            return tile;
+        }
+    });
+
+    return new TileHuntingVectorLayer(options);
+}
+
+function drawTileHuntingVectorTile(canvas, data)
+{
+    const context = canvas.getContext('2d');
+    const cellsPerAxis = data.cellsPerAxis;
+    const boxSize = Math.floor(canvas.width / cellsPerAxis);
+    if(boxSize === 0)
+    {
+        return;
+    }
+
+    // squares replace the pixels below them, just like the server-side rendered images
+    function fillRect(color, left, top, width, height)
+    {
+        context.clearRect(left, top, width, height);
+        context.fillStyle = color;
+        context.fillRect(left, top, width, height);
+    }
+
+    function fillCells(deltaEncodedCellIndices, getColor)
+    {
+        let cellIndex = 0;
+        for(let i = 0; i < deltaEncodedCellIndices.length; i++)
+        {
+            cellIndex += deltaEncodedCellIndices[i];
+            const left = (cellIndex % cellsPerAxis) * boxSize;
+            const top = Math.floor(cellIndex / cellsPerAxis) * boxSize;
+            fillRect(getColor(i), left, top, boxSize, boxSize);
+        }
+    }
+
+    fillCells(data.planned, () => data.plannedColor);
+    fillCells(data.visited, i => data.palette[data.visitedColors[i]]);
+
+    const maxSquare = data.maxSquare;
+    if(maxSquare !== null)
+    {
+        fillRect(maxSquare.color, maxSquare.x * boxSize, maxSquare.y * boxSize, maxSquare.width * boxSize, maxSquare.height * boxSize);
+    }
+
+    const grid = data.grid;
+    if(grid !== null)
+    {
+        const size = cellsPerAxis * boxSize;
+        for(let i = 0; i < cellsPerAxis; i++)
+        {
+            const offset = i * boxSize;
+            if(grid.vertical)
+            {
+                fillRect(grid.color, offset, 0, 1, size);
+            }
+            if(grid.horizontal)
+            {
+                fillRect(grid.color, 0, offset, size, 1);
+            }
+        }
+    }
+}
@@ -39,7 +39,7 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
     for(let i = 0; i < gpxInfo.length; i++)
     {
         const info = gpxInfo[i];
-        workouts.push(info['gpxUrl'])
+        workouts.push(info['geometryUrl'])
     }
 
     if(isTileHuntingOverlayEnabled)
@@ -47,13 +47,18 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
         const checkBoxEnableTileHunting = document.getElementById('tileHuntingEnableTiles');
         if(checkBoxEnableTileHunting !== null && checkBoxEnableTileHunting.checked)
         {
-            L.tileLayer(tileRenderUrl + '/{z}/{x}/{y}.png', {
+            createTileHuntingLayer({
                 minZoom: 9,
                 maxZoom: 16
             }).addTo(map);
         }
     }
 
+    // all tracks are loaded with a single request while the map plugins are loading
+    const geometriesPromise = fetchGeometryCollection(GEOMETRY_INITIAL_ZOOM);
+    let numberOfTracksWithGeometry = workouts.length;
+    let loadedRoutes = [];
+
     map.on('plugins_loaded', function(e)
     {
         L.GpxGroup.include({
@@ -79,6 +84,20 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
                     this.unhighlight(route, polyline);
                 }
             },
+            addTrack: function(geometryUrl)
+            {
+                // use the simplified geometry instead of loading the full gpx
+                const gpxInfoForWorkout = gpxInfo.find(info => info.geometryUrl === geometryUrl);
+                geometriesPromise.then(geometriesById =>
+                {
+                    numberOfTracksWithGeometry = Object.keys(geometriesById).length;
+                    const geojson = geometriesById[gpxInfoForWorkout.workoutId];
+                    if(geojson !== undefined)
+                    {
+                        this._loadGeoJSON(geojson, gpxInfoForWorkout.workoutId);
+                    }
+                });
+            },
             _loadGeoJSON: function(geojson, fallbackName)
             {
                 if(geojson)
@@ -87,10 +106,11 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
                     const gpxInfoForWorkout = getGpxInfoById(workoutId);
 
                     geojson.name = '<a href="' + gpxInfoForWorkout.workoutUrl + '" target="_blank" class="map-layer-link" data-name="' + gpxInfoForWorkout.workoutName + '">' + gpxInfoForWorkout.workoutName + '</a>'
-                    this._loadRoute(geojson, gpxInfoForWorkout.gpxUrl);
+                    geojson.workoutId = gpxInfoForWorkout.workoutId;
+                    this._loadRoute(geojson, gpxInfoForWorkout.geometryUrl);
                 }
             },
-            _loadRoute: function(data, gpxUrl)
+            _loadRoute: function(data, geometryUrl)
             {
                 if(!data)
                 {
@@ -98,7 +118,7 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
                 }
 
                 var line_style = {
-                    color: this._uniqueColors(this._tracks.length)[this._tracks.indexOf(gpxUrl)],  // access color by real index in workouts array instead of count of loaded elements
+                    color: this._uniqueColors(this._tracks.length)[this._tracks.indexOf(geometryUrl)],  // access color by real index in workouts array instead of count of loaded elements
                     opacity: 0.75,
                     weight: 5,
                     distanceMarkers: this.options.distanceMarkers_options,
@@ -112,6 +132,10 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
                     filter: feature => feature.geometry.type != "Point",
                 });
 
+                route.workoutId = data.workoutId;
+                route.geometryZoom = data.geometryZoom;
+                loadedRoutes.push(route);
+
                 this._elevation.import(this._elevation.__LGEOMUTIL).then(() =>
                 {
                     route.addTo(this._layers);
@@ -144,6 +168,11 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
 
         routes.addTo(map);
 
+        map.on('zoomend', function()
+        {
+            refineVisibleRoutes(map, loadedRoutes);
+        });
+
         let numberOfLoadedLayers = 0;
         let legendItemAlreadyClicked = false;
         map.on('layeradd', function(evt)
@@ -153,7 +182,7 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
                 numberOfLoadedLayers++;
             }
 
-            if(numberOfLoadedLayers === workouts.length && !legendItemAlreadyClicked)
+            if(numberOfLoadedLayers === numberOfTracksWithGeometry && !legendItemAlreadyClicked)
             {
                 setTimeout(function()
                 {
@@ -212,6 +241,129 @@ function initMap(itemSortFunction, onRouteSelectedCallback, showResetButton, spe
     });
 }
 
+// zoom level of the simplified geometries that are loaded first, finer geometries are loaded on zoom in
+const GEOMETRY_INITIAL_ZOOM = 11;
+
+function fetchGeometryCollection(zoom, workoutIds)
+{
+    let url = geometryCollectionUrl + '?zoom=' + zoom;
+    if(workoutIds !== undefined)
+    {
+        url += '&ids=' + workoutIds.join(',');
+    }
+
+    return fetch(url)
+        .then(response => response.json())
+        .then(geometryCollection =>
+        {
+            let geometriesById = {};
+            geometryCollection.tracks.forEach(track =>
+            {
+                geometriesById[track.id] = createGeoJsonFromGeometry(track.geometry);
+            });
+            return geometriesById;
+        });
+}
+
+function createGeoJsonFromGeometry(geometry)
+{
+    return {
+        type: 'FeatureCollection',
+        geometryZoom: geometry.zoom,
+        features: geometry.segments.map(segment =>
+        {
+            const coordinates = decodePolyline(segment.polyline, 2, 1e5);
+            if(segment.elevations !== null)
+            {
+                const elevations = decodePolyline(segment.elevations, 1, 1e1);
+                for(let i = 0; i < coordinates.length; i++)
+                {
+                    coordinates[i].push(elevations[i][0]);
+                }
+            }
+
+            return {
+                type: 'Feature',
+                properties: {},
+                geometry: {
+                    type: 'LineString',
+                    // GeoJSON expects longitude before latitude
+                    coordinates: coordinates.map(coordinate => [coordinate[1], coordinate[0], ...coordinate.slice(2)])
+                }
+            };
+        })
+    };
+}
+
+function decodePolyline(encoded, numberOfColumns, precision)
+{
+    let values = [];
+    let previous = new Array(numberOfColumns).fill(0);
+    let position = 0;
+    while(position < encoded.length)
+    {
+        let point = [];
+        for(let column = 0; column < numberOfColumns; column++)
+        {
+            let result = 0;
+            let shift = 0;
+            let byte;
+            do
+            {
+                byte = encoded.charCodeAt(position++) - 63;
+                result |= (byte & 0x1f) << shift;
+                shift += 5;
+            } while(byte >= 0x20);
+
+            previous[column] += (result & 1) ? ~(result >> 1) : (result >> 1);
+            point.push(previous[column] / precision);
+        }
+        values.push(point);
+    }
+    return values;
+}
+
+function refineVisibleRoutes(map, loadedRoutes)
+{
+    const zoom = map.getZoom();
+    const bounds = map.getBounds();
+
+    const routesToRefine = loadedRoutes.filter(route =>
+    {
+        return route.geometryZoom < zoom && !route.isLoadingGeometry && bounds.intersects(route.getBounds());
+    });
+    if(routesToRefine.length === 0)
+    {
+        return;
+    }
+
+    routesToRefine.forEach(route => route.isLoadingGeometry = true);
+    fetchGeometryCollection(zoom, routesToRefine.map(route => route.workoutId)).then(geometriesById =>
+    {
+        routesToRefine.forEach(route =>
+        {
+            const geojson = geometriesById[route.workoutId];
+            if(geojson === undefined)
+            {
+                return;
+            }
+
+            const layers = route.getLayers();
+            geojson.features.forEach((feature, index) =>
+            {
+                if(index < layers.length)
+                {
+                    layers[index].setLatLngs(L.GeoJSON.coordsToLatLngs(feature.geometry.coordinates));
+                }
+            });
+            route.geometryZoom = geojson.geometryZoom;
+        });
+    }).finally(() =>
+    {
+        routesToRefine.forEach(route => route.isLoadingGeometry = false);
+    });
+}
+
 const PATTERN_WORKOUT_NAME = /(\d{4}-\d{2}-\d{2} - .*)<\/a>/;
 const PATTERN_PLANNED_TOUR_NAME = /<a.*>(.*)<\/a>/;
 const PATTERN_LONG_DISTANCE_TOUR_STAGE_ORDER = /<a.*>\w+\s(\d+)\s-\s.*<\/a>/;
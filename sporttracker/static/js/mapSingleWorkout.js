@@ -25,7 +25,7 @@ function initMap()
     const checkBoxEnableTileHunting = document.getElementById('tileHuntingEnableTiles');
     if(checkBoxEnableTileHunting !== null && checkBoxEnableTileHunting.checked)
     {
-        L.tileLayer(tileRenderUrl + '/{z}/{x}/{y}.png', {
+        createTileHuntingLayer({
             minZoom: 9,
             maxZoom: 16
         }).addTo(map);
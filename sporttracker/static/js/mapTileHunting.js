@@ -33,7 +33,7 @@ function initMap()
 {
     let map = initMapBase();
 
-    L.tileLayer(tileRenderUrl + '/{z}/{x}/{y}.png', {
+    createTileHuntingLayer({
         minZoom: mapMinZoomLevel,
         maxZoom: 16
     }).addTo(map);
@@ -0,0 +1,50 @@
+import logging
+from typing import Iterable
+
+from sqlalchemy import Connection, Table
+from sqlalchemy.orm import Session, scoped_session
+
+from sporttracker import Constants
+from sporttracker.helpers.DatabaseDialect import DatabaseDialect
+from sporttracker.tileHunting.GpxPlannedTileEntity import GpxPlannedTile
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class BulkTileWriter:
+    """
+    Inserts all tiles of a track with multi-row INSERT statements that ignore already existing tiles.
+
+    Accepts a session as well as a plain connection (e.g. inside migrations) and never commits.
+    The caller is responsible for committing, so that all tiles of a track are written in a single transaction.
+    """
+
+    @staticmethod
+    def insert_visited_tiles(
+        connection: Connection | Session | scoped_session, workoutId: int, tiles: Iterable[tuple[int, int]]
+    ) -> int:
+        rows = [{'workout_id': workoutId, 'x': x, 'y': y} for x, y in tiles]
+        BulkTileWriter.__insert(connection, GpxVisitedTile.__table__, rows)
+        LOGGER.debug(f'Inserted {len(rows)} visited tiles for workout with id {workoutId}')
+        return len(rows)
+
+    @staticmethod
+    def insert_planned_tiles(
+        connection: Connection | Session | scoped_session, plannedTourId: int, tiles: Iterable[tuple[int, int]]
+    ) -> int:
+        rows = [{'planned_tour_id': plannedTourId, 'x': x, 'y': y} for x, y in tiles]
+        BulkTileWriter.__insert(connection, GpxPlannedTile.__table__, rows)
+        LOGGER.debug(f'Inserted {len(rows)} planned tiles for planned tour with id {plannedTourId}')
+        return len(rows)
+
+    @staticmethod
+    def __insert(connection: Connection | Session | scoped_session, table: Table, rows: list[dict[str, int]]) -> None:
+        if not rows:
+            return
+
+        dialectInsert = DatabaseDialect.get_insert_function(connection)
+        chunkSize = DatabaseDialect.get_chunk_size(connection, len(rows[0]))
+        for index in range(0, len(rows), chunkSize):
+            statement = dialectInsert(table).values(rows[index : index + chunkSize])
+            connection.execute(statement.on_conflict_do_nothing())
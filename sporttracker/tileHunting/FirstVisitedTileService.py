@@ -0,0 +1,298 @@
+import logging
+from typing import Any
+
+from sqlalchemy import func, extract, tuple_, or_, and_, exists, literal
+from sqlalchemy.orm import aliased
+
+from sporttracker import Constants
+from sporttracker.db import db
+from sporttracker.helpers.DatabaseDialect import DatabaseDialect
+from sporttracker.tileHunting.GpxFirstVisitedTileEntity import GpxFirstVisitedTile
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class FirstVisitedTileService:
+    """
+    Maintains the table of first visited tiles per user, workout type and year.
+
+    If multiple workouts visit a tile at the same start time, the workout with the lowest id is the first visit.
+    A tile is new for a set of workout types and years if its earliest entry among those types and years
+    belongs to the workout.
+    """
+
+    @staticmethod
+    def add_workout(workout: DistanceWorkout, tiles: list[tuple[int, int]]) -> None:
+        rows = [
+            {
+                'user_id': workout.user_id,
+                'workout_type': workout.type.name,
+                'year': workout.start_time.year,  # type: ignore[attr-defined]
+                'x': x,
+                'y': y,
+                'workout_id': workout.id,
+                'start_time': workout.start_time,
+            }
+            for x, y in tiles
+        ]
+
+        FirstVisitedTileService.__upsert(rows)
+        db.session.commit()
+        LOGGER.debug(f'Updated first visited tiles for {len(rows)} tiles of workout with id {workout.id}')
+
+    @staticmethod
+    def add_workouts(tilesPerWorkout: list[tuple[DistanceWorkout, list[tuple[int, int]]]]) -> None:
+        """
+        Adds the tiles of several workouts (e.g. during a bulk import) with a single commit.
+        Only the earliest visit of each tile among the workouts is upserted, since a single statement must not
+        update the same row twice.
+        """
+        earliestVisits: dict[tuple[int, str, int, int, int], tuple[Any, int]] = {}
+        for workout, tiles in tilesPerWorkout:
+            visit = (workout.start_time, workout.id)
+            for x, y in tiles:
+                key = (workout.user_id, workout.type.name, workout.start_time.year, x, y)  # type: ignore[attr-defined]
+                current = earliestVisits.get(key)
+                if current is None or visit < current:
+                    earliestVisits[key] = visit
+
+        FirstVisitedTileService.__upsert(
+            [
+                {
+                    'user_id': userId,
+                    'workout_type': workoutTypeName,
+                    'year': year,
+                    'x': x,
+                    'y': y,
+                    'workout_id': workoutId,
+                    'start_time': startTime,
+                }
+                for (userId, workoutTypeName, year, x, y), (startTime, workoutId) in earliestVisits.items()
+            ]
+        )
+        db.session.commit()
+        LOGGER.debug(f'Updated first visited tiles for {len(earliestVisits)} tiles of {len(tilesPerWorkout)} workouts')
+
+    @staticmethod
+    def remove_workout(workout: DistanceWorkout) -> None:
+        affectedRows = (
+            GpxFirstVisitedTile.query.with_entities(
+                GpxFirstVisitedTile.user_id,
+                GpxFirstVisitedTile.workout_type,
+                GpxFirstVisitedTile.year,
+                GpxFirstVisitedTile.x,
+                GpxFirstVisitedTile.y,
+            )
+            .filter(GpxFirstVisitedTile.workout_id == workout.id)
+            .all()
+        )
+
+        db.session.execute(GpxFirstVisitedTile.__table__.delete().where(GpxFirstVisitedTile.workout_id == workout.id))
+
+        tilesPerGroup: dict[tuple[int, str, int], list[tuple[int, int]]] = {}
+        for row in affectedRows:
+            tilesPerGroup.setdefault((row[0], row[1], row[2]), []).append((row[3], row[4]))
+
+        for (userId, workoutTypeName, year), tiles in tilesPerGroup.items():
+            FirstVisitedTileService.__recalculate_tiles(userId, workoutTypeName, year, tiles, workout.id)
+
+        db.session.commit()
+        LOGGER.debug(f'Removed first visited tiles of workout with id {workout.id}')
+
+    @staticmethod
+    def update_workout(workout: DistanceWorkout) -> None:
+        """
+        Must be called if the start time of a workout changes as it determines the year and the order of visits.
+        """
+        FirstVisitedTileService.remove_workout(workout)
+
+        tiles = (
+            GpxVisitedTile.query.with_entities(GpxVisitedTile.x, GpxVisitedTile.y)
+            .filter(GpxVisitedTile.workout_id == workout.id)
+            .all()
+        )
+        FirstVisitedTileService.add_workout(workout, [(row[0], row[1]) for row in tiles])
+
+    @staticmethod
+    def get_number_of_new_tiles_per_workout(
+        userId: int, workoutTypes: list[WorkoutType] | None, years: list[int] | None
+    ) -> dict[int, int]:
+        rankedTiles = FirstVisitedTileService.__get_ranked_tiles(userId, workoutTypes, years)
+
+        rows = (
+            db.session.query(rankedTiles.c.workout_id, func.count())
+            .filter(rankedTiles.c.rank == 1)
+            .group_by(rankedTiles.c.workout_id)
+            .all()
+        )
+
+        return {row[0]: row[1] for row in rows}
+
+    @staticmethod
+    def get_number_of_new_tiles_per_workout_type_and_year(
+        userId: int, workoutTypes: list[WorkoutType] | None, years: list[int] | None
+    ) -> dict[tuple[WorkoutType, int], int]:
+        rankedTiles = FirstVisitedTileService.__get_ranked_tiles(userId, workoutTypes, years)
+
+        rows = (
+            db.session.query(rankedTiles.c.workout_type, rankedTiles.c.year, func.count())
+            .filter(rankedTiles.c.rank == 1)
+            .group_by(rankedTiles.c.workout_type, rankedTiles.c.year)
+            .all()
+        )
+
+        return {(WorkoutType[row[0]], row[1]): row[2] for row in rows}
+
+    @staticmethod
+    def get_new_tiles_by_workout(workout: DistanceWorkout) -> list[tuple[int, int]]:
+        """
+        Returns all tiles of the workout that were not visited by any earlier distance workout of the same user.
+        """
+        candidate = aliased(GpxFirstVisitedTile)
+        earlier = aliased(GpxFirstVisitedTile)
+
+        earlierVisitExists = exists().where(
+            earlier.user_id == candidate.user_id,
+            earlier.x == candidate.x,
+            earlier.y == candidate.y,
+            or_(
+                earlier.start_time < candidate.start_time,
+                and_(earlier.start_time == candidate.start_time, earlier.workout_id < candidate.workout_id),
+            ),
+        )
+
+        rows = (
+            db.session.query(candidate.x, candidate.y)
+            .filter(candidate.workout_id == workout.id)
+            .filter(~earlierVisitExists)
+            .all()
+        )
+
+        return [(row[0], row[1]) for row in rows]
+
+    @staticmethod
+    def __get_ranked_tiles(userId: int, workoutTypes: list[WorkoutType] | None, years: list[int] | None) -> Any:
+        """
+        Ranks the first visits of each tile among the given workout types and years.
+        Most tiles are only visited by a single workout type in a single year and are therefore always ranked first.
+        The window function is restricted to the remaining tiles, which have competing first visits.
+        """
+        filters = [GpxFirstVisitedTile.user_id == userId]
+        if workoutTypes is not None:
+            filters.append(GpxFirstVisitedTile.workout_type.in_([t.name for t in workoutTypes]))
+        if years is not None:
+            filters.append(GpxFirstVisitedTile.year.in_(years))
+
+        competingTiles = (
+            db.session.query(GpxFirstVisitedTile.x, GpxFirstVisitedTile.y)
+            .filter(*filters)
+            .group_by(GpxFirstVisitedTile.x, GpxFirstVisitedTile.y)
+            .having(func.count() > 1)
+            .subquery()
+        )
+        isCompetingTile = and_(GpxFirstVisitedTile.x == competingTiles.c.x, GpxFirstVisitedTile.y == competingTiles.c.y)
+
+        uncontestedTiles = (
+            db.session.query(
+                GpxFirstVisitedTile.workout_id.label('workout_id'),
+                GpxFirstVisitedTile.workout_type.label('workout_type'),
+                GpxFirstVisitedTile.year.label('year'),
+                literal(1).label('rank'),
+            )
+            .outerjoin(competingTiles, isCompetingTile)
+            .filter(*filters)
+            .filter(competingTiles.c.x.is_(None))
+        )
+
+        rank = (
+            func.row_number()
+            .over(
+                partition_by=(GpxFirstVisitedTile.x, GpxFirstVisitedTile.y),
+                order_by=(GpxFirstVisitedTile.start_time, GpxFirstVisitedTile.workout_id),
+            )
+            .label('rank')
+        )
+        contestedTiles = (
+            db.session.query(
+                GpxFirstVisitedTile.workout_id.label('workout_id'),
+                GpxFirstVisitedTile.workout_type.label('workout_type'),
+                GpxFirstVisitedTile.year.label('year'),
+                rank,
+            )
+            .join(competingTiles, isCompetingTile)
+            .filter(*filters)
+        )
+
+        return uncontestedTiles.union_all(contestedTiles).subquery()
+
+    @staticmethod
+    def __recalculate_tiles(
+        userId: int, workoutTypeName: str, year: int, tiles: list[tuple[int, int]], excludedWorkoutId: int
+    ) -> None:
+        earliestVisitPerTile: dict[tuple[int, int], tuple[Any, int]] = {}
+
+        # each tile needs two parameters, the remaining parameters are reserved for the other filters
+        chunkSize = DatabaseDialect.get_chunk_size(db.session, 3)
+        for index in range(0, len(tiles), chunkSize):
+            chunk = tiles[index : index + chunkSize]
+            rows = (
+                DistanceWorkout.query.select_from(DistanceWorkout)
+                .join(GpxVisitedTile, GpxVisitedTile.workout_id == DistanceWorkout.id)
+                .with_entities(GpxVisitedTile.x, GpxVisitedTile.y, DistanceWorkout.start_time, DistanceWorkout.id)
+                .filter(DistanceWorkout.user_id == userId)
+                .filter(DistanceWorkout.type == WorkoutType[workoutTypeName])
+                .filter(extract('year', DistanceWorkout.start_time) == year)
+                .filter(DistanceWorkout.id != excludedWorkoutId)
+                .filter(tuple_(GpxVisitedTile.x, GpxVisitedTile.y).in_(chunk))
+                .all()
+            )
+
+            for x, y, startTime, workoutId in rows:
+                current = earliestVisitPerTile.get((x, y))
+                if current is None or (startTime, workoutId) < current:
+                    earliestVisitPerTile[(x, y)] = (startTime, workoutId)
+
+        FirstVisitedTileService.__upsert(
+            [
+                {
+                    'user_id': userId,
+                    'workout_type': workoutTypeName,
+                    'year': year,
+                    'x': x,
+                    'y': y,
+                    'workout_id': workoutId,
+                    'start_time': startTime,
+                }
+                for (x, y), (startTime, workoutId) in earliestVisitPerTile.items()
+            ]
+        )
+
+    @staticmethod
+    def __upsert(rows: list[dict[str, Any]]) -> None:
+        insert = DatabaseDialect.get_insert_function(db.session)
+        chunkSize = DatabaseDialect.get_chunk_size(db.session, len(GpxFirstVisitedTile.__table__.columns))
+
+        for index in range(0, len(rows), chunkSize):
+            statement = insert(GpxFirstVisitedTile).values(rows[index : index + chunkSize])
+            excluded = statement.excluded
+            statement = statement.on_conflict_do_update(
+                index_elements=[
+                    GpxFirstVisitedTile.user_id,
+                    GpxFirstVisitedTile.workout_type,
+                    GpxFirstVisitedTile.year,
+                    GpxFirstVisitedTile.x,
+                    GpxFirstVisitedTile.y,
+                ],
+                set_={'workout_id': excluded.workout_id, 'start_time': excluded.start_time},
+                where=or_(
+                    GpxFirstVisitedTile.start_time > excluded.start_time,
+                    and_(
+                        GpxFirstVisitedTile.start_time == excluded.start_time,
+                        GpxFirstVisitedTile.workout_id > excluded.workout_id,
+                    ),
+                ),
+            )
+            db.session.execute(statement)
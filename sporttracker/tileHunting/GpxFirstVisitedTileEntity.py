@@ -0,0 +1,21 @@
+from sqlalchemy import Integer, DateTime, String, Index
+from sqlalchemy.orm import mapped_column, Mapped
+
+from sporttracker.db import db
+
+
+class GpxFirstVisitedTile(db.Model):  # type: ignore[name-defined]
+    """
+    Stores the earliest distance workout that visited a tile for each user, workout type and year.
+    """
+
+    __tablename__ = 'gpx_first_visited_tile'
+    user_id: Mapped[int] = mapped_column(Integer, nullable=False, primary_key=True)
+    workout_type: Mapped[str] = mapped_column(String, nullable=False, primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, nullable=False, primary_key=True)
+    x: Mapped[int] = mapped_column(Integer, nullable=False, primary_key=True)
+    y: Mapped[int] = mapped_column(Integer, nullable=False, primary_key=True)
+    workout_id: Mapped[int] = mapped_column(Integer, nullable=False, index=True)
+    start_time: Mapped[DateTime] = mapped_column(DateTime, nullable=False)
+
+    __table_args__ = (Index('ix_gpx_first_visited_tile_user_id_x_y', 'user_id', 'x', 'y'),)
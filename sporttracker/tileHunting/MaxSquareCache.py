@@ -1,8 +1,14 @@
+import heapq
 import logging
+import sys
+from dataclasses import dataclass
 
 from sqlalchemy import extract
 
 from sporttracker import Constants
+from sporttracker.helpers.BoundedCache import BoundedCache, CacheStatistics
+from sporttracker.helpers.SharedCacheBackend import SharedCacheBackend, SharedCacheNamespace
+from sporttracker.helpers.SingleFlight import SingleFlight
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
 from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
 from sporttracker.workout.WorkoutType import WorkoutType
@@ -10,9 +16,121 @@ from sporttracker.workout.WorkoutType import WorkoutType
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
 
+@dataclass(frozen=True)
+class MaxSquare:
+    x: int
+    y: int
+    size: int
+
+    def contains(self, x: int, y: int) -> bool:
+        return self.x <= x < self.x + self.size and self.y <= y < self.y + self.size
+
+    def get_tile_positions(self) -> list[tuple[int, int]]:
+        return [(self.x + dx, self.y + dy) for dx in range(self.size) for dy in range(self.size)]
+
+
+class MaxSquareState:
+    """
+    Keeps the size of the largest fully visited square that ends at each visited tile (as lower right corner).
+
+    The size for a tile only depends on its upper, left and upper left neighbour.
+    Therefore, adding tiles only requires to update the sizes of the new tiles and of the tiles to the lower right
+    of them whose size actually changes.
+    """
+
+    ESTIMATED_SIZE_PER_TILE = 150
+
+    def __init__(self, userId: int, workoutTypes: list[WorkoutType], years: list[int]) -> None:
+        self.userId = userId
+        self._workoutTypes = set(workoutTypes)
+        self._years = set(years)
+        self._sizes: dict[tuple[int, int], int] = {}
+        self.maxSquare: MaxSquare | None = None
+
+    def is_matching(self, workoutType: WorkoutType, year: int) -> bool:
+        return workoutType in self._workoutTypes and year in self._years
+
+    def estimate_size(self) -> int:
+        # every tile is stored as tuple of two integers plus its slot in the dictionary
+        return sys.getsizeof(self._sizes) + len(self._sizes) * MaxSquareState.ESTIMATED_SIZE_PER_TILE
+
+    def add_tiles(self, tiles: list[tuple[int, int]]) -> None:
+        newTiles = sorted({tile for tile in tiles if tile not in self._sizes})
+        if not newTiles:
+            return
+
+        if not self._sizes:
+            # initial calculation: all predecessors of a tile are processed before the tile itself
+            for tile in newTiles:
+                self.__update_size(tile)
+            return
+
+        for tile in newTiles:
+            self._sizes[tile] = 0
+
+        # process all affected tiles in ascending order, so that all predecessors are already up-to-date
+        queuedTiles = set(newTiles)
+        heapq.heapify(newTiles)
+        while newTiles:
+            tile = heapq.heappop(newTiles)
+            queuedTiles.remove(tile)
+
+            if not self.__update_size(tile):
+                continue
+
+            x, y = tile
+            for successor in ((x + 1, y), (x, y + 1), (x + 1, y + 1)):
+                if successor in self._sizes and successor not in queuedTiles:
+                    queuedTiles.add(successor)
+                    heapq.heappush(newTiles, successor)
+
+    def __update_size(self, tile: tuple[int, int]) -> bool:
+        x, y = tile
+        size = 1 + min(
+            self._sizes.get((x - 1, y), 0),
+            self._sizes.get((x, y - 1), 0),
+            self._sizes.get((x - 1, y - 1), 0),
+        )
+
+        if self._sizes.get(tile) == size:
+            return False
+
+        self._sizes[tile] = size
+
+        if self.maxSquare is None or size > self.maxSquare.size:
+            self.maxSquare = MaxSquare(x - size + 1, y - size + 1, size)
+        elif size == self.maxSquare.size:
+            # prefer the square with the smallest origin to get stable results
+            if (x - size + 1, y - size + 1) < (self.maxSquare.x, self.maxSquare.y):
+                self.maxSquare = MaxSquare(x - size + 1, y - size + 1, size)
+
+        return True
+
+
 class MaxSquareCache:
-    def __init__(self) -> None:
-        self._max_square_tile_positions: dict[str, list[tuple[int, int]]] = {}
+    """
+    Concurrent requests for the same missing entry calculate it only once (single-flight).
+    Every change of a user's tiles increases the user's generation, so that a calculation that was started before
+    the change is not stored.
+
+    The states are kept in a BoundedCache, so the least recently used states are evicted once the size budget is
+    exceeded.
+    With a SharedCacheBackend, calculated states are shared with other SportTracker processes and changes of a user's
+    tiles invalidate the states of this user in all processes.
+    """
+
+    def __init__(
+        self,
+        maxSize: int = 128 * 1024 * 1024,
+        timeToLive: float | None = None,
+        sharedCacheBackend: SharedCacheBackend | None = None,
+    ) -> None:
+        self._states: BoundedCache[str, MaxSquareState] = BoundedCache(
+            'maxSquareCache', maxSize, MaxSquareState.estimate_size, timeToLive
+        )
+        self._generations: dict[int, int] = {}
+        self._singleFlight: SingleFlight[MaxSquareState] = SingleFlight()
+        self._sharedStates = SharedCacheNamespace(sharedCacheBackend, 'maxSquareCache', self.__invalidate_locally)
 
     @staticmethod
     def __calculate_cache_key(user_id: int, workout_types: list[WorkoutType], years: list[int]) -> str:
@@ -20,27 +138,69 @@ class MaxSquareCache:
         active_years = '_'.join(sorted([str(y) for y in years]))
         return f'{user_id}_{active_types}_{active_years}'
 
-    def get_max_square_tile_positions(
-        self, userId: int, workoutTypes: list[WorkoutType], years: list[int]
-    ) -> list[tuple[int, int]]:
+    def get_max_square(self, userId: int, workoutTypes: list[WorkoutType], years: list[int]) -> MaxSquare | None:
         cacheKey = self.__calculate_cache_key(userId, workoutTypes, years)
 
-        if cacheKey not in self._max_square_tile_positions:
-            LOGGER.debug(f'Creating entry in MaxSquareCache with key {cacheKey}')
-            self._max_square_tile_positions[cacheKey] = self.__determine_max_square_tile_positions(
-                userId, workoutTypes, years
+        state = self._states.get(cacheKey)
+        if state is None:
+            generation = self._generations.get(userId, 0)
+            state = self._singleFlight.run(
+                f'{cacheKey}#{generation}',
+                lambda: self.__create_state(cacheKey, generation, userId, workoutTypes, years),
             )
 
-        return self._max_square_tile_positions[cacheKey]
+        return state.maxSquare
+
+    def add_visited_tiles(self, userId: int, workoutType: WorkoutType, year: int, tiles: list[tuple[int, int]]) -> None:
+        self.__increase_generation(userId)
+
+        for key, state in self._states.get_entries_by_user(userId):
+            if state.is_matching(workoutType, year):
+                LOGGER.debug(f'Adding {len(tiles)} tiles to MaxSquareCache with key {key}')
+                state.add_tiles(tiles)
+                self._states.update_size(key)
+
+        if self._sharedStates.is_enabled():
+            # other processes discard their states of this user and can use the updated states of this process
+            sharedGeneration = self._sharedStates.invalidate(userId)
+            for key, state in self._states.get_entries_by_user(userId):
+                self._sharedStates.store(userId, key, sharedGeneration, state)
 
     def invalidate_cache_entry_by_user(self, userId: int) -> None:
-        for key in list(self._max_square_tile_positions.keys()):
-            if key.startswith(f'{userId}_'):
-                LOGGER.debug(f'Invalidating MaxSquareCache with key with id {key}')
-                del self._max_square_tile_positions[key]
+        self.__invalidate_locally(userId)
+        self._sharedStates.invalidate(userId)
+
+    def get_statistics(self) -> CacheStatistics:
+        return self._states.get_statistics()
+
+    def __create_state(
+        self, cacheKey: str, generation: int, userId: int, workoutTypes: list[WorkoutType], years: list[int]
+    ) -> MaxSquareState:
+        sharedGeneration, state = self._sharedStates.load(userId, cacheKey)
+        if state is None:
+            LOGGER.debug(f'Creating entry in MaxSquareCache with key {cacheKey}')
+            state = MaxSquareState(userId, workoutTypes, years)
+            state.add_tiles(self.__determine_visited_tiles(userId, workoutTypes, years))
+            self._sharedStates.store(userId, cacheKey, sharedGeneration, state)
+
+        if self._generations.get(userId, 0) == generation:
+            self._states.put(userId, cacheKey, state)
+        else:
+            LOGGER.debug(f'Discarding outdated entry in MaxSquareCache with key {cacheKey}')
+
+        return state
+
+    def __increase_generation(self, userId: int) -> None:
+        self._generations[userId] = self._generations.get(userId, 0) + 1
+
+    def __invalidate_locally(self, userId: int) -> None:
+        self.__increase_generation(userId)
+
+        numberOfEntries = self._states.invalidate_by_user(userId)
+        LOGGER.debug(f'Invalidated {numberOfEntries} entries in MaxSquareCache for user {userId}')
 
     @staticmethod
-    def __determine_max_square_tile_positions(
+    def __determine_visited_tiles(
         user_id: int, workout_types: list[WorkoutType], years: list[int]
     ) -> list[tuple[int, int]]:
         all_visited_tiles = (
@@ -51,26 +211,13 @@ class MaxSquareCache:
             .filter(DistanceWorkout.type.in_(workout_types))
             .filter(extract('year', DistanceWorkout.start_time).in_(years))
             .distinct()
-            .order_by(GpxVisitedTile.x, GpxVisitedTile.y)
             .all()
         )
 
-        return MaxSquareCache._calculate_max_square([(row[0], row[1]) for row in all_visited_tiles])
+        return [(row[0], row[1]) for row in all_visited_tiles]
 
     @staticmethod
-    def _calculate_max_square(tiles: list[tuple[int, int]]) -> list[tuple[int, int]]:
-        max_size = 0
-        square_tile_positions = []
-
-        for x, y in tiles:
-            # Try squares of increasing size starting from 1
-            for size in range(1, min(len(tiles), max(x, y)) + 2):
-                all_positions_in_square = [(x + dx, y + dy) for dx in range(size) for dy in range(size)]
-                if not all([t in tiles for t in all_positions_in_square]):
-                    break
-
-                if size > max_size:
-                    max_size = size
-                    square_tile_positions = all_positions_in_square
-
-        return square_tile_positions
+    def _calculate_max_square(tiles: list[tuple[int, int]]) -> MaxSquare | None:
+        state = MaxSquareState(0, [], [])
+        state.add_tiles(tiles)
+        return state.maxSquare
@@ -1,12 +1,17 @@
 import logging
+import sys
 from dataclasses import dataclass
 from datetime import datetime
 
-from sqlalchemy import text
+from sqlalchemy import extract
 
 from sporttracker import Constants
+from sporttracker.helpers.BoundedCache import BoundedCache, CacheStatistics
+from sporttracker.helpers.SharedCacheBackend import SharedCacheBackend, SharedCacheNamespace
+from sporttracker.helpers.SingleFlight import SingleFlight
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
 from sporttracker.workout.WorkoutType import WorkoutType
-from sporttracker.db import db
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
 
@@ -21,8 +26,32 @@ class NewTilesPerDistanceWorkout:
 
 
 class NewVisitedTileCache:
-    def __init__(self) -> None:
-        self._newVisitedTilesPerUser: dict[str, list[NewTilesPerDistanceWorkout]] = {}
+    """
+    Concurrent requests for the same missing entry calculate it only once (single-flight).
+    Every invalidation increases the user's generation, so that a calculation that was started before the
+    invalidation is not stored.
+
+    The entries are kept in a BoundedCache, so the least recently used entries are evicted once the size budget is
+    exceeded.
+    With a SharedCacheBackend, calculated entries are shared with other SportTracker processes and invalidations
+    are applied in all processes.
+    """
+
+    # instance, attribute dictionary, start time and integers of a NewTilesPerDistanceWorkout (without the name)
+    ESTIMATED_SIZE_PER_WORKOUT = 450
+
+    def __init__(
+        self,
+        maxSize: int = 32 * 1024 * 1024,
+        timeToLive: float | None = None,
+        sharedCacheBackend: SharedCacheBackend | None = None,
+    ) -> None:
+        self._newVisitedTilesPerUser: BoundedCache[str, list[NewTilesPerDistanceWorkout]] = BoundedCache(
+            'newVisitedTileCache', maxSize, self.__estimate_size, timeToLive
+        )
+        self._generations: dict[int, int] = {}
+        self._singleFlight: SingleFlight[list[NewTilesPerDistanceWorkout]] = SingleFlight()
+        self._sharedEntries = SharedCacheNamespace(sharedCacheBackend, 'newVisitedTileCache', self.__invalidate_locally)
 
     @staticmethod
     def __calculate_cache_key(userId: int, workoutTypes: list[WorkoutType], years: list[int]) -> str:
@@ -35,67 +64,76 @@ class NewVisitedTileCache:
     ) -> list[NewTilesPerDistanceWorkout]:
         cacheKey = self.__calculate_cache_key(userId, workoutTypes, years)
 
-        if cacheKey not in self._newVisitedTilesPerUser:
-            LOGGER.debug(f'Creating entry in NewVisitedTileCache with key {cacheKey}')
-            self._newVisitedTilesPerUser[cacheKey] = self.__determine_number_of_new_tiles_per_workout(
-                userId, workoutTypes, years
+        newVisitedTiles = self._newVisitedTilesPerUser.get(cacheKey)
+        if newVisitedTiles is None:
+            generation = self._generations.get(userId, 0)
+            newVisitedTiles = self._singleFlight.run(
+                f'{cacheKey}#{generation}',
+                lambda: self.__create_entry(cacheKey, generation, userId, workoutTypes, years),
             )
 
-        return self._newVisitedTilesPerUser[cacheKey]
+        return newVisitedTiles
 
     def invalidate_cache_entry_by_user(self, userId: int) -> None:
-        for key in list(self._newVisitedTilesPerUser.keys()):
-            if key.startswith(f'{userId}_'):
-                LOGGER.debug(f'Invalidating NewVisitedTileCache with key with id {key}')
-                del self._newVisitedTilesPerUser[key]
+        self.__invalidate_locally(userId)
+        self._sharedEntries.invalidate(userId)
+
+    def get_statistics(self) -> CacheStatistics:
+        return self._newVisitedTilesPerUser.get_statistics()
+
+    def __create_entry(
+        self, cacheKey: str, generation: int, userId: int, workoutTypes: list[WorkoutType], years: list[int]
+    ) -> list[NewTilesPerDistanceWorkout]:
+        sharedGeneration, newVisitedTiles = self._sharedEntries.load(userId, cacheKey)
+        if newVisitedTiles is None:
+            LOGGER.debug(f'Creating entry in NewVisitedTileCache with key {cacheKey}')
+            newVisitedTiles = self.__determine_number_of_new_tiles_per_workout(userId, workoutTypes, years)
+            self._sharedEntries.store(userId, cacheKey, sharedGeneration, newVisitedTiles)
+
+        if self._generations.get(userId, 0) == generation:
+            self._newVisitedTilesPerUser.put(userId, cacheKey, newVisitedTiles)
+        else:
+            LOGGER.debug(f'Discarding outdated entry in NewVisitedTileCache with key {cacheKey}')
+
+        return newVisitedTiles
+
+    def __invalidate_locally(self, userId: int) -> None:
+        self._generations[userId] = self._generations.get(userId, 0) + 1
+
+        numberOfEntries = self._newVisitedTilesPerUser.invalidate_by_user(userId)
+        LOGGER.debug(f'Invalidated {numberOfEntries} entries in NewVisitedTileCache for user {userId}')
+
+    @staticmethod
+    def __estimate_size(entries: list[NewTilesPerDistanceWorkout]) -> int:
+        return sys.getsizeof(entries) + sum(
+            NewVisitedTileCache.ESTIMATED_SIZE_PER_WORKOUT + sys.getsizeof(entry.name) for entry in entries
+        )
 
     @staticmethod
     def __determine_number_of_new_tiles_per_workout(
         userId: int, workoutTypes: list[WorkoutType], years: list[int]
     ) -> list[NewTilesPerDistanceWorkout]:
-        workoutTypeOperator = ''
-        workoutTypeOperator2 = ''
+        query = (
+            DistanceWorkout.query.with_entities(
+                DistanceWorkout.id, DistanceWorkout.type, DistanceWorkout.name, DistanceWorkout.start_time
+            )
+            .filter(DistanceWorkout.user_id == userId)
+            .filter(DistanceWorkout.gpx_metadata_id.isnot(None))
+        )
+
         if workoutTypes:
-            activeWorkoutTypes = ','.join([f"'{x.name}'" for x in workoutTypes])
-            workoutTypeOperator = f'AND w_inner."type" in ({activeWorkoutTypes})'
-            workoutTypeOperator2 = f'AND w."type" in ({activeWorkoutTypes})'
+            query = query.filter(DistanceWorkout.type.in_(workoutTypes))
 
-        yearOperator = ''
-        yearOperator2 = ''
         if years:
-            activeYears = ','.join([f"'{x}'" for x in years])
-            yearOperator = f'AND EXTRACT(year FROM w_inner."start_time") in ({activeYears})'
-            yearOperator2 = f'AND EXTRACT(year FROM w."start_time") in ({activeYears})'
-
-        rows = db.session.execute(
-            text(f"""SELECT t."id",
-               w."type",
-               w."name",
-               w."start_time",
-               (SELECT count(*)
-                FROM gpx_visited_tile
-                WHERE gpx_visited_tile."workout_id" = t."id"
-                  AND NOT EXISTS (SELECT
-                                  FROM distance_workout AS prev
-                                           join gpx_visited_tile AS visitied ON prev."id" = visitied."workout_id"
-                                  JOIN workout w_inner ON prev."id" = w_inner."id"
-                                  WHERE w_inner."start_time" < w."start_time"
-                                    AND w_inner."user_id" = w."user_id"
-                                    AND gpx_visited_tile."x" = visitied."x"
-                                    AND gpx_visited_tile."y" = visitied."y"
-                                    {workoutTypeOperator}
-                                    {yearOperator}
-                                    )) AS newTiles
-        FROM distance_workout AS t
-        JOIN workout w ON t."id" = w."id"
-        WHERE t."gpx_metadata_id" IS NOT NULL
-        AND w."user_id" = {userId}
-        {workoutTypeOperator2}
-        {yearOperator2}
-        ORDER BY w."start_time\"""")
-        ).fetchall()
+            query = query.filter(extract('year', DistanceWorkout.start_time).in_(years))
+
+        rows = query.order_by(DistanceWorkout.start_time).all()
+
+        numberOfNewTilesPerWorkout = FirstVisitedTileService.get_number_of_new_tiles_per_workout(
+            userId, workoutTypes if workoutTypes else None, years if years else None
+        )
 
         return [
-            NewTilesPerDistanceWorkout(row[0], WorkoutType(row[1]), row[2], row[3], row[4])  # type: ignore[call-arg]
+            NewTilesPerDistanceWorkout(row[0], row[1], row[2], row[3], numberOfNewTilesPerWorkout.get(row[0], 0))
             for row in rows
         ]
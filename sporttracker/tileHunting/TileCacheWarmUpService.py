@@ -0,0 +1,68 @@
+import logging
+import threading
+
+from flask import Flask, current_app, has_app_context
+from sqlalchemy import extract
+
+from sporttracker import Constants
+from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
+from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+class TileCacheWarmUpService:
+    """
+    Precomputes the entries of the NewVisitedTileCache and the MaxSquareCache for the default filter (all distance
+    workout types and all available years) in the background after the visited tiles of a user have changed.
+    Requests that arrive during the warm-up wait for its result instead of calculating the same entry again.
+    """
+
+    def __init__(
+        self, newVisitedTileCache: NewVisitedTileCache, maxSquareCache: MaxSquareCache, isEnabled: bool
+    ) -> None:
+        self._newVisitedTileCache = newVisitedTileCache
+        self._maxSquareCache = maxSquareCache
+        self._isEnabled = isEnabled
+
+    def start_warm_up(self, userId: int) -> bool:
+        """
+        Starts the warm-up for the user in a background thread.
+        Returns False if the warm-up is disabled or no app context is available.
+        """
+        if not self._isEnabled or not has_app_context():
+            return False
+
+        app = current_app._get_current_object()  # type: ignore[attr-defined]
+        threading.Thread(target=self.__warm_up_in_background, args=(app, userId), daemon=True).start()
+        return True
+
+    def warm_up(self, userId: int) -> None:
+        workoutTypes = WorkoutType.get_distance_workout_types()
+        years = self.__determine_available_years(userId)
+
+        LOGGER.debug(f'Warming up tile hunting caches for user {userId}')
+        self._newVisitedTileCache.get_number_of_new_visited_tiles_per_workout_by_user(userId, workoutTypes, years)
+        self._maxSquareCache.get_max_square(userId, workoutTypes, years)
+
+    def __warm_up_in_background(self, app: Flask, userId: int) -> None:
+        try:
+            with app.app_context():
+                self.warm_up(userId)
+        except Exception as e:
+            LOGGER.error(f'Failed to warm up tile hunting caches for user {userId}: {e}')
+
+    @staticmethod
+    def __determine_available_years(userId: int) -> list[int]:
+        year = extract('year', DistanceWorkout.start_time)
+        rows = (
+            DistanceWorkout.query.with_entities(year.label('year'))
+            .filter(DistanceWorkout.user_id == userId)
+            .group_by(year)
+            .order_by(year)
+            .all()
+        )
+
+        return [int(row.year) for row in rows]
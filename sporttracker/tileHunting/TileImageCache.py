@@ -0,0 +1,256 @@
+import hashlib
+import logging
+import os
+import threading
+import uuid
+from dataclasses import dataclass
+from typing import Any
+
+from sporttracker import Constants
+from sporttracker.helpers.BoundedCache import BoundedCache, CacheStatistics
+from sporttracker.helpers.SharedCacheBackend import SharedCacheBackend, SharedCacheNamespace
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+@dataclass(frozen=True)
+class TileImageCacheKey:
+    userId: int
+    generation: int
+    renderMode: str
+    filterStateHash: str
+    zoom: int
+    x: int
+    y: int
+
+
+class TileImageCache:
+    """
+    Bounded cache for rendered tile hunting PNG images.
+
+    Entries are kept in memory in least-recently-used order and can optionally be written to disk as second tier.
+    Every key contains a per-user generation counter that is increased whenever the tiles of a user change.
+    Therefore, images rendered before a change can never be served afterwards, even if a render with the old
+    generation finishes after the invalidation.
+
+    The disk tier may be shared by several processes. Its files are stored below a per-user disk generation that is
+    persisted next to them (<folder>/<userId>/generation) and replaced on every invalidation, so images of a previous
+    run stay valid until the tiles of the user change and outdated images are never read again.
+    The disk tier is bounded by its size in bytes, the least recently used files are removed first.
+    With a SharedCacheBackend, invalidations are applied in all SportTracker processes.
+    """
+
+    DISK_GENERATION_FILE_NAME = 'generation'
+
+    def __init__(
+        self,
+        maxNumberOfEntries: int,
+        diskCacheFolder: str | None = None,
+        maxDiskSizeInBytes: int = 512 * 1024 * 1024,
+        sharedCacheBackend: SharedCacheBackend | None = None,
+    ) -> None:
+        self._diskCacheFolder = diskCacheFolder
+        # each image counts as one, so the budget is the maximum number of entries
+        self._images: BoundedCache[TileImageCacheKey, bytes] = BoundedCache(
+            'tileImageCache', maxNumberOfEntries, lambda image: 1
+        )
+        self._generationPerUser: dict[int, int] = {}
+
+        self._diskLock = threading.Lock()
+        self._diskGenerationPerUser: dict[int, str] = {}
+        self._diskFiles: BoundedCache[str, int] = BoundedCache(
+            'tileImageDiskCache', maxDiskSizeInBytes, lambda size: size, onEviction=self.__remove_disk_file
+        )
+
+        if self._diskCacheFolder is not None:
+            os.makedirs(self._diskCacheFolder, exist_ok=True)
+            self.__index_disk_files()
+
+        self._sharedInvalidations = SharedCacheNamespace(
+            sharedCacheBackend, 'tileImageCache', self.__invalidate_after_remote_invalidation
+        )
+
+    @staticmethod
+    def calculate_filter_state_hash(values: list[Any]) -> str:
+        return hashlib.sha1(repr(values).encode('utf-8')).hexdigest()
+
+    def create_key(
+        self, userId: int, renderMode: str, filterStateHash: str, zoom: int, x: int, y: int
+    ) -> TileImageCacheKey:
+        return TileImageCacheKey(userId, self.get_generation(userId), renderMode, filterStateHash, zoom, x, y)
+
+    def get_generation(self, userId: int) -> int:
+        return self._generationPerUser.get(userId, 0)
+
+    def get(self, key: TileImageCacheKey) -> bytes | None:
+        image = self._images.get(key)
+        if image is not None:
+            return image
+
+        if self._diskCacheFolder is None:
+            return None
+
+        filePath = self.__get_disk_cache_file_path(key)
+        try:
+            with open(filePath, 'rb') as f:
+                image = f.read()
+        except OSError:
+            return None
+
+        # the file may have been written by another process
+        self._diskFiles.put(key.userId, filePath, len(image))
+        self.__put_in_memory(key, image)
+        return image
+
+    def put(self, key: TileImageCacheKey, image: bytes) -> None:
+        if key.generation != self.get_generation(key.userId):
+            # tiles changed while rendering
+            return
+
+        self.__put_in_memory(key, image)
+
+        if self._diskCacheFolder is None:
+            return
+
+        filePath = self.__get_disk_cache_file_path(key)
+        try:
+            os.makedirs(os.path.dirname(filePath), exist_ok=True)
+            temporaryFilePath = f'{filePath}.{os.getpid()}.tmp'
+            with open(temporaryFilePath, 'wb') as f:
+                f.write(image)
+            os.replace(temporaryFilePath, filePath)
+        except OSError as e:
+            LOGGER.error(f'Could not write tile image to disk cache: {e}')
+            return
+
+        self._diskFiles.put(key.userId, filePath, len(image))
+
+    def invalidate_cache_entry_by_user(self, userId: int) -> None:
+        self.__invalidate_locally(userId, False)
+        self._sharedInvalidations.invalidate(userId)
+
+    def get_number_of_entries(self) -> int:
+        return self._images.get_statistics().numberOfEntries
+
+    def get_disk_size(self) -> int:
+        return self._diskFiles.get_statistics().size
+
+    def get_statistics(self) -> list[CacheStatistics]:
+        return [self._images.get_statistics(), self._diskFiles.get_statistics()]
+
+    def __invalidate_after_remote_invalidation(self, userId: int) -> None:
+        self.__invalidate_locally(userId, True)
+
+    def __invalidate_locally(self, userId: int, isRemoteInvalidation: bool) -> None:
+        self._generationPerUser[userId] = self.get_generation(userId) + 1
+        LOGGER.debug(f'Invalidating TileImageCache for user {userId}')
+
+        self._images.invalidate_by_user(userId)
+
+        if self._diskCacheFolder is not None:
+            self.__invalidate_disk_files(userId, isRemoteInvalidation)
+
+    def __put_in_memory(self, key: TileImageCacheKey, image: bytes) -> None:
+        self._images.put(key.userId, key, image)
+
+    def __get_disk_cache_file_path(self, key: TileImageCacheKey) -> str:
+        return os.path.join(
+            self.__get_user_folder(key.userId),
+            self.__get_disk_generation(key.userId),
+            f'{key.renderMode}_{key.filterStateHash}',
+            str(key.zoom),
+            f'{key.x}_{key.y}.png',
+        )
+
+    def __get_user_folder(self, userId: int) -> str:
+        return os.path.join(self._diskCacheFolder, str(userId))  # type: ignore[arg-type]
+
+    def __get_disk_generation(self, userId: int) -> str:
+        diskGeneration = self._diskGenerationPerUser.get(userId)
+        if diskGeneration is not None:
+            return diskGeneration
+
+        with self._diskLock:
+            diskGeneration = self.__read_disk_generation(userId)
+            if diskGeneration is None:
+                diskGeneration = self.__write_new_disk_generation(userId)
+
+            self._diskGenerationPerUser[userId] = diskGeneration
+            return diskGeneration
+
+    def __read_disk_generation(self, userId: int) -> str | None:
+        try:
+            with open(os.path.join(self.__get_user_folder(userId), self.DISK_GENERATION_FILE_NAME)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def __write_new_disk_generation(self, userId: int) -> str:
+        diskGeneration = uuid.uuid4().hex
+        filePath = os.path.join(self.__get_user_folder(userId), self.DISK_GENERATION_FILE_NAME)
+        try:
+            os.makedirs(os.path.dirname(filePath), exist_ok=True)
+            temporaryFilePath = f'{filePath}.{os.getpid()}.tmp'
+            with open(temporaryFilePath, 'w') as f:
+                f.write(diskGeneration)
+            os.replace(temporaryFilePath, filePath)
+        except OSError as e:
+            # images are still written below the new generation, they just aren't reused after a restart
+            LOGGER.error(f'Could not write disk generation of tile image cache: {e}')
+
+        return diskGeneration
+
+    def __invalidate_disk_files(self, userId: int, isRemoteInvalidation: bool) -> None:
+        with self._diskLock:
+            diskGeneration = None
+            if isRemoteInvalidation:
+                # a process sharing the disk folder has already replaced the disk generation
+                storedDiskGeneration = self.__read_disk_generation(userId)
+                if storedDiskGeneration != self._diskGenerationPerUser.get(userId):
+                    diskGeneration = storedDiskGeneration
+
+            if diskGeneration is None:
+                diskGeneration = self.__write_new_disk_generation(userId)
+            self._diskGenerationPerUser[userId] = diskGeneration
+
+        # the images of previous generations are outdated for all processes
+        currentFolder = os.path.join(self.__get_user_folder(userId), diskGeneration) + os.sep
+        entries = self._diskFiles.get_entries_by_user(userId)
+        self._diskFiles.invalidate_by_user(userId)
+        for filePath, size in entries:
+            if filePath.startswith(currentFolder):
+                # already written by another process after the invalidation
+                self._diskFiles.put(userId, filePath, size)
+            else:
+                self.__remove_disk_file(filePath)
+
+    @staticmethod
+    def __remove_disk_file(filePath: str, size: int | None = None) -> None:
+        try:
+            os.remove(filePath)
+        except OSError:
+            pass
+
+    def __index_disk_files(self) -> None:
+        """
+        Adds the images of previous runs and other processes to the size budget, oldest first.
+        """
+        files = []
+        for entry in os.scandir(self._diskCacheFolder):  # type: ignore[arg-type]
+            if not entry.is_dir() or not entry.name.isdigit():
+                continue
+
+            for directoryPath, _, fileNames in os.walk(entry.path):
+                for fileName in fileNames:
+                    if not fileName.endswith('.png'):
+                        continue
+
+                    filePath = os.path.join(directoryPath, fileName)
+                    try:
+                        fileStatus = os.stat(filePath)
+                    except OSError:
+                        continue
+                    files.append((fileStatus.st_mtime, int(entry.name), filePath, fileStatus.st_size))
+
+        for _, userId, filePath, size in sorted(files):
+            self._diskFiles.put(userId, filePath, size)
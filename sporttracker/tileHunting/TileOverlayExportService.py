@@ -0,0 +1,549 @@
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterator
+
+from PIL import ImageColor
+from flask import Flask
+
+from sporttracker import Constants
+from sporttracker.quickFilter.QuickFilterStateEntity import QuickFilterState
+from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
+from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
+from sporttracker.tileHunting.TileHuntingFilterStateEntity import TileHuntingFilterState
+from sporttracker.tileHunting.TilePyramidCache import TilePyramidCache
+from sporttracker.tileHunting.TileRenderService import TileRenderService, TileRenderColorMode
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache, PackedTileIndex
+from sporttracker.tileHunting.VisitedTileService import VisitedTileService
+from sporttracker.user import CustomWorkoutFieldEntity  # noqa: F401 (required to configure all mappers in workers)
+from sporttracker.user.UserEntity import get_user_by_id
+from sporttracker.workout.heartRate import HeartRateEntity  # noqa: F401 (required to configure all mappers in workers)
+from sporttracker.workout.WorkoutType import WorkoutType
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+TILE_SIZE = 256
+
+# state of a base zoom tile that was not visited but is part of a planned tour (visited tiles store their type mask)
+PLANNED_TILE_STATE = 1 << 15
+
+# (zoom, metaTileX, metaTileY, tilePositions)
+RenderTask = tuple[int, int, int, list[tuple[int, int]]]
+
+
+@dataclass
+class TileOverlayExportResult:
+    numberOfRenderedTiles: int
+    numberOfDeletedTiles: int
+    isIncremental: bool
+    duration: float
+
+
+@dataclass
+class TileOverlayExportInfo:
+    fileSize: int
+    modificationDate: datetime
+    isOutdated: bool
+
+
+class TileOverlayRenderer:
+    """
+    Renders the shared tile hunting overlay of a user without database access.
+    All visited and planned tiles are passed in, so that the renderer can be created inside a worker process.
+    """
+
+    def __init__(
+        self,
+        baseZoomLevel: int,
+        minZoomLevel: int,
+        borderColor: str,
+        metaTileSize: int,
+        userId: int,
+        visitedEntries: list[tuple[int, int, int, int, int]],
+        plannedEntries: list[tuple[int, int, int, int, int]],
+        showPlanned: bool,
+    ) -> None:
+        self._metaTileSize = metaTileSize
+        self._userId = userId
+        self._borderColor = ImageColor.getcolor(borderColor, 'RGBA')
+
+        visitedTileIndexCache = VisitedTileIndexCache()
+        visitedTileIndexCache.put_visited_tile_index(userId, PackedTileIndex(list(visitedEntries)))
+        visitedTileIndexCache.put_planned_tile_index(userId, PackedTileIndex(list(plannedEntries)))
+        tilePyramidCache = TilePyramidCache(baseZoomLevel, minZoomLevel, visitedTileIndexCache)
+
+        # same filters as the shared overlay route
+        tileHuntingFilterState = TileHuntingFilterState().reset()
+        tileHuntingFilterState.is_show_max_square_active = False  # type: ignore[assignment]
+        tileHuntingFilterState.is_show_planned_tiles_active = showPlanned  # type: ignore[assignment]
+        quickFilterState = QuickFilterState().reset(sorted({entry[3] for entry in visitedEntries}))
+
+        visitedTileService = VisitedTileService(
+            NewVisitedTileCache(),
+            MaxSquareCache(),
+            tilePyramidCache,
+            visitedTileIndexCache,
+            quickFilterState,
+            tileHuntingFilterState,
+            None,  # type: ignore[arg-type]
+        )
+        self._tileRenderService = TileRenderService(baseZoomLevel, TILE_SIZE, visitedTileService)
+
+    def render(self, task: RenderTask) -> list[tuple[int, int, int, bytes]]:
+        """
+        Renders the metatile of the task and returns the PNG images of the requested tiles as (zoom, x, y, data).
+        """
+        zoom, metaTileX, metaTileY, tilePositions = task
+        images = self._tileRenderService.render_meta_tile(
+            tilePositions[0][0],
+            tilePositions[0][1],
+            zoom,
+            self._metaTileSize,
+            self._userId,
+            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+            self._borderColor,  # type: ignore[arg-type]
+            None,
+        )
+
+        result = []
+        for x, y in tilePositions:
+            with io.BytesIO() as output:
+                images[(x, y)].save(output, format='PNG')
+                result.append((zoom, x, y, output.getvalue()))
+
+        return result
+
+
+_WORKER_RENDERER: TileOverlayRenderer | None = None
+
+
+def _initialize_worker(*rendererArguments: Any) -> None:
+    global _WORKER_RENDERER
+    _WORKER_RENDERER = TileOverlayRenderer(*rendererArguments)
+
+
+def _render_in_worker(task: RenderTask) -> list[tuple[int, int, int, bytes]]:
+    assert _WORKER_RENDERER is not None
+    return _WORKER_RENDERER.render(task)
+
+
+class TileOverlayExportService:
+    """
+    Pre-renders the shared tile hunting overlay of a user into an MBTiles file (one SQLite file per user).
+
+    Besides the tiles, the file stores the state of every base zoom tile at the time of the export.
+    Comparing these states with the current tiles allows to detect outdated files and to only re-render
+    the tiles of all zoom levels that contain changed base zoom tiles.
+    """
+
+    FOLDER_NAME = 'tileOverlays'
+    FILE_EXTENSION = 'mbtiles'
+
+    def __init__(
+        self, dataFolder: str, tileHuntingSettings: dict[str, Any], visitedTileIndexCache: VisitedTileIndexCache
+    ) -> None:
+        self._folder = os.path.join(dataFolder, self.FOLDER_NAME)
+        self._baseZoomLevel = tileHuntingSettings['baseZoomLevel']
+        self._borderColor = tileHuntingSettings['borderColor']
+        self._metaTileSize = max(1, tileHuntingSettings.get('metaTileSize', 1))
+        self._visitedTileIndexCache = visitedTileIndexCache
+
+        exportSettings = tileHuntingSettings.get('tileOverlayExport', {})
+        self._minZoomLevel = exportSettings.get('minZoomLevel', tileHuntingSettings['mapMinZoomLevel'])
+        self._maxZoomLevel = exportSettings.get('maxZoomLevel', self._baseZoomLevel)
+        self._numberOfProcesses = exportSettings.get('numberOfProcesses', os.cpu_count() or 1)
+
+        # fingerprints are only recalculated if the tile indices were replaced or the file was modified
+        self._currentFingerprintsPerUser: dict[int, tuple[PackedTileIndex, PackedTileIndex | None, str]] = {}
+        self._fileFingerprintsPerPath: dict[str, tuple[int, int, str | None]] = {}
+
+        self._lock = threading.Lock()
+        self._runningExports: set[int] = set()
+
+        # one read-only connection per file, replaced as soon as the file was replaced by a new export
+        self._readConnectionLock = threading.Lock()
+        self._readConnectionsPerPath: dict[str, tuple[tuple[int, int, int], sqlite3.Connection]] = {}
+
+    def get_file_path(self, userId: int) -> str:
+        return os.path.join(self._folder, f'{userId}.{self.FILE_EXTENSION}')
+
+    def export(self, userId: int, showPlanned: bool) -> TileOverlayExportResult:
+        """
+        Exports the shared tile hunting overlay of the user.
+        An existing file with the same settings is updated incrementally, otherwise a new file is created.
+        The file is replaced atomically, so readers never see a partially written export.
+        """
+        startTime = time.perf_counter()
+        visitedTileIndex, plannedTileIndex = self.__get_tile_indices(userId, showPlanned)
+        states = self.__determine_tile_states(visitedTileIndex, plannedTileIndex)
+        settingsKey = self.__get_settings_key(showPlanned)
+        fingerprint = self.__calculate_fingerprint(settingsKey, states)
+
+        rendererArguments = (
+            self._baseZoomLevel,
+            self._minZoomLevel,
+            self._borderColor,
+            self._metaTileSize,
+            userId,
+            visitedTileIndex.get_entries(),
+            plannedTileIndex.get_entries() if plannedTileIndex is not None else [],
+            showPlanned,
+        )
+
+        path = self.get_file_path(userId)
+        os.makedirs(self._folder, exist_ok=True)
+
+        previousStates = self.__read_tile_states(path, settingsKey)
+        isIncremental = previousStates is not None
+
+        # the current file may be read or downloaded during the export, therefore changes are written to a copy
+        temporaryPath = f'{path}.tmp'
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        if previousStates is not None:
+            shutil.copyfile(path, temporaryPath)
+
+        numberOfRenderedTiles, numberOfDeletedTiles = self.__write(
+            temporaryPath, settingsKey, fingerprint, previousStates or {}, states, rendererArguments
+        )
+        os.replace(temporaryPath, path)
+
+        result = TileOverlayExportResult(
+            numberOfRenderedTiles, numberOfDeletedTiles, isIncremental, time.perf_counter() - startTime
+        )
+        LOGGER.info(f'Exported tile overlay for user {userId}: {result}')
+        return result
+
+    def start_export_in_background(self, app: Flask, userId: int) -> bool:
+        """
+        Starts the export for the user in a background thread.
+        Returns False if an export for this user is already running.
+        """
+        with self._lock:
+            if userId in self._runningExports:
+                return False
+            self._runningExports.add(userId)
+
+        threading.Thread(target=self.__export_in_background, args=(app, userId), daemon=True).start()
+        return True
+
+    def is_export_running(self, userId: int) -> bool:
+        with self._lock:
+            return userId in self._runningExports
+
+    def is_export_available(self, userId: int) -> bool:
+        return os.path.exists(self.get_file_path(userId))
+
+    def is_export_outdated(self, userId: int, showPlanned: bool) -> bool:
+        fileFingerprint = self.__get_file_fingerprint(self.get_file_path(userId))
+        return fileFingerprint != self.__get_current_fingerprint(userId, showPlanned)
+
+    def get_export_info(self, userId: int, showPlanned: bool) -> TileOverlayExportInfo | None:
+        path = self.get_file_path(userId)
+        if not os.path.exists(path):
+            return None
+
+        return TileOverlayExportInfo(
+            os.path.getsize(path),
+            datetime.fromtimestamp(os.path.getmtime(path)),
+            self.is_export_outdated(userId, showPlanned),
+        )
+
+    def get_tile(self, userId: int, showPlanned: bool, zoom: int, x: int, y: int) -> bytes | None:
+        """
+        Returns the exported PNG image of the tile.
+        Returns None if the tile is not part of the export or if the export is missing or outdated.
+        """
+        if not self._minZoomLevel <= zoom <= self._maxZoomLevel:
+            return None
+
+        path = self.get_file_path(userId)
+        if not os.path.exists(path) or self.is_export_outdated(userId, showPlanned):
+            return None
+
+        try:
+            row = self.__read_row(
+                path,
+                'SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                (zoom, x, self.__to_tms_row(zoom, y)),
+            )
+        except sqlite3.Error as e:
+            LOGGER.error(f'Could not read tile from tile overlay export "{path}": {e}')
+            return None
+
+        if row is None:
+            return None
+
+        return row[0]
+
+    def __export_in_background(self, app: Flask, userId: int) -> None:
+        try:
+            with app.app_context():
+                user = get_user_by_id(userId)
+                self.export(userId, user.isTileHuntingShowPlannedTilesActivated)
+        except Exception as e:
+            LOGGER.error(f'Failed to export tile overlay for user {userId}: {e}')
+        finally:
+            with self._lock:
+                self._runningExports.discard(userId)
+
+    def __get_tile_indices(self, userId: int, showPlanned: bool) -> tuple[PackedTileIndex, PackedTileIndex | None]:
+        visitedTileIndex = self._visitedTileIndexCache.get_visited_tile_index(userId)
+        plannedTileIndex = self._visitedTileIndexCache.get_planned_tile_index(userId) if showPlanned else None
+        return visitedTileIndex, plannedTileIndex
+
+    @staticmethod
+    def __determine_tile_states(
+        visitedTileIndex: PackedTileIndex, plannedTileIndex: PackedTileIndex | None
+    ) -> dict[tuple[int, int], int]:
+        distanceWorkoutTypeMask = PackedTileIndex.get_type_mask(WorkoutType.get_distance_workout_types())
+
+        states: dict[tuple[int, int], int] = {}
+        if plannedTileIndex is not None:
+            for x, y, typeMask, _, _ in plannedTileIndex.get_entries():
+                if typeMask & distanceWorkoutTypeMask:
+                    states[(x, y)] = PLANNED_TILE_STATE
+
+        visitedStates: dict[tuple[int, int], int] = {}
+        for x, y, typeMask, _, _ in visitedTileIndex.get_entries():
+            if typeMask & distanceWorkoutTypeMask:
+                visitedStates[(x, y)] = visitedStates.get((x, y), 0) | (typeMask & distanceWorkoutTypeMask)
+
+        # visited tiles are drawn on top of planned tiles
+        states.update(visitedStates)
+        return states
+
+    def __get_settings_key(self, showPlanned: bool) -> str:
+        return (
+            f'{self._baseZoomLevel}/{self._minZoomLevel}/{self._maxZoomLevel}/{TILE_SIZE}/'
+            f'{self._borderColor}/{showPlanned}'
+        )
+
+    @staticmethod
+    def __calculate_fingerprint(settingsKey: str, states: dict[tuple[int, int], int]) -> str:
+        fingerprint = hashlib.sha1(settingsKey.encode())
+        for (x, y), state in sorted(states.items()):
+            fingerprint.update(f'{x},{y},{state};'.encode())
+
+        return fingerprint.hexdigest()
+
+    def __get_current_fingerprint(self, userId: int, showPlanned: bool) -> str:
+        visitedTileIndex, plannedTileIndex = self.__get_tile_indices(userId, showPlanned)
+
+        cachedFingerprint = self._currentFingerprintsPerUser.get(userId)
+        if (
+            cachedFingerprint is not None
+            and cachedFingerprint[0] is visitedTileIndex
+            and cachedFingerprint[1] is plannedTileIndex
+        ):
+            return cachedFingerprint[2]
+
+        states = self.__determine_tile_states(visitedTileIndex, plannedTileIndex)
+        fingerprint = self.__calculate_fingerprint(self.__get_settings_key(showPlanned), states)
+        self._currentFingerprintsPerUser[userId] = (visitedTileIndex, plannedTileIndex, fingerprint)
+        return fingerprint
+
+    def __get_file_fingerprint(self, path: str) -> str | None:
+        try:
+            fileStat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        cachedFingerprint = self._fileFingerprintsPerPath.get(path)
+        if cachedFingerprint is not None and cachedFingerprint[:2] == (fileStat.st_mtime_ns, fileStat.st_size):
+            return cachedFingerprint[2]
+
+        try:
+            row = self.__read_row(path, "SELECT value FROM metadata WHERE name = 'sporttracker_fingerprint'", ())
+        except sqlite3.Error as e:
+            LOGGER.error(f'Could not read tile overlay export "{path}": {e}')
+            return None
+
+        fingerprint = row[0] if row is not None else None
+        self._fileFingerprintsPerPath[path] = (fileStat.st_mtime_ns, fileStat.st_size, fingerprint)
+        return fingerprint
+
+    def __read_row(self, path: str, query: str, parameters: tuple) -> tuple | None:
+        """
+        Executes the query with the cached read-only connection of the file.
+        Returns None if the file does not exist.
+        """
+        try:
+            fileStat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        fileVersion = (fileStat.st_ino, fileStat.st_mtime_ns, fileStat.st_size)
+        with self._readConnectionLock:
+            cachedConnection = self._readConnectionsPerPath.get(path)
+            if cachedConnection is None or cachedConnection[0] != fileVersion:
+                if cachedConnection is not None:
+                    cachedConnection[1].close()
+                    del self._readConnectionsPerPath[path]
+
+                # the connection is shared by all threads, the lock serializes the queries
+                connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+                cachedConnection = (fileVersion, connection)
+                self._readConnectionsPerPath[path] = cachedConnection
+
+            return cachedConnection[1].execute(query, parameters).fetchone()
+
+    @staticmethod
+    def __read_tile_states(path: str, settingsKey: str) -> dict[tuple[int, int], int] | None:
+        """
+        Returns the tile states stored in an existing export with the same settings, otherwise None.
+        """
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with closing(sqlite3.connect(path)) as connection:
+                row = connection.execute("SELECT value FROM metadata WHERE name = 'sporttracker_settings'").fetchone()
+                if row is None or row[0] != settingsKey:
+                    return None
+
+                return {(x, y): state for x, y, state in connection.execute('SELECT x, y, state FROM tile_state')}
+        except sqlite3.Error as e:
+            LOGGER.warning(f'Could not read tile overlay export "{path}", creating a new one: {e}')
+            return None
+
+    def __write(
+        self,
+        path: str,
+        settingsKey: str,
+        fingerprint: str,
+        previousStates: dict[tuple[int, int], int],
+        states: dict[tuple[int, int], int],
+        rendererArguments: tuple,
+    ) -> tuple[int, int]:
+        changedBaseTiles = {
+            position
+            for position in previousStates.keys() | states.keys()
+            if previousStates.get(position) != states.get(position)
+        }
+
+        tilesToRender: dict[int, set[tuple[int, int]]] = {}
+        tilesToDelete: list[tuple[int, int, int]] = []
+        for zoom in range(self._minZoomLevel, self._maxZoomLevel + 1):
+            tilesWithData = self.__get_tiles_of_zoom_level(states.keys(), zoom)
+            changedTiles = self.__get_tiles_of_zoom_level(changedBaseTiles, zoom)
+            tilesToRender[zoom] = changedTiles & tilesWithData
+            tilesToDelete.extend((zoom, x, y) for x, y in changedTiles - tilesWithData)
+
+        with closing(sqlite3.connect(path)) as connection:
+            self.__create_tables(connection)
+
+            numberOfRenderedTiles = 0
+            for zoom, x, y, data in self.__render_tiles(rendererArguments, self.__create_tasks(tilesToRender)):
+                connection.execute(
+                    'INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)',
+                    (zoom, x, self.__to_tms_row(zoom, y), data),
+                )
+                numberOfRenderedTiles += 1
+
+            connection.executemany(
+                'DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                [(zoom, x, self.__to_tms_row(zoom, y)) for zoom, x, y in tilesToDelete],
+            )
+
+            connection.executemany('DELETE FROM tile_state WHERE x = ? AND y = ?', changedBaseTiles)
+            connection.executemany(
+                'INSERT INTO tile_state (x, y, state) VALUES (?, ?, ?)',
+                [(x, y, states[(x, y)]) for x, y in changedBaseTiles if (x, y) in states],
+            )
+
+            connection.executemany(
+                'INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)',
+                [
+                    ('name', 'SportTracker tile hunting'),
+                    ('format', 'png'),
+                    ('type', 'overlay'),
+                    ('version', '1.1'),
+                    ('minzoom', str(self._minZoomLevel)),
+                    ('maxzoom', str(self._maxZoomLevel)),
+                    ('sporttracker_settings', settingsKey),
+                    ('sporttracker_fingerprint', fingerprint),
+                ],
+            )
+            connection.commit()
+
+        return numberOfRenderedTiles, len(tilesToDelete)
+
+    @staticmethod
+    def __create_tables(connection: sqlite3.Connection) -> None:
+        connection.execute('CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT)')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, '
+            'tile_data BLOB)'
+        )
+        connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS tile_index ON tiles (zoom_level, tile_column, tile_row)')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS tile_state (x INTEGER, y INTEGER, state INTEGER, PRIMARY KEY (x, y))'
+        )
+
+    def __get_tiles_of_zoom_level(self, baseTilePositions: Any, zoom: int) -> set[tuple[int, int]]:
+        """
+        Returns all tiles of the zoom level that contain at least one of the base zoom tiles.
+        """
+        zoomDifference = self._baseZoomLevel - zoom
+        if zoomDifference >= 0:
+            return {(x >> zoomDifference, y >> zoomDifference) for x, y in baseTilePositions}
+
+        numberOfSubTiles = 1 << -zoomDifference
+        return {
+            (x * numberOfSubTiles + offsetX, y * numberOfSubTiles + offsetY)
+            for x, y in baseTilePositions
+            for offsetX in range(numberOfSubTiles)
+            for offsetY in range(numberOfSubTiles)
+        }
+
+    def __create_tasks(self, tilesToRender: dict[int, set[tuple[int, int]]]) -> list[RenderTask]:
+        tasks = []
+        for zoom, tilePositions in tilesToRender.items():
+            tilePositionsByMetaTile: dict[tuple[int, int], list[tuple[int, int]]] = {}
+            for x, y in sorted(tilePositions):
+                metaTilePosition = (x - x % self._metaTileSize, y - y % self._metaTileSize)
+                tilePositionsByMetaTile.setdefault(metaTilePosition, []).append((x, y))
+
+            for (metaTileX, metaTileY), positions in tilePositionsByMetaTile.items():
+                tasks.append((zoom, metaTileX, metaTileY, positions))
+
+        return tasks
+
+    def __render_tiles(
+        self, rendererArguments: tuple, tasks: list[RenderTask]
+    ) -> Iterator[tuple[int, int, int, bytes]]:
+        if not tasks:
+            return
+
+        if self._numberOfProcesses <= 1 or len(tasks) == 1:
+            renderer = TileOverlayRenderer(*rendererArguments)
+            for task in tasks:
+                yield from renderer.render(task)
+            return
+
+        # spawn instead of fork, since the server process may hold open database connections and greenlets
+        with ProcessPoolExecutor(
+            max_workers=self._numberOfProcesses,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_initialize_worker,
+            initargs=rendererArguments,
+        ) as executor:
+            chunkSize = max(1, len(tasks) // (self._numberOfProcesses * 4))
+            for result in executor.map(_render_in_worker, tasks, chunksize=chunkSize):
+                yield from result
+
+    @staticmethod
+    def __to_tms_row(zoom: int, y: int) -> int:
+        # MBTiles uses the TMS scheme with the origin in the lower left corner
+        return (1 << zoom) - 1 - y
@@ -0,0 +1,214 @@
+import logging
+from dataclasses import dataclass, field
+
+from sporttracker import Constants
+from sporttracker.helpers.SharedCacheBackend import SharedCacheBackend, SharedCacheNamespace
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache, PackedTileIndex
+from sporttracker.workout.WorkoutType import WorkoutType
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+@dataclass
+class TilePyramidCell:
+    """
+    Aggregated state of all base zoom tiles inside one tile of a lower zoom level.
+    """
+
+    tilePositions: set[tuple[int, int]] = field(default_factory=set)
+    numberOfVisitsByTypeAndYear: dict[tuple[WorkoutType, int], int] = field(default_factory=dict)
+
+    def is_matching(self, workoutTypes: set[WorkoutType], years: set[int]) -> bool:
+        return any(t in workoutTypes and y in years for t, y in self.numberOfVisitsByTypeAndYear)
+
+
+class TilePyramid:
+    """
+    Stores the visits of all base zoom tiles of a user and aggregates them for every zoom level
+    from the minimum map zoom level up to the base zoom level.
+
+    A tile of a lower zoom level therefore directly knows all visited base zoom tiles it contains,
+    instead of querying all base zoom tiles inside its bounding box.
+    """
+
+    def __init__(self, baseZoomLevel: int, minZoomLevel: int) -> None:
+        self._baseZoomLevel = baseZoomLevel
+        self._minZoomLevel = min(minZoomLevel, baseZoomLevel)
+        self._numberOfVisitsByTile: dict[tuple[int, int], dict[tuple[WorkoutType, int], int]] = {}
+        self._cellsByZoomLevel: dict[int, dict[tuple[int, int], TilePyramidCell]] = {
+            zoom: {} for zoom in range(self._minZoomLevel, self._baseZoomLevel)
+        }
+
+    def add_visits(
+        self, workoutType: WorkoutType, year: int, tilePositions: list[tuple[int, int]], numberOfVisits: int = 1
+    ) -> None:
+        key = (workoutType, year)
+        for position in tilePositions:
+            visitsOfTile = self._numberOfVisitsByTile.setdefault(position, {})
+            visitsOfTile[key] = visitsOfTile.get(key, 0) + numberOfVisits
+
+            for cell in self.__get_or_create_cells(position):
+                cell.tilePositions.add(position)
+                cell.numberOfVisitsByTypeAndYear[key] = cell.numberOfVisitsByTypeAndYear.get(key, 0) + numberOfVisits
+
+    def remove_visits(self, workoutType: WorkoutType, year: int, tilePositions: list[tuple[int, int]]) -> None:
+        key = (workoutType, year)
+        for position in tilePositions:
+            numberOfVisitsByTypeAndYear = self._numberOfVisitsByTile.get(position)
+            if numberOfVisitsByTypeAndYear is None or key not in numberOfVisitsByTypeAndYear:
+                continue
+
+            self.__decrement(numberOfVisitsByTypeAndYear, key)
+            isTileVisited = bool(numberOfVisitsByTypeAndYear)
+            if not isTileVisited:
+                del self._numberOfVisitsByTile[position]
+
+            for zoom, cellPosition in self.__get_cell_positions(position):
+                cells = self._cellsByZoomLevel[zoom]
+                cell = cells[cellPosition]
+                self.__decrement(cell.numberOfVisitsByTypeAndYear, key)
+                if not isTileVisited:
+                    cell.tilePositions.discard(position)
+                if not cell.tilePositions:
+                    del cells[cellPosition]
+
+    def get_number_of_visits_in_bounding_box(
+        self, min_x: int, max_x: int, min_y: int, max_y: int, workoutTypes: list[WorkoutType], years: list[int]
+    ) -> list[tuple[int, int, dict[WorkoutType, int]]] | None:
+        """
+        Returns the matching number of visits per workout type for all visited base zoom tiles inside the bounding box.
+        Returns None if the bounding box is not a tile of one of the precomputed zoom levels.
+        """
+        activeWorkoutTypes = set(workoutTypes)
+        activeYears = set(years)
+
+        tilePositions = self.__get_tile_positions_in_bounding_box(
+            min_x, max_x, min_y, max_y, activeWorkoutTypes, activeYears
+        )
+        if tilePositions is None:
+            return None
+
+        result = []
+        for position in tilePositions:
+            numberOfVisitsByType: dict[WorkoutType, int] = {}
+            for (workoutType, year), numberOfVisits in self._numberOfVisitsByTile[position].items():
+                if workoutType in activeWorkoutTypes and year in activeYears:
+                    numberOfVisitsByType[workoutType] = numberOfVisitsByType.get(workoutType, 0) + numberOfVisits
+
+            if numberOfVisitsByType:
+                result.append((position[0], position[1], numberOfVisitsByType))
+
+        return result
+
+    def __get_tile_positions_in_bounding_box(
+        self, min_x: int, max_x: int, min_y: int, max_y: int, workoutTypes: set[WorkoutType], years: set[int]
+    ) -> list[tuple[int, int]] | None:
+        size = max_x - min_x + 1
+        if size != max_y - min_y + 1 or size & (size - 1) != 0:
+            return None
+
+        zoomDifference = size.bit_length() - 1
+        if min_x % size != 0 or min_y % size != 0:
+            return None
+
+        if zoomDifference == 0:
+            position = (min_x, min_y)
+            return [position] if position in self._numberOfVisitsByTile else []
+
+        cells = self._cellsByZoomLevel.get(self._baseZoomLevel - zoomDifference)
+        if cells is None:
+            return None
+
+        cell = cells.get((min_x >> zoomDifference, min_y >> zoomDifference))
+        if cell is None or not cell.is_matching(workoutTypes, years):
+            return []
+
+        return list(cell.tilePositions)
+
+    def __get_cell_positions(self, position: tuple[int, int]) -> list[tuple[int, tuple[int, int]]]:
+        return [
+            (zoom, (position[0] >> (self._baseZoomLevel - zoom), position[1] >> (self._baseZoomLevel - zoom)))
+            for zoom in self._cellsByZoomLevel
+        ]
+
+    def __get_or_create_cells(self, position: tuple[int, int]) -> list[TilePyramidCell]:
+        result = []
+        for zoom, cellPosition in self.__get_cell_positions(position):
+            cells = self._cellsByZoomLevel[zoom]
+            cell = cells.get(cellPosition)
+            if cell is None:
+                cell = TilePyramidCell()
+                cells[cellPosition] = cell
+            result.append(cell)
+
+        return result
+
+    @staticmethod
+    def __decrement(numberOfVisitsByTypeAndYear: dict[tuple[WorkoutType, int], int], key: tuple[WorkoutType, int]):
+        numberOfVisitsByTypeAndYear[key] -= 1
+        if numberOfVisitsByTypeAndYear[key] <= 0:
+            del numberOfVisitsByTypeAndYear[key]
+
+
+class TilePyramidCache:
+    """
+    Holds a lazily created TilePyramid for every user, which is updated incrementally when tracks are added or removed.
+    With a SharedCacheBackend, other SportTracker processes discard their pyramid of the user on every change.
+    """
+
+    def __init__(
+        self,
+        baseZoomLevel: int,
+        minZoomLevel: int,
+        visitedTileIndexCache: VisitedTileIndexCache,
+        sharedCacheBackend: SharedCacheBackend | None = None,
+    ) -> None:
+        self._baseZoomLevel = baseZoomLevel
+        self._minZoomLevel = minZoomLevel
+        self._visitedTileIndexCache = visitedTileIndexCache
+        self._pyramidsPerUser: dict[int, TilePyramid] = {}
+        self._sharedPyramids = SharedCacheNamespace(sharedCacheBackend, 'tilePyramidCache', self.__invalidate_locally)
+
+    def get_pyramid(self, userId: int) -> TilePyramid:
+        if userId not in self._pyramidsPerUser:
+            LOGGER.debug(f'Creating entry in TilePyramidCache for user {userId}')
+            self._pyramidsPerUser[userId] = self.__create_pyramid(userId)
+
+        return self._pyramidsPerUser[userId]
+
+    def add_visited_tiles(
+        self, userId: int, workoutType: WorkoutType, year: int, tilePositions: list[tuple[int, int]]
+    ) -> None:
+        pyramid = self._pyramidsPerUser.get(userId)
+        if pyramid is not None:
+            pyramid.add_visits(workoutType, year, tilePositions)
+
+        self._sharedPyramids.invalidate(userId)
+
+    def remove_visited_tiles(
+        self, userId: int, workoutType: WorkoutType, year: int, tilePositions: list[tuple[int, int]]
+    ) -> None:
+        pyramid = self._pyramidsPerUser.get(userId)
+        if pyramid is not None:
+            pyramid.remove_visits(workoutType, year, tilePositions)
+
+        self._sharedPyramids.invalidate(userId)
+
+    def invalidate_cache_entry_by_user(self, userId: int) -> None:
+        self.__invalidate_locally(userId)
+        self._sharedPyramids.invalidate(userId)
+
+    def __invalidate_locally(self, userId: int) -> None:
+        if self._pyramidsPerUser.pop(userId, None) is not None:
+            LOGGER.debug(f'Invalidating TilePyramidCache for user {userId}')
+
+    def __create_pyramid(self, userId: int) -> TilePyramid:
+        # the visited tile index is shared with the pyramid, so the database is only queried once per user
+        visitedTileIndex = self._visitedTileIndexCache.get_visited_tile_index(userId)
+
+        pyramid = TilePyramid(self._baseZoomLevel, self._minZoomLevel)
+        for x, y, typeMask, year, numberOfVisits in visitedTileIndex.get_entries():
+            for workoutType in PackedTileIndex.get_workout_types(typeMask):
+                pyramid.add_visits(workoutType, year, [(x, y)], numberOfVisits)
+
+        return pyramid
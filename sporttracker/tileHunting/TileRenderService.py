@@ -1,10 +1,11 @@
 import logging
-import math
 from enum import Enum
+from functools import cache
 
 from PIL import Image, ImageColor
 
 from sporttracker import Constants
+from sporttracker.gpx.GpxParser import VisitedTile
 from sporttracker.tileHunting.VisitedTileService import VisitedTileService, TileColorPosition, TileCountPosition
 
 LOGGER = logging.getLogger(Constants.APP_NAME)
@@ -25,37 +26,6 @@ class TileRenderService:
         self._tileSize = tileSize
         self._visitedTileService = visitedTileService
 
-    def __transform_tile_positions_to_base_zoom_level(self, x: int, y: int, zoom: int) -> list[tuple[int, int]]:
-        """
-        Returns all tile positions for a tile with the position (x, y) and the specified zoom level transformed to self._baseZoomLevel.
-        """
-        if zoom == self._baseZoomLevel:
-            return [(x, y)]
-
-        newPositions: set[tuple[int, int]] = set()
-
-        def counterIncrement(zoomLevel: int) -> int:
-            return zoomLevel + 1
-
-        def counterDecrement(zoomLevel: int) -> int:
-            return zoomLevel - 1
-
-        transformerFunction = self.transform_position_zoom_in
-        counterModifierFunction = counterIncrement
-        if zoom > self._baseZoomLevel:
-            transformerFunction = self.transform_position_zoom_out
-            counterModifierFunction = counterDecrement
-
-        positions = [(x, y)]
-        while zoom != self._baseZoomLevel:
-            newPositions = set()
-            for position in positions:
-                newPositions = newPositions.union(set(transformerFunction(position[0], position[1])))
-            positions = list(newPositions)
-            zoom = counterModifierFunction(zoom)
-
-        return sorted(list(newPositions), key=lambda p: (p[0], p[1]))
-
     @staticmethod
     def transform_position_zoom_in(x: int, y: int) -> list[tuple[int, int]]:
         """
@@ -116,8 +86,10 @@ class TileRenderService:
         if not matchingCounts:
             return TileRenderService.COLOR_TRANSPARENT
 
-        count = matchingCounts[0].count
+        return TileRenderService.__get_heatmap_color_by_count(matchingCounts[0].count)
 
+    @staticmethod
+    def __get_heatmap_color_by_count(count: int) -> tuple[int, int, int, int]:
         if count >= 100:
             return 89, 0, 8, 192
 
@@ -178,107 +150,241 @@ class TileRenderService:
         Already visited (sub-) tiles are shown as squares using the color defined inside the visited tile instance.
         All non visited (sub-) tiles will be transparent.
         Optionally renders a border for each sub tile.
+
+        The whole tile is built as one image buffer:
+        The color of each sub tile is resolved via dict lookups, each colored sub tile is filled as a block
+        and the border is applied afterward with a precomputed mask.
         """
-        img = Image.new('RGBA', (self._tileSize, self._tileSize))
-        pixels = img.load()
+        return self.render_meta_tile(x, y, zoom, 1, user_id, tileRenderColorMode, borderColor, maxSquareColor)[(x, y)]
+
+    def render_meta_tile(
+        self,
+        x: int,
+        y: int,
+        zoom: int,
+        metaTileSize: int,
+        user_id: int,
+        tileRenderColorMode: TileRenderColorMode,
+        borderColor: tuple[int, int, int, int] | None,
+        maxSquareColor: tuple[int, int, int, int] | None,
+    ) -> dict[tuple[int, int], Image.Image]:
+        """
+        Renders all tiles of the metatile containing the tile (x,y).
+        A metatile is the aligned block of metaTileSize x metaTileSize neighbouring tiles of the same zoom level.
+        The visited tiles of the whole block are fetched once and the block is cut into the individual tile images.
+        Tiles outside the world are skipped, except the requested tile.
+        """
+        numberOfTilesPerAxis = 1 << zoom
+        metaTileX = x - x % metaTileSize
+        metaTileY = y - y % metaTileSize
+        tilePositions = [
+            (tileX, tileY)
+            for tileX in range(metaTileX, metaTileX + metaTileSize)
+            for tileY in range(metaTileY, metaTileY + metaTileSize)
+            if (tileX < numberOfTilesPerAxis and tileY < numberOfTilesPerAxis) or (tileX, tileY) == (x, y)
+        ]
 
-        positions = self.__transform_tile_positions_to_base_zoom_level(x, y, zoom)
-        numberOfElementsPerAxis = int(math.sqrt(len(positions)))
+        boundingBoxes = {position: self.get_bounding_box(position[0], position[1], zoom) for position in tilePositions}
+        numberOfElementsPerAxis = boundingBoxes[(x, y)][1] - boundingBoxes[(x, y)][0] + 1
         boxSize = int(self._tileSize / numberOfElementsPerAxis)
-        zoomDifference = zoom - self._baseZoomLevel
 
-        if not positions:
-            raise RuntimeError(f'No positions were found for tile with coordinates x: {x}, y: {y}')
+        if boxSize == 0:
+            # sub tiles would be smaller than a pixel, therefore nothing can be drawn
+            return {position: Image.new('RGBA', (self._tileSize, self._tileSize)) for position in tilePositions}
+
+        min_x = min(boundingBox[0] for boundingBox in boundingBoxes.values())
+        max_x = max(boundingBox[1] for boundingBox in boundingBoxes.values())
+        min_y = min(boundingBox[2] for boundingBox in boundingBoxes.values())
+        max_y = max(boundingBox[3] for boundingBox in boundingBoxes.values())
+        colorsByPosition = self.__determine_colors_in_bounding_box(
+            min_x, max_x, min_y, max_y, user_id, tileRenderColorMode, maxSquareColor
+        )
+
+        return {
+            position: self.__render_tile(
+                position[0], position[1], zoom, boundingBoxes[position], boxSize, colorsByPosition, borderColor
+            )
+            for position in tilePositions
+        }
 
-        max_x, max_y, min_x, min_y = self.__calculate_min_and_max(positions)
+    def get_bounding_box(self, x: int, y: int, zoom: int) -> tuple[int, int, int, int]:
+        """
+        Returns the bounding box (min_x, max_x, min_y, max_y) of the tile in base zoom level tile positions.
+        """
+        zoomDifference = zoom - self._baseZoomLevel
+        if zoomDifference > 0:
+            numberOfElementsPerAxis = 1
+            min_x = x >> zoomDifference
+            min_y = y >> zoomDifference
+        else:
+            numberOfElementsPerAxis = 1 << -zoomDifference
+            min_x = x * numberOfElementsPerAxis
+            min_y = y * numberOfElementsPerAxis
 
-        tileColorPositions = []
-        tileCountPositions = []
-        plannedTilePositions = []
+        return min_x, min_x + numberOfElementsPerAxis - 1, min_y, min_y + numberOfElementsPerAxis - 1
+
+    def __determine_colors_in_bounding_box(
+        self,
+        min_x: int,
+        max_x: int,
+        min_y: int,
+        max_y: int,
+        user_id: int,
+        tileRenderColorMode: TileRenderColorMode,
+        maxSquareColor: tuple[int, int, int, int] | None,
+    ) -> dict[tuple[int, int], tuple[int, int, int, int]]:
         if tileRenderColorMode == TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES:
             tileColorPositions = self._visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles(
-                min_x,  # type: ignore[arg-type]
-                max_x,  # type: ignore[arg-type]
-                min_y,  # type: ignore[arg-type]
-                max_y,  # type: ignore[arg-type]
-                user_id,
-            )
-            plannedTilePositions = self._visitedTileService.determine_planned_tiles(
-                min_x,  # type: ignore[arg-type]
-                max_x,  # type: ignore[arg-type]
-                min_y,  # type: ignore[arg-type]
-                max_y,  # type: ignore[arg-type]
-                user_id,
+                min_x, max_x, min_y, max_y, user_id
             )
+            plannedTilePositions = self._visitedTileService.determine_planned_tiles(min_x, max_x, min_y, max_y, user_id)
+            colorsByPosition = self.determine_colors_by_position(tileColorPositions, plannedTilePositions)
         else:
             tileCountPositions = self._visitedTileService.determine_number_of_visits(
-                min_x,  # type: ignore[arg-type]
-                max_x,  # type: ignore[arg-type]
-                min_y,  # type: ignore[arg-type]
-                max_y,  # type: ignore[arg-type]
-                user_id,
+                min_x, max_x, min_y, max_y, user_id
             )
+            colorsByPosition = self.determine_heatmap_colors_by_position(tileCountPositions)
+
+        if maxSquareColor is not None:
+            maxSquare = self._visitedTileService.get_max_square()
+            if maxSquare is not None:
+                # only the part of the max square inside the bounding box is relevant
+                for positionX in range(max(min_x, maxSquare.x), min(max_x, maxSquare.x + maxSquare.size - 1) + 1):
+                    for positionY in range(max(min_y, maxSquare.y), min(max_y, maxSquare.y + maxSquare.size - 1) + 1):
+                        colorsByPosition[(positionX, positionY)] = maxSquareColor
 
-        for row in range(0, numberOfElementsPerAxis):
-            for col in range(0, numberOfElementsPerAxis):
-                elementIndex = row * numberOfElementsPerAxis + col
-                position = positions[elementIndex]
-                if zoomDifference > 0:
-                    isTouchingUpperEdgeOfBaseZoomTile = x / 2**zoomDifference == position[0]
-                    isTouchingLeftEdgeOfBaseZoomTile = y / 2**zoomDifference == position[1]
-                else:
-                    isTouchingUpperEdgeOfBaseZoomTile = True
-                    isTouchingLeftEdgeOfBaseZoomTile = True
-
-                if tileRenderColorMode == TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES:
-                    isVisitPlanned = any([t for t in plannedTilePositions if t.x == position[0] and t.y == position[1]])
-                    colorToUse = TileRenderService.calculate_color(
-                        position[0], position[1], tileColorPositions, isVisitPlanned
-                    )
-                else:
-                    colorToUse = TileRenderService.calculate_heatmap_color(position[0], position[1], tileCountPositions)
-
-                if maxSquareColor is not None:
-                    if position in self._visitedTileService.get_max_square_tile_positions():
-                        colorToUse = maxSquareColor
-
-                for pixelX in range(boxSize):
-                    for pixelY in range(boxSize):
-                        pixels[row * boxSize + pixelX, col * boxSize + pixelY] = colorToUse  # type: ignore[index]
-                        if borderColor is not None:
-                            border = self.calculate_border_color(
-                                pixelX,
-                                pixelY,
-                                isTouchingUpperEdgeOfBaseZoomTile,
-                                isTouchingLeftEdgeOfBaseZoomTile,
-                                colorToUse,
-                                borderColor,
-                            )
-                            pixels[row * boxSize + pixelX, col * boxSize + pixelY] = border  # type: ignore[index]
+        return colorsByPosition
+
+    def __render_tile(
+        self,
+        x: int,
+        y: int,
+        zoom: int,
+        boundingBox: tuple[int, int, int, int],
+        boxSize: int,
+        colorsByPosition: dict[tuple[int, int], tuple[int, int, int, int]],
+        borderColor: tuple[int, int, int, int] | None,
+    ) -> Image.Image:
+        img = Image.new('RGBA', (self._tileSize, self._tileSize))
+
+        min_x, max_x, min_y, max_y = boundingBox
+        numberOfElementsPerAxis = max_x - min_x + 1
+
+        if len(colorsByPosition) <= numberOfElementsPerAxis * numberOfElementsPerAxis:
+            colorsInsideTile = [
+                (position, color)
+                for position, color in colorsByPosition.items()
+                if min_x <= position[0] <= max_x and min_y <= position[1] <= max_y
+            ]
+        else:
+            # the colors of a metatile may cover many more positions than this tile
+            colorsInsideTile = [
+                ((positionX, positionY), colorsByPosition[(positionX, positionY)])
+                for positionX in range(min_x, max_x + 1)
+                for positionY in range(min_y, max_y + 1)
+                if (positionX, positionY) in colorsByPosition
+            ]
+
+        for (positionX, positionY), color in colorsInsideTile:
+            if color == self.COLOR_TRANSPARENT:
+                continue
+
+            left = (positionX - min_x) * boxSize
+            top = (positionY - min_y) * boxSize
+            img.paste(color, (left, top, left + boxSize, top + boxSize))
+
+        if borderColor is not None:
+            zoomDifference = zoom - self._baseZoomLevel
+            if zoomDifference > 0:
+                # only the sub tile touching the upper left corner of the base zoom tile gets a border
+                isTouchingUpperEdgeOfBaseZoomTile = x % (1 << zoomDifference) == 0
+                isTouchingLeftEdgeOfBaseZoomTile = y % (1 << zoomDifference) == 0
+            else:
+                isTouchingUpperEdgeOfBaseZoomTile = True
+                isTouchingLeftEdgeOfBaseZoomTile = True
+
+            borderMask = self.__get_border_mask(
+                self._tileSize,
+                boxSize,
+                numberOfElementsPerAxis,
+                isTouchingUpperEdgeOfBaseZoomTile,
+                isTouchingLeftEdgeOfBaseZoomTile,
+            )
+            if borderMask is not None:
+                img.paste(borderColor, mask=borderMask)
 
         return img
 
     @staticmethod
-    def __calculate_min_and_max(
-        positions: list[tuple[int, int]],
-    ) -> tuple[int | None, int | None, int | None, int | None]:
-        min_x = None
-        max_x = None
-        min_y = None
-        max_y = None
+    def determine_colors_by_position(
+        tileColorPositions: list[TileColorPosition], plannedTilePositions: list[VisitedTile]
+    ) -> dict[tuple[int, int], tuple[int, int, int, int]]:
+        """
+        Equivalent to calling calculate_color() for every sub tile, but resolves all colors with a single pass over
+        the query results.
+        """
+        hexColorsByPosition: dict[tuple[int, int], list[str]] = {}
+        for tileColorPosition in tileColorPositions:
+            hexColorsByPosition.setdefault((tileColorPosition.x, tileColorPosition.y), []).append(
+                tileColorPosition.tile_color
+            )
+
+        colorsByPosition: dict[tuple[int, int], tuple[int, int, int, int]] = {}
+        for plannedTile in plannedTilePositions:
+            colorsByPosition[(plannedTile.x, plannedTile.y)] = TileRenderService.COLOR_PLANNED
+
+        for position, hexColors in hexColorsByPosition.items():
+            if len(hexColors) == 1:
+                colorsByPosition[position] = TileRenderService.__get_rgba_color(hexColors[0])
+            else:
+                colorsByPosition[position] = TileRenderService.COLOR_MULTIPLE_MATCHES
+
+        return colorsByPosition
+
+    @staticmethod
+    def determine_heatmap_colors_by_position(
+        tileCountPositions: list[TileCountPosition],
+    ) -> dict[tuple[int, int], tuple[int, int, int, int]]:
+        """
+        Equivalent to calling calculate_heatmap_color() for every sub tile.
+        """
+        colorsByPosition: dict[tuple[int, int], tuple[int, int, int, int]] = {}
+        for tileCountPosition in tileCountPositions:
+            position = (tileCountPosition.x, tileCountPosition.y)
+            if position not in colorsByPosition:
+                colorsByPosition[position] = TileRenderService.__get_heatmap_color_by_count(tileCountPosition.count)
 
-        for position in positions:
-            pos_x, pos_y = position
-            if min_x is None or pos_x < min_x:
-                min_x = pos_x
+        return colorsByPosition
 
-            if max_x is None or pos_x > max_x:
-                max_x = pos_x
+    @staticmethod
+    @cache
+    def __get_rgba_color(hexColor: str) -> tuple[int, int, int, int]:
+        return ImageColor.getcolor(hexColor, 'RGBA')  # type: ignore[return-value]
 
-            if min_y is None or pos_y < min_y:
-                min_y = pos_y
+    @staticmethod
+    @cache
+    def __get_border_mask(
+        tileSize: int,
+        boxSize: int,
+        numberOfElementsPerAxis: int,
+        isTouchingUpperEdgeOfBaseZoomTile: bool,
+        isTouchingLeftEdgeOfBaseZoomTile: bool,
+    ) -> Image.Image | None:
+        """
+        Returns a mask (255 = border pixel) that matches the pixels calculate_border_color() would color.
+        The mask only depends on the zoom difference to the base zoom level and on the tile position
+        relative to its base zoom tile, therefore it is computed only once per combination.
+        """
+        if not isTouchingUpperEdgeOfBaseZoomTile and not isTouchingLeftEdgeOfBaseZoomTile:
+            return None
 
-            if max_y is None or pos_y > max_y:
-                max_y = pos_y
+        mask = Image.new('L', (tileSize, tileSize), 0)
+        size = numberOfElementsPerAxis * boxSize
+        for index in range(numberOfElementsPerAxis):
+            offset = index * boxSize
+            if isTouchingUpperEdgeOfBaseZoomTile:
+                mask.paste(255, (offset, 0, offset + 1, size))
+            if isTouchingLeftEdgeOfBaseZoomTile:
+                mask.paste(255, (0, offset, size, offset + 1))
 
-        return max_x, max_y, min_x, min_y
+        return mask
@@ -0,0 +1,143 @@
+from typing import Any
+
+from sporttracker.tileHunting.TileRenderService import TileRenderService, TileRenderColorMode
+from sporttracker.tileHunting.VisitedTileService import VisitedTileService
+
+
+class TileVectorService:
+    """
+    Alternative to the TileRenderService that returns the tile hunting tiles of a map tile as compact JSON
+    instead of a rendered PNG. The map draws and styles the squares client-side.
+
+    All base zoom tiles inside the map tile are called cells and are numbered row by row:
+    index = (y - min_y) * cellsPerAxis + (x - min_x).
+    The sorted cell indices are delta-encoded, i.e. every value is the difference to the previous index.
+    Colors are stored once in a palette and referenced by their palette index.
+
+    The same filters and colors as for the rendered PNGs are used.
+    """
+
+    def __init__(self, baseZoomLevel: int, visitedTileService: VisitedTileService) -> None:
+        self._tileRenderService = TileRenderService(baseZoomLevel, 256, visitedTileService)
+        self._baseZoomLevel = baseZoomLevel
+        self._visitedTileService = visitedTileService
+
+    def get_vector_tile(
+        self,
+        x: int,
+        y: int,
+        zoom: int,
+        user_id: int,
+        tileRenderColorMode: TileRenderColorMode,
+        borderColor: str | None,
+        maxSquareColor: str | None,
+    ) -> dict[str, Any]:
+        min_x, max_x, min_y, max_y = self._tileRenderService.get_bounding_box(x, y, zoom)
+        cellsPerAxis = max_x - min_x + 1
+
+        if tileRenderColorMode == TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES:
+            colorsByPosition = TileRenderService.determine_colors_by_position(
+                self._visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles(
+                    min_x, max_x, min_y, max_y, user_id
+                ),
+                [],
+            )
+            plannedPositions = [
+                (tile.x, tile.y)
+                for tile in self._visitedTileService.determine_planned_tiles(min_x, max_x, min_y, max_y, user_id)
+                if (tile.x, tile.y) not in colorsByPosition
+            ]
+        else:
+            colorsByPosition = TileRenderService.determine_heatmap_colors_by_position(
+                self._visitedTileService.determine_number_of_visits(min_x, max_x, min_y, max_y, user_id)
+            )
+            plannedPositions = []
+
+        palette: list[str] = []
+        paletteIndexByColor: dict[tuple[int, int, int, int], int] = {}
+        cellIndices = []
+        colorIndexByCellIndex = {}
+        for (positionX, positionY), color in colorsByPosition.items():
+            if color == TileRenderService.COLOR_TRANSPARENT:
+                continue
+
+            if color not in paletteIndexByColor:
+                paletteIndexByColor[color] = len(palette)
+                palette.append(self.__to_hex_color(color))
+
+            cellIndex = (positionY - min_y) * cellsPerAxis + (positionX - min_x)
+            cellIndices.append(cellIndex)
+            colorIndexByCellIndex[cellIndex] = paletteIndexByColor[color]
+
+        cellIndices.sort()
+        plannedCellIndices = sorted(
+            (positionY - min_y) * cellsPerAxis + (positionX - min_x) for positionX, positionY in plannedPositions
+        )
+
+        return {
+            'cellsPerAxis': cellsPerAxis,
+            'palette': palette,
+            'visited': self.__delta_encode(cellIndices),
+            'visitedColors': [colorIndexByCellIndex[cellIndex] for cellIndex in cellIndices],
+            'planned': self.__delta_encode(plannedCellIndices),
+            'plannedColor': self.__to_hex_color(TileRenderService.COLOR_PLANNED),
+            'maxSquare': self.__get_max_square(min_x, max_x, min_y, max_y, maxSquareColor),
+            'grid': self.__get_grid(x, y, zoom, borderColor),
+        }
+
+    def __get_max_square(
+        self, min_x: int, max_x: int, min_y: int, max_y: int, maxSquareColor: str | None
+    ) -> dict[str, Any] | None:
+        """
+        Returns the part of the max square inside the bounding box as cell range.
+        """
+        if maxSquareColor is None:
+            return None
+
+        maxSquare = self._visitedTileService.get_max_square()
+        if maxSquare is None:
+            return None
+
+        left = max(min_x, maxSquare.x)
+        right = min(max_x, maxSquare.x + maxSquare.size - 1)
+        top = max(min_y, maxSquare.y)
+        bottom = min(max_y, maxSquare.y + maxSquare.size - 1)
+        if left > right or top > bottom:
+            return None
+
+        return {
+            'x': left - min_x,
+            'y': top - min_y,
+            'width': right - left + 1,
+            'height': bottom - top + 1,
+            'color': maxSquareColor,
+        }
+
+    def __get_grid(self, x: int, y: int, zoom: int, borderColor: str | None) -> dict[str, Any] | None:
+        if borderColor is None:
+            return None
+
+        # same borders as the rendered PNGs: tiles above the base zoom level only draw the edges of the base zoom tile
+        zoomDifference = zoom - self._baseZoomLevel
+        if zoomDifference > 0:
+            return {
+                'color': borderColor,
+                'vertical': x % (1 << zoomDifference) == 0,
+                'horizontal': y % (1 << zoomDifference) == 0,
+            }
+
+        return {'color': borderColor, 'vertical': True, 'horizontal': True}
+
+    @staticmethod
+    def __delta_encode(sortedValues: list[int]) -> list[int]:
+        result = []
+        previousValue = 0
+        for value in sortedValues:
+            result.append(value - previousValue)
+            previousValue = value
+
+        return result
+
+    @staticmethod
+    def __to_hex_color(color: tuple[int, int, int, int]) -> str:
+        return '#{:02X}{:02X}{:02X}{:02X}'.format(*color)
@@ -0,0 +1,210 @@
+import logging
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+
+from sqlalchemy import extract, func, or_
+
+from sporttracker import Constants
+from sporttracker.helpers.SharedCacheBackend import SharedCacheBackend, SharedCacheNamespace
+from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
+from sporttracker.tileHunting.GpxPlannedTileEntity import GpxPlannedTile
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+
+@dataclass
+class IndexedTile:
+    x: int
+    y: int
+    typeMask: int
+    numberOfVisits: int
+
+
+class PackedTileIndex:
+    """
+    Read-only index of tiles stored as sorted packed (x, y) int64 keys with parallel arrays for the
+    workout type bitmask, the year and the number of visits of each entry.
+
+    A tile may consist of multiple consecutive entries, e.g. one per workout type and year.
+    Bounding box queries use binary search and skip all columns and rows outside the bounding box.
+    """
+
+    def __init__(self, entries: list[tuple[int, int, int, int, int]]) -> None:
+        """
+        Creates the index from entries of the form (x, y, typeMask, year, numberOfVisits).
+        """
+        entries.sort()
+        self._keys = array('q', [PackedTileIndex.__pack(entry[0], entry[1]) for entry in entries])
+        self._typeMasks = array('H', [entry[2] for entry in entries])
+        self._years = array('H', [entry[3] for entry in entries])
+        self._numberOfVisits = array('I', [entry[4] for entry in entries])
+
+    @staticmethod
+    def get_type_mask(workoutTypes: list[WorkoutType]) -> int:
+        typeMask = 0
+        for workoutType in workoutTypes:
+            typeMask |= 1 << workoutType.order
+
+        return typeMask
+
+    @staticmethod
+    def get_workout_types(typeMask: int) -> list[WorkoutType]:
+        return [workoutType for workoutType in WorkoutType if typeMask & (1 << workoutType.order)]
+
+    def get_number_of_entries(self) -> int:
+        return len(self._keys)
+
+    def get_entries(self) -> list[tuple[int, int, int, int, int]]:
+        return [
+            (key >> 32, key & 0xFFFFFFFF, typeMask, year, numberOfVisits)
+            for key, typeMask, year, numberOfVisits in zip(
+                self._keys, self._typeMasks, self._years, self._numberOfVisits
+            )
+        ]
+
+    def get_tiles_in_bounding_box(
+        self, min_x: int, max_x: int, min_y: int, max_y: int, typeMask: int, years: set[int] | None
+    ) -> list[IndexedTile]:
+        """
+        Returns all tiles inside the bounding box with at least one entry matching the type mask and years.
+        The type mask of a result only contains the matching types and the number of visits only counts matching entries.
+        If years is None, entries of all years are matching.
+        """
+        keys = self._keys
+        index = bisect_left(keys, PackedTileIndex.__pack(min_x, min_y))
+        end = bisect_right(keys, PackedTileIndex.__pack(max_x, max_y))
+
+        result = []
+        while index < end:
+            key = keys[index]
+            x = key >> 32
+            y = key & 0xFFFFFFFF
+
+            if y < min_y:
+                index = bisect_left(keys, PackedTileIndex.__pack(x, min_y), index, end)
+                continue
+
+            if y > max_y:
+                index = bisect_left(keys, PackedTileIndex.__pack(x + 1, min_y), index, end)
+                continue
+
+            matchingTypeMask = 0
+            numberOfVisits = 0
+            while index < end and keys[index] == key:
+                entryTypeMask = self._typeMasks[index] & typeMask
+                if entryTypeMask and (years is None or self._years[index] in years):
+                    matchingTypeMask |= entryTypeMask
+                    numberOfVisits += self._numberOfVisits[index]
+                index += 1
+
+            if matchingTypeMask:
+                result.append(IndexedTile(x, y, matchingTypeMask, numberOfVisits))
+
+        return result
+
+    def get_tile(self, x: int, y: int, typeMask: int, years: set[int] | None) -> IndexedTile | None:
+        tiles = self.get_tiles_in_bounding_box(x, x, y, y, typeMask, years)
+        if tiles:
+            return tiles[0]
+
+        return None
+
+    @staticmethod
+    def __pack(x: int, y: int) -> int:
+        return (x << 32) | y
+
+
+class VisitedTileIndexCache:
+    """
+    Holds a lazily created PackedTileIndex of the visited tiles and of the planned tiles for every user.
+
+    The database is only queried to create a missing index. Uploading or deleting tracks invalidates the index.
+    With a SharedCacheBackend, invalidations are applied in all SportTracker processes.
+    """
+
+    def __init__(self, sharedCacheBackend: SharedCacheBackend | None = None) -> None:
+        self._visitedTileIndexPerUser: dict[int, PackedTileIndex] = {}
+        self._plannedTileIndexPerUser: dict[int, PackedTileIndex] = {}
+        self._sharedVisitedTileIndex = SharedCacheNamespace(
+            sharedCacheBackend, 'visitedTileIndexCache', self.__invalidate_visited_tiles_locally
+        )
+        self._sharedPlannedTileIndex = SharedCacheNamespace(
+            sharedCacheBackend, 'plannedTileIndexCache', self.__invalidate_planned_tiles_locally
+        )
+
+    def get_visited_tile_index(self, userId: int) -> PackedTileIndex:
+        if userId not in self._visitedTileIndexPerUser:
+            index = PackedTileIndex(self.__load_visited_tiles(userId))
+            LOGGER.debug(f'Created visited tile index with {index.get_number_of_entries()} entries for user {userId}')
+            self._visitedTileIndexPerUser[userId] = index
+
+        return self._visitedTileIndexPerUser[userId]
+
+    def get_planned_tile_index(self, userId: int) -> PackedTileIndex:
+        if userId not in self._plannedTileIndexPerUser:
+            index = PackedTileIndex(self.__load_planned_tiles(userId))
+            LOGGER.debug(f'Created planned tile index with {index.get_number_of_entries()} entries for user {userId}')
+            self._plannedTileIndexPerUser[userId] = index
+
+        return self._plannedTileIndexPerUser[userId]
+
+    def put_visited_tile_index(self, userId: int, index: PackedTileIndex) -> None:
+        self._visitedTileIndexPerUser[userId] = index
+
+    def put_planned_tile_index(self, userId: int, index: PackedTileIndex) -> None:
+        self._plannedTileIndexPerUser[userId] = index
+
+    def invalidate_visited_tiles_by_user(self, userId: int) -> None:
+        self.__invalidate_visited_tiles_locally(userId)
+        self._sharedVisitedTileIndex.invalidate(userId)
+
+    def invalidate_planned_tiles_by_user(self, userId: int) -> None:
+        self.__invalidate_planned_tiles_locally(userId)
+        self._sharedPlannedTileIndex.invalidate(userId)
+
+    def __invalidate_visited_tiles_locally(self, userId: int) -> None:
+        if self._visitedTileIndexPerUser.pop(userId, None) is not None:
+            LOGGER.debug(f'Invalidated visited tile index for user {userId}')
+
+    def __invalidate_planned_tiles_locally(self, userId: int) -> None:
+        if self._plannedTileIndexPerUser.pop(userId, None) is not None:
+            LOGGER.debug(f'Invalidated planned tile index for user {userId}')
+
+    @staticmethod
+    def __load_visited_tiles(userId: int) -> list[tuple[int, int, int, int, int]]:
+        year = extract('year', DistanceWorkout.start_time)
+        rows = (
+            DistanceWorkout.query.select_from(DistanceWorkout)
+            .join(GpxVisitedTile, GpxVisitedTile.workout_id == DistanceWorkout.id)
+            .with_entities(GpxVisitedTile.x, GpxVisitedTile.y, DistanceWorkout.type, year, func.count())
+            .filter(DistanceWorkout.user_id == userId)
+            .group_by(GpxVisitedTile.x, GpxVisitedTile.y, DistanceWorkout.type, year)
+            .all()
+        )
+
+        return [
+            (x, y, 1 << workoutType.order, int(workoutYear), count) for x, y, workoutType, workoutYear, count in rows
+        ]
+
+    @staticmethod
+    def __load_planned_tiles(userId: int) -> list[tuple[int, int, int, int, int]]:
+        rows = (
+            PlannedTour.query.select_from(PlannedTour)
+            .join(GpxPlannedTile, GpxPlannedTile.planned_tour_id == PlannedTour.id)
+            .with_entities(GpxPlannedTile.x, GpxPlannedTile.y, PlannedTour.type)
+            .filter(
+                or_(
+                    PlannedTour.user_id == userId,
+                    PlannedTour.shared_users.any(id=userId),
+                )
+            )
+            .group_by(GpxPlannedTile.x, GpxPlannedTile.y, PlannedTour.type)
+            .all()
+        )
+
+        # planned tiles have no year, all planned tours of the same type are merged into a single entry
+        return [(x, y, 1 << workoutType.order, 0, 1) for x, y, workoutType in rows]
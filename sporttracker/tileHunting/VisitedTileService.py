@@ -1,21 +1,19 @@
-import math
 from dataclasses import dataclass
 
 from flask_login import current_user
-from sqlalchemy import extract, text, func, or_
 from sqlalchemy.orm import aliased
 
-from sporttracker.gpx.GpxService import VisitedTile
-from sporttracker.tileHunting.GpxPlannedTileEntity import GpxPlannedTile
-from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
-from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
+from sporttracker.gpx.GpxParser import VisitedTile
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
+from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache, MaxSquare
+from sporttracker.tileHunting.TilePyramidCache import TilePyramidCache
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache, PackedTileIndex, IndexedTile
 from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache, NewTilesPerDistanceWorkout
 from sporttracker.workout.WorkoutType import WorkoutType
 from sporttracker.quickFilter.QuickFilterStateEntity import QuickFilterState
 from sporttracker.tileHunting.TileHuntingFilterStateEntity import TileHuntingFilterState
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
 from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
-from sporttracker.db import db
 from sporttracker.workout.distance.DistanceWorkoutService import DistanceWorkoutService
 
 
@@ -40,6 +38,8 @@ class VisitedTileService:
         self,
         newVisitedTileCache: NewVisitedTileCache,
         maxSquareCache: MaxSquareCache,
+        tilePyramidCache: TilePyramidCache,
+        visitedTileIndexCache: VisitedTileIndexCache,
         quickFilterState: QuickFilterState,
         tileHuntingFilterState: TileHuntingFilterState,
         distanceWorkoutService: DistanceWorkoutService,
@@ -47,6 +47,8 @@ class VisitedTileService:
     ) -> None:
         self._newVisitedTileCache = newVisitedTileCache
         self._maxSquareCache = maxSquareCache
+        self._tilePyramidCache = tilePyramidCache
+        self._visitedTileIndexCache = visitedTileIndexCache
         self._quickFilterState = quickFilterState
         self._tileHuntingFilterState = tileHuntingFilterState
         self._distanceWorkoutService = distanceWorkoutService
@@ -85,25 +87,19 @@ class VisitedTileService:
     def __determine_tile_colors_of_all_workouts_that_visit_tiles(
         self, min_x: int, max_x: int, min_y: int, max_y: int, user_id: int
     ) -> list[TileColorPosition]:
-        distanceWorkoutAlias = aliased(DistanceWorkout)
-        gpxVisitedTileAlias = aliased(GpxVisitedTile)
-
-        rows = (
-            distanceWorkoutAlias.query.select_from(distanceWorkoutAlias)
-            .join(gpxVisitedTileAlias, gpxVisitedTileAlias.workout_id == distanceWorkoutAlias.id)
-            .with_entities(distanceWorkoutAlias.type, gpxVisitedTileAlias.x, gpxVisitedTileAlias.y)
-            .filter(distanceWorkoutAlias.user_id == user_id)
-            .filter(distanceWorkoutAlias.type.in_(self._quickFilterState.get_active_distance_workout_types()))
-            .filter(extract('year', distanceWorkoutAlias.start_time).in_(self._quickFilterState.years))
-            .filter(gpxVisitedTileAlias.x >= min_x)
-            .filter(gpxVisitedTileAlias.x <= max_x)
-            .filter(gpxVisitedTileAlias.y >= min_y)
-            .filter(gpxVisitedTileAlias.y <= max_y)
-            .group_by(gpxVisitedTileAlias.x, gpxVisitedTileAlias.y, distanceWorkoutAlias.type)
-            .all()
-        )
-
-        return [TileColorPosition(r[0].tile_color, r[1], r[2]) for r in rows]
+        numberOfVisits = self.__get_number_of_visits_from_tile_pyramid(min_x, max_x, min_y, max_y, user_id)
+        if numberOfVisits is not None:
+            return [
+                TileColorPosition(workoutType.tile_color, x, y)
+                for x, y, numberOfVisitsByType in numberOfVisits
+                for workoutType in numberOfVisitsByType
+            ]
+
+        return [
+            TileColorPosition(workoutType.tile_color, tile.x, tile.y)
+            for tile in self.__get_visited_tiles_from_index(min_x, max_x, min_y, max_y, user_id)
+            for workoutType in PackedTileIndex.get_workout_types(tile.typeMask)
+        ]
 
     def determine_planned_tiles(
         self, min_x: int, max_x: int, min_y: int, max_y: int, user_id: int
@@ -114,52 +110,55 @@ class VisitedTileService:
         if not self._tileHuntingFilterState.is_show_planned_tiles_active:  # type: ignore[arg-type]
             return []
 
-        plannedTourAlias = aliased(PlannedTour)
-        gpxPlannedTileAlias = aliased(GpxPlannedTile)
-
-        rows = (
-            plannedTourAlias.query.select_from(plannedTourAlias)
-            .join(gpxPlannedTileAlias, gpxPlannedTileAlias.planned_tour_id == plannedTourAlias.id)
-            .with_entities(gpxPlannedTileAlias.x, gpxPlannedTileAlias.y)
-            .filter(
-                or_(
-                    plannedTourAlias.user_id == user_id,
-                    plannedTourAlias.shared_users.any(id=user_id),
-                )
-            )
-            .filter(plannedTourAlias.type.in_(self._quickFilterState.get_active_distance_workout_types()))
-            .filter(gpxPlannedTileAlias.x >= min_x)
-            .filter(gpxPlannedTileAlias.x <= max_x)
-            .filter(gpxPlannedTileAlias.y >= min_y)
-            .filter(gpxPlannedTileAlias.y <= max_y)
-            .group_by(gpxPlannedTileAlias.x, gpxPlannedTileAlias.y)
-            .all()
+        plannedTiles = self._visitedTileIndexCache.get_planned_tile_index(user_id).get_tiles_in_bounding_box(
+            min_x,
+            max_x,
+            min_y,
+            max_y,
+            PackedTileIndex.get_type_mask(self._quickFilterState.get_active_distance_workout_types()),
+            None,
         )
 
-        return [VisitedTile(r[0], r[1]) for r in rows]
+        return [VisitedTile(tile.x, tile.y) for tile in plannedTiles]
 
     def determine_number_of_visits(
         self, min_x: int, max_x: int, min_y: int, max_y: int, user_id: int
     ) -> list[TileCountPosition]:
-        distanceWorkoutAlias = aliased(DistanceWorkout)
-        gpxVisitedTileAlias = aliased(GpxVisitedTile)
-
-        rows = (
-            distanceWorkoutAlias.query.select_from(distanceWorkoutAlias)
-            .join(gpxVisitedTileAlias, gpxVisitedTileAlias.workout_id == distanceWorkoutAlias.id)
-            .with_entities(func.count(), gpxVisitedTileAlias.x, gpxVisitedTileAlias.y)
-            .filter(distanceWorkoutAlias.user_id == user_id)
-            .filter(distanceWorkoutAlias.type.in_(self._quickFilterState.get_active_distance_workout_types()))
-            .filter(extract('year', distanceWorkoutAlias.start_time).in_(self._quickFilterState.years))
-            .filter(gpxVisitedTileAlias.x >= min_x)
-            .filter(gpxVisitedTileAlias.x <= max_x)
-            .filter(gpxVisitedTileAlias.y >= min_y)
-            .filter(gpxVisitedTileAlias.y <= max_y)
-            .group_by(gpxVisitedTileAlias.x, gpxVisitedTileAlias.y)
-            .all()
+        numberOfVisits = self.__get_number_of_visits_from_tile_pyramid(min_x, max_x, min_y, max_y, user_id)
+        if numberOfVisits is not None:
+            return [
+                TileCountPosition(sum(numberOfVisitsByType.values()), x, y)
+                for x, y, numberOfVisitsByType in numberOfVisits
+            ]
+
+        return [
+            TileCountPosition(tile.numberOfVisits, tile.x, tile.y)
+            for tile in self.__get_visited_tiles_from_index(min_x, max_x, min_y, max_y, user_id)
+        ]
+
+    def __get_number_of_visits_from_tile_pyramid(
+        self, min_x: int, max_x: int, min_y: int, max_y: int, user_id: int
+    ) -> list[tuple[int, int, dict[WorkoutType, int]]] | None:
+        return self._tilePyramidCache.get_pyramid(user_id).get_number_of_visits_in_bounding_box(
+            min_x,
+            max_x,
+            min_y,
+            max_y,
+            self._quickFilterState.get_active_distance_workout_types(),
+            self._quickFilterState.years,
         )
 
-        return [TileCountPosition(r[0], r[1], r[2]) for r in rows]
+    def __get_visited_tiles_from_index(
+        self, min_x: int, max_x: int, min_y: int, max_y: int, user_id: int
+    ) -> list[IndexedTile]:
+        return self._visitedTileIndexCache.get_visited_tile_index(user_id).get_tiles_in_bounding_box(
+            min_x,
+            max_x,
+            min_y,
+            max_y,
+            PackedTileIndex.get_type_mask(self._quickFilterState.get_active_distance_workout_types()),
+            set(self._quickFilterState.years),
+        )
 
     def __determine_tile_colors_of_single_workout(
         self,
@@ -214,61 +213,36 @@ class VisitedTileService:
 
     @staticmethod
     def __get_new_visited_tiles_by_workout(workout: DistanceWorkout) -> list[tuple[int, int]]:
-        rows = db.session.execute(
-            text(f"""SELECT *
-            FROM gpx_visited_tile
-            WHERE gpx_visited_tile."workout_id" = {workout.id}
-              AND NOT EXISTS (SELECT
-                              FROM distance_workout AS prev
-                                       join gpx_visited_tile AS visitied ON prev."id" = visitied."workout_id"
-                                       JOIN workout w_inner ON prev."id" = w_inner."id"
-                              WHERE w_inner."start_time" < '{workout.start_time}'
-                                AND w_inner."user_id" = {workout.user.id}
-                                AND gpx_visited_tile."x" = visitied."x"
-                                AND gpx_visited_tile."y" = visitied."y")""")
-        ).fetchall()
-
-        return [(row[1], row[2]) for row in rows]
-
-    def get_max_square_tile_positions(self) -> list[tuple[int, int]]:
-        return self._maxSquareCache.get_max_square_tile_positions(
+        return FirstVisitedTileService.get_new_tiles_by_workout(workout)
+
+    def get_max_square(self) -> MaxSquare | None:
+        return self._maxSquareCache.get_max_square(
             current_user.id,
             self._quickFilterState.get_active_distance_workout_types(),
             self._quickFilterState.years,
         )
 
     def get_max_square_size(self) -> int:
-        maxSquareTilePositions = self.get_max_square_tile_positions()
-        if not maxSquareTilePositions:
+        maxSquare = self.get_max_square()
+        if maxSquare is None:
             return 0
 
-        return int(math.sqrt(len(maxSquareTilePositions)))
+        return maxSquare.size
 
     def get_number_of_new_tiles_per_workout_type_per_year(
         self, min_year: int, max_year: int, workout_types: list[WorkoutType]
     ) -> dict[WorkoutType, dict[int, int]]:
-        numberOfVisitedTilesPerWorkout = self._newVisitedTileCache.get_number_of_new_visited_tiles_per_workout_by_user(
+        numberOfNewTilesPerTypeAndYear = FirstVisitedTileService.get_number_of_new_tiles_per_workout_type_and_year(
             current_user.id,
             workout_types,
-            self._quickFilterState.years,
+            self._quickFilterState.years if self._quickFilterState.years else None,
         )
 
         result = {}
         for workoutType in workout_types:
-            numberOfNewTilesPerYear = {}
-            for currentYear in range(min_year, max_year + 1):
-                numberOfNewTiles = 0
-                for entry in numberOfVisitedTilesPerWorkout:
-                    if entry.type != workoutType:
-                        continue
-
-                    if entry.startTime.year != currentYear:
-                        continue
-
-                    numberOfNewTiles = numberOfNewTiles + entry.numberOfNewTiles
-
-                numberOfNewTilesPerYear[currentYear] = numberOfNewTiles
-
-            result[workoutType] = numberOfNewTilesPerYear
+            result[workoutType] = {
+                currentYear: numberOfNewTilesPerTypeAndYear.get((workoutType, currentYear), 0)
+                for currentYear in range(min_year, max_year + 1)
+            }
 
         return result
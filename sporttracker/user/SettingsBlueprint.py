@@ -2,7 +2,7 @@ import logging
 import uuid
 
 from TheCodeLabs_BaseUtils.NtfyHelper import NtfyHelper
-from flask import Blueprint, render_template, redirect, url_for, abort, flash, jsonify
+from flask import Blueprint, render_template, redirect, url_for, abort, flash, jsonify, send_file, current_app
 from flask_babel import gettext
 from flask_bcrypt import Bcrypt
 from flask_login import login_required, current_user, fresh_login_required
@@ -33,6 +33,7 @@ from sporttracker.user.UserEntity import (
     DistanceWorkoutInfoItem,
     DistanceWorkoutInfoItemType,
 )
+from sporttracker.tileHunting.TileOverlayExportService import TileOverlayExportService, TileOverlayExportInfo
 from sporttracker.workout.WorkoutType import WorkoutType
 from sporttracker.db import db
 from sporttracker.maintenance.MaintenanceFilterStateEntity import get_maintenance_filter_state_by_user
@@ -98,7 +99,7 @@ class EditNtfySettingsModel(BaseModel):
     ntfy_password: str | None = None
 
 
-def construct_blueprint():
+def construct_blueprint(tileOverlayExportService: TileOverlayExportService):
     settings = Blueprint('settings', __name__, static_folder='static', url_prefix='/settings')
 
     @settings.route('/settings')
@@ -111,6 +112,8 @@ def construct_blueprint():
             participants=get_participants(),
             infoItems=__get_info_items(),
             tileRenderUrl=__get_tile_render_url(),
+            tileOverlayExportInfo=__get_tile_overlay_export_info(),
+            isTileOverlayExportRunning=tileOverlayExportService.is_export_running(current_user.id),
             ntfySettings=__get_ntfy_settings(),
             allNotificationSettings=__get_all_notification_settings(),
         )
@@ -135,6 +138,8 @@ def construct_blueprint():
                 participants=get_participants(),
                 infoItems=__get_info_items(),
                 tileRenderUrl=__get_tile_render_url(),
+                tileOverlayExportInfo=__get_tile_overlay_export_info(),
+                isTileOverlayExportRunning=tileOverlayExportService.is_export_running(current_user.id),
                 ntfySettings=__get_ntfy_settings(),
                 allNotificationSettings=__get_all_notification_settings(),
             )
@@ -148,6 +153,8 @@ def construct_blueprint():
                 participants=get_participants(),
                 infoItems=__get_info_items(),
                 tileRenderUrl=__get_tile_render_url(),
+                tileOverlayExportInfo=__get_tile_overlay_export_info(),
+                isTileOverlayExportRunning=tileOverlayExportService.is_export_running(current_user.id),
                 ntfySettings=__get_ntfy_settings(),
                 allNotificationSettings=__get_all_notification_settings(),
             )
@@ -205,6 +212,32 @@ def construct_blueprint():
 
         return redirect(url_for('settings.settingsShow'))
 
+    @settings.route('/exportTileOverlay', methods=['POST'])
+    @login_required
+    def exportTileOverlay():
+        if not current_user.isTileHuntingAccessActivated:
+            abort(404)
+
+        tileOverlayExportService.start_export_in_background(
+            current_app._get_current_object(),  # type: ignore[attr-defined]
+            current_user.id,
+        )
+
+        return redirect(url_for('settings.settingsShow'))
+
+    @settings.route('/downloadTileOverlay')
+    @login_required
+    def downloadTileOverlay():
+        if not tileOverlayExportService.is_export_available(current_user.id):
+            abort(404)
+
+        return send_file(
+            tileOverlayExportService.get_file_path(current_user.id),
+            mimetype='application/vnd.sqlite3',
+            as_attachment=True,
+            download_name=f'tileHunting_{current_user.username}.{TileOverlayExportService.FILE_EXTENSION}',
+        )
+
     @settings.route('/editDistanceWorkoutInfoItems', methods=['POST'])
     @login_required
     @validate()
@@ -614,6 +647,14 @@ def construct_blueprint():
         tileRenderUrl = tileRenderUrl + '/{z}/{x}/{y}.png'
         return tileRenderUrl
 
+    def __get_tile_overlay_export_info() -> TileOverlayExportInfo | None:
+        if not current_user.isTileHuntingAccessActivated:
+            return None
+
+        return tileOverlayExportService.get_export_info(
+            current_user.id, current_user.isTileHuntingShowPlannedTilesActivated
+        )
+
     def __get_ntfy_settings() -> EditNtfySettingsModel:
         ntfySettings = current_user.get_ntfy_settings()
         if ntfySettings is None:
@@ -0,0 +1,478 @@
+from __future__ import annotations
+
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, IO, Iterator, Sequence
+from zipfile import ZipFile, is_zipfile
+
+from sporttracker import Constants
+from sporttracker.db import db
+from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.gpx.GpxMetaInfo import GpxMetaInfo
+from sporttracker.gpx.GpxParser import GpxParser, TileExtractionMode
+from sporttracker.gpx.GpxService import GpxService
+from sporttracker.helpers.StageTimer import StageTimer
+from sporttracker.monthGoal.MonthGoalEntity import MonthGoalSummary
+from sporttracker.monthGoal.MonthGoalService import MonthGoalService
+from sporttracker.notification.NotificationService import NotificationService
+from sporttracker.tileHunting.BulkTileWriter import BulkTileWriter
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.GpxIngestService import GpxIngestService
+from sporttracker.workout.heartRate.HeartRateService import HeartRateService
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+from sporttracker.workout.distance.DistanceWorkoutService import DistanceWorkoutService
+
+LOGGER = logging.getLogger(Constants.APP_NAME)
+
+IMPORT_FILE_EXTENSIONS = (GpxService.GPX_FILE_EXTENSION, GpxService.FIT_FILE_EXTENSION)
+
+
+@dataclass(frozen=True)
+class WorkoutImportFile:
+    """
+    A gpx or fit file to import, either a file on disk or an entry (memberName) of a zip archive (path).
+    """
+
+    path: str
+    memberName: str | None = None
+
+    @property
+    def name(self) -> str:
+        return self.path if self.memberName is None else f'{self.path}:{self.memberName}'
+
+    @property
+    def workoutName(self) -> str:
+        return os.path.splitext(os.path.basename(self.memberName or self.path))[0]
+
+    @property
+    def extension(self) -> str:
+        return (self.memberName or self.path).rsplit('.', 1)[-1].lower()
+
+
+def find_import_files(path: str) -> list[WorkoutImportFile]:
+    """
+    Returns all gpx and fit files of the directory (including subdirectories) or zip archive, sorted by name.
+    """
+    if os.path.isdir(path):
+        filePaths: list[str] = []
+        for directoryPath, _, fileNames in os.walk(path):
+            filePaths.extend(
+                os.path.join(directoryPath, fileName)
+                for fileName in fileNames
+                if GpxService.is_allowed_file(fileName, list(IMPORT_FILE_EXTENSIONS))
+            )
+        return [WorkoutImportFile(filePath) for filePath in sorted(filePaths)]
+
+    if os.path.isfile(path) and is_zipfile(path):
+        with ZipFile(path, 'r') as zipObject:
+            memberNames = [
+                info.filename
+                for info in zipObject.infolist()
+                if not info.is_dir() and GpxService.is_allowed_file(info.filename, list(IMPORT_FILE_EXTENSIONS))
+            ]
+        return [WorkoutImportFile(path, memberName) for memberName in sorted(memberNames)]
+
+    raise ValueError(f'"{path}" is neither a directory nor a zip archive')
+
+
+@contextmanager
+def _open_import_file(importFile: WorkoutImportFile) -> Iterator[IO[bytes]]:
+    if importFile.memberName is None:
+        with open(importFile.path, 'rb') as f:
+            yield f
+        return
+
+    with ZipFile(importFile.path, 'r') as zipObject:
+        with zipObject.open(importFile.memberName) as f:
+            yield f
+
+
+@dataclass
+class ParsedWorkout:
+    """
+    Everything that is needed to create a workout from an import file, determined in a worker process.
+    The gpx archive, track points and geometries are already stored in the folder of gpxFileName.
+    """
+
+    name: str
+    gpxFileName: str
+    workoutType: WorkoutType | None
+    startTime: datetime
+    duration: int
+    distance: int
+    elevationSum: int | None
+    averageHeartRate: int | None
+    heartRateSamples: list[tuple[datetime, int]]
+    metaInfo: GpxMetaInfo
+    tiles: list[tuple[int, int]]
+
+
+@dataclass
+class WorkoutImportResult:
+    importFile: WorkoutImportFile
+    parsedWorkout: ParsedWorkout | None
+    stageDurations: dict[str, float]
+    error: str | None = None
+
+
+@dataclass
+class WorkoutImportReport:
+    numberOfFiles: int = 0
+    numberOfImportedWorkouts: int = 0
+    numberOfVisitedTiles: int = 0
+    failedFiles: list[tuple[str, str]] = field(default_factory=list)
+    # summed up over all worker processes
+    stageDurations: dict[str, float] = field(default_factory=dict)
+    databaseDuration: float = 0.0
+    finishDuration: float = 0.0
+    duration: float = 0.0
+
+    def add_stage_durations(self, stageDurations: dict[str, float]) -> None:
+        for stage, duration in stageDurations.items():
+            self.stageDurations[stage] = self.stageDurations.get(stage, 0.0) + duration
+
+    def get_files_per_second(self) -> float:
+        return self.numberOfFiles / self.duration if self.duration > 0 else 0.0
+
+
+def parse_import_file(
+    ingestService: GpxIngestService,
+    importFile: WorkoutImportFile,
+    gpxFileName: str,
+    baseZoomLevel: int,
+    tileExtractionMode: TileExtractionMode,
+) -> WorkoutImportResult:
+    """
+    Stores the gpx (or the fit and the converted gpx) like an upload and extracts the visited tiles.
+    Start time and duration are taken from the fit session or the times of the track points.
+    Does not access the database, so that files can be parsed in worker processes.
+    """
+    stageTimer = StageTimer()
+    try:
+        with _open_import_file(importFile) as stream:
+            if importFile.extension == GpxService.FIT_FILE_EXTENSION:
+                ingestResult = ingestService.ingest_fit(gpxFileName, stream, stageTimer)
+            else:
+                ingestResult = ingestService.ingest_gpx(gpxFileName, stream, stageTimer)
+
+        with stageTimer.measure('tiles'):
+            tiles = [
+                (tile.x, tile.y)
+                for tile in GpxParser.get_visited_tiles_of_segments(
+                    ingestResult.trackPoints.get_segments(), baseZoomLevel, tileExtractionMode
+                )
+            ]
+
+        metaInfo = ingestResult.metaInfo
+        fitActivity = ingestResult.fitActivity
+        heartRateSamples = [] if fitActivity is None else fitActivity.get_heart_rate_samples()
+        fitSession = None if fitActivity is None else fitActivity.session
+        if fitSession is not None:
+            parsedWorkout = ParsedWorkout(
+                name=importFile.workoutName,
+                gpxFileName=gpxFileName,
+                workoutType=fitSession.workout_type,
+                startTime=fitSession.start_time,
+                duration=fitSession.duration,
+                distance=int(metaInfo.distance) if fitSession.distance is None else fitSession.distance,
+                elevationSum=metaInfo.uphillDownhill.uphill
+                if fitSession.total_ascent is None
+                else fitSession.total_ascent,
+                averageHeartRate=fitSession.average_heart_rate,
+                heartRateSamples=heartRateSamples,
+                metaInfo=metaInfo,
+                tiles=tiles,
+            )
+        else:
+            startTime, duration = _get_start_time_and_duration(ingestResult.trackPoints.times)
+            parsedWorkout = ParsedWorkout(
+                name=importFile.workoutName,
+                gpxFileName=gpxFileName,
+                workoutType=None,
+                startTime=startTime,
+                duration=duration,
+                distance=int(metaInfo.distance),
+                elevationSum=metaInfo.uphillDownhill.uphill,
+                averageHeartRate=None,
+                heartRateSamples=heartRateSamples,
+                metaInfo=metaInfo,
+                tiles=tiles,
+            )
+    except Exception as e:
+        shutil.rmtree(ingestService.get_folder_path(gpxFileName), ignore_errors=True)
+        LOGGER.error(f'Could not import "{importFile.name}": {e}')
+        return WorkoutImportResult(importFile, None, stageTimer.get_durations(), str(e))
+
+    return WorkoutImportResult(importFile, parsedWorkout, stageTimer.get_durations())
+
+
+def _get_start_time_and_duration(times: Sequence[float]) -> tuple[datetime, int]:
+    """
+    Returns the (local) start time and the duration in seconds from the first and last track point with a time.
+    """
+    firstTime = next((t for t in times if not math.isnan(t)), None)
+    if firstTime is None:
+        raise ValueError('The track contains no times')
+
+    lastTime = next(t for t in reversed(times) if not math.isnan(t))
+    return datetime.fromtimestamp(int(firstTime)), int(lastTime - firstTime)
+
+
+_WORKER_ARGUMENTS: tuple[GpxIngestService, int, TileExtractionMode] | None = None
+
+
+def _initialize_worker(ingestService: GpxIngestService, baseZoomLevel: int, tileExtractionMode: Any) -> None:
+    global _WORKER_ARGUMENTS
+    _WORKER_ARGUMENTS = (ingestService, baseZoomLevel, tileExtractionMode)
+
+
+def _parse_in_worker(task: tuple[WorkoutImportFile, str]) -> WorkoutImportResult:
+    assert _WORKER_ARGUMENTS is not None
+    ingestService, baseZoomLevel, tileExtractionMode = _WORKER_ARGUMENTS
+    return parse_import_file(ingestService, task[0], task[1], baseZoomLevel, tileExtractionMode)
+
+
+@dataclass
+class _NotificationState:
+    """
+    Records the state before the first workout of each workout type and month is imported and one imported workout
+    per workout type and month, so that the notifications are evaluated once at the end of the import.
+    """
+
+    previousLongestDistances: dict[WorkoutType, int | None] = field(default_factory=dict)
+    previousBestMonthDistances: dict[WorkoutType, int | None] = field(default_factory=dict)
+    previousCompletedMonthGoals: dict[tuple[WorkoutType, int, int], list[MonthGoalSummary]] = field(
+        default_factory=dict
+    )
+    longestWorkouts: dict[WorkoutType, DistanceWorkout] = field(default_factory=dict)
+    monthWorkouts: dict[tuple[WorkoutType, int, int], DistanceWorkout] = field(default_factory=dict)
+
+    def record_previous_state(self, userId: int, workoutType: WorkoutType, startTime: datetime) -> None:
+        if workoutType not in self.previousLongestDistances:
+            self.previousLongestDistances[workoutType] = DistanceWorkoutService.get_longest_workout_distance(
+                userId, workoutType
+            )
+            self.previousBestMonthDistances[workoutType] = DistanceWorkoutService.get_best_month_distance(
+                userId, workoutType
+            )
+
+        monthKey = (workoutType, startTime.year, startTime.month)
+        if monthKey not in self.previousCompletedMonthGoals:
+            self.previousCompletedMonthGoals[monthKey] = MonthGoalService.get_goal_summaries_for_completed_goals(
+                startTime.year, startTime.month, [workoutType], userId
+            )
+
+    def add_workout(self, workout: DistanceWorkout) -> None:
+        longestWorkout = self.longestWorkouts.get(workout.type)
+        if longestWorkout is None or workout.distance > longestWorkout.distance:
+            self.longestWorkouts[workout.type] = workout
+
+        self.monthWorkouts.setdefault(
+            (workout.type, workout.start_time.year, workout.start_time.month),  # type: ignore[attr-defined]
+            workout,
+        )
+
+
+class DistanceWorkoutImportService:
+    """
+    Imports a large number of gpx and fit files as distance workouts of a user.
+
+    The files are parsed, stored and their visited tiles are extracted in several processes.
+    The workouts are created in batches with one transaction per batch.
+    The tile caches are invalidated and the notifications are evaluated only once at the end of the import.
+    """
+
+    def __init__(
+        self, gpxService: GpxService, notificationService: NotificationService, tileHuntingSettings: dict[str, Any]
+    ) -> None:
+        self._gpxService = gpxService
+        self._notificationService = notificationService
+        self._baseZoomLevel = tileHuntingSettings['baseZoomLevel']
+
+    def import_workouts(
+        self,
+        importFiles: list[WorkoutImportFile],
+        userId: int,
+        defaultWorkoutType: WorkoutType,
+        numberOfProcesses: int,
+        batchSize: int,
+        onProgress: Callable[[WorkoutImportResult], None] | None = None,
+    ) -> WorkoutImportReport:
+        """
+        defaultWorkoutType is used for gpx files and fit files without supported sport.
+        onProgress is called for each parsed file.
+        """
+        report = WorkoutImportReport(numberOfFiles=len(importFiles))
+        notificationState = _NotificationState()
+        startTime = time.perf_counter()
+
+        batch: list[WorkoutImportResult] = []
+        for result in self.__parse(importFiles, numberOfProcesses):
+            report.add_stage_durations(result.stageDurations)
+            if result.error is not None:
+                report.failedFiles.append((result.importFile.name, result.error))
+            else:
+                batch.append(result)
+
+            if len(batch) >= batchSize:
+                self.__store_batch(batch, userId, defaultWorkoutType, notificationState, report)
+                batch = []
+
+            if onProgress is not None:
+                onProgress(result)
+
+        if batch:
+            self.__store_batch(batch, userId, defaultWorkoutType, notificationState, report)
+
+        finishStartTime = time.perf_counter()
+        if report.numberOfImportedWorkouts > 0:
+            self._gpxService.invalidate_tile_caches_by_user(userId)
+            self.__evaluate_notifications(userId, notificationState)
+        report.finishDuration = time.perf_counter() - finishStartTime
+
+        report.duration = time.perf_counter() - startTime
+        return report
+
+    def __parse(self, importFiles: list[WorkoutImportFile], numberOfProcesses: int) -> Iterator[WorkoutImportResult]:
+        """
+        Yields the parse result of each file in the order of the given files.
+        """
+        ingestService = self._gpxService.get_ingest_service()
+        tileExtractionMode = self._gpxService.get_tile_extraction_mode()
+        tasks = [(importFile, uuid.uuid4().hex) for importFile in importFiles]
+
+        if numberOfProcesses <= 1 or len(tasks) <= 1:
+            for importFile, gpxFileName in tasks:
+                yield parse_import_file(ingestService, importFile, gpxFileName, self._baseZoomLevel, tileExtractionMode)
+            return
+
+        # spawn instead of fork, since the process holds open database connections
+        with ProcessPoolExecutor(
+            max_workers=numberOfProcesses,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_initialize_worker,
+            initargs=(ingestService, self._baseZoomLevel, tileExtractionMode),
+        ) as executor:
+            chunkSize = max(1, len(tasks) // (numberOfProcesses * 4))
+            yield from executor.map(_parse_in_worker, tasks, chunksize=chunkSize)
+
+    def __store_batch(
+        self,
+        batch: list[WorkoutImportResult],
+        userId: int,
+        defaultWorkoutType: WorkoutType,
+        notificationState: _NotificationState,
+        report: WorkoutImportReport,
+    ) -> None:
+        """
+        Creates the gpx metadata, workouts, visited tiles, heart rate data and first visited tiles of all files in one
+        transaction.
+        If the transaction fails, the stored files of the batch are removed and all its files are reported as failed.
+        """
+        startTime = time.perf_counter()
+        parsedWorkouts = [result.parsedWorkout for result in batch if result.parsedWorkout is not None]
+        try:
+            gpxMetadataList = []
+            for parsedWorkout in parsedWorkouts:
+                notificationState.record_previous_state(
+                    userId, parsedWorkout.workoutType or defaultWorkoutType, parsedWorkout.startTime
+                )
+
+                metaInfo = parsedWorkout.metaInfo
+                gpxMetadataList.append(
+                    GpxMetadata(
+                        gpx_file_name=parsedWorkout.gpxFileName,
+                        length=metaInfo.distance,
+                        elevation_minimum=metaInfo.elevationExtremes.minimum,
+                        elevation_maximum=metaInfo.elevationExtremes.maximum,
+                        uphill=metaInfo.uphillDownhill.uphill,
+                        downhill=metaInfo.uphillDownhill.downhill,
+                        editor_link=metaInfo.editorLink,
+                    )
+                )
+
+            # one flush per table, so that the rows are inserted together
+            db.session.add_all(gpxMetadataList)
+            db.session.flush()
+
+            workouts = [
+                DistanceWorkout(
+                    name=parsedWorkout.name,
+                    type=parsedWorkout.workoutType or defaultWorkoutType,
+                    start_time=parsedWorkout.startTime,
+                    duration=parsedWorkout.duration,
+                    distance=parsedWorkout.distance,
+                    average_heart_rate=parsedWorkout.averageHeartRate,
+                    elevation_sum=parsedWorkout.elevationSum,
+                    gpx_metadata_id=gpxMetadata.id,
+                    custom_fields={},
+                    user_id=userId,
+                    participants=[],
+                    share_code=None,
+                    planned_tour=None,
+                )
+                for parsedWorkout, gpxMetadata in zip(parsedWorkouts, gpxMetadataList)
+            ]
+            db.session.add_all(workouts)
+            db.session.flush()
+
+            workoutsWithTiles = []
+            for workout, parsedWorkout in zip(workouts, parsedWorkouts):
+                BulkTileWriter.insert_visited_tiles(db.session, workout.id, parsedWorkout.tiles)
+                HeartRateService.add_heart_rate_data(workout.id, parsedWorkout.heartRateSamples)
+                workoutsWithTiles.append((workout, parsedWorkout.tiles))
+
+            # commits the whole batch
+            FirstVisitedTileService.add_workouts(workoutsWithTiles)
+        except Exception as e:
+            db.session.rollback()
+            LOGGER.error(f'Could not store batch of {len(batch)} imported workouts: {e}')
+            for result in batch:
+                if result.parsedWorkout is not None:
+                    shutil.rmtree(
+                        self._gpxService.get_folder_path(result.parsedWorkout.gpxFileName), ignore_errors=True
+                    )
+                report.failedFiles.append((result.importFile.name, str(e)))
+            report.databaseDuration += time.perf_counter() - startTime
+            return
+
+        for workout, tiles in workoutsWithTiles:
+            notificationState.add_workout(workout)
+            report.numberOfVisitedTiles += len(tiles)
+        report.numberOfImportedWorkouts += len(workoutsWithTiles)
+        report.databaseDuration += time.perf_counter() - startTime
+        LOGGER.debug(f'Stored batch of {len(workoutsWithTiles)} imported workouts for user {userId}')
+
+    def __evaluate_notifications(self, userId: int, notificationState: _NotificationState) -> None:
+        for workoutType, longestWorkout in notificationState.longestWorkouts.items():
+            monthWorkouts = {
+                (year, month): workout
+                for (monthWorkoutType, year, month), workout in notificationState.monthWorkouts.items()
+                if monthWorkoutType == workoutType
+            }
+            bestMonth = max(
+                monthWorkouts,
+                key=lambda yearAndMonth: DistanceWorkoutService.get_month_distance(userId, workoutType, *yearAndMonth),
+            )
+            self._notificationService.on_distance_workouts_imported(
+                userId,
+                longestWorkout,
+                monthWorkouts[bestMonth],
+                notificationState.previousLongestDistances[workoutType],
+                notificationState.previousBestMonthDistances[workoutType],
+            )
+
+        for monthKey, workout in notificationState.monthWorkouts.items():
+            self._notificationService.on_check_month_goals(
+                userId, workout, notificationState.previousCompletedMonthGoals[monthKey]
+            )
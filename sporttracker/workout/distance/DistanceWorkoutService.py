@@ -23,6 +23,7 @@ from werkzeug.datastructures import FileStorage
 from sporttracker.api.FormModels import DistanceWorkoutApiFormModel
 from sporttracker import Constants
 from sporttracker.gpx.GpxService import GpxService
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
 from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout, MonthDistanceSum
 from sporttracker.user.ParticipantEntity import get_participants_by_ids
 from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
@@ -57,7 +58,8 @@ class DistanceWorkoutService:
         if form_model.fit_file_name:  # only filled during import from FIT file
             files = self.__handle_fit_import(form_model)
 
-        gpxMetadataId = self._gpx_service.handle_gpx_upload_for_workout(files)
+        uploadResult = self._gpx_service.handle_gpx_upload_for_workout(files)
+        gpxMetadataId = None if uploadResult is None else uploadResult.gpxMetadataId
 
         participants = get_participants_by_ids(participant_ids)
         if form_model.planned_tour_id == '-1':
@@ -93,6 +95,9 @@ class DistanceWorkoutService:
         )
 
         db.session.add(workout)
+        db.session.flush()
+        if uploadResult is not None:
+            HeartRateService.add_heart_rate_data(workout.id, uploadResult.heartRateSamples)
         db.session.commit()
 
         if gpxMetadataId is not None:
@@ -213,6 +218,8 @@ class DistanceWorkoutService:
         else:
             plannedTour = PlannedTourService.get_planned_tour_by_id(int(form_model.planned_tour_id))
 
+        previousStartTime = workout.start_time
+
         workout.name = form_model.name  # type: ignore[assignment]
         workout.start_time = startTime  # type: ignore[assignment]
         workout.distance = form_model.distance * 1000  # type: ignore[assignment]
@@ -224,7 +231,8 @@ class DistanceWorkoutService:
         workout.planned_tour = plannedTour  # type: ignore[assignment]
 
         shouldUpdateVisitedTiles = False
-        newGpxMetadataId = self._gpx_service.handle_gpx_upload_for_workout(files)
+        uploadResult = self._gpx_service.handle_gpx_upload_for_workout(files)
+        newGpxMetadataId = None if uploadResult is None else uploadResult.gpxMetadataId
         if workout.gpx_metadata_id is None:
             workout.gpx_metadata_id = newGpxMetadataId
             shouldUpdateVisitedTiles = True
@@ -234,6 +242,9 @@ class DistanceWorkoutService:
                 workout.gpx_metadata_id = newGpxMetadataId
                 shouldUpdateVisitedTiles = True
 
+        if uploadResult is not None and uploadResult.heartRateSamples:
+            HeartRateService.replace_heart_rate_data(workout_id, uploadResult.heartRateSamples)
+
         workout.custom_fields = form_model.model_extra
 
         db.session.commit()
@@ -242,6 +253,10 @@ class DistanceWorkoutService:
             self._gpx_service.add_visited_tiles_for_workout(
                 workout, self._tile_hunting_settings['baseZoomLevel'], user_id
             )
+        elif previousStartTime != startTime and workout.gpx_metadata_id is not None:
+            # the start time determines which tiles are new and whether the tiles match the year filter
+            FirstVisitedTileService.update_workout(workout)
+            self._gpx_service.invalidate_tile_caches_by_user(user_id)
 
         LOGGER.debug(f'Updated distance workout: {workout}')
         self._notification_service.on_distance_workout_updated(
@@ -0,0 +1,226 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from array import array
+from dataclasses import dataclass
+from typing import IO
+
+from sporttracker.fit.FitDecoder import FitActivity, FitDecoder
+from sporttracker.fit.FitToGpxConverter import FitToGpxConverter
+from sporttracker.gpx import GpxGeometry
+from sporttracker.gpx.GpxArchiveCompression import GpxArchiveCompression
+from sporttracker.gpx.GpxMetaInfo import GpxMetaInfo
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser, ReadableStream
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+from sporttracker.helpers.StageTimer import StageTimer
+
+
+@dataclass
+class GpxIngestResult:
+    gpxFileName: str
+    metaInfo: GpxMetaInfo
+    trackPoints: GpxTrackPoints
+    stageDurations: dict[str, float]
+    # session and heart rate samples of an ingested fit file
+    fitActivity: FitActivity | None = None
+
+
+class _ArchivingStream:
+    """
+    Passes all data read from the source stream to the parser and writes it into the zip entry at the same time.
+    """
+
+    def __init__(self, source: ReadableStream, target: IO[bytes], stageTimer: StageTimer) -> None:
+        self._source = source
+        self._target = target
+        self._stageTimer = stageTimer
+
+    def read(self, size: int = -1, /) -> bytes:
+        with self._stageTimer.measure('read'):
+            chunk = self._source.read(size)
+
+        with self._stageTimer.measure('compress'):
+            self._target.write(chunk)
+
+        return chunk
+
+
+class _CompressingStream:
+    """
+    Measures the time spent on compressing the chunks written into a zip entry.
+    """
+
+    def __init__(self, target: IO[bytes], stageTimer: StageTimer) -> None:
+        self._target = target
+        self._stageTimer = stageTimer
+
+    def write(self, data: bytes, /) -> int:
+        with self._stageTimer.measure('compress'):
+            return self._target.write(data)
+
+
+class GpxIngestService:
+    """
+    Writes the files of an uploaded gpx into its folder in the data folder: the gpx archive, the track points file
+    and the simplified geometries.
+    Independent of the database and the tile caches, so that gpx files can also be ingested in worker processes.
+    """
+
+    ZIP_FILE_EXTENSION = 'gpx.zip'
+    GPX_FILE_EXTENSION = 'gpx'
+    FIT_FILE_EXTENSION = 'fit'
+    TRACK_POINTS_FILE_EXTENSION = 'points'
+    GEOMETRY_FOLDER_NAME = 'geometry'
+
+    def __init__(self, dataPath: str, archiveCompression: GpxArchiveCompression) -> None:
+        self._dataPath = dataPath
+        self._archiveCompression = archiveCompression
+
+    def get_folder_path(self, gpxFileName: str) -> str:
+        return os.path.join(self._dataPath, gpxFileName)
+
+    def get_zip_file_path(self, gpxFileName: str) -> str:
+        return os.path.join(self.get_folder_path(gpxFileName), f'{gpxFileName}.{GpxIngestService.ZIP_FILE_EXTENSION}')
+
+    def get_track_points_file_path(self, gpxFileName: str) -> str:
+        return os.path.join(
+            self.get_folder_path(gpxFileName), f'{gpxFileName}.{GpxIngestService.TRACK_POINTS_FILE_EXTENSION}'
+        )
+
+    def get_fit_file_path(self, gpxFileName: str) -> str:
+        return os.path.join(self.get_folder_path(gpxFileName), f'{gpxFileName}.{GpxIngestService.FIT_FILE_EXTENSION}')
+
+    def get_geometry_file_path(self, gpxFileName: str, zoomLevel: int) -> str:
+        return os.path.join(
+            self.get_folder_path(gpxFileName), GpxIngestService.GEOMETRY_FOLDER_NAME, f'{zoomLevel}.json'
+        )
+
+    def ingest_gpx(
+        self, gpxFileName: str, stream: ReadableStream, stageTimer: StageTimer | None = None
+    ) -> GpxIngestResult:
+        """
+        Stores a gpx in a single pass: the data is parsed (metadata and track points) while it is compressed into
+        the zip archive. Afterwards the track points are saved to a compact file, so that the visited tiles
+        can be extracted later without parsing the gpx again.
+        """
+        if stageTimer is None:
+            stageTimer = StageTimer()
+
+        destinationFolderPath = self.get_folder_path(gpxFileName)
+        os.makedirs(destinationFolderPath, exist_ok=True)
+
+        durationsBeforePass = stageTimer.get_durations()
+        startTime = time.perf_counter()
+        try:
+            with self._archiveCompression.open(self.get_zip_file_path(gpxFileName)) as zipObject:
+                zipEntry = zipObject.open(f'{gpxFileName}.{GpxIngestService.GPX_FILE_EXTENSION}', mode='w')
+                try:
+                    gpxParser = GpxStreamParser(_ArchivingStream(stream, zipEntry, stageTimer))
+                finally:
+                    # flushes the remaining compressed data
+                    with stageTimer.measure('compress'):
+                        zipEntry.close()
+        except Exception:
+            shutil.rmtree(destinationFolderPath, ignore_errors=True)
+            raise
+
+        # read and compress are measured inside the single pass, the remaining time is spent on parsing
+        durationsOfPass = stageTimer.get_durations()
+        stageTimer.add(
+            'parse',
+            time.perf_counter()
+            - startTime
+            - sum(
+                durationsOfPass.get(stage, 0.0) - durationsBeforePass.get(stage, 0.0) for stage in ('read', 'compress')
+            ),
+        )
+
+        trackPoints = gpxParser.get_track_points()
+        self.__save_track_points(gpxFileName, trackPoints, stageTimer)
+
+        return GpxIngestResult(gpxFileName, gpxParser.get_meta_info(), trackPoints, stageTimer.get_durations())
+
+    def ingest_fit(
+        self, gpxFileName: str, stream: ReadableStream, stageTimer: StageTimer | None = None
+    ) -> GpxIngestResult:
+        """
+        Stores the fit file next to the gpx archive (offered for download) and decodes it in a single pass.
+        The gpx archive, track points, geometries and meta info are all created from the decoded track points,
+        the gpx is neither written to a temporary file nor parsed again.
+        """
+        if stageTimer is None:
+            stageTimer = StageTimer()
+
+        destinationFolderPath = self.get_folder_path(gpxFileName)
+        os.makedirs(destinationFolderPath, exist_ok=True)
+
+        fitFilePath = self.get_fit_file_path(gpxFileName)
+        try:
+            with stageTimer.measure('read'):
+                with open(fitFilePath, 'wb') as fitFile:
+                    shutil.copyfileobj(stream, fitFile)
+
+            with stageTimer.measure('decode'):
+                fitActivity = FitDecoder.decode(fitFilePath, gpxFileName)
+
+            self.__write_converted_gpx(gpxFileName, fitActivity, stageTimer)
+
+            # the converted gpx consists of a single track with a single segment
+            trackPoints = GpxTrackPoints(
+                fitActivity.latitudes, fitActivity.longitudes, fitActivity.altitudes, fitActivity.times, array('I', [0])
+            )
+            with stageTimer.measure('metaInfo'):
+                metaInfo = trackPoints.get_meta_info()
+
+            self.__save_track_points(gpxFileName, trackPoints, stageTimer)
+        except Exception:
+            shutil.rmtree(destinationFolderPath, ignore_errors=True)
+            raise
+
+        return GpxIngestResult(gpxFileName, metaInfo, trackPoints, stageTimer.get_durations(), fitActivity)
+
+    def __write_converted_gpx(self, gpxFileName: str, fitActivity: FitActivity, stageTimer: StageTimer) -> None:
+        """
+        Streams the gpx converted from the fit track points into the zip entry, without creating the whole xml.
+        """
+        durationsBeforeConversion = stageTimer.get_durations()
+        startTime = time.perf_counter()
+
+        with self._archiveCompression.open(self.get_zip_file_path(gpxFileName)) as zipObject:
+            zipEntry = zipObject.open(f'{gpxFileName}.{GpxIngestService.GPX_FILE_EXTENSION}', mode='w')
+            try:
+                FitToGpxConverter.write_gpx(fitActivity, _CompressingStream(zipEntry, stageTimer))
+            finally:
+                # flushes the remaining compressed data
+                with stageTimer.measure('compress'):
+                    zipEntry.close()
+
+        # compress is measured per chunk, the remaining time is spent on creating the xml
+        durationsOfConversion = stageTimer.get_durations()
+        stageTimer.add(
+            'convert',
+            time.perf_counter()
+            - startTime
+            - (durationsOfConversion.get('compress', 0.0) - durationsBeforeConversion.get('compress', 0.0)),
+        )
+
+    def __save_track_points(self, gpxFileName: str, trackPoints: GpxTrackPoints, stageTimer: StageTimer) -> None:
+        with stageTimer.measure('trackPoints'):
+            trackPoints.save(self.get_track_points_file_path(gpxFileName))
+
+        with stageTimer.measure('geometry'):
+            self.save_geometries(gpxFileName, trackPoints)
+
+    def save_geometries(self, gpxFileName: str, trackPoints: GpxTrackPoints) -> None:
+        os.makedirs(
+            os.path.join(self.get_folder_path(gpxFileName), GpxIngestService.GEOMETRY_FOLDER_NAME), exist_ok=True
+        )
+
+        for zoomLevel, geometry in GpxGeometry.create_geometries(trackPoints).items():
+            geometryFilePath = self.get_geometry_file_path(gpxFileName, zoomLevel)
+            temporaryFilePath = f'{geometryFilePath}.{uuid.uuid4().hex}.tmp'
+            with open(temporaryFilePath, 'w', encoding='utf-8') as geometryFile:
+                json.dump(geometry, geometryFile, separators=(',', ':'))
+            os.replace(temporaryFilePath, geometryFilePath)
@@ -1,6 +1,9 @@
 from __future__ import annotations
 
 import logging
+from datetime import datetime
+
+from sqlalchemy import insert
 
 from sporttracker import Constants
 from sporttracker.db import db
@@ -24,3 +27,26 @@ class HeartRateService:
         deleteStatement = HeartRateEntity.__table__.delete().where(HeartRateEntity.workout_id == workout_id)
         db.session.execute(deleteStatement)
         db.session.commit()
+
+    @staticmethod
+    def add_heart_rate_data(workout_id: int, samples: list[tuple[datetime, int]]) -> int:
+        """
+        Inserts all samples with a single executemany statement.
+        Does not commit, so that the samples can be stored in the same transaction as their workout.
+        """
+        if not samples:
+            return 0
+
+        rows = [{'workout_id': workout_id, 'timestamp': timestamp, 'bpm': bpm} for timestamp, bpm in samples]
+        db.session.execute(insert(HeartRateEntity), rows)
+        LOGGER.debug(f'Added {len(rows)} heart rate data points for workout {workout_id}')
+        return len(rows)
+
+    @staticmethod
+    def replace_heart_rate_data(workout_id: int, samples: list[tuple[datetime, int]]) -> int:
+        """
+        Replaces the heart rate data of a workout, e.g. by the samples of a new fit file. Does not commit.
+        """
+        deleteStatement = HeartRateEntity.__table__.delete().where(HeartRateEntity.workout_id == workout_id)
+        db.session.execute(deleteStatement)
+        return HeartRateService.add_heart_rate_data(workout_id, samples)
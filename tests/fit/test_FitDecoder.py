@@ -0,0 +1,144 @@
+import math
+import os
+import struct
+from datetime import datetime, timezone
+
+import fitdecode.utils  # type: ignore[import-untyped]
+
+from sporttracker.fit.FitDecoder import FitDecoder
+from sporttracker.fit.FitSessionParser import FitSessionParser
+from sporttracker.workout.WorkoutType import WorkoutType
+from tests.TestConstants import ROOT_DIRECTORY
+
+FIT_FILE_PATH = os.path.join(ROOT_DIRECTORY, 'sporttracker', 'dummyData', 'fitTrack_1.fit')
+
+# seconds between the unix epoch and the FIT epoch (1989-12-31 00:00:00 UTC)
+FIT_EPOCH_OFFSET = 631065600
+SEMICIRCLES_PER_DEGREE = (2**32) / 360
+
+# field definition number, struct format, base type
+RECORD_FIELDS = [(253, 'I', 0x86), (0, 'i', 0x85), (1, 'i', 0x85), (2, 'H', 0x84), (3, 'B', 0x02)]
+SESSION_FIELDS = [(2, 'I', 0x86), (8, 'I', 0x86), (9, 'I', 0x86), (5, 'B', 0x00), (22, 'H', 0x84), (16, 'B', 0x02)]
+SPORTS = {'cycling': 2, 'running': 1, 'swimming': 5}
+
+
+def _create_definition(localType: int, globalNumber: int, fields: list[tuple[int, str, int]]) -> bytes:
+    content = struct.pack('<BBBHB', 0x40 | localType, 0, 0, globalNumber, len(fields))
+    for number, fieldFormat, baseType in fields:
+        content += struct.pack('<BBB', number, struct.calcsize(fieldFormat), baseType)
+    return content
+
+
+def _create_message(localType: int, fields: list[tuple[int, str, int]], values: list[int]) -> bytes:
+    return bytes([localType]) + struct.pack('<' + ''.join(fieldFormat for _, fieldFormat, _ in fields), *values)
+
+
+def _to_fit_time(time: datetime) -> int:
+    return int(time.timestamp()) - FIT_EPOCH_OFFSET
+
+
+def create_fit_file(
+    points: list[tuple[datetime, float | None, float | None, float | None, int | None]],
+    startTime: datetime,
+    sport: str = 'cycling',
+) -> bytes:
+    """
+    Creates a minimal FIT file with one record per point (time, latitude, longitude, altitude, heart rate)
+    and a session. Missing values are written as the invalid value of the respective base type.
+    """
+    data = _create_definition(0, 20, RECORD_FIELDS)
+    for time, latitude, longitude, altitude, heartRate in points:
+        data += _create_message(
+            0,
+            RECORD_FIELDS,
+            [
+                _to_fit_time(time),
+                0x7FFFFFFF if latitude is None else round(latitude * SEMICIRCLES_PER_DEGREE),
+                0x7FFFFFFF if longitude is None else round(longitude * SEMICIRCLES_PER_DEGREE),
+                0xFFFF if altitude is None else round((altitude + 500) * 5),
+                0xFF if heartRate is None else heartRate,
+            ],
+        )
+
+    data += _create_definition(1, 18, SESSION_FIELDS)
+    duration = int((points[-1][0] - points[0][0]).total_seconds())
+    data += _create_message(
+        1, SESSION_FIELDS, [_to_fit_time(startTime), duration * 1000, 123456, SPORTS[sport], 42, 0xFF]
+    )
+
+    header = struct.pack('<BBHI4s', 14, 0x20, 2132, len(data), b'.FIT')
+    header += struct.pack('<H', fitdecode.utils.compute_crc(header))
+    content = header + data
+    return content + struct.pack('<H', fitdecode.utils.compute_crc(content))
+
+
+def get_time(minute: int, second: int = 0) -> datetime:
+    return datetime(2024, 5, 1, 10, minute, second, tzinfo=timezone.utc)
+
+
+def create_fit_file_with_heart_rate(sport: str = 'cycling') -> bytes:
+    return create_fit_file(
+        [
+            (get_time(0), 52.5, 13.3, 35.0, 100),
+            (get_time(0, 30), None, None, None, 110),
+            (get_time(1), 52.51, 13.31, None, 120),
+            (get_time(1), 52.52, 13.32, 37.2, 120),
+            (get_time(2), 52.53, 13.33, 38.0, None),
+        ],
+        get_time(0),
+        sport,
+    )
+
+
+class TestFitDecoder:
+    def test_decode(self, tmp_path):
+        (tmp_path / 'track.fit').write_bytes(create_fit_file_with_heart_rate())
+
+        activity = FitDecoder.decode(str(tmp_path / 'track.fit'), 'track')
+
+        assert activity.session is not None
+        assert activity.session.file_name == 'track'
+        assert activity.session.start_time == datetime.fromtimestamp(get_time(0).timestamp())
+        assert activity.session.duration == 120
+        assert activity.session.distance == 1234
+        assert activity.session.total_ascent == 42
+        assert activity.session.average_heart_rate is None
+        assert activity.session.workout_type == WorkoutType.BIKING
+
+        # the record without a position only contains a heart rate sample
+        assert len(activity) == 4
+        assert [round(latitude, 6) for latitude in activity.latitudes] == [52.5, 52.51, 52.52, 52.53]
+        assert [round(longitude, 6) for longitude in activity.longitudes] == [13.3, 13.31, 13.32, 13.33]
+        assert math.isnan(activity.altitudes[1])
+        assert [round(activity.altitudes[index], 1) for index in (0, 2, 3)] == [35.0, 37.2, 38.0]
+        assert list(activity.times) == [get_time(minute).timestamp() for minute in (0, 1, 1, 2)]
+
+        assert list(activity.heartRateValues) == [100, 110, 120, 120]
+
+    def test_get_heart_rate_samples(self, tmp_path):
+        (tmp_path / 'track.fit').write_bytes(create_fit_file_with_heart_rate())
+
+        activity = FitDecoder.decode(str(tmp_path / 'track.fit'), 'track')
+
+        # duplicate samples are skipped
+        assert activity.get_heart_rate_samples() == [
+            (datetime.fromtimestamp(get_time(0).timestamp()), 100),
+            (datetime.fromtimestamp(get_time(0, 30).timestamp()), 110),
+            (datetime.fromtimestamp(get_time(1).timestamp()), 120),
+        ]
+
+    def test_decode_unsupported_sport(self, tmp_path):
+        (tmp_path / 'track.fit').write_bytes(create_fit_file_with_heart_rate('swimming'))
+
+        activity = FitDecoder.decode(str(tmp_path / 'track.fit'), 'track')
+
+        assert activity.session is None
+        assert len(activity) == 4
+        assert len(activity.heartRateValues) == 4
+
+    def test_decode_same_session_as_session_parser(self):
+        activity = FitDecoder.decode(FIT_FILE_PATH, 'fitTrack_1')
+
+        assert activity.session == FitSessionParser.parse(FIT_FILE_PATH)
+        assert len(activity) == 5102
+        assert len(activity.heartRateValues) == 0
@@ -0,0 +1,79 @@
+import io
+import math
+from array import array
+from datetime import datetime, timezone
+from unittest.mock import patch
+
+import gpxpy.gpx
+
+from sporttracker.fit.FitDecoder import FitActivity, FitDecoder
+from sporttracker.fit.FitToGpxConverter import FitToGpxConverter
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser
+from tests.fit.test_FitDecoder import FIT_FILE_PATH
+
+
+def create_gpxpy_xml(activity: FitActivity) -> str:
+    gpx = gpxpy.gpx.GPX()
+    gpx.creator = 'SportTracker'
+    track = gpxpy.gpx.GPXTrack()
+    gpx.tracks.append(track)
+    segment = gpxpy.gpx.GPXTrackSegment()
+    track.segments.append(segment)
+
+    for latitude, longitude, altitude, time in zip(
+        activity.latitudes, activity.longitudes, activity.altitudes, activity.times
+    ):
+        segment.points.append(
+            gpxpy.gpx.GPXTrackPoint(
+                latitude=latitude,
+                longitude=longitude,
+                time=None if math.isnan(time) else datetime.fromtimestamp(time, timezone.utc),
+                elevation=None if math.isnan(altitude) else altitude,
+            )
+        )
+
+    return gpx.to_xml()
+
+
+class ChunkRecorder(io.BytesIO):
+    def __init__(self) -> None:
+        super().__init__()
+        self.numberOfWrites = 0
+
+    def write(self, data, /) -> int:  # type: ignore[override]
+        self.numberOfWrites += 1
+        return super().write(data)
+
+
+class TestFitToGpxConverter:
+    def test_create_gpx_xml_is_identical_to_gpxpy(self):
+        activity = FitDecoder.decode(FIT_FILE_PATH, 'fitTrack_1')
+
+        assert FitToGpxConverter.create_gpx_xml(activity) == create_gpxpy_xml(activity)
+
+    def test_create_gpx_xml_with_missing_values(self):
+        activity = FitActivity(
+            latitudes=array('d', [0.0000001, 52.0]),
+            longitudes=array('d', [-3.0, 2.5]),
+            altitudes=array('d', [math.nan, 0.000000001]),
+            times=array('d', [math.nan, 1.5]),
+        )
+
+        assert FitToGpxConverter.create_gpx_xml(activity) == create_gpxpy_xml(activity)
+        assert FitToGpxConverter.create_gpx_xml(FitActivity()) == create_gpxpy_xml(FitActivity())
+
+    def test_write_gpx_in_chunks(self):
+        activity = FitDecoder.decode(FIT_FILE_PATH, 'fitTrack_1')
+        target = ChunkRecorder()
+
+        with patch.object(FitToGpxConverter, 'POINTS_PER_CHUNK', 1000):
+            numberOfBytes = FitToGpxConverter.write_gpx(activity, target)
+
+        # header, 5 full chunks and the remaining 102 points with the footer
+        assert target.numberOfWrites == 7
+        assert numberOfBytes == len(target.getvalue())
+
+        trackPoints = GpxStreamParser.from_bytes(target.getvalue()).get_track_points()
+        assert trackPoints.latitudes == activity.latitudes
+        assert trackPoints.longitudes == activity.longitudes
+        assert trackPoints.times == activity.times
@@ -0,0 +1,54 @@
+import pytest
+
+from sporttracker.user.UserEntity import create_user, Language
+from tests.TestConstants import TEST_USERNAME, TEST_PASSWORD
+
+ADMIN_USERNAME = 'metrics_admin'
+METRICS_TOKEN = 'test-metrics-token'
+
+
+@pytest.fixture(autouse=True)
+def prepare_test_data(app):
+    with app.app_context():
+        create_user(TEST_USERNAME, TEST_PASSWORD, False, Language.ENGLISH)
+        create_user(ADMIN_USERNAME, TEST_PASSWORD, True, Language.ENGLISH)
+
+
+@pytest.fixture()
+def client(app):
+    return app.test_client()
+
+
+def login(client, username: str) -> None:
+    client.post('/login', data={'username': username, 'password': TEST_PASSWORD})
+
+
+class TestGeneralBlueprint:
+    def test_metrics_without_authentication_is_unauthorized(self, client):
+        response = client.get('/metrics')
+        assert response.status_code == 401
+        assert response.headers['WWW-Authenticate'] == 'Bearer'
+
+    def test_metrics_with_wrong_token_is_unauthorized(self, client):
+        response = client.get('/metrics', headers={'Authorization': 'Bearer wrong-token'})
+        assert response.status_code == 401
+
+    def test_metrics_as_user_is_unauthorized(self, client):
+        login(client, TEST_USERNAME)
+
+        response = client.get('/metrics')
+        assert response.status_code == 401
+
+    def test_metrics_with_token(self, client):
+        response = client.get('/metrics', headers={'Authorization': f'Bearer {METRICS_TOKEN}'})
+        assert response.status_code == 200
+
+        responseData = response.data.decode('utf-8')
+        for cacheName in ['newVisitedTileCache', 'maxSquareCache', 'tileImageCache', 'tileImageDiskCache']:
+            assert f'cache="{cacheName}"' in responseData
+
+    def test_metrics_as_admin(self, client):
+        login(client, ADMIN_USERNAME)
+
+        response = client.get('/metrics')
+        assert response.status_code == 200
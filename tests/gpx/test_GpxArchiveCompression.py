@@ -0,0 +1,154 @@
+import os
+from zipfile import ZipFile, ZIP_DEFLATED, ZIP_LZMA, ZIP_STORED
+
+import pytest
+
+from sporttracker.gpx.GpxArchiveCompression import (
+    GpxArchiveCodec,
+    GpxArchiveCompression,
+    GpxArchiveRecompressionReport,
+    GpxArchiveRecompressor,
+    recompress_archive,
+)
+from tests.gpx.test_GpxStreamParser import SAMPLE_GPX
+
+
+def create_archive(folderPath, name: str, compression: GpxArchiveCompression) -> str:
+    os.makedirs(folderPath / name, exist_ok=True)
+    zipFilePath = str(folderPath / name / f'{name}.gpx.zip')
+    with compression.open(zipFilePath) as zipObject:
+        zipObject.writestr(f'{name}.gpx', SAMPLE_GPX * 20)
+    return zipFilePath
+
+
+def read_archive(zipFilePath: str) -> tuple[int, bytes]:
+    with ZipFile(zipFilePath) as zipObject:
+        info = zipObject.infolist()[0]
+        return info.compress_type, zipObject.read(info)
+
+
+class TestGpxArchiveCompression:
+    def test_from_settings(self):
+        assert GpxArchiveCompression.from_settings({}) == GpxArchiveCompression(GpxArchiveCodec.DEFLATED, 6)
+        assert GpxArchiveCompression.from_settings({'codec': 'deflated', 'level': 1}).level == 1
+        assert GpxArchiveCompression.from_settings({'codec': 'lzma'}) == GpxArchiveCompression(
+            GpxArchiveCodec.LZMA, None
+        )
+
+    @pytest.mark.parametrize(
+        'archiveSettings',
+        [
+            {'codec': 'zstd'},
+            {'codec': 'deflated', 'level': 10},
+            {'codec': 'bzip2', 'level': 0},
+            {'codec': 'lzma', 'level': 9},
+        ],
+    )
+    def test_from_settings_invalid(self, archiveSettings):
+        with pytest.raises(ValueError):
+            GpxArchiveCompression.from_settings(archiveSettings)
+
+    @pytest.mark.parametrize(
+        'compression',
+        [
+            GpxArchiveCompression(GpxArchiveCodec.STORED, None),
+            GpxArchiveCompression(GpxArchiveCodec.DEFLATED, 1),
+            GpxArchiveCompression(GpxArchiveCodec.BZIP2, None),
+            GpxArchiveCompression(GpxArchiveCodec.LZMA, None),
+        ],
+    )
+    def test_comment(self, compression):
+        assert GpxArchiveCompression.from_comment(compression.to_comment()) == compression
+
+    def test_from_comment_unknown(self):
+        assert GpxArchiveCompression.from_comment(b'') is None
+        assert GpxArchiveCompression.from_comment(b'sporttracker-compression=zstd') is None
+
+    def test_open_records_codec(self, tmp_path):
+        zipFilePath = create_archive(tmp_path, 'track', GpxArchiveCompression(GpxArchiveCodec.LZMA, None))
+
+        assert read_archive(zipFilePath) == (ZIP_LZMA, SAMPLE_GPX * 20)
+        with ZipFile(zipFilePath) as zipObject:
+            assert GpxArchiveCompression.from_comment(zipObject.comment) == GpxArchiveCompression(
+                GpxArchiveCodec.LZMA, None
+            )
+
+
+class TestRecompressArchive:
+    def test_recompress(self, tmp_path):
+        zipFilePath = create_archive(tmp_path, 'track', GpxArchiveCompression(GpxArchiveCodec.STORED, None))
+
+        result = recompress_archive(zipFilePath, GpxArchiveCompression(GpxArchiveCodec.DEFLATED, 9))
+
+        assert not result.isSkipped
+        assert result.error is None
+        assert result.sizeAfter < result.sizeBefore
+        assert result.sizeAfter == os.path.getsize(zipFilePath)
+        assert read_archive(zipFilePath) == (ZIP_DEFLATED, SAMPLE_GPX * 20)
+        assert not os.path.exists(f'{zipFilePath}.tmp')
+
+    def test_recompress_dry_run(self, tmp_path):
+        zipFilePath = create_archive(tmp_path, 'track', GpxArchiveCompression(GpxArchiveCodec.STORED, None))
+
+        result = recompress_archive(zipFilePath, GpxArchiveCompression(GpxArchiveCodec.LZMA, None), isDryRun=True)
+
+        assert result.sizeAfter < result.sizeBefore
+        assert read_archive(zipFilePath)[0] == ZIP_STORED
+        assert not os.path.exists(f'{zipFilePath}.tmp')
+
+    def test_recompress_skips_archive_with_same_compression(self, tmp_path):
+        compression = GpxArchiveCompression(GpxArchiveCodec.DEFLATED, 6)
+        zipFilePath = create_archive(tmp_path, 'track', compression)
+
+        assert recompress_archive(zipFilePath, compression).isSkipped
+        assert not recompress_archive(zipFilePath, compression, isForced=True).isSkipped
+
+    def test_recompress_archive_without_comment(self, tmp_path):
+        zipFilePath = str(tmp_path / 'track.gpx.zip')
+        with ZipFile(zipFilePath, mode='w', compression=ZIP_DEFLATED, compresslevel=9) as zipObject:
+            zipObject.writestr('track.gpx', SAMPLE_GPX)
+
+        result = recompress_archive(zipFilePath, GpxArchiveCompression())
+
+        assert not result.isSkipped
+        assert read_archive(zipFilePath) == (ZIP_DEFLATED, SAMPLE_GPX)
+
+    def test_recompress_invalid_archive(self, tmp_path):
+        zipFilePath = tmp_path / 'track.gpx.zip'
+        zipFilePath.write_bytes(b'no zip file')
+
+        result = recompress_archive(str(zipFilePath), GpxArchiveCompression())
+
+        assert result.error is not None
+        assert zipFilePath.read_bytes() == b'no zip file'
+
+
+class TestGpxArchiveRecompressor:
+    def test_find_archives(self, tmp_path):
+        firstZipFilePath = create_archive(tmp_path, 'first', GpxArchiveCompression())
+        secondZipFilePath = create_archive(tmp_path, 'second', GpxArchiveCompression())
+        os.makedirs(tmp_path / 'tileOverlays')
+        (tmp_path / 'other.gpx.zip').write_bytes(b'')
+
+        recompressor = GpxArchiveRecompressor(str(tmp_path), 'gpx.zip', 1)
+
+        assert recompressor.find_archives() == [firstZipFilePath, secondZipFilePath]
+
+    @pytest.mark.parametrize('numberOfProcesses', [1, 2])
+    def test_recompress(self, tmp_path, numberOfProcesses):
+        for name in ['first', 'second', 'third']:
+            create_archive(tmp_path, name, GpxArchiveCompression(GpxArchiveCodec.STORED, None))
+        create_archive(tmp_path, 'fourth', GpxArchiveCompression(GpxArchiveCodec.BZIP2, 9))
+
+        recompressor = GpxArchiveRecompressor(str(tmp_path), 'gpx.zip', numberOfProcesses)
+        zipFilePaths = recompressor.find_archives()
+
+        report = GpxArchiveRecompressionReport()
+        for result in recompressor.recompress(zipFilePaths, GpxArchiveCompression(GpxArchiveCodec.BZIP2, 9)):
+            report.add(result)
+
+        assert report.numberOfArchives == 3
+        assert report.numberOfSkippedArchives == 1
+        assert report.failedArchives == []
+        assert report.sizeAfter < report.sizeBefore
+        assert all(read_archive(zipFilePath)[1] == SAMPLE_GPX * 20 for zipFilePath in zipFilePaths)
@@ -0,0 +1,128 @@
+import io
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+from flask import Flask
+from flask_login import LoginManager
+
+from sporttracker.gpx import GpxBlueprint
+from sporttracker.gpx.GpxPreviewImageService import GpxPreviewImageService
+from tests.TestConstants import ROOT_DIRECTORY
+from tests.gpx.test_GpxService import create_gpx_service
+from tests.gpx.test_GpxStreamParser import SAMPLE_GPX
+
+
+@pytest.fixture
+def gpxService(tmp_path):
+    gpxService = create_gpx_service(str(tmp_path))
+    gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+    return gpxService
+
+
+@pytest.fixture
+def client(gpxService):
+    workout = Mock()
+    workout.get_gpx_metadata.return_value.gpx_file_name = 'track'
+    workout.get_download_name.return_value = 'My Workout'
+
+    distanceWorkoutService = Mock()
+    distanceWorkoutService.get_distance_workout_by_share_code.side_effect = lambda shareCode: (
+        workout if shareCode == 'abc' else None
+    )
+    distanceWorkoutService.get_distance_workout_by_id.side_effect = lambda workoutId, userId: (
+        workout if workoutId == 1 and userId == 5 else None
+    )
+
+    app = Flask(__name__, root_path=os.path.join(ROOT_DIRECTORY, 'sporttracker'))
+    loginManager = LoginManager(app)
+    loginManager.request_loader(lambda request: Mock(id=5, is_authenticated=True, is_active=True))
+    app.register_blueprint(GpxBlueprint.construct_blueprint(gpxService, distanceWorkoutService))
+    return app.test_client()
+
+
+class TestGpxBlueprint:
+    def test_download_gpx(self, client, gpxService):
+        response = client.get('/gpxTracks/workout/shared/abc/gpx')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/gpx'
+        assert response.headers['Content-Disposition'] == 'attachment; filename="My Workout.gpx"'
+        assert response.headers['ETag']
+        assert response.headers['Last-Modified']
+        assert response.get_data(as_text=True) == gpxService.get_joined_tracks_and_segments('track', 'My Workout')
+
+    def test_download_gpx_not_modified(self, client):
+        response = client.get('/gpxTracks/workout/shared/abc/gpx')
+
+        etagResponse = client.get(
+            '/gpxTracks/workout/shared/abc/gpx', headers={'If-None-Match': response.headers['ETag']}
+        )
+        assert etagResponse.status_code == 304
+        assert etagResponse.get_data() == b''
+
+        lastModifiedResponse = client.get(
+            '/gpxTracks/workout/shared/abc/gpx', headers={'If-Modified-Since': response.headers['Last-Modified']}
+        )
+        assert lastModifiedResponse.status_code == 304
+
+    def test_download_gpx_modified(self, client):
+        response = client.get('/gpxTracks/workout/shared/abc/gpx', headers={'If-None-Match': '"outdated"'})
+
+        assert response.status_code == 200
+
+    def test_download_gpx_unknown_share_code(self, client):
+        assert client.get('/gpxTracks/workout/shared/unknown/gpx').status_code == 404
+
+    def test_download_fit(self, client, tmp_path):
+        (tmp_path / 'track' / 'track.fit').write_bytes(b'fit content')
+
+        response = client.get('/gpxTracks/workout/shared/abc/fit')
+
+        assert response.status_code == 200
+        assert response.headers['Content-Disposition'] == 'attachment; filename="My Workout.fit"'
+        assert response.get_data() == b'fit content'
+        assert (
+            client.get(
+                '/gpxTracks/workout/shared/abc/fit', headers={'If-None-Match': response.headers['ETag']}
+            ).status_code
+            == 304
+        )
+
+    def test_get_geometry(self, client):
+        response = client.get('/gpxTracks/geometry/9/workout/1')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'application/json'
+        assert response.json['zoom'] == 11
+        assert len(response.json['segments']) == 3
+        assert (
+            client.get(
+                '/gpxTracks/geometry/9/workout/1', headers={'If-None-Match': response.headers['ETag']}
+            ).status_code
+            == 304
+        )
+
+    def test_get_geometry_unknown_workout(self, client):
+        assert client.get('/gpxTracks/geometry/9/workout/2').status_code == 404
+
+    def test_preview_image_placeholder_until_image_is_rendered(self, client, gpxService):
+        plannedTour = Mock()
+        plannedTour.get_gpx_metadata.return_value.gpx_file_name = 'track'
+
+        with patch.object(GpxBlueprint.PlannedTourService, 'get_planned_tour_by_id', return_value=plannedTour):
+            response = client.get('/gpxTracks/previewImage/1')
+
+            assert response.status_code == 200
+            assert response.mimetype == 'image/png'
+            assert 'no-cache' in response.headers['Cache-Control']
+            response.close()
+
+            with open(GpxPreviewImageService('track', gpxService).get_preview_image_path(), 'wb') as f:
+                f.write(b'preview image')
+
+            response = client.get('/gpxTracks/previewImage/1')
+
+            assert response.status_code == 200
+            assert response.mimetype == 'image/jpg'
+            assert response.get_data() == b'preview image'
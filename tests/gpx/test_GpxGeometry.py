@@ -0,0 +1,98 @@
+import math
+from array import array
+
+import pytest
+
+from sporttracker.gpx import GpxGeometry
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+from tests.gpx.test_GpxStreamParser import SAMPLE_GPX
+
+
+def create_track_points(latitudes: list[float], longitudes: list[float], elevations: list[float]) -> GpxTrackPoints:
+    return GpxTrackPoints(
+        array('d', latitudes),
+        array('d', longitudes),
+        array('d', elevations),
+        array('d', [math.nan] * len(latitudes)),
+        array('I', [0]),
+    )
+
+
+class TestGpxGeometry:
+    def test_encode_polyline(self):
+        # example of the format documentation
+        assert GpxGeometry.encode_polyline([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453]) == (
+            '_p~iF~ps|U_ulLnnqC_mqNvxq`@'
+        )
+
+    def test_decode_values(self):
+        encoded = GpxGeometry.encode_polyline([38.5, 40.7, 43.252], [-120.2, -120.95, -126.453])
+        assert GpxGeometry.decode_values(encoded, 2, 1e5) == [(38.5, -120.2), (40.7, -120.95), (43.252, -126.453)]
+
+    def test_encode_values(self):
+        encoded = GpxGeometry.encode_values([35.0, 41.24, -2.5], 1e1)
+        assert GpxGeometry.decode_values(encoded, 1, 1e1) == [(35.0,), (41.2,), (-2.5,)]
+
+    @pytest.mark.parametrize('zoom, expected', [(0, 8), (8, 8), (9, 11), (14, 14), (15, 16), (18, 16)])
+    def test_get_zoom_level(self, zoom, expected):
+        assert GpxGeometry.get_zoom_level(zoom) == expected
+
+    def test_simplify_straight_line(self):
+        xCoordinates = [float(i) for i in range(10)]
+        yCoordinates = [0.0] * 10
+
+        assert GpxGeometry.simplify(xCoordinates, yCoordinates, list(range(10)), 0.1) == [0, 9]
+
+    def test_simplify_keeps_corners(self):
+        xCoordinates = [0.0, 1.0, 2.0, 2.0, 2.0, 2.05]
+        yCoordinates = [0.0, 0.0, 0.0, 1.0, 2.0, 3.0]
+
+        assert GpxGeometry.simplify(xCoordinates, yCoordinates, list(range(6)), 0.1) == [0, 2, 5]
+
+    def test_simplify_drops_close_points(self):
+        xCoordinates = [0.0, 0.01, 0.02, 5.0]
+        yCoordinates = [0.0, 0.5, -0.5, 0.0]
+
+        assert GpxGeometry.simplify(xCoordinates, yCoordinates, list(range(4)), 1.0) == [0, 3]
+
+    def test_simplify_returns_back(self):
+        # the farthest point of a route that returns to its start must be kept
+        xCoordinates = [0.0, 1.0, 2.0, 1.0, 0.0]
+        yCoordinates = [0.0, 0.0, 0.0, 0.0, 0.0]
+
+        assert GpxGeometry.simplify(xCoordinates, yCoordinates, list(range(5)), 0.1) == [0, 2, 4]
+
+    def test_create_geometries(self):
+        geometries = GpxGeometry.create_geometries(GpxStreamParser.from_bytes(SAMPLE_GPX).get_track_points())
+
+        assert list(geometries) == list(GpxGeometry.ZOOM_LEVELS)
+        geometry = geometries[16]
+        assert geometry['zoom'] == 16
+        assert len(geometry['segments']) == 3
+        assert GpxGeometry.decode_values(geometry['segments'][2]['polyline'], 2, 1e5) == [(48.1, 11.5), (48.2, 11.6)]
+        assert GpxGeometry.decode_values(geometry['segments'][2]['elevations'], 1, 1e1) == [(520.0,), (530.0,)]
+
+    def test_create_geometries_fewer_points_for_lower_zoom_levels(self):
+        latitudes = [52.5 + 0.001 * math.sin(i / 10) for i in range(1000)]
+        longitudes = [13.4 + 0.0001 * i for i in range(1000)]
+        trackPoints = create_track_points(latitudes, longitudes, [30.0] * 1000)
+
+        geometries = GpxGeometry.create_geometries(trackPoints)
+        numberOfPoints = [
+            len(GpxGeometry.decode_values(geometries[zoomLevel]['segments'][0]['polyline'], 2, 1e5))
+            for zoomLevel in GpxGeometry.ZOOM_LEVELS
+        ]
+
+        assert numberOfPoints == sorted(numberOfPoints)
+        assert numberOfPoints[0] < numberOfPoints[-1] < 1000
+
+    def test_create_geometries_missing_elevations(self):
+        nan = math.nan
+        trackPoints = create_track_points([52.5, 52.6, 52.7], [13.3, 13.5, 13.4], [nan, 40.0, nan])
+        segment = GpxGeometry.create_geometries(trackPoints)[16]['segments'][0]
+
+        assert GpxGeometry.decode_values(segment['elevations'], 1, 1e1) == [(40.0,), (40.0,), (40.0,)]
+
+        trackPoints = create_track_points([52.5, 52.6], [13.3, 13.5], [nan, nan])
+        assert GpxGeometry.create_geometries(trackPoints)[16]['segments'][0]['elevations'] is None
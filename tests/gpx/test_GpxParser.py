@@ -1,6 +1,20 @@
+from array import array
+
 import pytest
 
-from sporttracker.gpx.GpxService import VisitedTile, GpxParser
+from sporttracker.gpx.GpxService import VisitedTile, GpxParser, TileExtractionMode
+
+
+def create_gpx(*segments: list[tuple[float, float]]) -> bytes:
+    segmentsXml = ''.join(
+        '<trkseg>' + ''.join(f'<trkpt lat="{lat}" lon="{lon}"></trkpt>' for lat, lon in points) + '</trkseg>'
+        for points in segments
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<gpx version="1.1" creator="test" xmlns="http://www.topografix.com/GPX/1/1">'
+        f'<trk>{segmentsXml}</trk></gpx>'
+    ).encode('utf-8')
 
 
 class TestGpxParser:
@@ -27,3 +41,59 @@ class TestGpxParser:
     def test_convert_coordinate_to_tile_position_zoom_level_16(self, lat, lon, zoom, expected_x, expected_y):
         tile = GpxParser.convert_coordinate_to_tile_position(lat, lon, zoom)
         assert tile == VisitedTile(expected_x, expected_y)
+
+    def test_get_visited_tiles_points(self):
+        tiles = GpxParser(create_gpx([(52.5145, 13.3503), (52.5145, 13.4503)])).get_visited_tiles(14)
+        assert tiles == {
+            GpxParser.convert_coordinate_to_tile_position(52.5145, 13.3503, 14),
+            GpxParser.convert_coordinate_to_tile_position(52.5145, 13.4503, 14),
+        }
+
+    def test_get_visited_tiles_segments(self):
+        parser = GpxParser(create_gpx([(52.5145, 13.3503), (52.5145, 13.4503)]))
+        tiles = parser.get_visited_tiles(14, TileExtractionMode.SEGMENTS)
+
+        start = GpxParser.convert_coordinate_to_tile_position(52.5145, 13.3503, 14)
+        end = GpxParser.convert_coordinate_to_tile_position(52.5145, 13.4503, 14)
+        assert tiles == {VisitedTile(x, start.y) for x in range(start.x, end.x + 1)}
+
+    def test_get_visited_tiles_segments_are_not_connected_across_gpx_segments(self):
+        gpxContent = create_gpx([(52.5145, 13.3503)], [(52.5145, 13.4503)])
+        tiles = GpxParser(gpxContent).get_visited_tiles(14, TileExtractionMode.SEGMENTS)
+        assert len(tiles) == 2
+
+    def test_get_visited_tiles_segments_contains_all_point_tiles(self):
+        points = [(52.5 + index * 0.013, 13.3 + (index % 7) * 0.021) for index in range(50)]
+        parser = GpxParser(create_gpx(points))
+
+        pointTiles = parser.get_visited_tiles(14)
+        segmentTiles = parser.get_visited_tiles(14, TileExtractionMode.SEGMENTS)
+        assert pointTiles < segmentTiles
+
+    @pytest.mark.parametrize(
+        'xCoordinates,yCoordinates,expected',
+        [
+            pytest.param([0.5, 0.7], [0.5, 0.2], {(0, 0)}, id='same_tile'),
+            pytest.param([0.5, 3.5], [0.5, 0.5], {(0, 0), (1, 0), (2, 0), (3, 0)}, id='horizontal'),
+            pytest.param([0.5, 0.5], [2.5, 0.5], {(0, 2), (0, 1), (0, 0)}, id='vertical_upwards'),
+            pytest.param([0.5, 2.5], [0.5, 1.5], {(0, 0), (1, 0), (1, 1), (2, 1)}, id='diagonal'),
+            pytest.param([0.5, 1.5], [0.5, 1.5], {(0, 0), (1, 0), (0, 1), (1, 1)}, id='through_corner'),
+            pytest.param([1.5, 0.5], [0.5, 1.5], {(1, 0), (0, 0), (1, 1), (0, 1)}, id='through_corner_backwards'),
+            pytest.param(
+                [0.5, 3.5, 3.5], [0.5, 0.5, 2.5], {(0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (3, 2)}, id='polyline'
+            ),
+        ],
+    )
+    def test_add_tiles_crossed_by_segments(self, xCoordinates, yCoordinates, expected):
+        tilePositions: set[tuple[int, int]] = set()
+        GpxParser._GpxParser__add_tiles_crossed_by_segments(  # type: ignore[attr-defined]
+            array('d', xCoordinates), array('d', yCoordinates), 16, tilePositions
+        )
+        assert tilePositions == expected
+
+    def test_add_tiles_crossed_by_segments_antimeridian(self):
+        tilePositions: set[tuple[int, int]] = set()
+        GpxParser._GpxParser__add_tiles_crossed_by_segments(  # type: ignore[attr-defined]
+            array('d', [0.5, 15.5]), array('d', [0.5, 0.5]), 16, tilePositions
+        )
+        assert tilePositions == {(0, 0), (15, 0)}
@@ -0,0 +1,279 @@
+import io
+import json
+import os
+from zipfile import ZipFile
+from unittest.mock import Mock, patch
+
+import pytest
+from gpxpy.gpx import GPXXMLSyntaxException
+
+from sporttracker.gpx import GpxGeometry
+from sporttracker.gpx.GpxArchiveCompression import GpxArchiveCompression, GpxArchiveCodec
+from sporttracker.gpx.GpxParser import GpxParser, TileExtractionMode
+from sporttracker.gpx.GpxService import GpxService, GpxGeometryTrack
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+from tests.fit.test_FitDecoder import FIT_FILE_PATH, create_fit_file_with_heart_rate
+from tests.gpx.test_GpxStreamParser import SAMPLE_GPX
+
+
+def create_gpx_service(
+    dataPath: str,
+    tileExtractionMode: TileExtractionMode = TileExtractionMode.POINTS,
+    archiveCompression: GpxArchiveCompression = GpxArchiveCompression(),
+) -> GpxService:
+    return GpxService(dataPath, Mock(), Mock(), Mock(), Mock(), Mock(), Mock(), tileExtractionMode, archiveCompression)
+
+
+class TestGpxService:
+    def test_ingest_gpx(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+
+        ingestResult = gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+
+        assert ingestResult.gpxFileName == 'track'
+        assert ingestResult.metaInfo == GpxParser(SAMPLE_GPX).get_meta_info()
+        assert len(ingestResult.trackPoints) == 8
+        assert {'read', 'compress', 'parse', 'trackPoints'} <= set(ingestResult.stageDurations)
+        assert gpxService.get_gpx_content('track') == SAMPLE_GPX
+        assert os.path.exists(tmp_path / 'track' / 'track.points')
+
+    @pytest.mark.parametrize('codec', list(GpxArchiveCodec))
+    def test_ingest_gpx_with_archive_codec(self, tmp_path, codec):
+        archiveCompression = GpxArchiveCompression(codec, 1 if codec == GpxArchiveCodec.DEFLATED else None)
+        gpxService = create_gpx_service(str(tmp_path), archiveCompression=archiveCompression)
+
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+        gpxService.create_zip('other', SAMPLE_GPX)
+
+        assert gpxService.get_gpx_content('track') == SAMPLE_GPX
+        assert gpxService.get_gpx_content('other') == SAMPLE_GPX
+        with ZipFile(tmp_path / 'track' / 'track.gpx.zip') as zipObject:
+            assert zipObject.infolist()[0].compress_type == codec.compressionMethod
+
+    def test_ingest_invalid_gpx_removes_files(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+
+        with pytest.raises(GPXXMLSyntaxException):
+            gpxService.ingest_gpx('track', io.BytesIO(b'<gpx><trk>'))
+
+        assert not os.path.exists(tmp_path / 'track')
+
+    def test_ingest_fit(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+
+        with open(FIT_FILE_PATH, 'rb') as fitFile:
+            ingestResult = gpxService.get_ingest_service().ingest_fit('track', fitFile)
+
+        # the meta info calculated from the decoded track points equals the one of the stored gpx
+        gpxParser = GpxStreamParser.from_bytes(gpxService.get_gpx_content('track'))
+        assert ingestResult.metaInfo == gpxParser.get_meta_info()
+        assert ingestResult.trackPoints.latitudes == gpxParser.get_track_points().latitudes
+        assert len(ingestResult.trackPoints) == 5102
+        assert ingestResult.fitActivity is not None
+        assert ingestResult.fitActivity.session is not None
+        assert {'read', 'decode', 'convert', 'compress', 'trackPoints', 'geometry'} <= set(ingestResult.stageDurations)
+        assert sorted(os.listdir(tmp_path / 'track')) == ['geometry', 'track.fit', 'track.gpx.zip', 'track.points']
+        assert gpxService.get_track_points('track').latitudes == ingestResult.trackPoints.latitudes
+
+    def test_ingest_fit_with_heart_rate(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+
+        ingestResult = gpxService.get_ingest_service().ingest_fit(
+            'track', io.BytesIO(create_fit_file_with_heart_rate())
+        )
+
+        assert len(ingestResult.trackPoints) == 4
+        assert ingestResult.fitActivity is not None
+        assert len(ingestResult.fitActivity.get_heart_rate_samples()) == 3
+
+    def test_ingest_invalid_fit_removes_files(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+
+        with pytest.raises(Exception):
+            gpxService.get_ingest_service().ingest_fit('track', io.BytesIO(b'invalid fit file'))
+
+        assert not os.path.exists(tmp_path / 'track')
+
+    @pytest.mark.parametrize('tileExtractionMode', list(TileExtractionMode))
+    def test_get_visited_tiles_uses_track_points_file(self, tmp_path, tileExtractionMode):
+        gpxService = create_gpx_service(str(tmp_path), tileExtractionMode)
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+
+        with patch.object(GpxStreamParser, '__init__') as parserMock:
+            visitedTiles = gpxService.get_visited_tiles('track', 14)
+            parserMock.assert_not_called()
+
+        assert set(visitedTiles) == GpxParser(SAMPLE_GPX).get_visited_tiles(14, tileExtractionMode)
+
+    def test_get_visited_tiles_without_track_points_file(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+        os.remove(tmp_path / 'track' / 'track.points')
+
+        assert set(gpxService.get_visited_tiles('track', 14)) == GpxParser(SAMPLE_GPX).get_visited_tiles(14)
+        # the missing file is written on the first access
+        assert GpxTrackPoints.is_file_up_to_date(str(tmp_path / 'track' / 'track.points'))
+
+    def test_backfill_track_points(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.create_zip('track', SAMPLE_GPX)
+
+        assert gpxService.backfill_track_points('track') == 8
+        assert gpxService.backfill_track_points('track') is None
+        assert gpxService.backfill_track_points('track', overwrite=True) == 8
+
+    def test_backfill_track_points_replaces_outdated_file(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.create_zip('track', SAMPLE_GPX)
+        (tmp_path / 'track' / 'track.points').write_bytes(b'STPT\x01\x00')
+
+        assert gpxService.backfill_track_points('track') == 8
+        assert len(gpxService.get_track_points('track')) == 8
+
+    def test_join_multiple_gpx(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('first', io.BytesIO(SAMPLE_GPX))
+        gpxService.ingest_gpx('second', io.BytesIO(SAMPLE_GPX))
+
+        joinedTrackPoints = GpxStreamParser.from_bytes(
+            gpxService.join_multiple_gpx(['first', 'second'])
+        ).get_track_points()
+        trackPoints = GpxStreamParser.from_bytes(SAMPLE_GPX).get_track_points()
+
+        assert list(joinedTrackPoints.segmentStartIndices) == [0, 4, 6, 8, 12, 14]
+        assert list(joinedTrackPoints.latitudes) == list(trackPoints.latitudes) * 2
+        assert list(joinedTrackPoints.longitudes) == list(trackPoints.longitudes) * 2
+        assert list(joinedTrackPoints.elevations) == list(trackPoints.elevations) * 2
+
+    def test_get_download_file_path(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+
+        downloadFilePath = gpxService.get_download_file_path('track', 'My Workout')
+
+        with open(downloadFilePath, encoding='utf-8') as downloadFile:
+            assert downloadFile.read() == gpxService.get_joined_tracks_and_segments('track', 'My Workout')
+
+    def test_get_download_file_path_is_reused(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+        downloadFilePath = gpxService.get_download_file_path('track', 'My Workout')
+
+        with patch.object(GpxParser, 'join_tracks_and_segments') as joinMock:
+            assert gpxService.get_download_file_path('track', 'My Workout') == downloadFilePath
+            joinMock.assert_not_called()
+
+    def test_get_download_file_path_after_archive_was_replaced(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+        downloadFilePath = gpxService.get_download_file_path('track', 'My Workout')
+
+        otherGpx = SAMPLE_GPX.replace(b'52.5145', b'52.4145')
+        gpxService.create_zip('track', otherGpx)
+        zipModificationTime = os.stat(downloadFilePath).st_mtime + 1
+        os.utime(tmp_path / 'track' / 'track.gpx.zip', (zipModificationTime, zipModificationTime))
+
+        assert gpxService.get_download_file_path('track', 'My Workout') == downloadFilePath
+        with open(downloadFilePath, encoding='utf-8') as downloadFile:
+            assert '52.4145' in downloadFile.read()
+
+    def test_get_download_file_path_with_other_download_name(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+        firstDownloadFilePath = gpxService.get_download_file_path('track', 'My Workout')
+
+        secondDownloadFilePath = gpxService.get_download_file_path('track', 'Renamed Workout')
+
+        assert secondDownloadFilePath != firstDownloadFilePath
+        assert sorted(os.listdir(tmp_path / 'track' / GpxService.DOWNLOAD_FOLDER_NAME)) == sorted(
+            [os.path.basename(firstDownloadFilePath), os.path.basename(secondDownloadFilePath)]
+        )
+        with open(firstDownloadFilePath, encoding='utf-8') as downloadFile:
+            assert downloadFile.read() == gpxService.get_joined_tracks_and_segments('track', 'My Workout')
+
+    def test_get_download_file_path_removes_files_of_previous_archive(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+        outdatedDownloadFilePath = gpxService.get_download_file_path('track', 'My Workout')
+
+        zipModificationTime = os.stat(outdatedDownloadFilePath).st_mtime + 1
+        os.utime(tmp_path / 'track' / 'track.gpx.zip', (zipModificationTime, zipModificationTime))
+
+        downloadFilePath = gpxService.get_download_file_path('track', 'Renamed Workout')
+
+        assert os.listdir(tmp_path / 'track' / GpxService.DOWNLOAD_FOLDER_NAME) == [os.path.basename(downloadFilePath)]
+
+    def test_get_download_file_path_missing_archive(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+
+        with pytest.raises(FileNotFoundError):
+            gpxService.get_download_file_path('track', 'My Workout')
+
+    def test_ingest_gpx_writes_geometries(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        ingestResult = gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+
+        assert 'geometry' in ingestResult.stageDurations
+        with patch.object(GpxGeometry, 'create_geometries') as createMock:
+            geometryFilePath = gpxService.get_geometry_file_path('track', 12)
+            createMock.assert_not_called()
+
+        with open(geometryFilePath, encoding='utf-8') as geometryFile:
+            assert json.load(geometryFile) == GpxGeometry.create_geometries(ingestResult.trackPoints)[14]
+
+    def test_get_geometry_file_path_without_geometries(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.create_zip('track', SAMPLE_GPX)
+
+        geometryFilePath = gpxService.get_geometry_file_path('track', 18)
+
+        with open(geometryFilePath, encoding='utf-8') as geometryFile:
+            assert json.load(geometryFile)['zoom'] == 16
+        assert sorted(os.listdir(tmp_path / 'track' / GpxService.GEOMETRY_FOLDER_NAME)) == sorted(
+            f'{zoomLevel}.json' for zoomLevel in GpxGeometry.ZOOM_LEVELS
+        )
+
+    def test_get_geometry_collection(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('first', io.BytesIO(SAMPLE_GPX))
+        gpxService.create_zip('second', SAMPLE_GPX)
+        tracks = [
+            GpxGeometryTrack(2, 'RUNNING', '#0DCAF0', 'second'),
+            GpxGeometryTrack(1, 'BIKING', '#FFC107', 'first'),
+            GpxGeometryTrack(3, 'BIKING', '#FFC107', 'unknown'),
+        ]
+
+        geometryCollection = gpxService.get_geometry_collection(tracks, 12)
+        content = json.loads(b''.join(geometryCollection.stream()))
+
+        assert geometryCollection.get_number_of_tracks() == 2
+        assert content['zoom'] == 14
+        assert [(track['id'], track['type'], track['color']) for track in content['tracks']] == [
+            (2, 'RUNNING', '#0DCAF0'),
+            (1, 'BIKING', '#FFC107'),
+        ]
+        with open(gpxService.get_geometry_file_path('first', 12), encoding='utf-8') as geometryFile:
+            assert content['tracks'][1]['geometry'] == json.load(geometryFile)
+
+    def test_get_geometry_collection_empty(self, tmp_path):
+        geometryCollection = create_gpx_service(str(tmp_path)).get_geometry_collection([], 8)
+
+        assert json.loads(b''.join(geometryCollection.stream())) == {'zoom': 8, 'tracks': []}
+
+    def test_get_geometry_collection_etag(self, tmp_path):
+        gpxService = create_gpx_service(str(tmp_path))
+        gpxService.ingest_gpx('first', io.BytesIO(SAMPLE_GPX))
+        gpxService.ingest_gpx('second', io.BytesIO(SAMPLE_GPX))
+        first = GpxGeometryTrack(1, 'BIKING', '#FFC107', 'first')
+        second = GpxGeometryTrack(2, 'BIKING', '#FFC107', 'second')
+
+        etag = gpxService.get_geometry_collection([first, second], 12).get_etag()
+
+        assert gpxService.get_geometry_collection([first, second], 13).get_etag() == etag
+        assert gpxService.get_geometry_collection([first, second], 8).get_etag() != etag
+        assert gpxService.get_geometry_collection([first], 12).get_etag() != etag
+        assert gpxService.get_geometry_collection([second, first], 12).get_etag() != etag
+
+        gpxService.ingest_gpx('second', io.BytesIO(SAMPLE_GPX))
+        assert gpxService.get_geometry_collection([first, second], 12).get_etag() != etag
@@ -0,0 +1,110 @@
+import math
+from datetime import datetime, timezone
+from zipfile import ZipFile, ZIP_DEFLATED
+
+import pytest
+from gpxpy.gpx import GPXException, GPXXMLSyntaxException
+
+from sporttracker.gpx.GpxMetaInfo import ElevationExtremes, UphillDownhill
+from sporttracker.gpx.GpxParser import GpxParser, TileExtractionMode
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser
+
+GPX_11_HEADER = '<?xml version="1.0" encoding="UTF-8"?><gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+
+
+def create_gpx(tracks: str, header: str = GPX_11_HEADER) -> bytes:
+    return f'{header}{tracks}</gpx>'.encode('utf-8')
+
+
+def create_point(lat: float, lon: float, ele: float | None = None, time: str | None = None) -> str:
+    eleXml = '' if ele is None else f'<ele>{ele}</ele>'
+    timeXml = '' if time is None else f'<time>{time}</time>'
+    return f'<trkpt lat="{lat}" lon="{lon}">{eleXml}{timeXml}</trkpt>'
+
+
+SAMPLE_GPX = create_gpx(
+    '<trk><link href="https://example.com/route"><text>Route</text></link>'
+    '<trkseg>'
+    + create_point(52.5145, 13.3503, 35.0, '2024-05-01T10:00:00Z')
+    + create_point(52.5155, 13.3603, 41.2, '2024-05-01T10:01:00Z')
+    + create_point(52.5165, 13.3703, 38.0, '2024-05-01T10:02:00Z')
+    + create_point(52.5175, 13.3803, 52.7, '2024-05-01T10:03:00Z')
+    + '</trkseg><trkseg>'
+    + create_point(52.6, 13.5, 60.0)
+    + create_point(52.61, 13.52, 55.0)
+    + '</trkseg></trk>'
+    '<trk><trkseg>' + create_point(48.1, 11.5, 520.0) + create_point(48.2, 11.6, 530.0) + '</trkseg></trk>'
+)
+
+
+class TestGpxStreamParser:
+    def test_get_meta_info_is_identical_to_gpx_parser(self):
+        assert GpxStreamParser.from_bytes(SAMPLE_GPX).get_meta_info() == GpxParser(SAMPLE_GPX).get_meta_info()
+
+    @pytest.mark.parametrize('tileExtractionMode', list(TileExtractionMode))
+    def test_get_visited_tiles_is_identical_to_gpx_parser(self, tileExtractionMode):
+        expected = GpxParser(SAMPLE_GPX).get_visited_tiles(14, tileExtractionMode)
+        assert GpxStreamParser.from_bytes(SAMPLE_GPX).get_visited_tiles(14, tileExtractionMode) == expected
+
+    def test_get_track_points(self):
+        trackPoints = GpxStreamParser.from_bytes(SAMPLE_GPX).get_track_points()
+
+        assert len(trackPoints) == 8
+        assert list(trackPoints.segmentStartIndices) == [0, 4, 6]
+        assert trackPoints.latitudes[4] == 52.6
+        assert trackPoints.longitudes[4] == 13.5
+        assert trackPoints.elevations[7] == 530.0
+        assert trackPoints.times[1] == datetime(2024, 5, 1, 10, 1, tzinfo=timezone.utc).timestamp()
+        assert math.isnan(trackPoints.times[4])
+        assert [len(latitudes) for latitudes, _ in trackPoints.get_segments()] == [4, 2, 2]
+
+    def test_missing_elevation(self):
+        gpx = create_gpx('<trk><trkseg>' + create_point(52.5, 13.3) + create_point(52.6, 13.4) + '</trkseg></trk>')
+        metaInfo = GpxStreamParser.from_bytes(gpx).get_meta_info()
+
+        assert metaInfo.elevationExtremes == ElevationExtremes(None, None)
+        assert metaInfo.uphillDownhill == UphillDownhill(0, 0)
+        assert metaInfo == GpxParser(gpx).get_meta_info()
+
+    def test_empty_gpx(self):
+        gpx = create_gpx('')
+        assert GpxStreamParser.from_bytes(gpx).get_meta_info() == GpxParser(gpx).get_meta_info()
+        assert GpxStreamParser.from_bytes(gpx).get_visited_tiles(14) == set()
+
+    def test_editor_link_gpx_10(self):
+        gpx = create_gpx(
+            '<trk><url>https://example.com/route</url><trkseg>' + create_point(52.5, 13.3) + '</trkseg></trk>',
+            '<?xml version="1.0" encoding="UTF-8"?><gpx version="1.0" xmlns="http://www.topografix.com/GPX/1/0">',
+        )
+        assert GpxStreamParser.from_bytes(gpx).get_meta_info().editorLink == 'https://example.com/route'
+
+    def test_ignores_other_elements_and_extensions(self):
+        gpx = create_gpx(
+            '<wpt lat="1.0" lon="2.0"><ele>9999</ele></wpt>'
+            '<rte><rtept lat="1.0" lon="2.0"><ele>9999</ele></rtept></rte>'
+            '<trk><trkseg><trkpt lat="52.5" lon="13.3"><ele>10</ele><extensions>'
+            '<x:ele xmlns:x="urn:example">9999</x:ele></extensions></trkpt></trkseg></trk>'
+        )
+        parser = GpxStreamParser.from_bytes(gpx)
+
+        assert len(parser.get_track_points()) == 1
+        assert parser.get_meta_info().elevationExtremes == ElevationExtremes(10, 10)
+
+    def test_parse_from_zip_stream(self, tmp_path):
+        zipFilePath = tmp_path / 'track.gpx.zip'
+        with ZipFile(zipFilePath, mode='w', compression=ZIP_DEFLATED) as zipObject:
+            zipObject.writestr('track.gpx', SAMPLE_GPX)
+
+        with ZipFile(zipFilePath) as zipObject:
+            with zipObject.open('track.gpx') as gpxFile:
+                parser = GpxStreamParser(gpxFile)
+
+        assert parser.get_meta_info() == GpxParser(SAMPLE_GPX).get_meta_info()
+
+    def test_invalid_xml_should_raise(self):
+        with pytest.raises(GPXXMLSyntaxException):
+            GpxStreamParser.from_bytes(b'<gpx><trk>')
+
+    def test_missing_coordinate_should_raise(self):
+        with pytest.raises(GPXException):
+            GpxStreamParser.from_bytes(create_gpx('<trk><trkseg><trkpt lat="52.5"></trkpt></trkseg></trk>'))
@@ -0,0 +1,62 @@
+import math
+
+import pytest
+
+from sporttracker.gpx.GpxParser import GpxParser
+from sporttracker.gpx.GpxStreamParser import GpxStreamParser
+from sporttracker.gpx.GpxTrackPoints import GpxTrackPoints
+from tests.gpx.test_GpxStreamParser import SAMPLE_GPX
+
+
+class TestGpxTrackPoints:
+    def test_save_and_load(self, tmp_path):
+        trackPoints = GpxStreamParser.from_bytes(SAMPLE_GPX).get_track_points()
+        filePath = str(tmp_path / 'track.points')
+
+        trackPoints.save(filePath)
+        loadedTrackPoints = GpxTrackPoints.load(filePath)
+
+        assert loadedTrackPoints.segmentStartIndices == trackPoints.segmentStartIndices
+        assert loadedTrackPoints.latitudes == trackPoints.latitudes
+        assert loadedTrackPoints.longitudes == trackPoints.longitudes
+        assert loadedTrackPoints.elevations == trackPoints.elevations
+        assert loadedTrackPoints.times[0] == trackPoints.times[0]
+        assert math.isnan(loadedTrackPoints.times[4])
+
+    def test_load_uses_mapped_file(self, tmp_path):
+        filePath = str(tmp_path / 'track.points')
+        GpxStreamParser.from_bytes(SAMPLE_GPX).get_track_points().save(filePath)
+
+        trackPoints = GpxTrackPoints.load(filePath)
+
+        assert isinstance(trackPoints.latitudes, memoryview)
+        assert trackPoints.latitudes.readonly
+        assert [len(latitudes) for latitudes, _ in trackPoints.get_segments()] == [4, 2, 2]
+
+    def test_load_incomplete_file_should_raise(self, tmp_path):
+        filePath = tmp_path / 'track.points'
+        GpxStreamParser.from_bytes(SAMPLE_GPX).get_track_points().save(str(filePath))
+        filePath.write_bytes(filePath.read_bytes()[:-10])
+
+        with pytest.raises(ValueError):
+            GpxTrackPoints.load(str(filePath))
+
+    def test_is_file_up_to_date(self, tmp_path):
+        filePath = tmp_path / 'track.points'
+        assert not GpxTrackPoints.is_file_up_to_date(str(filePath))
+
+        GpxTrackPoints().save(str(filePath))
+        assert GpxTrackPoints.is_file_up_to_date(str(filePath))
+
+    def test_get_meta_info(self):
+        trackPoints = GpxStreamParser.from_bytes(SAMPLE_GPX).get_track_points()
+        expectedMetaInfo = GpxParser(SAMPLE_GPX).get_meta_info()
+
+        assert trackPoints.get_meta_info(expectedMetaInfo.editorLink) == expectedMetaInfo
+
+    def test_load_invalid_file_should_raise(self, tmp_path):
+        filePath = tmp_path / 'track.points'
+        filePath.write_bytes(b'invalid file content with enough bytes for the header')
+
+        with pytest.raises(ValueError):
+            GpxTrackPoints.load(str(filePath))
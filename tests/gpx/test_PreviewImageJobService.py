@@ -0,0 +1,376 @@
+import io
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import cast
+
+import pytest
+from sqlalchemy import update
+
+from sporttracker.db import db
+from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.gpx.GpxPreviewImageService import GpxPreviewImageService
+from sporttracker.gpx.LongDistanceTourGpxPreviewImageService import LongDistanceTourGpxPreviewImageService
+from sporttracker.gpx.PreviewImageJobEntity import PreviewImageJob, PreviewImageJobState, PreviewImageJobType
+from sporttracker.gpx.PreviewImageJobService import PreviewImageJobService
+from sporttracker.longDistanceTour.LongDistanceTourEntity import (
+    LongDistanceTour,
+    LongDistanceTourPlannedTourAssociation,
+)
+from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
+from sporttracker.plannedTour.TravelDirection import TravelDirection
+from sporttracker.plannedTour.TravelType import TravelType
+from sporttracker.workout.WorkoutType import WorkoutType
+from tests.gpx.test_GpxService import create_gpx_service
+from tests.gpx.test_GpxStreamParser import SAMPLE_GPX
+
+IMAGE_CONTENT = b'rendered preview image'
+
+
+class GeoRenderStandIn:
+    """
+    Replaces georender: answers each posted gpx with the next configured status code (200 once all are used).
+    """
+
+    def __init__(self) -> None:
+        self.statusCodes: list[int] = []
+        self.receivedRequests: list[bytes] = []
+
+        standIn = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                standIn.receivedRequests.append(self.rfile.read(int(self.headers['Content-Length'])))
+                statusCode = standIn.statusCodes.pop(0) if standIn.statusCodes else 200
+
+                content = IMAGE_CONTENT if statusCode == 200 else b'error'
+                self.send_response(statusCode)
+                self.send_header('Content-Type', 'image/jpeg')
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def geoRender():
+    geoRender = GeoRenderStandIn()
+    yield geoRender
+    geoRender.shutdown()
+
+
+@pytest.fixture
+def gpxService(tmp_path):
+    gpxService = create_gpx_service(str(tmp_path))
+    gpxService.ingest_gpx('track', io.BytesIO(SAMPLE_GPX))
+    gpxService.ingest_gpx('otherTrack', io.BytesIO(SAMPLE_GPX))
+    return gpxService
+
+
+def create_service(gpxService, geoRender: GeoRenderStandIn, **settings) -> PreviewImageJobService:
+    gpxPreviewImageSettings = {
+        'enabled': True,
+        'geoRenderUrl': geoRender.url,
+        'numberOfWorkers': 1,
+        'maxNumberOfAttempts': 3,
+        'retryDelayInSeconds': 30,
+        'requestTimeoutInSeconds': 5,
+        'pollIntervalInSeconds': 0.1,
+    }
+    gpxPreviewImageSettings.update(settings)
+    return PreviewImageJobService(gpxService, gpxPreviewImageSettings)
+
+
+def create_planned_tour(gpxFileName: str) -> PlannedTour:
+    gpxMetadata = GpxMetadata(gpx_file_name=gpxFileName, length=1000)
+    db.session.add(gpxMetadata)
+    db.session.commit()
+
+    plannedTour = PlannedTour(
+        name='Awesome planned tour',
+        type=WorkoutType.BIKING,
+        user_id=1,
+        creation_date=datetime.now(),
+        last_edit_date=datetime.now(),
+        last_edit_user_id=1,
+        gpx_metadata_id=gpxMetadata.id,
+        shared_users=[],
+        arrival_method=TravelType.NONE,
+        departure_method=TravelType.NONE,
+        direction=TravelDirection.ROUNDTRIP,
+        share_code=None,
+    )
+    db.session.add(plannedTour)
+    db.session.commit()
+    return plannedTour
+
+
+def create_long_distance_tour(plannedTourIds: list[int]) -> LongDistanceTour:
+    longDistanceTour = LongDistanceTour(
+        name='Awesome long-distance tour',
+        type=WorkoutType.BIKING,
+        user_id=1,
+        creation_date=datetime.now(),
+        last_edit_date=datetime.now(),
+        last_edit_user_id=1,
+        shared_users=[],
+    )
+    db.session.add(longDistanceTour)
+    db.session.commit()
+
+    longDistanceTour.linked_planned_tours = [
+        LongDistanceTourPlannedTourAssociation(
+            long_distance_tour_id=longDistanceTour.id, planned_tour_id=plannedTourId, order=index
+        )
+        for index, plannedTourId in enumerate(plannedTourIds)
+    ]
+    db.session.commit()
+    return longDistanceTour
+
+
+def get_jobs() -> list[PreviewImageJob]:
+    return PreviewImageJob.query.order_by(PreviewImageJob.id).all()
+
+
+def get_retry_delay(job: PreviewImageJob) -> timedelta:
+    return cast(datetime, job.next_attempt_time) - datetime.now()
+
+
+def make_job_due(job: PreviewImageJob) -> None:
+    db.session.execute(
+        update(PreviewImageJob).where(PreviewImageJob.id == job.id).values(next_attempt_time=datetime.now())
+    )
+    db.session.commit()
+
+
+class TestPreviewImageJobService:
+    def test_enqueue_does_nothing_if_disabled(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender, enabled=False)
+
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, 1)
+
+            assert get_jobs() == []
+
+    def test_enqueue_deduplicates_pending_jobs(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, 1)
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, 1)
+            service.enqueue(PreviewImageJobType.LONG_DISTANCE_TOUR, 1)
+
+            jobs = get_jobs()
+            assert [(job.type, job.item_id, job.state) for job in jobs] == [
+                ('PLANNED_TOUR', 1, 'PENDING'),
+                ('LONG_DISTANCE_TOUR', 1, 'PENDING'),
+            ]
+
+    def test_process_planned_tour_job(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+            plannedTour = create_planned_tour('track')
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+
+            assert service.process_next_job()
+
+            imagePath = GpxPreviewImageService('track', gpxService).get_preview_image_path()
+            with open(imagePath, 'rb') as f:
+                assert f.read() == IMAGE_CONTENT
+            assert not os.path.exists(f'{imagePath}.tmp')
+            assert b'<trkpt' in geoRender.receivedRequests[0]
+            assert get_jobs() == []
+            assert not service.process_next_job()
+
+    def test_process_long_distance_tour_job(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+            plannedTourIds = [create_planned_tour('track').id, create_planned_tour('otherTrack').id]
+            longDistanceTour = create_long_distance_tour(plannedTourIds)
+            service.enqueue(PreviewImageJobType.LONG_DISTANCE_TOUR, longDistanceTour.id)
+
+            assert service.process_next_job()
+
+            imageService = LongDistanceTourGpxPreviewImageService(longDistanceTour, gpxService)
+            assert imageService.is_image_existing()
+            assert geoRender.receivedRequests[0].count(b'<trkseg>') == 2 * SAMPLE_GPX.count(b'<trkseg>')
+            assert get_jobs() == []
+
+    def test_long_distance_tour_image_is_removed_without_gpx_tracks(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+            longDistanceTour = create_long_distance_tour([create_planned_tour('track').id])
+            service.enqueue(PreviewImageJobType.LONG_DISTANCE_TOUR, longDistanceTour.id)
+            service.process_next_job()
+
+            longDistanceTour.linked_planned_tours = []
+            db.session.commit()
+            service.enqueue(PreviewImageJobType.LONG_DISTANCE_TOUR, longDistanceTour.id)
+            service.process_next_job()
+
+            assert not LongDistanceTourGpxPreviewImageService(longDistanceTour, gpxService).is_image_existing()
+            assert len(geoRender.receivedRequests) == 1
+
+    def test_job_of_deleted_item_is_removed(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, 42)
+
+            assert service.process_next_job()
+
+            assert get_jobs() == []
+            assert geoRender.receivedRequests == []
+
+    def test_failed_job_is_retried_with_backoff(self, app, gpxService, geoRender):
+        geoRender.statusCodes = [500, 503]
+
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+            plannedTour = create_planned_tour('track')
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+
+            assert service.process_next_job()
+
+            job = get_jobs()[0]
+            assert job.state == PreviewImageJobState.PENDING.value
+            assert job.number_of_attempts == 1
+            assert '500' in job.last_error
+            firstDelay = get_retry_delay(job)
+            assert timedelta(seconds=25) < firstDelay <= timedelta(seconds=30)
+
+            # the job is not due yet
+            assert not service.process_next_job()
+
+            make_job_due(job)
+            assert service.process_next_job()
+
+            job = get_jobs()[0]
+            assert job.number_of_attempts == 2
+            secondDelay = get_retry_delay(job)
+            assert timedelta(seconds=55) < secondDelay <= timedelta(seconds=60)
+
+            make_job_due(job)
+            assert service.process_next_job()
+
+            assert GpxPreviewImageService('track', gpxService).is_image_existing()
+            assert get_jobs() == []
+            assert len(geoRender.receivedRequests) == 3
+
+    def test_job_fails_after_max_number_of_attempts(self, app, gpxService, geoRender):
+        geoRender.statusCodes = [500, 500]
+
+        with app.app_context():
+            service = create_service(gpxService, geoRender, maxNumberOfAttempts=2, retryDelayInSeconds=0)
+            plannedTour = create_planned_tour('track')
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+
+            assert service.process_next_job()
+            assert service.process_next_job()
+            assert not service.process_next_job()
+
+            job = get_jobs()[0]
+            assert job.state == PreviewImageJobState.FAILED.value
+            assert job.number_of_attempts == 2
+            assert not GpxPreviewImageService('track', gpxService).is_image_existing()
+
+            # enqueuing the item again starts over, the failed job is removed once the image is rendered
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+            assert service.process_next_job()
+
+            assert GpxPreviewImageService('track', gpxService).is_image_existing()
+            assert get_jobs() == []
+
+    def test_unreachable_georender_is_retried(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender, geoRenderUrl='http://127.0.0.1:1')
+            plannedTour = create_planned_tour('track')
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+
+            assert service.process_next_job()
+
+            job = get_jobs()[0]
+            assert job.state == PreviewImageJobState.PENDING.value
+            assert job.last_error
+
+    def test_pending_job_waits_for_running_job_of_same_item(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+            plannedTour = create_planned_tour('track')
+            db.session.add(
+                PreviewImageJob(
+                    type=PreviewImageJobType.PLANNED_TOUR.value,
+                    item_id=plannedTour.id,
+                    state=PreviewImageJobState.RUNNING.value,
+                    number_of_attempts=1,
+                    next_attempt_time=datetime.now(),
+                    start_time=datetime.now(),
+                )
+            )
+            db.session.commit()
+
+            service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+
+            assert len(get_jobs()) == 2
+            assert not service.process_next_job()
+
+    def test_stale_running_job_is_processed_again(self, app, gpxService, geoRender):
+        with app.app_context():
+            service = create_service(gpxService, geoRender)
+            plannedTour = create_planned_tour('track')
+            db.session.add(
+                PreviewImageJob(
+                    type=PreviewImageJobType.PLANNED_TOUR.value,
+                    item_id=plannedTour.id,
+                    state=PreviewImageJobState.RUNNING.value,
+                    number_of_attempts=1,
+                    next_attempt_time=datetime.now() - timedelta(hours=1),
+                    start_time=datetime.now() - timedelta(hours=1),
+                )
+            )
+            db.session.commit()
+
+            # the stale job is scheduled for a retry first
+            assert not service.process_next_job()
+            job = get_jobs()[0]
+            assert job.state == PreviewImageJobState.PENDING.value
+
+            make_job_due(job)
+            assert service.process_next_job()
+
+            assert GpxPreviewImageService('track', gpxService).is_image_existing()
+            assert get_jobs() == []
+
+    def test_workers_render_in_background(self, app, gpxService, geoRender):
+        service = create_service(gpxService, geoRender)
+        imagePath = GpxPreviewImageService('track', gpxService).get_preview_image_path()
+
+        with app.app_context():
+            plannedTourId = create_planned_tour('track').id
+
+        service.start(app)
+        try:
+            with app.app_context():
+                service.enqueue(PreviewImageJobType.PLANNED_TOUR, plannedTourId)
+
+            for _ in range(100):
+                if os.path.exists(imagePath):
+                    break
+                time.sleep(0.05)
+        finally:
+            service.stop()
+
+        assert os.path.exists(imagePath)
+        with app.app_context():
+            assert get_jobs() == []
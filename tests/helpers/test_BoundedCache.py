@@ -0,0 +1,143 @@
+from sporttracker.helpers.BoundedCache import BoundedCache, CacheStatistics, format_statistics_as_prometheus
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def create_cache(maxSize: int = 100, timeToLive: float | None = None, clock=None) -> BoundedCache[str, str]:
+    if clock is None:
+        return BoundedCache('test', maxSize, len, timeToLive)
+    return BoundedCache('test', maxSize, len, timeToLive, clock)
+
+
+class TestBoundedCache:
+    def test_get_missing_entry(self):
+        cache = create_cache()
+        assert cache.get('a') is None
+        assert cache.get_statistics().misses == 1
+
+    def test_put_and_get(self):
+        cache = create_cache()
+        cache.put(1, 'a', 'value')
+
+        assert cache.get('a') == 'value'
+        statistics = cache.get_statistics()
+        assert statistics.hits == 1
+        assert statistics.numberOfEntries == 1
+        assert statistics.size == 5
+
+    def test_put_replaces_entry(self):
+        cache = create_cache()
+        cache.put(1, 'a', 'value')
+        cache.put(1, 'a', 'other value')
+
+        assert cache.get('a') == 'other value'
+        assert cache.get_statistics().size == 11
+
+    def test_evicts_least_recently_used_entries(self):
+        cache = create_cache(maxSize=10)
+        cache.put(1, 'a', 'aaaa')
+        cache.put(1, 'b', 'bbbb')
+        cache.get('a')
+        cache.put(2, 'c', 'cccc')
+
+        assert cache.get('a') == 'aaaa'
+        assert cache.get('b') is None
+        assert cache.get('c') == 'cccc'
+        statistics = cache.get_statistics()
+        assert statistics.evictions == 1
+        assert statistics.size == 8
+
+    def test_eviction_callback(self):
+        evictedEntries: list[tuple[str, str]] = []
+        cache: BoundedCache[str, str] = BoundedCache(
+            'test', 10, len, onEviction=lambda key, value: evictedEntries.append((key, value))
+        )
+        cache.put(1, 'a', 'aaaa')
+        cache.put(1, 'b', 'bbbb')
+        cache.invalidate_by_user(1)
+        cache.put(1, 'c', 'cccc')
+        cache.put(1, 'd', 'dddd')
+        cache.put(1, 'e', 'eeee')
+
+        # invalidated entries are not reported
+        assert evictedEntries == [('c', 'cccc')]
+
+    def test_entry_larger_than_budget_is_not_stored(self):
+        cache = create_cache(maxSize=3)
+        cache.put(1, 'a', 'aaaa')
+
+        assert cache.get('a') is None
+        assert cache.get_statistics().numberOfEntries == 0
+
+    def test_entry_expires(self):
+        clock = FakeClock()
+        cache = create_cache(timeToLive=60, clock=clock)
+        cache.put(1, 'a', 'value')
+
+        clock.now = 59
+        assert cache.get('a') == 'value'
+
+        clock.now = 60
+        assert cache.get('a') is None
+        statistics = cache.get_statistics()
+        assert statistics.expirations == 1
+        assert statistics.numberOfEntries == 0
+        assert statistics.size == 0
+
+    def test_invalidate_by_user(self):
+        cache = create_cache()
+        cache.put(1, 'a', 'a')
+        cache.put(1, 'b', 'b')
+        cache.put(11, 'c', 'c')
+
+        assert cache.invalidate_by_user(1) == 2
+        assert cache.invalidate_by_user(1) == 0
+        assert cache.get('a') is None
+        assert cache.get('b') is None
+        assert cache.get('c') == 'c'
+        assert cache.get_statistics().size == 1
+
+    def test_get_entries_by_user(self):
+        cache = create_cache()
+        cache.put(1, 'a', 'a')
+        cache.put(1, 'b', 'b')
+        cache.put(2, 'c', 'c')
+
+        assert sorted(cache.get_entries_by_user(1)) == [('a', 'a'), ('b', 'b')]
+        assert cache.get_entries_by_user(3) == []
+        assert cache.get_statistics().hits == 0
+
+    def test_update_size(self):
+        sizes = {'a': 4}
+        cache: BoundedCache[str, str] = BoundedCache('test', 10, lambda value: sizes[value])
+        cache.put(1, 'a', 'a')
+
+        sizes['a'] = 8
+        cache.update_size('a')
+        assert cache.get_statistics().size == 8
+
+        sizes['a'] = 11
+        cache.update_size('a')
+        assert cache.get('a') is None
+        assert cache.get_statistics().evictions == 1
+
+    def test_format_statistics_as_prometheus(self):
+        result = format_statistics_as_prometheus(
+            [
+                CacheStatistics('first', 1, 100, 1000, 5, 2, 0, 0),
+                CacheStatistics('second', 3, 300, 1000, 0, 7, 1, 2),
+            ]
+        )
+
+        lines = result.splitlines()
+        assert '# TYPE sporttracker_cache_hits_total counter' in lines
+        assert 'sporttracker_cache_hits_total{cache="first"} 5' in lines
+        assert 'sporttracker_cache_misses_total{cache="second"} 7' in lines
+        assert 'sporttracker_cache_size_bytes{cache="second"} 300' in lines
+        assert result.endswith('\n')
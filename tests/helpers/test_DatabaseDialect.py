@@ -0,0 +1,32 @@
+from unittest.mock import MagicMock
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+
+from sporttracker.helpers.DatabaseDialect import DatabaseDialect
+
+
+def create_session(dialectName: str) -> MagicMock:
+    session = MagicMock()
+    session.get_bind.return_value.dialect.name = dialectName
+    return session
+
+
+class TestDatabaseDialect:
+    def test_get_insert_function_sqliteConnection(self):
+        with create_engine('sqlite://').connect() as connection:
+            assert DatabaseDialect.get_insert_function(connection) is sqlite.insert
+
+    def test_get_insert_function_postgresqlSession(self):
+        assert DatabaseDialect.get_insert_function(create_session('postgresql')) is postgresql.insert
+
+    def test_get_insert_function_unsupportedDialect_raises(self):
+        with pytest.raises(ValueError):
+            DatabaseDialect.get_insert_function(create_session('mysql'))
+
+    def test_get_chunk_size_sqlite_respectsParameterLimit(self):
+        assert DatabaseDialect.get_chunk_size(create_session('sqlite'), 3) == 333
+
+    def test_get_chunk_size_postgresql(self):
+        assert DatabaseDialect.get_chunk_size(create_session('postgresql'), 3) == DatabaseDialect.CHUNK_SIZE
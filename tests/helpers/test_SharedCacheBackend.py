@@ -0,0 +1,223 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from sporttracker.helpers.SharedCacheBackend import DatabaseSharedCacheBackend
+from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache, MaxSquare
+from sporttracker.tileHunting.TileImageCache import TileImageCache
+from sporttracker.tileHunting.TilePyramidCache import TilePyramidCache
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache, PackedTileIndex
+from sporttracker.workout.WorkoutType import WorkoutType
+
+NAMESPACE = 'test'
+
+
+@pytest.fixture
+def databaseUri(tmp_path) -> str:
+    return f'sqlite:///{tmp_path / "sharedCache.db"}'
+
+
+@pytest.fixture
+def backends(databaseUri):
+    # two backends on the same database simulate two SportTracker processes
+    first = DatabaseSharedCacheBackend(databaseUri, pollInterval=0.05)
+    second = DatabaseSharedCacheBackend(databaseUri, pollInterval=0.05)
+    yield first, second
+    first.close()
+    second.close()
+
+
+class InvalidationRecorder:
+    def __init__(self) -> None:
+        self.invalidations: list[tuple[str, int]] = []
+        self.received = threading.Event()
+
+    def __call__(self, namespace: str, userId: int) -> None:
+        self.invalidations.append((namespace, userId))
+        self.received.set()
+
+
+class TestDatabaseSharedCacheBackend:
+    def test_get_missing_entry(self, backends):
+        first, _ = backends
+        assert first.get(NAMESPACE, 1, 'key') == (0, None)
+
+    def test_put_and_get_from_other_process(self, backends):
+        first, second = backends
+        assert first.put(NAMESPACE, 1, 'key', 0, b'value')
+
+        assert second.get(NAMESPACE, 1, 'key') == (0, b'value')
+        assert second.get('other', 1, 'key') == (0, None)
+
+    def test_put_replaces_entry(self, backends):
+        first, second = backends
+        first.put(NAMESPACE, 1, 'key', 0, b'value')
+        second.put(NAMESPACE, 1, 'key', 0, b'other value')
+
+        assert first.get(NAMESPACE, 1, 'key') == (0, b'other value')
+
+    def test_invalidate_by_user(self, backends):
+        first, second = backends
+        first.put(NAMESPACE, 1, 'first', 0, b'value')
+        first.put(NAMESPACE, 2, 'second', 0, b'value')
+
+        assert second.invalidate_by_user(NAMESPACE, 1) == 1
+        assert second.invalidate_by_user(NAMESPACE, 1) == 2
+
+        assert first.get(NAMESPACE, 1, 'first') == (2, None)
+        assert first.get(NAMESPACE, 2, 'second') == (0, b'value')
+
+    def test_put_outdated_generation_is_rejected(self, backends):
+        first, second = backends
+        generation, _ = first.get(NAMESPACE, 1, 'key')
+
+        # the other process invalidates while the value is calculated
+        second.invalidate_by_user(NAMESPACE, 1)
+
+        assert not first.put(NAMESPACE, 1, 'key', generation, b'outdated')
+        assert first.get(NAMESPACE, 1, 'key') == (1, None)
+
+    def test_invalidation_is_broadcast_to_other_processes(self, backends):
+        first, second = backends
+        firstRecorder = InvalidationRecorder()
+        secondRecorder = InvalidationRecorder()
+        first.add_invalidation_listener(firstRecorder)
+        second.add_invalidation_listener(secondRecorder)
+
+        first.invalidate_by_user(NAMESPACE, 5)
+
+        assert secondRecorder.received.wait(timeout=5)
+        assert secondRecorder.invalidations == [(NAMESPACE, 5)]
+        # the invalidating process has already invalidated its local entries
+        assert firstRecorder.invalidations == []
+
+    def test_max_square_cache_is_shared_between_processes(self, backends):
+        first, second = backends
+        firstCache = MaxSquareCache(sharedCacheBackend=first)
+        secondCache = MaxSquareCache(sharedCacheBackend=second)
+
+        with patch.object(
+            MaxSquareCache, '_MaxSquareCache__determine_visited_tiles', return_value=[(1, 1), (1, 2), (2, 1), (2, 2)]
+        ) as determineMock:
+            assert firstCache.get_max_square(1, [WorkoutType.BIKING], [2025]) == MaxSquare(1, 1, 2)
+            assert secondCache.get_max_square(1, [WorkoutType.BIKING], [2025]) == MaxSquare(1, 1, 2)
+            assert determineMock.call_count == 1
+
+    def test_max_square_cache_invalidation_reaches_other_processes(self, backends):
+        first, second = backends
+        firstCache = MaxSquareCache(sharedCacheBackend=first)
+        secondCache = MaxSquareCache(sharedCacheBackend=second)
+        secondRecorder = InvalidationRecorder()
+        second.add_invalidation_listener(secondRecorder)
+
+        with patch.object(MaxSquareCache, '_MaxSquareCache__determine_visited_tiles', return_value=[(1, 1)]):
+            firstCache.get_max_square(1, [WorkoutType.BIKING], [2025])
+            secondCache.get_max_square(1, [WorkoutType.BIKING], [2025])
+
+        firstCache.add_visited_tiles(1, WorkoutType.BIKING, 2025, [(1, 2), (2, 1), (2, 2)])
+        assert secondRecorder.received.wait(timeout=5)
+
+        with patch.object(MaxSquareCache, '_MaxSquareCache__determine_visited_tiles') as determineMock:
+            # the second process drops its outdated state and uses the updated state of the first process
+            assert secondCache.get_max_square(1, [WorkoutType.BIKING], [2025]) == MaxSquare(1, 1, 2)
+            determineMock.assert_not_called()
+
+    def test_visited_tile_index_cache_invalidation_reaches_other_processes(self, backends):
+        first, second = backends
+        firstCache = VisitedTileIndexCache(first)
+        secondCache = VisitedTileIndexCache(second)
+        secondRecorder = InvalidationRecorder()
+        second.add_invalidation_listener(secondRecorder)
+
+        typeMask = PackedTileIndex.get_type_mask([WorkoutType.BIKING])
+        with (
+            patch.object(
+                VisitedTileIndexCache,
+                '_VisitedTileIndexCache__load_visited_tiles',
+                return_value=[(1, 1, typeMask, 2025, 1)],
+            ) as loadVisitedMock,
+            patch.object(
+                VisitedTileIndexCache,
+                '_VisitedTileIndexCache__load_planned_tiles',
+                return_value=[(1, 1, typeMask, 0, 1)],
+            ) as loadPlannedMock,
+        ):
+            secondCache.get_visited_tile_index(1)
+            secondCache.get_planned_tile_index(1)
+
+            firstCache.invalidate_visited_tiles_by_user(1)
+            assert secondRecorder.received.wait(timeout=5)
+            secondRecorder.received.clear()
+
+            secondCache.get_visited_tile_index(1)
+            secondCache.get_planned_tile_index(1)
+            assert loadVisitedMock.call_count == 2
+            assert loadPlannedMock.call_count == 1
+
+            firstCache.invalidate_planned_tiles_by_user(1)
+            assert secondRecorder.received.wait(timeout=5)
+
+            secondCache.get_planned_tile_index(1)
+            assert loadPlannedMock.call_count == 2
+
+    def test_tile_pyramid_cache_changes_reach_other_processes(self, backends):
+        first, second = backends
+        firstCache = TilePyramidCache(14, 10, VisitedTileIndexCache(), first)
+        secondCache = TilePyramidCache(14, 10, VisitedTileIndexCache(), second)
+        secondRecorder = InvalidationRecorder()
+        second.add_invalidation_listener(secondRecorder)
+
+        typeMask = PackedTileIndex.get_type_mask([WorkoutType.BIKING])
+        with patch.object(
+            VisitedTileIndexCache,
+            '_VisitedTileIndexCache__load_visited_tiles',
+            return_value=[(1, 1, typeMask, 2025, 1)],
+        ):
+            firstPyramid = firstCache.get_pyramid(1)
+            secondPyramid = secondCache.get_pyramid(1)
+
+            firstCache.add_visited_tiles(1, WorkoutType.BIKING, 2025, [(1, 2)])
+            assert secondRecorder.received.wait(timeout=5)
+
+            # the first process updates its pyramid incrementally, the second process discards its outdated pyramid
+            assert firstCache.get_pyramid(1) is firstPyramid
+            assert secondCache.get_pyramid(1) is not secondPyramid
+
+    def test_tile_image_cache_invalidation_reaches_other_processes(self, backends, tmp_path):
+        first, second = backends
+        firstCache = TileImageCache(10, str(tmp_path / 'first'), sharedCacheBackend=first)
+        secondCache = TileImageCache(10, str(tmp_path / 'second'), sharedCacheBackend=second)
+        secondRecorder = InvalidationRecorder()
+        second.add_invalidation_listener(secondRecorder)
+
+        key = secondCache.create_key(1, 'all', 'hash', 14, 1, 2)
+        secondCache.put(key, b'image')
+        assert secondCache.get_disk_size() == len(b'image')
+
+        firstCache.invalidate_cache_entry_by_user(1)
+        assert secondRecorder.received.wait(timeout=5)
+
+        assert secondCache.get(key) is None
+        assert secondCache.get(secondCache.create_key(1, 'all', 'hash', 14, 1, 2)) is None
+        assert secondCache.get_disk_size() == 0
+
+    def test_tile_image_cache_with_shared_disk_folder(self, backends, tmp_path):
+        first, second = backends
+        diskCacheFolder = str(tmp_path / 'tileImageCache')
+        firstCache = TileImageCache(10, diskCacheFolder, sharedCacheBackend=first)
+        secondCache = TileImageCache(10, diskCacheFolder, sharedCacheBackend=second)
+        secondRecorder = InvalidationRecorder()
+        second.add_invalidation_listener(secondRecorder)
+
+        firstCache.put(firstCache.create_key(1, 'all', 'hash', 14, 1, 2), b'outdated')
+        assert secondCache.get(secondCache.create_key(1, 'all', 'hash', 14, 1, 2)) == b'outdated'
+
+        firstCache.invalidate_cache_entry_by_user(1)
+        assert secondRecorder.received.wait(timeout=5)
+
+        assert secondCache.get(secondCache.create_key(1, 'all', 'hash', 14, 1, 2)) is None
+
+        # both processes use the disk generation of the invalidating process
+        secondCache.put(secondCache.create_key(1, 'all', 'hash', 14, 1, 2), b'image')
+        assert firstCache.get(firstCache.create_key(1, 'all', 'hash', 14, 1, 2)) == b'image'
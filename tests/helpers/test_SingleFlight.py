@@ -0,0 +1,130 @@
+import threading
+import time
+
+import pytest
+
+from sporttracker.helpers.SingleFlight import SingleFlight
+
+
+def run_concurrently(singleFlight: SingleFlight, key: str, function, numberOfCallers: int) -> list:
+    results: list = [None] * numberOfCallers
+
+    def call(index: int) -> None:
+        try:
+            results[index] = singleFlight.run(key, function)
+        except Exception as e:
+            results[index] = e
+
+    threads = [threading.Thread(target=call, args=(index,)) for index in range(numberOfCallers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    return results
+
+
+def create_blocking_function(started: threading.Event, release: threading.Event, result):
+    calls = []
+
+    def function():
+        calls.append(1)
+        started.set()
+        release.wait(timeout=5)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return function, calls
+
+
+class TestSingleFlight:
+    def test_run_returns_result(self):
+        assert SingleFlight[int]().run('key', lambda: 42) == 42
+
+    def test_run_concurrent_callers_compute_once(self):
+        singleFlight: SingleFlight[list[int]] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        function, calls = create_blocking_function(started, release, [1, 2, 3])
+
+        results: list = []
+        callers = threading.Thread(target=lambda: results.extend(run_concurrently(singleFlight, 'key', function, 10)))
+        callers.start()
+        assert started.wait(timeout=5)
+        # give the remaining callers time to join the running flight
+        time.sleep(0.2)
+        release.set()
+        callers.join(timeout=5)
+
+        assert calls == [1]
+        assert results == [[1, 2, 3]] * 10
+        assert not singleFlight.is_running('key')
+
+    def test_run_waiters_receive_result_of_running_flight(self):
+        singleFlight: SingleFlight[str] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        function, calls = create_blocking_function(started, release, 'result')
+
+        leader = threading.Thread(target=singleFlight.run, args=('key', function))
+        leader.start()
+        assert started.wait(timeout=5)
+        assert singleFlight.is_running('key')
+
+        results: list = []
+        waiter = threading.Thread(target=lambda: results.append(singleFlight.run('key', lambda: 'other')))
+        waiter.start()
+        time.sleep(0.2)
+        release.set()
+        waiter.join(timeout=5)
+        leader.join(timeout=5)
+
+        assert calls == [1]
+        assert results == ['result']
+
+    def test_run_different_keys_are_independent(self):
+        singleFlight: SingleFlight[str] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        function, _ = create_blocking_function(started, release, 'first')
+
+        leader = threading.Thread(target=singleFlight.run, args=('first', function))
+        leader.start()
+        assert started.wait(timeout=5)
+
+        assert singleFlight.run('second', lambda: 'second') == 'second'
+        release.set()
+        leader.join(timeout=5)
+
+    def test_run_error_is_raised_for_all_callers(self):
+        singleFlight: SingleFlight[str] = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        function, calls = create_blocking_function(started, release, ValueError('failed'))
+
+        errors: list = []
+
+        def call_leader():
+            try:
+                singleFlight.run('key', function)
+            except ValueError as e:
+                errors.append(e)
+
+        leader = threading.Thread(target=call_leader)
+        leader.start()
+        assert started.wait(timeout=5)
+
+        waiter = threading.Thread(target=lambda: errors.extend(run_concurrently(singleFlight, 'key', function, 1)))
+        waiter.start()
+        time.sleep(0.2)
+        release.set()
+        waiter.join(timeout=5)
+        leader.join(timeout=5)
+
+        assert len(errors) == 2
+        assert all(isinstance(error, ValueError) for error in errors)
+
+        # a failed flight is not remembered
+        with pytest.raises(ZeroDivisionError):
+            singleFlight.run('key', lambda: str(1 / 0))
@@ -0,0 +1,59 @@
+from sporttracker.helpers.StageTimer import StageTimer, StageStatistics, format_stage_durations
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestStageTimer:
+    def test_measure(self):
+        clock = FakeClock()
+        stageTimer = StageTimer(clock)
+
+        with stageTimer.measure('parse'):
+            clock.now += 0.5
+        with stageTimer.measure('compress'):
+            clock.now += 0.25
+        with stageTimer.measure('parse'):
+            clock.now += 0.5
+
+        assert stageTimer.get_durations() == {'parse': 1.0, 'compress': 0.25}
+
+    def test_measure_on_exception(self):
+        clock = FakeClock()
+        stageTimer = StageTimer(clock)
+
+        try:
+            with stageTimer.measure('parse'):
+                clock.now += 2
+                raise ValueError()
+        except ValueError:
+            pass
+
+        assert stageTimer.get_durations() == {'parse': 2}
+
+    def test_format_stage_durations(self):
+        assert format_stage_durations({'parse': 0.0123, 'metadata': 0.002}) == 'parse: 12.3 ms, metadata: 2.0 ms'
+
+
+class TestStageStatistics:
+    def test_add(self):
+        statistics = StageStatistics('gpx_ingest')
+        statistics.add({'parse': 1.0, 'compress': 0.5})
+        statistics.add({'parse': 2.0})
+
+        assert statistics.get_number_of_operations() == 2
+        assert statistics.get_durations() == {'parse': 3.0, 'compress': 0.5}
+
+    def test_format_as_prometheus(self):
+        statistics = StageStatistics('gpx_ingest')
+        statistics.add({'parse': 1.5})
+
+        lines = statistics.format_as_prometheus().splitlines()
+        assert '# TYPE sporttracker_gpx_ingest_total counter' in lines
+        assert 'sporttracker_gpx_ingest_total 1' in lines
+        assert 'sporttracker_gpx_ingest_stage_seconds_total{stage="parse"} 1.500000' in lines
@@ -0,0 +1,202 @@
+from datetime import datetime
+from unittest.mock import Mock, call
+
+import pytest
+from flask_login import FlaskLoginClient, login_user
+
+from sporttracker.db import db
+from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.gpx.PreviewImageJobEntity import PreviewImageJobType
+from sporttracker.longDistanceTour.LongDistanceTourEntity import (
+    LongDistanceTour,
+    LongDistanceTourPlannedTourAssociation,
+)
+from sporttracker.plannedTour.PlannedTourEntity import PlannedTour
+from sporttracker.plannedTour.PlannedTourService import PlannedTourService, PlannedTourFormModel
+from sporttracker.plannedTour.TravelDirection import TravelDirection
+from sporttracker.plannedTour.TravelType import TravelType
+from sporttracker.tileHunting.BulkTileWriter import BulkTileWriter
+from sporttracker.user.UserEntity import create_user, Language, User
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+from tests.TestConstants import TEST_USERNAME, TEST_PASSWORD
+
+
+@pytest.fixture(autouse=True)
+def prepare_test_data(app):
+    app.test_client_class = FlaskLoginClient
+
+    with app.app_context():
+        create_user(TEST_USERNAME, TEST_PASSWORD, False, Language.ENGLISH)
+        create_user('USER_2', TEST_PASSWORD, False, Language.ENGLISH)
+
+
+def create_gpx_metadata() -> int:
+    gpxMetadata = GpxMetadata(gpx_file_name='dummy', length=10 * 1000)
+    db.session.add(gpxMetadata)
+    db.session.commit()
+    return gpxMetadata.id
+
+
+def create_planned_tour(userId: int, tiles: list[tuple[int, int]]) -> PlannedTour:
+    plannedTour = PlannedTour(
+        name='Awesome planned tour',
+        type=WorkoutType.BIKING,
+        user_id=userId,
+        creation_date=datetime.now(),
+        last_edit_date=datetime.now(),
+        last_edit_user_id=userId,
+        gpx_metadata_id=create_gpx_metadata(),
+        shared_users=[],
+        arrival_method=TravelType.NONE,
+        departure_method=TravelType.NONE,
+        direction=TravelDirection.ROUNDTRIP,
+        share_code=None,
+    )
+    db.session.add(plannedTour)
+    db.session.commit()
+
+    BulkTileWriter.insert_planned_tiles(db.session, plannedTour.id, tiles)
+    db.session.commit()
+    return plannedTour
+
+
+def create_workout(userId: int, tiles: list[tuple[int, int]]) -> None:
+    workout = DistanceWorkout(
+        type=WorkoutType.BIKING,
+        name='Dummy Workout',
+        start_time=datetime(year=2025, month=8, day=15),
+        duration=3600,
+        distance=10 * 1000,
+        average_heart_rate=130,
+        elevation_sum=16,
+        gpx_metadata_id=create_gpx_metadata(),
+        user_id=userId,
+        custom_fields={},
+    )
+    db.session.add(workout)
+    db.session.commit()
+
+    BulkTileWriter.insert_visited_tiles(db.session, workout.id, tiles)
+    db.session.commit()
+
+
+def create_long_distance_tour(userId: int, plannedTourId: int) -> LongDistanceTour:
+    longDistanceTour = LongDistanceTour(
+        name='Awesome long-distance tour',
+        type=WorkoutType.BIKING,
+        user_id=userId,
+        creation_date=datetime.now(),
+        last_edit_date=datetime.now(),
+        last_edit_user_id=userId,
+        shared_users=[],
+    )
+    db.session.add(longDistanceTour)
+    db.session.commit()
+
+    longDistanceTour.linked_planned_tours = [
+        LongDistanceTourPlannedTourAssociation(
+            long_distance_tour_id=longDistanceTour.id, planned_tour_id=plannedTourId, order=0
+        )
+    ]
+    db.session.commit()
+    return longDistanceTour
+
+
+def create_service(newGpxMetadataId: int | None) -> tuple[PlannedTourService, Mock]:
+    gpxService = Mock()
+    gpxService.handle_gpx_upload_for_planned_tour.return_value = newGpxMetadataId
+    previewImageJobService = Mock()
+    plannedTourService = PlannedTourService(gpxService, previewImageJobService, {'baseZoomLevel': 14}, Mock())
+    return plannedTourService, previewImageJobService
+
+
+FORM_MODEL = PlannedTourFormModel(
+    name='Awesome planned tour',
+    type=WorkoutType.BIKING.name,
+    arrivalMethod=TravelType.NONE.name,
+    departureMethod=TravelType.NONE.name,
+    direction=TravelDirection.ROUNDTRIP.name,
+)
+
+
+class TestPlannedTourService:
+    def test_get_number_of_new_visited_tiles(self, app):
+        with app.test_request_context():
+            user = db.session.get(User, 2)
+            otherUser = db.session.get(User, 3)
+            assert user is not None
+            assert otherUser is not None
+            login_user(user, remember=False)
+
+            plannedTour = create_planned_tour(user.id, [(1, 1), (1, 2), (2, 1), (2, 2)])
+            create_workout(user.id, [(1, 1), (5, 5)])
+            create_workout(user.id, [(1, 1), (1, 2)])
+            create_workout(otherUser.id, [(2, 1)])
+
+            assert PlannedTourService.get_number_of_new_visited_tiles(plannedTour) == 2
+
+    def test_get_number_of_new_visited_tiles_without_gpx(self, app):
+        with app.test_request_context():
+            user = db.session.get(User, 2)
+            assert user is not None
+            login_user(user, remember=False)
+
+            plannedTour = create_planned_tour(user.id, [])
+            plannedTour.gpx_metadata_id = None
+            db.session.commit()
+
+            assert PlannedTourService.get_number_of_new_visited_tiles(plannedTour) == 0
+
+    def test_add_planned_tour_enqueues_preview_image(self, app):
+        with app.test_request_context():
+            user = db.session.get(User, 2)
+            assert user is not None
+            login_user(user, remember=False)
+            plannedTourService, previewImageJobService = create_service(create_gpx_metadata())
+
+            plannedTour = plannedTourService.add_planned_tour(FORM_MODEL, {}, [], user.id)
+
+            assert previewImageJobService.enqueue.call_args_list == [
+                call(PreviewImageJobType.PLANNED_TOUR, plannedTour.id)
+            ]
+
+    def test_add_planned_tour_without_gpx(self, app):
+        with app.test_request_context():
+            user = db.session.get(User, 2)
+            assert user is not None
+            login_user(user, remember=False)
+            plannedTourService, previewImageJobService = create_service(None)
+
+            plannedTourService.add_planned_tour(FORM_MODEL, {}, [], user.id)
+
+            previewImageJobService.enqueue.assert_not_called()
+
+    def test_edit_planned_tour_enqueues_preview_images_of_linked_long_distance_tours(self, app):
+        with app.test_request_context():
+            user = db.session.get(User, 2)
+            assert user is not None
+            login_user(user, remember=False)
+            plannedTour = create_planned_tour(user.id, [])
+            longDistanceTour = create_long_distance_tour(user.id, plannedTour.id)
+            plannedTourService, previewImageJobService = create_service(create_gpx_metadata())
+
+            plannedTourService.edit_planned_tour(plannedTour.id, FORM_MODEL, {}, [], user.id)
+
+            assert previewImageJobService.enqueue.call_args_list == [
+                call(PreviewImageJobType.PLANNED_TOUR, plannedTour.id),
+                call(PreviewImageJobType.LONG_DISTANCE_TOUR, longDistanceTour.id),
+            ]
+
+    def test_edit_planned_tour_without_new_gpx(self, app):
+        with app.test_request_context():
+            user = db.session.get(User, 2)
+            assert user is not None
+            login_user(user, remember=False)
+            plannedTour = create_planned_tour(user.id, [])
+            create_long_distance_tour(user.id, plannedTour.id)
+            plannedTourService, previewImageJobService = create_service(None)
+
+            plannedTourService.edit_planned_tour(plannedTour.id, FORM_MODEL, {}, [], user.id)
+
+            previewImageJobService.enqueue.assert_not_called()
@@ -0,0 +1,54 @@
+import os
+from unittest.mock import patch
+
+from TheCodeLabs_FlaskUtils import FlaskBaseApp
+
+from sporttracker import Constants
+from sporttracker.SportTracker import SportTracker, LOGGER, create_test_app
+from sporttracker.gpx.PreviewImageJobService import PreviewImageJobService
+
+
+def create_sport_tracker() -> SportTracker:
+    return SportTracker(
+        Constants.APP_NAME,
+        os.path.dirname(os.path.abspath(Constants.__file__)),
+        LOGGER,
+        False,
+        False,
+        False,
+        True,
+        settingsPath='../settings-test.json',
+    )
+
+
+class TestSportTracker:
+    def test_start_server_starts_preview_image_workers(self):
+        sportTracker = create_sport_tracker()
+
+        with (
+            patch.object(FlaskBaseApp, 'start_server', lambda self: self.init_app()),
+            patch.object(PreviewImageJobService, 'start') as startMock,
+        ):
+            sportTracker.start_server()
+
+        startMock.assert_called_once()
+
+    def test_start_server_with_existing_app_starts_preview_image_workers(self):
+        sportTracker = create_sport_tracker()
+
+        with (
+            patch.object(FlaskBaseApp, 'start_server'),
+            patch.object(PreviewImageJobService, 'start') as startMock,
+        ):
+            app = sportTracker.init_app()
+            startMock.assert_not_called()
+
+            sportTracker.start_server()
+
+        startMock.assert_called_once_with(app)
+
+    def test_create_test_app_does_not_start_preview_image_workers(self):
+        with patch.object(PreviewImageJobService, 'start') as startMock:
+            create_test_app()
+
+        startMock.assert_not_called()
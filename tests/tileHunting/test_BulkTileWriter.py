@@ -0,0 +1,42 @@
+import pytest
+from flask_login import FlaskLoginClient
+
+from sporttracker.db import db
+from sporttracker.tileHunting.BulkTileWriter import BulkTileWriter
+from sporttracker.tileHunting.GpxPlannedTileEntity import GpxPlannedTile
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+
+
+@pytest.fixture(autouse=True)
+def prepare_test_data(app):
+    app.test_client_class = FlaskLoginClient
+
+
+class TestBulkTileWriter:
+    def test_insert_visited_tiles(self, app):
+        with app.app_context():
+            tiles = [(x, y) for x in range(100) for y in range(25)]
+
+            numberOfTiles = BulkTileWriter.insert_visited_tiles(db.session, 1, tiles)
+            db.session.commit()
+
+            assert numberOfTiles == 2500
+            assert GpxVisitedTile.query.filter(GpxVisitedTile.workout_id == 1).count() == 2500
+
+    def test_insert_visited_tiles_ignores_existing_tiles(self, app):
+        with app.app_context():
+            BulkTileWriter.insert_visited_tiles(db.session, 1, [(1, 1), (1, 2)])
+            BulkTileWriter.insert_visited_tiles(db.session, 1, [(1, 2), (1, 3)])
+            db.session.commit()
+
+            rows = GpxVisitedTile.query.filter(GpxVisitedTile.workout_id == 1).order_by(GpxVisitedTile.y).all()
+            assert [(row.x, row.y) for row in rows] == [(1, 1), (1, 2), (1, 3)]
+
+    def test_insert_planned_tiles(self, app):
+        with app.app_context():
+            BulkTileWriter.insert_planned_tiles(db.session, 5, [(3, 4), (5, 6)])
+            BulkTileWriter.insert_planned_tiles(db.session, 6, [])
+            db.session.commit()
+
+            assert GpxPlannedTile.query.filter(GpxPlannedTile.planned_tour_id == 5).count() == 2
+            assert GpxPlannedTile.query.filter(GpxPlannedTile.planned_tour_id == 6).count() == 0
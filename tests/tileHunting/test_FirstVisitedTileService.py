@@ -0,0 +1,130 @@
+from datetime import datetime
+
+import pytest
+from flask_login import FlaskLoginClient
+
+from sporttracker.db import db
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+from sporttracker.user.UserEntity import create_user, Language
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+from tests.TestConstants import TEST_USERNAME, TEST_PASSWORD
+
+
+@pytest.fixture(autouse=True)
+def prepare_test_data(app):
+    app.test_client_class = FlaskLoginClient
+
+    with app.app_context():
+        create_user(TEST_USERNAME, TEST_PASSWORD, False, Language.ENGLISH)
+
+
+def create_workout(workoutType: WorkoutType, startTime: datetime, tiles: list[tuple[int, int]]) -> DistanceWorkout:
+    workout = DistanceWorkout(
+        type=workoutType,
+        name='Dummy Workout',
+        start_time=startTime,
+        duration=3600,
+        distance=10 * 1000,
+        average_heart_rate=130,
+        elevation_sum=16,
+        user_id=2,
+        custom_fields={},
+    )
+    db.session.add(workout)
+    db.session.commit()
+
+    for x, y in tiles:
+        db.session.add(GpxVisitedTile(workout_id=workout.id, x=x, y=y))
+    db.session.commit()
+
+    FirstVisitedTileService.add_workout(workout, tiles)
+    return workout
+
+
+def remove_workout(workout: DistanceWorkout) -> None:
+    db.session.execute(GpxVisitedTile.__table__.delete().where(GpxVisitedTile.workout_id == workout.id))
+    db.session.commit()
+    FirstVisitedTileService.remove_workout(workout)
+
+
+class TestFirstVisitedTileService:
+    def test_get_number_of_new_tiles_per_workout(self, app):
+        with app.app_context():
+            first = create_workout(WorkoutType.BIKING, datetime(2024, 5, 1), [(1, 1), (1, 2)])
+            second = create_workout(WorkoutType.BIKING, datetime(2024, 6, 1), [(1, 2), (1, 3)])
+            third = create_workout(WorkoutType.RUNNING, datetime(2023, 1, 1), [(1, 3), (1, 4)])
+
+            result = FirstVisitedTileService.get_number_of_new_tiles_per_workout(
+                2, [WorkoutType.BIKING, WorkoutType.RUNNING], [2023, 2024]
+            )
+            assert result == {first.id: 2, third.id: 2}
+
+            result = FirstVisitedTileService.get_number_of_new_tiles_per_workout(2, [WorkoutType.BIKING], [2024])
+            assert result == {first.id: 2, second.id: 1}
+
+    def test_get_number_of_new_tiles_per_workout_type_and_year(self, app):
+        with app.app_context():
+            create_workout(WorkoutType.BIKING, datetime(2024, 5, 1), [(1, 1), (1, 2)])
+            create_workout(WorkoutType.RUNNING, datetime(2025, 1, 1), [(1, 2), (1, 3), (1, 4)])
+
+            result = FirstVisitedTileService.get_number_of_new_tiles_per_workout_type_and_year(
+                2, [WorkoutType.BIKING, WorkoutType.RUNNING], None
+            )
+            assert result == {(WorkoutType.BIKING, 2024): 2, (WorkoutType.RUNNING, 2025): 2}
+
+    def test_get_new_tiles_by_workout(self, app):
+        with app.app_context():
+            create_workout(WorkoutType.RUNNING, datetime(2023, 1, 1), [(1, 1)])
+            workout = create_workout(WorkoutType.BIKING, datetime(2024, 5, 1), [(1, 1), (1, 2)])
+            create_workout(WorkoutType.BIKING, datetime(2022, 5, 1), [(5, 5)])
+
+            assert FirstVisitedTileService.get_new_tiles_by_workout(workout) == [(1, 2)]
+
+    def test_remove_workout_promotes_next_visit(self, app):
+        with app.app_context():
+            first = create_workout(WorkoutType.BIKING, datetime(2024, 5, 1), [(1, 1), (1, 2)])
+            second = create_workout(WorkoutType.BIKING, datetime(2024, 6, 1), [(1, 2), (1, 3)])
+
+            remove_workout(first)
+
+            result = FirstVisitedTileService.get_number_of_new_tiles_per_workout(2, [WorkoutType.BIKING], [2024])
+            assert result == {second.id: 2}
+
+    def test_update_workout_after_start_time_change(self, app):
+        with app.app_context():
+            first = create_workout(WorkoutType.BIKING, datetime(2024, 5, 1), [(1, 1), (1, 2)])
+            second = create_workout(WorkoutType.BIKING, datetime(2024, 6, 1), [(1, 2), (1, 3)])
+
+            second.start_time = datetime(2024, 4, 1)  # type: ignore[assignment]
+            db.session.commit()
+            FirstVisitedTileService.update_workout(second)
+
+            result = FirstVisitedTileService.get_number_of_new_tiles_per_workout(2, [WorkoutType.BIKING], [2024])
+            assert result == {first.id: 1, second.id: 2}
+
+    def test_add_workouts(self, app):
+        with app.app_context():
+            existing = create_workout(WorkoutType.BIKING, datetime(2024, 5, 1), [(1, 1)])
+
+            workouts = []
+            for startTime in [datetime(2024, 7, 1), datetime(2024, 6, 1)]:
+                workout = DistanceWorkout(
+                    type=WorkoutType.BIKING,
+                    name='Imported Workout',
+                    start_time=startTime,
+                    duration=3600,
+                    distance=10 * 1000,
+                    user_id=2,
+                    custom_fields={},
+                )
+                db.session.add(workout)
+                workouts.append(workout)
+            db.session.commit()
+
+            # both workouts visit the same tiles, which must not be updated twice in the same statement
+            FirstVisitedTileService.add_workouts([(workout, [(1, 1), (1, 2), (1, 3)]) for workout in workouts])
+
+            result = FirstVisitedTileService.get_number_of_new_tiles_per_workout(2, [WorkoutType.BIKING], [2024])
+            assert result == {existing.id: 1, workouts[1].id: 2}
@@ -1,15 +1,20 @@
-from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache
+import random
+import threading
+import time
+from unittest.mock import patch
+
+from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache, MaxSquare, MaxSquareState
+from sporttracker.workout.WorkoutType import WorkoutType
 
 
 class TestMaxSquareCache:
     def test_calculate_max_square_no_visited_tiles(self):
         result = MaxSquareCache._calculate_max_square([])
-        assert len(result) == 0
+        assert result is None
 
     def test_calculate_max_square_one_visited_tile(self):
         result = MaxSquareCache._calculate_max_square([(123, 456)])
-        assert len(result) == 1
-        assert (123, 456) in result
+        assert result == MaxSquare(123, 456, 1)
 
     def test_calculate_max_square_2x2_square(self):
         result = MaxSquareCache._calculate_max_square(
@@ -20,11 +25,8 @@ class TestMaxSquareCache:
                 (2, 2),
             ]
         )
-        assert len(result) == 4
-        assert (1, 1) in result
-        assert (1, 2) in result
-        assert (2, 1) in result
-        assert (2, 2) in result
+        assert result == MaxSquare(1, 1, 2)
+        assert result.get_tile_positions() == [(1, 1), (1, 2), (2, 1), (2, 2)]
 
     def test_calculate_max_square_multiple_2x2_squares(self):
         result = MaxSquareCache._calculate_max_square(
@@ -39,11 +41,7 @@ class TestMaxSquareCache:
                 (6, 6),
             ]
         )
-        assert len(result) == 4
-        assert (1, 1) in result
-        assert (1, 2) in result
-        assert (2, 1) in result
-        assert (2, 2) in result
+        assert result == MaxSquare(1, 1, 2)
 
     def test_calculate_max_square_2x2_square_not_completely_visited(self):
         result = MaxSquareCache._calculate_max_square(
@@ -53,8 +51,7 @@ class TestMaxSquareCache:
                 (2, 2),
             ]
         )
-        assert len(result) == 1
-        assert (1, 1) in result
+        assert result == MaxSquare(1, 1, 1)
 
     def test_calculate_max_square_2x2_square_in_large_mesh(self):
         result = MaxSquareCache._calculate_max_square(
@@ -71,8 +68,145 @@ class TestMaxSquareCache:
                 (6, 6),
             ]
         )
-        assert len(result) == 4
-        assert (5, 5) in result
-        assert (5, 6) in result
-        assert (6, 5) in result
-        assert (5, 6) in result
+        assert result == MaxSquare(5, 5, 2)
+
+    def test_calculate_max_square_unsorted_input(self):
+        tiles = [(x, y) for x in range(10, 13) for y in range(20, 23)]
+        random.Random(0).shuffle(tiles)
+
+        result = MaxSquareCache._calculate_max_square(tiles)
+        assert result == MaxSquare(10, 20, 3)
+
+    def test_max_square_contains(self):
+        maxSquare = MaxSquare(10, 20, 2)
+        assert maxSquare.contains(10, 20)
+        assert maxSquare.contains(11, 21)
+        assert not maxSquare.contains(12, 21)
+        assert not maxSquare.contains(11, 19)
+
+    def test_add_tiles_incrementally(self):
+        state = MaxSquareState(1, [WorkoutType.BIKING], [2025])
+        state.add_tiles([(1, 1), (1, 2), (2, 1), (5, 5)])
+        assert state.maxSquare == MaxSquare(1, 1, 1)
+
+        state.add_tiles([(2, 2)])
+        assert state.maxSquare == MaxSquare(1, 1, 2)
+
+        state.add_tiles([(3, 1), (3, 2), (1, 3), (2, 3)])
+        assert state.maxSquare == MaxSquare(1, 1, 2)
+
+        state.add_tiles([(3, 3)])
+        assert state.maxSquare == MaxSquare(1, 1, 3)
+
+    def test_add_tiles_incrementally_matches_full_calculation(self):
+        randomGenerator = random.Random(42)
+        tiles = [(x, y) for x in range(30) for y in range(30) if randomGenerator.random() < 0.85]
+        randomGenerator.shuffle(tiles)
+
+        state = MaxSquareState(1, [WorkoutType.BIKING], [2025])
+        for index in range(0, len(tiles), 37):
+            state.add_tiles(tiles[index : index + 37])
+            assert state.maxSquare == MaxSquareCache._calculate_max_square(tiles[: index + 37])
+
+    def test_state_is_matching(self):
+        state = MaxSquareState(1, [WorkoutType.BIKING, WorkoutType.RUNNING], [2024, 2025])
+        assert state.is_matching(WorkoutType.RUNNING, 2024)
+        assert not state.is_matching(WorkoutType.HIKING, 2024)
+        assert not state.is_matching(WorkoutType.BIKING, 2023)
+
+    def test_get_max_square_concurrent_requests_query_once(self):
+        cache = MaxSquareCache()
+        started = threading.Event()
+        release = threading.Event()
+
+        def determine_visited_tiles(*args):
+            started.set()
+            release.wait(timeout=5)
+            return [(1, 1), (1, 2), (2, 1), (2, 2)]
+
+        results: list = []
+        with patch.object(
+            MaxSquareCache, '_MaxSquareCache__determine_visited_tiles', side_effect=determine_visited_tiles
+        ) as determineMock:
+            threads = [
+                threading.Thread(target=lambda: results.append(cache.get_max_square(1, [WorkoutType.BIKING], [2025])))
+                for _ in range(5)
+            ]
+            threads[0].start()
+            assert started.wait(timeout=5)
+            for thread in threads[1:]:
+                thread.start()
+            time.sleep(0.2)
+            release.set()
+            for thread in threads:
+                thread.join(timeout=5)
+
+            assert determineMock.call_count == 1
+            assert results == [MaxSquare(1, 1, 2)] * 5
+
+            cache.get_max_square(1, [WorkoutType.BIKING], [2025])
+            assert determineMock.call_count == 1
+
+    def test_get_max_square_invalidated_during_calculation_is_not_stored(self):
+        cache = MaxSquareCache()
+
+        def determine_visited_tiles(*args):
+            cache.invalidate_cache_entry_by_user(1)
+            return [(1, 1)]
+
+        with patch.object(
+            MaxSquareCache, '_MaxSquareCache__determine_visited_tiles', side_effect=determine_visited_tiles
+        ) as determineMock:
+            assert cache.get_max_square(1, [WorkoutType.BIKING], [2025]) == MaxSquare(1, 1, 1)
+            assert cache.get_max_square(1, [WorkoutType.BIKING], [2025]) == MaxSquare(1, 1, 1)
+            assert determineMock.call_count == 2
+
+    def test_add_visited_tiles_updates_states_of_user(self):
+        cache = MaxSquareCache()
+
+        with patch.object(MaxSquareCache, '_MaxSquareCache__determine_visited_tiles', return_value=[(1, 1)]):
+            cache.get_max_square(1, [WorkoutType.BIKING], [2025])
+            cache.get_max_square(1, [WorkoutType.RUNNING], [2025])
+            cache.get_max_square(2, [WorkoutType.BIKING], [2025])
+        sizeBefore = cache.get_statistics().size
+
+        cache.add_visited_tiles(1, WorkoutType.BIKING, 2025, [(1, 2), (2, 1), (2, 2)])
+
+        with patch.object(MaxSquareCache, '_MaxSquareCache__determine_visited_tiles') as determineMock:
+            assert cache.get_max_square(1, [WorkoutType.BIKING], [2025]) == MaxSquare(1, 1, 2)
+            assert cache.get_max_square(1, [WorkoutType.RUNNING], [2025]) == MaxSquare(1, 1, 1)
+            assert cache.get_max_square(2, [WorkoutType.BIKING], [2025]) == MaxSquare(1, 1, 1)
+            determineMock.assert_not_called()
+
+        assert cache.get_statistics().size > sizeBefore
+
+    def test_invalidate_cache_entry_by_user(self):
+        cache = MaxSquareCache()
+
+        with patch.object(MaxSquareCache, '_MaxSquareCache__determine_visited_tiles', return_value=[(1, 1)]):
+            cache.get_max_square(1, [WorkoutType.BIKING], [2025])
+            cache.get_max_square(11, [WorkoutType.BIKING], [2025])
+
+        cache.invalidate_cache_entry_by_user(1)
+
+        statistics = cache.get_statistics()
+        assert statistics.numberOfEntries == 1
+        assert statistics.misses == 2
+
+    def test_get_max_square_evicts_least_recently_used_state(self):
+        state = MaxSquareState(1, [], [])
+        state.add_tiles([(1, 1)])
+        cache = MaxSquareCache(maxSize=state.estimate_size() * 2)
+
+        with patch.object(
+            MaxSquareCache, '_MaxSquareCache__determine_visited_tiles', return_value=[(1, 1)]
+        ) as determineMock:
+            cache.get_max_square(1, [WorkoutType.BIKING], [2025])
+            cache.get_max_square(1, [WorkoutType.BIKING], [2024])
+            cache.get_max_square(1, [WorkoutType.BIKING], [2023])
+            assert cache.get_statistics().evictions == 1
+
+            cache.get_max_square(1, [WorkoutType.BIKING], [2023])
+            assert determineMock.call_count == 3
+            cache.get_max_square(1, [WorkoutType.BIKING], [2025])
+            assert determineMock.call_count == 4
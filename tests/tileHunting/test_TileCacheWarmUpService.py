@@ -0,0 +1,89 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from flask_login import FlaskLoginClient
+
+from sporttracker.db import db
+from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+from sporttracker.tileHunting.MaxSquareCache import MaxSquareCache, MaxSquare
+from sporttracker.tileHunting.NewVisitedTileCache import NewVisitedTileCache
+from sporttracker.tileHunting.TileCacheWarmUpService import TileCacheWarmUpService
+from sporttracker.user.UserEntity import create_user, Language
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+from tests.TestConstants import TEST_USERNAME, TEST_PASSWORD
+
+
+@pytest.fixture(autouse=True)
+def prepare_test_data(app):
+    app.test_client_class = FlaskLoginClient
+
+    with app.app_context():
+        create_user(TEST_USERNAME, TEST_PASSWORD, False, Language.ENGLISH)
+
+
+def create_workout(workoutType: WorkoutType, startTime: datetime, tiles: list[tuple[int, int]]) -> DistanceWorkout:
+    gpxMetadata = GpxMetadata(gpx_file_name='dummy', length=10 * 1000)
+    db.session.add(gpxMetadata)
+    db.session.commit()
+
+    workout = DistanceWorkout(
+        type=workoutType,
+        name='Dummy Workout',
+        start_time=startTime,
+        duration=3600,
+        distance=10 * 1000,
+        average_heart_rate=130,
+        elevation_sum=16,
+        user_id=2,
+        custom_fields={},
+        gpx_metadata_id=gpxMetadata.id,
+    )
+    db.session.add(workout)
+    db.session.commit()
+
+    for x, y in tiles:
+        db.session.add(GpxVisitedTile(workout_id=workout.id, x=x, y=y))
+    db.session.commit()
+
+    FirstVisitedTileService.add_workout(workout, tiles)
+    return workout
+
+
+class TestTileCacheWarmUpService:
+    def test_warm_up_default_filter(self, app):
+        with app.app_context():
+            create_workout(WorkoutType.BIKING, datetime(2024, 5, 1), [(1, 1), (1, 2), (2, 1)])
+            create_workout(WorkoutType.RUNNING, datetime(2025, 1, 1), [(2, 2)])
+
+            newVisitedTileCache = NewVisitedTileCache()
+            maxSquareCache = MaxSquareCache()
+            TileCacheWarmUpService(newVisitedTileCache, maxSquareCache, True).warm_up(2)
+
+            workoutTypes = WorkoutType.get_distance_workout_types()
+            with (
+                patch.object(FirstVisitedTileService, 'get_number_of_new_tiles_per_workout') as newTilesMock,
+                patch.object(MaxSquareCache, '_MaxSquareCache__determine_visited_tiles') as visitedTilesMock,
+            ):
+                newVisitedTiles = newVisitedTileCache.get_number_of_new_visited_tiles_per_workout_by_user(
+                    2, workoutTypes, [2025, 2024]
+                )
+                maxSquare = maxSquareCache.get_max_square(2, list(reversed(workoutTypes)), [2024, 2025])
+
+                newTilesMock.assert_not_called()
+                visitedTilesMock.assert_not_called()
+
+            assert [entry.numberOfNewTiles for entry in newVisitedTiles] == [3, 1]
+            assert maxSquare == MaxSquare(1, 1, 2)
+
+    def test_start_warm_up_disabled(self, app):
+        with app.app_context():
+            service = TileCacheWarmUpService(NewVisitedTileCache(), MaxSquareCache(), False)
+            assert not service.start_warm_up(2)
+
+    def test_start_warm_up_without_app_context(self):
+        service = TileCacheWarmUpService(NewVisitedTileCache(), MaxSquareCache(), True)
+        assert not service.start_warm_up(2)
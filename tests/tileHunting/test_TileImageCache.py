@@ -0,0 +1,163 @@
+import os
+
+from sporttracker.tileHunting.TileImageCache import TileImageCache
+
+
+def get_cache_file_path(diskCacheFolder: str, content: bytes) -> str:
+    for directoryPath, _, fileNames in os.walk(diskCacheFolder):
+        for fileName in fileNames:
+            filePath = os.path.join(directoryPath, fileName)
+            with open(filePath, 'rb') as f:
+                if fileName.endswith('.png') and f.read() == content:
+                    return filePath
+
+    raise FileNotFoundError(content)
+
+
+class TestTileImageCache:
+    def test_get_not_cached(self):
+        cache = TileImageCache(10)
+        key = cache.create_key(1, 'all', 'hash', 14, 1, 2)
+        assert cache.get(key) is None
+
+    def test_put_and_get(self):
+        cache = TileImageCache(10)
+        key = cache.create_key(1, 'all', 'hash', 14, 1, 2)
+        cache.put(key, b'image')
+
+        assert cache.get(cache.create_key(1, 'all', 'hash', 14, 1, 2)) == b'image'
+        assert cache.get(cache.create_key(1, 'heatmap', 'hash', 14, 1, 2)) is None
+        assert cache.get(cache.create_key(1, 'all', 'otherHash', 14, 1, 2)) is None
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TileImageCache(2)
+        firstKey = cache.create_key(1, 'all', 'hash', 14, 1, 1)
+        secondKey = cache.create_key(1, 'all', 'hash', 14, 2, 2)
+        thirdKey = cache.create_key(1, 'all', 'hash', 14, 3, 3)
+
+        cache.put(firstKey, b'first')
+        cache.put(secondKey, b'second')
+        cache.get(firstKey)
+        cache.put(thirdKey, b'third')
+
+        assert cache.get_number_of_entries() == 2
+        assert cache.get(firstKey) == b'first'
+        assert cache.get(secondKey) is None
+        assert cache.get(thirdKey) == b'third'
+
+    def test_invalidate_cache_entry_by_user(self):
+        cache = TileImageCache(10)
+        cache.put(cache.create_key(1, 'all', 'hash', 14, 1, 2), b'image')
+        cache.put(cache.create_key(2, 'all', 'hash', 14, 1, 2), b'otherImage')
+
+        cache.invalidate_cache_entry_by_user(1)
+
+        assert cache.get(cache.create_key(1, 'all', 'hash', 14, 1, 2)) is None
+        assert cache.get(cache.create_key(2, 'all', 'hash', 14, 1, 2)) == b'otherImage'
+
+    def test_put_ignores_image_rendered_before_invalidation(self):
+        cache = TileImageCache(10)
+        keyBeforeInvalidation = cache.create_key(1, 'all', 'hash', 14, 1, 2)
+
+        cache.invalidate_cache_entry_by_user(1)
+        cache.put(keyBeforeInvalidation, b'outdatedImage')
+
+        assert cache.get_number_of_entries() == 0
+        assert cache.get(cache.create_key(1, 'all', 'hash', 14, 1, 2)) is None
+
+    def test_disk_cache(self, tmp_path):
+        diskCacheFolder = str(tmp_path / 'tileImageCache')
+        cache = TileImageCache(1, diskCacheFolder)
+        firstKey = cache.create_key(1, 'all', 'hash', 14, 1, 1)
+        secondKey = cache.create_key(1, 'all', 'hash', 14, 2, 2)
+
+        cache.put(firstKey, b'first')
+        cache.put(secondKey, b'second')
+
+        assert cache.get(firstKey) == b'first'
+
+        cache.invalidate_cache_entry_by_user(1)
+        assert cache.get(cache.create_key(1, 'all', 'hash', 14, 1, 1)) is None
+
+    def test_disk_cache_is_kept_for_next_process(self, tmp_path):
+        diskCacheFolder = str(tmp_path / 'tileImageCache')
+        cache = TileImageCache(10, diskCacheFolder)
+        cache.put(cache.create_key(1, 'all', 'hash', 14, 1, 1), b'first')
+
+        # a second process using the same folder does not remove the images and can serve them
+        otherCache = TileImageCache(10, diskCacheFolder)
+
+        assert cache.get(cache.create_key(1, 'all', 'hash', 14, 1, 1)) == b'first'
+        assert otherCache.get(otherCache.create_key(1, 'all', 'hash', 14, 1, 1)) == b'first'
+        assert otherCache.get_disk_size() == len(b'first')
+
+    def test_disk_cache_invalidation_is_persisted(self, tmp_path):
+        diskCacheFolder = str(tmp_path / 'tileImageCache')
+        cache = TileImageCache(10, diskCacheFolder)
+        cache.put(cache.create_key(1, 'all', 'hash', 14, 1, 1), b'first')
+        cache.put(cache.create_key(2, 'all', 'hash', 14, 1, 1), b'other')
+
+        cache.invalidate_cache_entry_by_user(1)
+
+        # a restarted process starts with generation 0 again, but must not serve the outdated image
+        restartedCache = TileImageCache(10, diskCacheFolder)
+        assert restartedCache.get(restartedCache.create_key(1, 'all', 'hash', 14, 1, 1)) is None
+        assert restartedCache.get(restartedCache.create_key(2, 'all', 'hash', 14, 1, 1)) == b'other'
+        assert restartedCache.get_disk_size() == len(b'other')
+
+    def test_disk_cache_is_bounded(self, tmp_path):
+        diskCacheFolder = str(tmp_path / 'tileImageCache')
+        cache = TileImageCache(0, diskCacheFolder, maxDiskSizeInBytes=10)
+        firstKey = cache.create_key(1, 'all', 'hash', 14, 1, 1)
+        secondKey = cache.create_key(1, 'all', 'hash', 14, 2, 2)
+        thirdKey = cache.create_key(2, 'all', 'hash', 14, 3, 3)
+
+        cache.put(firstKey, b'aaaa')
+        cache.put(secondKey, b'bbbb')
+        cache.get(firstKey)
+        cache.put(thirdKey, b'cccc')
+
+        assert cache.get_disk_size() == 8
+        assert cache.get(firstKey) == b'aaaa'
+        assert cache.get(secondKey) is None
+        assert cache.get(thirdKey) == b'cccc'
+
+        pngFiles = [name for _, _, names in os.walk(diskCacheFolder) for name in names if name.endswith('.png')]
+        assert len(pngFiles) == 2
+
+    def test_disk_cache_of_previous_run_is_bounded(self, tmp_path):
+        diskCacheFolder = str(tmp_path / 'tileImageCache')
+        cache = TileImageCache(0, diskCacheFolder)
+        firstKey = cache.create_key(1, 'all', 'hash', 14, 1, 1)
+        secondKey = cache.create_key(1, 'all', 'hash', 14, 2, 2)
+        cache.put(firstKey, b'aaaa')
+        cache.put(secondKey, b'bbbb')
+        os.utime(get_cache_file_path(diskCacheFolder, b'aaaa'), (0, 0))
+
+        smallerCache = TileImageCache(0, diskCacheFolder, maxDiskSizeInBytes=6)
+
+        assert smallerCache.get_disk_size() == 4
+        assert smallerCache.get(firstKey) is None
+        assert smallerCache.get(secondKey) == b'bbbb'
+
+    def test_get_statistics(self, tmp_path):
+        cache = TileImageCache(10, str(tmp_path), 1024)
+        key = cache.create_key(1, 'all', 'hash', 14, 1, 2)
+        cache.put(key, b'image')
+        cache.get(key)
+
+        imageStatistics, diskStatistics = cache.get_statistics()
+        assert imageStatistics.name == 'tileImageCache'
+        assert imageStatistics.numberOfEntries == 1
+        assert imageStatistics.hits == 1
+        assert diskStatistics.name == 'tileImageDiskCache'
+        assert diskStatistics.size == len(b'image')
+        assert diskStatistics.maxSize == 1024
+
+    def test_calculate_filter_state_hash(self):
+        assert TileImageCache.calculate_filter_state_hash([['BIKING'], [2024], True]) == (
+            TileImageCache.calculate_filter_state_hash([['BIKING'], [2024], True])
+        )
+        assert TileImageCache.calculate_filter_state_hash([['BIKING'], [2024], True]) != (
+            TileImageCache.calculate_filter_state_hash([['BIKING'], [2024], False])
+        )
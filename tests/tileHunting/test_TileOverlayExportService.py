@@ -0,0 +1,172 @@
+import io
+import os
+import sqlite3
+from contextlib import closing
+from unittest.mock import patch
+
+from PIL import Image
+
+from sporttracker.tileHunting.TileOverlayExportService import TileOverlayExportService
+from sporttracker.tileHunting.VisitedTileIndex import VisitedTileIndexCache, PackedTileIndex
+from sporttracker.workout.WorkoutType import WorkoutType
+
+USER_ID = 1
+BASE_ZOOM_LEVEL = 14
+BIKING = 1 << WorkoutType.BIKING.order
+RUNNING = 1 << WorkoutType.RUNNING.order
+
+TILE_HUNTING_SETTINGS = {
+    'baseZoomLevel': BASE_ZOOM_LEVEL,
+    'mapMinZoomLevel': 12,
+    'borderColor': '#00000088',
+    'metaTileSize': 2,
+    'tileOverlayExport': {'minZoomLevel': 12, 'maxZoomLevel': 15, 'numberOfProcesses': 1},
+}
+
+
+def create_service(
+    tmp_path, visitedEntries, plannedEntries=None
+) -> tuple[TileOverlayExportService, VisitedTileIndexCache]:
+    visitedTileIndexCache = VisitedTileIndexCache()
+    update_tiles(visitedTileIndexCache, visitedEntries, plannedEntries)
+    return TileOverlayExportService(str(tmp_path), TILE_HUNTING_SETTINGS, visitedTileIndexCache), visitedTileIndexCache
+
+
+def update_tiles(visitedTileIndexCache, visitedEntries, plannedEntries=None) -> None:
+    visitedTileIndexCache.put_visited_tile_index(USER_ID, PackedTileIndex(list(visitedEntries)))
+    visitedTileIndexCache.put_planned_tile_index(USER_ID, PackedTileIndex(list(plannedEntries or [])))
+
+
+def get_tile_keys(service: TileOverlayExportService) -> set[tuple[int, int, int]]:
+    with closing(sqlite3.connect(service.get_file_path(USER_ID))) as connection:
+        rows = connection.execute('SELECT zoom_level, tile_column, tile_row FROM tiles').fetchall()
+
+    return {(zoom, x, (1 << zoom) - 1 - tmsRow) for zoom, x, tmsRow in rows}
+
+
+class TestTileOverlayExportService:
+    def test_export_full(self, tmp_path):
+        service, _ = create_service(tmp_path, [(8800, 5370, BIKING, 2024, 1), (8801, 5370, RUNNING, 2023, 2)])
+
+        result = service.export(USER_ID, False)
+
+        assert not result.isIncremental
+        assert result.numberOfRenderedTiles == 1 + 1 + 2 + 8
+        assert get_tile_keys(service) == {
+            (12, 2200, 1342),
+            (13, 4400, 2685),
+            (14, 8800, 5370),
+            (14, 8801, 5370),
+        } | {(15, x, y) for x in range(17600, 17604) for y in range(10740, 10742)}
+
+    def test_get_tile(self, tmp_path):
+        service, _ = create_service(tmp_path, [(8800, 5370, BIKING, 2024, 1)])
+        service.export(USER_ID, False)
+
+        data = service.get_tile(USER_ID, False, 14, 8800, 5370)
+        assert data is not None
+        image = Image.open(io.BytesIO(data))
+        assert image.size == (256, 256)
+        assert image.getpixel((128, 128)) == Image.new('RGBA', (1, 1), WorkoutType.BIKING.tile_color).getpixel((0, 0))
+
+        assert service.get_tile(USER_ID, False, 14, 8801, 5370) is None
+        assert service.get_tile(USER_ID, False, 16, 35200, 21480) is None
+
+    def test_get_tile_outdated(self, tmp_path):
+        service, visitedTileIndexCache = create_service(tmp_path, [(8800, 5370, BIKING, 2024, 1)])
+        assert service.get_tile(USER_ID, False, 14, 8800, 5370) is None
+
+        service.export(USER_ID, False)
+        assert not service.is_export_outdated(USER_ID, False)
+        assert service.is_export_outdated(USER_ID, True)
+
+        update_tiles(visitedTileIndexCache, [(8800, 5370, BIKING, 2024, 1), (8801, 5370, BIKING, 2024, 1)])
+        assert service.is_export_outdated(USER_ID, False)
+        assert service.get_tile(USER_ID, False, 14, 8800, 5370) is None
+
+    def test_get_tile_reuses_connection(self, tmp_path):
+        service, visitedTileIndexCache = create_service(tmp_path, [(8800, 5370, BIKING, 2024, 1)])
+        service.export(USER_ID, False)
+
+        with patch('sqlite3.connect', wraps=sqlite3.connect) as connectMock:
+            for _ in range(3):
+                assert service.get_tile(USER_ID, False, 14, 8800, 5370) is not None
+            assert connectMock.call_count == 1
+
+        update_tiles(visitedTileIndexCache, [(8801, 5370, RUNNING, 2024, 1)])
+        service.export(USER_ID, False)
+
+        # the connection to the replaced file is not reused
+        assert service.get_tile(USER_ID, False, 14, 8800, 5370) is None
+        assert service.get_tile(USER_ID, False, 14, 8801, 5370) is not None
+
+    def test_get_tile_additional_visit_does_not_change_export(self, tmp_path):
+        service, visitedTileIndexCache = create_service(tmp_path, [(8800, 5370, BIKING, 2024, 1)])
+        service.export(USER_ID, False)
+
+        update_tiles(visitedTileIndexCache, [(8800, 5370, BIKING, 2024, 3)])
+        assert not service.is_export_outdated(USER_ID, False)
+
+    def test_export_incremental(self, tmp_path):
+        service, visitedTileIndexCache = create_service(
+            tmp_path, [(8800, 5370, BIKING, 2024, 1), (8900, 5370, BIKING, 2024, 1)]
+        )
+        service.export(USER_ID, False)
+        unchangedTile = service.get_tile(USER_ID, False, 14, 8900, 5370)
+
+        update_tiles(visitedTileIndexCache, [(8801, 5370, RUNNING, 2024, 1), (8900, 5370, BIKING, 2024, 1)])
+        result = service.export(USER_ID, False)
+
+        assert result.isIncremental
+        # zoom 12 and 13 contain both tiles, zoom 14 and 15 only re-render the new tile
+        assert result.numberOfRenderedTiles == 1 + 1 + 1 + 4
+        assert result.numberOfDeletedTiles == 1 + 4
+        assert not service.is_export_outdated(USER_ID, False)
+        assert service.get_tile(USER_ID, False, 14, 8800, 5370) is None
+        assert service.get_tile(USER_ID, False, 14, 8801, 5370) is not None
+        assert service.get_tile(USER_ID, False, 14, 8900, 5370) == unchangedTile
+
+    def test_export_incremental_does_not_modify_file_in_use(self, tmp_path):
+        service, visitedTileIndexCache = create_service(tmp_path, [(8800, 5370, BIKING, 2024, 1)])
+        service.export(USER_ID, False)
+        tileKeysBeforeUpdate = get_tile_keys(service)
+
+        with open(service.get_file_path(USER_ID), 'rb') as downloadedFile:
+            update_tiles(visitedTileIndexCache, [(8801, 5370, RUNNING, 2024, 1)])
+            assert service.export(USER_ID, False).isIncremental
+
+            # a download started before the update still receives the complete previous export
+            previousExportPath = tmp_path / 'previous.mbtiles'
+            previousExportPath.write_bytes(downloadedFile.read())
+
+        with closing(sqlite3.connect(previousExportPath)) as connection:
+            rows = connection.execute('SELECT zoom_level, tile_column, tile_row FROM tiles').fetchall()
+        assert {(zoom, x, (1 << zoom) - 1 - tmsRow) for zoom, x, tmsRow in rows} == tileKeysBeforeUpdate
+        assert get_tile_keys(service) != tileKeysBeforeUpdate
+        assert not os.path.exists(f'{service.get_file_path(USER_ID)}.tmp')
+
+    def test_export_incremental_equals_full_export(self, tmp_path):
+        service, visitedTileIndexCache = create_service(tmp_path / 'incremental', [(8800, 5370, BIKING, 2024, 1)])
+        service.export(USER_ID, True)
+
+        visitedEntries = [(8800, 5370, BIKING, 2024, 1), (8803, 5372, RUNNING, 2023, 1)]
+        plannedEntries = [(8802, 5370, BIKING, 0, 1), (8803, 5372, BIKING, 0, 1)]
+        update_tiles(visitedTileIndexCache, visitedEntries, plannedEntries)
+        service.export(USER_ID, True)
+
+        fullService, _ = create_service(tmp_path / 'full', visitedEntries, plannedEntries)
+        fullService.export(USER_ID, True)
+
+        assert get_tile_keys(service) == get_tile_keys(fullService)
+        for zoom, x, y in get_tile_keys(fullService):
+            assert service.get_tile(USER_ID, True, zoom, x, y) == fullService.get_tile(USER_ID, True, zoom, x, y)
+
+    def test_export_planned_tiles(self, tmp_path):
+        service, _ = create_service(tmp_path, [(8800, 5370, BIKING, 2024, 1)], [(8802, 5370, BIKING, 0, 1)])
+
+        service.export(USER_ID, False)
+        assert service.get_tile(USER_ID, False, 14, 8802, 5370) is None
+
+        result = service.export(USER_ID, True)
+        assert not result.isIncremental
+        assert service.get_tile(USER_ID, True, 14, 8802, 5370) is not None
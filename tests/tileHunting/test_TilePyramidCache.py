@@ -0,0 +1,77 @@
+from sporttracker.tileHunting.TilePyramidCache import TilePyramid
+from sporttracker.workout.WorkoutType import WorkoutType
+
+BASE_ZOOM_LEVEL = 14
+MIN_ZOOM_LEVEL = 10
+
+
+def sort_result(result):
+    return sorted(result, key=lambda item: (item[0], item[1]))
+
+
+class TestTilePyramid:
+    def test_get_number_of_visits_empty_pyramid(self):
+        pyramid = TilePyramid(BASE_ZOOM_LEVEL, MIN_ZOOM_LEVEL)
+        result = pyramid.get_number_of_visits_in_bounding_box(0, 15, 0, 15, [WorkoutType.BIKING], [2024])
+        assert result == []
+
+    def test_get_number_of_visits_single_base_tile(self):
+        pyramid = TilePyramid(BASE_ZOOM_LEVEL, MIN_ZOOM_LEVEL)
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(17, 33)])
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(17, 33)])
+
+        result = pyramid.get_number_of_visits_in_bounding_box(17, 17, 33, 33, [WorkoutType.BIKING], [2024])
+        assert result == [(17, 33, {WorkoutType.BIKING: 2})]
+
+    def test_get_number_of_visits_lower_zoom_level(self):
+        pyramid = TilePyramid(BASE_ZOOM_LEVEL, MIN_ZOOM_LEVEL)
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(1, 2), (3, 3), (4, 4)])
+        pyramid.add_visits(WorkoutType.RUNNING, 2023, [(1, 2)])
+
+        result = pyramid.get_number_of_visits_in_bounding_box(
+            0, 3, 0, 3, [WorkoutType.BIKING, WorkoutType.RUNNING], [2023, 2024]
+        )
+        assert sort_result(result) == [
+            (1, 2, {WorkoutType.BIKING: 1, WorkoutType.RUNNING: 1}),
+            (3, 3, {WorkoutType.BIKING: 1}),
+        ]
+
+    def test_get_number_of_visits_filters_types_and_years(self):
+        pyramid = TilePyramid(BASE_ZOOM_LEVEL, MIN_ZOOM_LEVEL)
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(1, 2), (3, 3)])
+        pyramid.add_visits(WorkoutType.RUNNING, 2023, [(1, 2)])
+
+        assert pyramid.get_number_of_visits_in_bounding_box(0, 3, 0, 3, [WorkoutType.RUNNING], [2024]) == []
+        assert pyramid.get_number_of_visits_in_bounding_box(0, 3, 0, 3, [WorkoutType.RUNNING], [2023]) == [
+            (1, 2, {WorkoutType.RUNNING: 1})
+        ]
+
+    def test_get_number_of_visits_not_aligned_bounding_box(self):
+        pyramid = TilePyramid(BASE_ZOOM_LEVEL, MIN_ZOOM_LEVEL)
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(1, 2)])
+
+        assert pyramid.get_number_of_visits_in_bounding_box(1, 4, 0, 3, [WorkoutType.BIKING], [2024]) is None
+        assert pyramid.get_number_of_visits_in_bounding_box(0, 2, 0, 2, [WorkoutType.BIKING], [2024]) is None
+
+    def test_get_number_of_visits_zoom_level_not_precomputed(self):
+        pyramid = TilePyramid(BASE_ZOOM_LEVEL, MIN_ZOOM_LEVEL)
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(1, 2)])
+
+        size = 2 ** (BASE_ZOOM_LEVEL - MIN_ZOOM_LEVEL + 1)
+        result = pyramid.get_number_of_visits_in_bounding_box(0, size - 1, 0, size - 1, [WorkoutType.BIKING], [2024])
+        assert result is None
+
+    def test_remove_visits(self):
+        pyramid = TilePyramid(BASE_ZOOM_LEVEL, MIN_ZOOM_LEVEL)
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(1, 2), (3, 3)])
+        pyramid.add_visits(WorkoutType.BIKING, 2024, [(1, 2)])
+
+        pyramid.remove_visits(WorkoutType.BIKING, 2024, [(1, 2), (3, 3)])
+
+        result = pyramid.get_number_of_visits_in_bounding_box(0, 3, 0, 3, [WorkoutType.BIKING], [2024])
+        assert result == [(1, 2, {WorkoutType.BIKING: 1})]
+
+        pyramid.remove_visits(WorkoutType.BIKING, 2024, [(1, 2)])
+
+        result = pyramid.get_number_of_visits_in_bounding_box(0, 15, 0, 15, [WorkoutType.BIKING], [2024])
+        assert result == []
@@ -2,6 +2,8 @@ from unittest.mock import Mock
 
 from PIL import Image, ImageChops
 
+from sporttracker.gpx.GpxParser import VisitedTile
+from sporttracker.tileHunting.MaxSquareCache import MaxSquare
 from sporttracker.tileHunting.TileRenderService import TileRenderService, TileRenderColorMode
 from sporttracker.tileHunting.VisitedTileService import TileColorPosition, TileCountPosition
 
@@ -12,6 +14,9 @@ class TestTileRenderService:
     COLOR_VISITED = (255, 0, 0, 255)
     COLOR_VISITED_HEX = '#FF0000FF'
     COLOR_BORDER = (0, 0, 0, 96)
+    COLOR_PLANNED = (0, 0, 0, 85)
+    COLOR_MULTIPLE_MATCHES = (255, 0, 0, 96)
+    COLOR_MAX_SQUARE = (3, 62, 125, 191)
 
     COLOR_HEATMAP_1 = (113, 167, 195, 192)
     COLOR_HEATMAP_ABOVE_1 = (30, 111, 156, 192)
@@ -246,3 +251,141 @@ class TestTileRenderService:
     def test_calculate_heatmap_color_visited_100(self):
         color = TileRenderService.calculate_heatmap_color(35199, 21494, [TileCountPosition(100, 35199, 21494)])
         assert color == self.COLOR_HEATMAP_ABOVE_100
+
+    def test_render_image_higher_zoom_not_touching_edge_of_base_zoom_tile(self):
+        def mocked_color_method(
+            min_x: int, max_x: int, min_y: int, max_y: int, user_id: int
+        ) -> list[TileColorPosition]:
+            return [
+                TileColorPosition(self.COLOR_VISITED_HEX, 17599, 10747),
+            ]
+
+        visitedTileService = Mock()
+        visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.side_effect = mocked_color_method
+        visitedTileService.determine_planned_tiles.return_value = []
+
+        service = TileRenderService(15, 4, visitedTileService)
+        image = service.render_image(
+            35199,
+            21495,
+            16,
+            1,
+            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+            self.COLOR_BORDER,
+            None,
+        )
+
+        expectedImage = Image.new('RGBA', (4, 4), color=self.COLOR_VISITED)
+
+        assert not ImageChops.difference(image, expectedImage).getbbox()
+
+    def test_render_image_lower_zoom_planned_multiple_matches_and_max_square(self):
+        def mocked_color_method(
+            min_x: int, max_x: int, min_y: int, max_y: int, user_id: int
+        ) -> list[TileColorPosition]:
+            return [
+                TileColorPosition(self.COLOR_VISITED_HEX, 35198, 21494),
+                TileColorPosition(self.COLOR_VISITED_HEX, 35199, 21494),
+                TileColorPosition('#00FF00FF', 35199, 21494),
+            ]
+
+        visitedTileService = Mock()
+        visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.side_effect = mocked_color_method
+        visitedTileService.determine_planned_tiles.return_value = [VisitedTile(35198, 21495)]
+        visitedTileService.get_max_square.return_value = MaxSquare(35199, 21495, 2)
+
+        service = TileRenderService(14, 4, visitedTileService)
+        image = service.render_image(
+            17599,
+            10747,
+            13,
+            1,
+            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+            None,
+            self.COLOR_MAX_SQUARE,
+        )
+
+        expectedImage = Image.new('RGBA', (4, 4))
+        expectedImage.paste(self.COLOR_VISITED, (0, 0, 2, 2))
+        expectedImage.paste(self.COLOR_PLANNED, (0, 2, 2, 4))
+        expectedImage.paste(self.COLOR_MULTIPLE_MATCHES, (2, 0, 4, 2))
+        expectedImage.paste(self.COLOR_MAX_SQUARE, (2, 2, 4, 4))
+
+        assert not ImageChops.difference(image, expectedImage).getbbox()
+
+    def test_render_image_heatmap_lower_zoom(self):
+        visitedTileService = Mock()
+        visitedTileService.determine_number_of_visits.return_value = [
+            TileCountPosition(1, 35198, 21494),
+            TileCountPosition(100, 35199, 21495),
+        ]
+
+        service = TileRenderService(14, 4, visitedTileService)
+        image = service.render_image(
+            17599,
+            10747,
+            13,
+            1,
+            TileRenderColorMode.NUMBER_OF_VISITS,
+            self.COLOR_BORDER,
+            None,
+        )
+
+        expectedImage = Image.new('RGBA', (4, 4))
+        expectedImage.paste(self.COLOR_HEATMAP_1, (0, 0, 2, 2))
+        expectedImage.paste(self.COLOR_HEATMAP_ABOVE_100, (2, 2, 4, 4))
+        pixels = expectedImage.load()
+        for index in range(4):
+            pixels[0, index] = self.COLOR_BORDER  # type: ignore[index]
+            pixels[2, index] = self.COLOR_BORDER  # type: ignore[index]
+            pixels[index, 0] = self.COLOR_BORDER  # type: ignore[index]
+            pixels[index, 2] = self.COLOR_BORDER  # type: ignore[index]
+
+        assert not ImageChops.difference(image, expectedImage).getbbox()
+        visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.assert_not_called()
+
+    def test_render_meta_tile_fetches_data_once(self):
+        visitedTileService = Mock()
+        visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.return_value = [
+            TileColorPosition(self.COLOR_VISITED_HEX, 8796, 5372),
+            TileColorPosition(self.COLOR_VISITED_HEX, 8799, 5375),
+        ]
+        visitedTileService.determine_planned_tiles.return_value = []
+
+        service = TileRenderService(14, 4, visitedTileService)
+        images = service.render_meta_tile(
+            4399,
+            2687,
+            13,
+            2,
+            1,
+            TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+            None,
+            None,
+        )
+
+        assert sorted(images.keys()) == [(4398, 2686), (4398, 2687), (4399, 2686), (4399, 2687)]
+        visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.assert_called_once_with(
+            8796, 8799, 5372, 5375, 1
+        )
+
+        expectedUpperLeftImage = Image.new('RGBA', (4, 4))
+        expectedUpperLeftImage.paste(self.COLOR_VISITED, (0, 0, 2, 2))
+        assert not ImageChops.difference(images[(4398, 2686)], expectedUpperLeftImage).getbbox()
+
+        expectedLowerRightImage = Image.new('RGBA', (4, 4))
+        expectedLowerRightImage.paste(self.COLOR_VISITED, (2, 2, 4, 4))
+        assert not ImageChops.difference(images[(4399, 2687)], expectedLowerRightImage).getbbox()
+
+        expectedEmptyImage = Image.new('RGBA', (4, 4))
+        assert not ImageChops.difference(images[(4398, 2687)], expectedEmptyImage).getbbox()
+        assert not ImageChops.difference(images[(4399, 2686)], expectedEmptyImage).getbbox()
+
+    def test_render_meta_tile_skips_tiles_outside_of_world(self):
+        visitedTileService = Mock()
+        visitedTileService.determine_number_of_visits.return_value = []
+
+        service = TileRenderService(14, 4, visitedTileService)
+        images = service.render_meta_tile(1, 1, 1, 4, 1, TileRenderColorMode.NUMBER_OF_VISITS, None, None)
+
+        assert sorted(images.keys()) == [(0, 0), (0, 1), (1, 0), (1, 1)]
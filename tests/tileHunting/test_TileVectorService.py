@@ -0,0 +1,147 @@
+from unittest.mock import Mock
+
+from PIL import Image, ImageChops, ImageColor
+
+from sporttracker.gpx.GpxParser import VisitedTile
+from sporttracker.tileHunting.MaxSquareCache import MaxSquare
+from sporttracker.tileHunting.TileRenderService import TileRenderService, TileRenderColorMode
+from sporttracker.tileHunting.TileVectorService import TileVectorService
+from sporttracker.tileHunting.VisitedTileService import TileColorPosition, TileCountPosition
+
+COLOR_VISITED_HEX = '#FF0000FF'
+COLOR_BORDER_HEX = '#00000060'
+COLOR_MAX_SQUARE_HEX = '#033E7DBF'
+
+
+def create_visited_tile_service() -> Mock:
+    visitedTileService = Mock()
+    visitedTileService.determine_tile_colors_of_workouts_that_visit_tiles.return_value = [
+        TileColorPosition(COLOR_VISITED_HEX, 35198, 21494),
+        TileColorPosition(COLOR_VISITED_HEX, 35199, 21494),
+        TileColorPosition('#00FF00FF', 35199, 21494),
+        TileColorPosition(COLOR_VISITED_HEX, 35196, 21493),
+    ]
+    visitedTileService.determine_planned_tiles.return_value = [VisitedTile(35198, 21495), VisitedTile(35198, 21494)]
+    visitedTileService.get_max_square.return_value = MaxSquare(35199, 21495, 3)
+    return visitedTileService
+
+
+def draw(data: dict, tileSize: int) -> Image.Image:
+    """
+    Draws the vector tile the same way as the map does client-side.
+    """
+    image = Image.new('RGBA', (tileSize, tileSize))
+    cellsPerAxis = data['cellsPerAxis']
+    boxSize = tileSize // cellsPerAxis
+
+    def fill_cells(deltaEncodedCellIndices: list[int], colors: list[str]) -> None:
+        cellIndex = 0
+        for delta, color in zip(deltaEncodedCellIndices, colors):
+            cellIndex += delta
+            left = (cellIndex % cellsPerAxis) * boxSize
+            top = (cellIndex // cellsPerAxis) * boxSize
+            image.paste(ImageColor.getcolor(color, 'RGBA'), (left, top, left + boxSize, top + boxSize))
+
+    fill_cells(data['planned'], [data['plannedColor']] * len(data['planned']))
+    fill_cells(data['visited'], [data['palette'][index] for index in data['visitedColors']])
+
+    maxSquare = data['maxSquare']
+    if maxSquare is not None:
+        left = maxSquare['x'] * boxSize
+        top = maxSquare['y'] * boxSize
+        image.paste(
+            ImageColor.getcolor(maxSquare['color'], 'RGBA'),
+            (left, top, left + maxSquare['width'] * boxSize, top + maxSquare['height'] * boxSize),
+        )
+
+    grid = data['grid']
+    if grid is not None:
+        color = ImageColor.getcolor(grid['color'], 'RGBA')
+        size = cellsPerAxis * boxSize
+        for index in range(cellsPerAxis):
+            offset = index * boxSize
+            if grid['vertical']:
+                image.paste(color, (offset, 0, offset + 1, size))
+            if grid['horizontal']:
+                image.paste(color, (0, offset, size, offset + 1))
+
+    return image
+
+
+class TestTileVectorService:
+    def test_get_vector_tile_lower_zoom(self):
+        service = TileVectorService(14, create_visited_tile_service())
+        data = service.get_vector_tile(
+            8799, 5373, 12, 1, TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, None, COLOR_MAX_SQUARE_HEX
+        )
+
+        assert data['cellsPerAxis'] == 4
+        # cells (0, 1), (2, 2) and (3, 2)
+        assert data['palette'] == ['#FF0000FF', '#FF000060']
+        assert data['visited'] == [4, 6, 1]
+        assert data['visitedColors'] == [0, 0, 1]
+        # visited tiles are not planned anymore
+        assert data['planned'] == [14]
+        assert data['plannedColor'] == '#00000055'
+        assert data['maxSquare'] == {'x': 3, 'y': 3, 'width': 1, 'height': 1, 'color': COLOR_MAX_SQUARE_HEX}
+        assert data['grid'] is None
+
+    def test_get_vector_tile_max_square_outside(self):
+        visitedTileService = create_visited_tile_service()
+        visitedTileService.get_max_square.return_value = MaxSquare(100, 100, 3)
+
+        service = TileVectorService(14, visitedTileService)
+        data = service.get_vector_tile(
+            8799, 5373, 12, 1, TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, None, COLOR_MAX_SQUARE_HEX
+        )
+
+        assert data['maxSquare'] is None
+
+    def test_get_vector_tile_higher_zoom_grid(self):
+        service = TileVectorService(14, create_visited_tile_service())
+
+        data = service.get_vector_tile(
+            70396, 42988, 15, 1, TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, COLOR_BORDER_HEX, None
+        )
+        assert data['cellsPerAxis'] == 1
+        assert data['grid'] == {'color': COLOR_BORDER_HEX, 'vertical': True, 'horizontal': True}
+
+        data = service.get_vector_tile(
+            70397, 42988, 15, 1, TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, COLOR_BORDER_HEX, None
+        )
+        assert data['grid'] == {'color': COLOR_BORDER_HEX, 'vertical': False, 'horizontal': True}
+
+    def test_get_vector_tile_heatmap(self):
+        visitedTileService = Mock()
+        visitedTileService.determine_number_of_visits.return_value = [
+            TileCountPosition(1, 35198, 21494),
+            TileCountPosition(100, 35199, 21495),
+        ]
+
+        service = TileVectorService(14, visitedTileService)
+        data = service.get_vector_tile(17599, 10747, 13, 1, TileRenderColorMode.NUMBER_OF_VISITS, None, None)
+
+        assert data['cellsPerAxis'] == 2
+        assert data['visited'] == [0, 3]
+        assert data['palette'] == ['#71A7C3C0', '#590008C0']
+        assert data['planned'] == []
+        visitedTileService.determine_planned_tiles.assert_not_called()
+
+    def test_get_vector_tile_matches_rendered_image(self):
+        for zoom, x, y in [(12, 8799, 5373), (13, 17599, 10747), (14, 35198, 21494), (15, 70397, 42989)]:
+            visitedTileService = create_visited_tile_service()
+            renderedImage = TileRenderService(14, 256, visitedTileService).render_image(
+                x,
+                y,
+                zoom,
+                1,
+                TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES,
+                ImageColor.getcolor(COLOR_BORDER_HEX, 'RGBA'),  # type: ignore[arg-type]
+                ImageColor.getcolor(COLOR_MAX_SQUARE_HEX, 'RGBA'),  # type: ignore[arg-type]
+            )
+
+            data = TileVectorService(14, visitedTileService).get_vector_tile(
+                x, y, zoom, 1, TileRenderColorMode.NUMBER_OF_WORKOUT_TYPES, COLOR_BORDER_HEX, COLOR_MAX_SQUARE_HEX
+            )
+
+            assert not ImageChops.difference(draw(data, 256), renderedImage).getbbox()
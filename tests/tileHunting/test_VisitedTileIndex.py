@@ -0,0 +1,99 @@
+import random
+
+from sporttracker.tileHunting.VisitedTileIndex import PackedTileIndex, IndexedTile
+from sporttracker.workout.WorkoutType import WorkoutType
+
+BIKING = 1 << WorkoutType.BIKING.order
+RUNNING = 1 << WorkoutType.RUNNING.order
+HIKING = 1 << WorkoutType.HIKING.order
+ALL_TYPES = BIKING | RUNNING | HIKING
+
+
+class TestPackedTileIndex:
+    def test_get_type_mask(self):
+        assert PackedTileIndex.get_type_mask([]) == 0
+        assert PackedTileIndex.get_type_mask([WorkoutType.BIKING, WorkoutType.HIKING]) == BIKING | HIKING
+
+    def test_get_workout_types(self):
+        assert PackedTileIndex.get_workout_types(BIKING | HIKING) == [WorkoutType.BIKING, WorkoutType.HIKING]
+
+    def test_get_tiles_in_bounding_box_empty_index(self):
+        index = PackedTileIndex([])
+        assert index.get_tiles_in_bounding_box(0, 10, 0, 10, ALL_TYPES, None) == []
+
+    def test_get_tiles_in_bounding_box_merges_entries_of_tile(self):
+        index = PackedTileIndex(
+            [
+                (5, 7, BIKING, 2024, 2),
+                (5, 7, RUNNING, 2023, 1),
+                (5, 7, BIKING, 2023, 3),
+            ]
+        )
+
+        result = index.get_tiles_in_bounding_box(0, 10, 0, 10, ALL_TYPES, None)
+        assert result == [IndexedTile(5, 7, BIKING | RUNNING, 6)]
+
+    def test_get_tiles_in_bounding_box_filters_types_and_years(self):
+        index = PackedTileIndex(
+            [
+                (5, 7, BIKING, 2024, 2),
+                (5, 7, RUNNING, 2023, 1),
+                (6, 7, RUNNING, 2024, 4),
+            ]
+        )
+
+        assert index.get_tiles_in_bounding_box(0, 10, 0, 10, BIKING, {2024}) == [IndexedTile(5, 7, BIKING, 2)]
+        assert index.get_tiles_in_bounding_box(0, 10, 0, 10, RUNNING, {2024}) == [IndexedTile(6, 7, RUNNING, 4)]
+        assert index.get_tiles_in_bounding_box(0, 10, 0, 10, HIKING, None) == []
+        assert index.get_tiles_in_bounding_box(0, 10, 0, 10, ALL_TYPES, set()) == []
+
+    def test_get_tiles_in_bounding_box_skips_rows_outside(self):
+        index = PackedTileIndex(
+            [
+                (4, 5, BIKING, 2024, 1),
+                (5, 4, BIKING, 2024, 1),
+                (5, 5, BIKING, 2024, 1),
+                (5, 9, BIKING, 2024, 1),
+                (6, 6, BIKING, 2024, 1),
+                (7, 5, BIKING, 2024, 1),
+            ]
+        )
+
+        result = index.get_tiles_in_bounding_box(5, 6, 5, 6, ALL_TYPES, None)
+        assert result == [IndexedTile(5, 5, BIKING, 1), IndexedTile(6, 6, BIKING, 1)]
+
+    def test_get_tiles_in_bounding_box_random(self):
+        randomGenerator = random.Random(42)
+        entries = [
+            (
+                randomGenerator.randint(0, 40),
+                randomGenerator.randint(0, 40),
+                randomGenerator.choice([BIKING, RUNNING, HIKING]),
+                randomGenerator.choice([2023, 2024]),
+                randomGenerator.randint(1, 5),
+            )
+            for _ in range(500)
+        ]
+        index = PackedTileIndex(list(entries))
+
+        for _ in range(50):
+            min_x = randomGenerator.randint(0, 40)
+            min_y = randomGenerator.randint(0, 40)
+            max_x = min_x + randomGenerator.randint(0, 10)
+            max_y = min_y + randomGenerator.randint(0, 10)
+
+            expected: dict[tuple[int, int], IndexedTile] = {}
+            for x, y, typeMask, year, numberOfVisits in entries:
+                if min_x <= x <= max_x and min_y <= y <= max_y and typeMask & (BIKING | HIKING) and year == 2024:
+                    tile = expected.setdefault((x, y), IndexedTile(x, y, 0, 0))
+                    tile.typeMask |= typeMask
+                    tile.numberOfVisits += numberOfVisits
+
+            result = index.get_tiles_in_bounding_box(min_x, max_x, min_y, max_y, BIKING | HIKING, {2024})
+            assert result == [expected[position] for position in sorted(expected)]
+
+    def test_get_tile(self):
+        index = PackedTileIndex([(5, 7, BIKING, 2024, 2), (5, 8, RUNNING, 2024, 1)])
+
+        assert index.get_tile(5, 7, ALL_TYPES, None) == IndexedTile(5, 7, BIKING, 2)
+        assert index.get_tile(5, 6, ALL_TYPES, None) is None
@@ -0,0 +1,297 @@
+import os
+from datetime import datetime, timezone
+from typing import cast
+from unittest.mock import Mock
+from zipfile import ZipFile
+
+import pytest
+
+from sporttracker.db import db
+from sporttracker.gpx.GpxMetadataEntity import GpxMetadata
+from sporttracker.gpx.GpxParser import TileExtractionMode
+from sporttracker.notification.NotificationEntity import Notification
+from sporttracker.notification.NotificationType import NotificationType
+from sporttracker.notification.NotificationService import NotificationService
+from sporttracker.tileHunting.FirstVisitedTileService import FirstVisitedTileService
+from sporttracker.tileHunting.GpxVisitedTileEntity import GpxVisitedTile
+from sporttracker.user.UserEntity import create_user, Language
+from sporttracker.workout.WorkoutType import WorkoutType
+from sporttracker.workout.distance.DistanceWorkoutEntity import DistanceWorkout
+from sporttracker.workout.distance.DistanceWorkoutImportService import (
+    DistanceWorkoutImportService,
+    WorkoutImportFile,
+    WorkoutImportResult,
+    find_import_files,
+    parse_import_file,
+)
+from sporttracker.workout.heartRate.HeartRateService import HeartRateService
+from tests.TestConstants import TEST_USERNAME, TEST_PASSWORD
+from tests.fit.test_FitDecoder import FIT_FILE_PATH, create_fit_file_with_heart_rate
+from tests.gpx.test_GpxService import create_gpx_service
+from tests.gpx.test_GpxStreamParser import create_gpx, create_point
+
+
+def create_track(day: int, length: int) -> bytes:
+    points = ''.join(
+        create_point(52.5 + index * 0.01, 13.3, 35.0 + index, f'2024-05-{day:02d}T10:{index:02d}:00Z')
+        for index in range(length)
+    )
+    return create_gpx(f'<trk><trkseg>{points}</trkseg></trk>')
+
+
+def get_local_time(day: int, minute: int) -> datetime:
+    return datetime.fromtimestamp(datetime(2024, 5, day, 10, minute, tzinfo=timezone.utc).timestamp())
+
+
+class TestFindImportFiles:
+    def test_directory(self, tmp_path):
+        os.makedirs(tmp_path / 'nested')
+        (tmp_path / 'b.gpx').write_bytes(b'')
+        (tmp_path / 'a.FIT').write_bytes(b'')
+        (tmp_path / 'nested' / 'c.gpx').write_bytes(b'')
+        (tmp_path / 'notes.txt').write_bytes(b'')
+
+        assert find_import_files(str(tmp_path)) == [
+            WorkoutImportFile(str(tmp_path / 'a.FIT')),
+            WorkoutImportFile(str(tmp_path / 'b.gpx')),
+            WorkoutImportFile(str(tmp_path / 'nested' / 'c.gpx')),
+        ]
+
+    def test_zip_archive(self, tmp_path):
+        zipFilePath = str(tmp_path / 'export.zip')
+        with ZipFile(zipFilePath, 'w') as zipObject:
+            zipObject.writestr('tracks/second.gpx', b'')
+            zipObject.writestr('first.fit', b'')
+            zipObject.writestr('readme.md', b'')
+
+        importFiles = find_import_files(zipFilePath)
+
+        assert importFiles == [
+            WorkoutImportFile(zipFilePath, 'first.fit'),
+            WorkoutImportFile(zipFilePath, 'tracks/second.gpx'),
+        ]
+        assert importFiles[1].workoutName == 'second'
+        assert importFiles[1].extension == 'gpx'
+
+    def test_invalid_path(self, tmp_path):
+        (tmp_path / 'track.gpx').write_bytes(b'')
+
+        with pytest.raises(ValueError):
+            find_import_files(str(tmp_path / 'track.gpx'))
+
+
+class TestParseImportFile:
+    def test_parse_gpx(self, tmp_path):
+        (tmp_path / 'morning ride.gpx').write_bytes(create_track(1, 4))
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+
+        result = parse_import_file(
+            gpxService.get_ingest_service(),
+            WorkoutImportFile(str(tmp_path / 'morning ride.gpx')),
+            'track',
+            14,
+            TileExtractionMode.POINTS,
+        )
+
+        assert result.error is None
+        parsedWorkout = result.parsedWorkout
+        assert parsedWorkout is not None
+        assert parsedWorkout.name == 'morning ride'
+        assert parsedWorkout.workoutType is None
+        assert parsedWorkout.startTime == get_local_time(1, 0)
+        assert parsedWorkout.duration == 180
+        assert parsedWorkout.distance == int(parsedWorkout.metaInfo.distance)
+        assert parsedWorkout.elevationSum == parsedWorkout.metaInfo.uphillDownhill.uphill
+        assert parsedWorkout.tiles == [(tile.x, tile.y) for tile in gpxService.get_visited_tiles('track', 14)]
+        assert {'parse', 'compress', 'tiles'} <= result.stageDurations.keys()
+
+    def test_parse_fit_from_zip_archive(self, tmp_path):
+        zipFilePath = str(tmp_path / 'export.zip')
+        with ZipFile(zipFilePath, 'w') as zipObject:
+            zipObject.write(FIT_FILE_PATH, 'fitTrack_1.fit')
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+
+        result = parse_import_file(
+            gpxService.get_ingest_service(),
+            WorkoutImportFile(zipFilePath, 'fitTrack_1.fit'),
+            'track',
+            14,
+            TileExtractionMode.POINTS,
+        )
+
+        assert result.error is None
+        parsedWorkout = result.parsedWorkout
+        assert parsedWorkout is not None
+        assert parsedWorkout.workoutType == WorkoutType.BIKING
+        assert parsedWorkout.startTime == datetime(2024, 9, 20, 16, 30, 6)
+        assert parsedWorkout.duration == 5102
+        assert parsedWorkout.distance == 35390
+        assert parsedWorkout.elevationSum == 319
+        assert len(parsedWorkout.tiles) > 0
+        assert gpxService.has_fit_file('track')
+
+    def test_parse_fit_with_heart_rate(self, tmp_path):
+        (tmp_path / 'track.fit').write_bytes(create_fit_file_with_heart_rate())
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+
+        result = parse_import_file(
+            gpxService.get_ingest_service(),
+            WorkoutImportFile(str(tmp_path / 'track.fit')),
+            'track',
+            14,
+            TileExtractionMode.POINTS,
+        )
+
+        assert result.error is None
+        parsedWorkout = result.parsedWorkout
+        assert parsedWorkout is not None
+        assert [bpm for _, bpm in parsedWorkout.heartRateSamples] == [100, 110, 120]
+        assert parsedWorkout.startTime == get_local_time(1, 0)
+
+    def test_parse_gpx_without_times(self, tmp_path):
+        (tmp_path / 'track.gpx').write_bytes(
+            create_gpx('<trk><trkseg>' + create_point(52.5, 13.3) + create_point(52.6, 13.4) + '</trkseg></trk>')
+        )
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+
+        result = parse_import_file(
+            gpxService.get_ingest_service(),
+            WorkoutImportFile(str(tmp_path / 'track.gpx')),
+            'track',
+            14,
+            TileExtractionMode.POINTS,
+        )
+
+        assert result.parsedWorkout is None
+        assert result.error is not None
+        assert not os.path.exists(gpxService.get_folder_path('track'))
+
+    def test_parse_invalid_gpx(self, tmp_path):
+        (tmp_path / 'track.gpx').write_bytes(b'<gpx><trk>')
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+
+        result = parse_import_file(
+            gpxService.get_ingest_service(),
+            WorkoutImportFile(str(tmp_path / 'track.gpx')),
+            'track',
+            14,
+            TileExtractionMode.POINTS,
+        )
+
+        assert result.error is not None
+        assert not os.path.exists(gpxService.get_folder_path('track'))
+
+
+@pytest.fixture
+def user_id(app):
+    with app.app_context():
+        create_user(TEST_USERNAME, TEST_PASSWORD, False, Language.ENGLISH)
+    return 2
+
+
+class TestDistanceWorkoutImportService:
+    @pytest.mark.parametrize('numberOfProcesses', [1, 2])
+    def test_import_workouts(self, app, user_id, tmp_path, monkeypatch, numberOfProcesses):
+        os.makedirs(tmp_path / 'import')
+        (tmp_path / 'import' / 'first.gpx').write_bytes(create_track(1, 4))
+        (tmp_path / 'import' / 'second.gpx').write_bytes(create_track(2, 10))
+        (tmp_path / 'import' / 'third.gpx').write_bytes(create_track(3, 2))
+        (tmp_path / 'import' / 'broken.gpx').write_bytes(b'<gpx><trk>')
+
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+        invalidateMock = Mock()
+        monkeypatch.setattr(gpxService, 'invalidate_tile_caches_by_user', invalidateMock)
+        importService = DistanceWorkoutImportService(gpxService, NotificationService(), {'baseZoomLevel': 14})
+        progress: list[WorkoutImportResult] = []
+
+        with app.app_context():
+            report = importService.import_workouts(
+                find_import_files(str(tmp_path / 'import')),
+                user_id,
+                WorkoutType.RUNNING,
+                numberOfProcesses,
+                2,
+                progress.append,
+            )
+
+            assert report.numberOfFiles == 4
+            assert report.numberOfImportedWorkouts == 3
+            assert [fileName for fileName, _ in report.failedFiles] == [str(tmp_path / 'import' / 'broken.gpx')]
+            assert len(progress) == 4
+
+            workouts = DistanceWorkout.query.order_by(DistanceWorkout.start_time).all()
+            assert [workout.name for workout in workouts] == ['first', 'second', 'third']
+            assert [workout.start_time for workout in workouts] == [get_local_time(day, 0) for day in (1, 2, 3)]
+            assert all(workout.type == WorkoutType.RUNNING for workout in workouts)
+            assert all(workout.user_id == user_id for workout in workouts)
+            assert GpxMetadata.query.count() == 3
+            assert report.numberOfVisitedTiles == GpxVisitedTile.query.count()
+
+            # all tracks start in the same tile, which is only new for the first workout
+            newTiles = FirstVisitedTileService.get_number_of_new_tiles_per_workout(user_id, None, None)
+            assert sum(newTiles.values()) == len({(tile.x, tile.y) for tile in GpxVisitedTile.query.all()})
+            assert workouts[0].id in newTiles
+
+            invalidateMock.assert_called_once_with(user_id)
+
+    def test_import_workouts_with_heart_rate(self, app, user_id, tmp_path):
+        os.makedirs(tmp_path / 'import')
+        (tmp_path / 'import' / 'track.fit').write_bytes(create_fit_file_with_heart_rate())
+        (tmp_path / 'import' / 'track.gpx').write_bytes(create_track(2, 4))
+
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+        importService = DistanceWorkoutImportService(gpxService, NotificationService(), {'baseZoomLevel': 14})
+
+        with app.app_context():
+            report = importService.import_workouts(
+                find_import_files(str(tmp_path / 'import')), user_id, WorkoutType.RUNNING, 1, 10
+            )
+
+            assert report.numberOfImportedWorkouts == 2
+            fitWorkout = DistanceWorkout.query.filter(DistanceWorkout.type == WorkoutType.BIKING).first()
+            gpxWorkout = DistanceWorkout.query.filter(DistanceWorkout.type == WorkoutType.RUNNING).first()
+            heartRateData = HeartRateService.get_heart_rate_data(fitWorkout.id)
+            assert sorted(entity.bpm for entity in heartRateData) == [100, 110, 120]
+            timestamps = [cast(datetime, entity.timestamp) for entity in heartRateData]
+            assert min(timestamps) == fitWorkout.start_time
+            assert not HeartRateService.has_heart_rate_data(gpxWorkout.id)
+
+    def test_import_workouts_notifications(self, app, user_id, tmp_path):
+        os.makedirs(tmp_path / 'import')
+        (tmp_path / 'import' / 'first.gpx').write_bytes(create_track(1, 4))
+        (tmp_path / 'import' / 'second.gpx').write_bytes(create_track(2, 10))
+
+        gpxService = create_gpx_service(str(tmp_path / 'data'))
+        importService = DistanceWorkoutImportService(gpxService, NotificationService(), {'baseZoomLevel': 14})
+
+        with app.app_context():
+            db.session.add(
+                DistanceWorkout(
+                    type=WorkoutType.BIKING,
+                    name='Existing Workout',
+                    start_time=datetime(2024, 4, 1),
+                    duration=3600,
+                    distance=1000,
+                    user_id=user_id,
+                    custom_fields={},
+                )
+            )
+            db.session.commit()
+
+            importService.import_workouts(
+                find_import_files(str(tmp_path / 'import')), user_id, WorkoutType.BIKING, 1, 1
+            )
+
+            notifications = Notification.query.filter(Notification.user_id == user_id).all()
+            longestWorkout = DistanceWorkout.query.filter(DistanceWorkout.name == 'second').first()
+
+            # a single notification per record, evaluating each workout would create two of each
+            assert sorted(notification.type.name for notification in notifications) == [
+                NotificationType.BEST_MONTH.name,
+                NotificationType.LONGEST_WORKOUT.name,
+            ]
+            assert [
+                notification.item_id
+                for notification in notifications
+                if notification.type == NotificationType.LONGEST_WORKOUT
+            ] == [longestWorkout.id]